@@ -2,6 +2,8 @@ from flask import Flask
 from flask_login import LoginManager
 from .database import db, init_app
 from .config import config
+from .utils.cache import cache
+from .services.exportacion_service import exportaciones, cache_exportaciones
 import os
 
 def create_app(config_name=None):
@@ -18,6 +20,23 @@ def create_app(config_name=None):
     # Inicializar la base de datos
     init_app(app)
     
+    # Informar índices faltantes (flask db-indices --crear los crea)
+    if app.config.get('VERIFICAR_INDICES'):
+        from .database.indices import verificar_indices
+        verificar_indices(app)
+    
+    # Inicializar la caché compartida del dashboard
+    cache.init_app(app)
+    
+    # Cola de exportaciones en segundo plano
+    exportaciones.init_app(app)
+    cache_exportaciones.init_app(app)
+    
+    # Reconstruir el resumen mensual de movimientos si una base existente lo tiene vacío
+    if app.config.get('VERIFICAR_RESUMEN'):
+        from .database.resumen import verificar_resumen
+        verificar_resumen(app)
+    
     # Configurar Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -60,6 +79,10 @@ def create_app(config_name=None):
         def error_route():
             return f"Error de configuración: {error_message}", 500
     
+    # Comandos CLI (flask kardex-backfill, ...)
+    from .cli import register_commands
+    register_commands(app)
+    
     # Manejo de errores
     @app.errorhandler(404)
     def not_found_error(error):
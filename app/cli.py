@@ -0,0 +1,141 @@
+"""
+Comandos de línea de comandos de la aplicación (flask <comando>).
+"""
+
+import click
+from flask.cli import with_appcontext
+
+
+def register_commands(app):
+    """Registra los comandos CLI en la aplicación"""
+    app.cli.add_command(kardex_backfill)
+    app.cli.add_command(resumen_movimientos_rebuild)
+    app.cli.add_command(db_indices)
+    app.cli.add_command(secuencias_sincronizar)
+    app.cli.add_command(periodo_cerrar)
+
+
+@click.command('kardex-backfill')
+@click.option('--todos', is_flag=True, default=False,
+              help='Recalcula todos los movimientos, no solo los que tienen columnas de kardex vacías.')
+@with_appcontext
+def kardex_backfill(todos):
+    """Completa m_stock_anterior/m_stock_actual/m_valor_anterior/m_valor_actual en movimientos históricos"""
+    from app.database import db
+    from app.database.models import MovimientoDetalle
+    from app.database.repositories.movimientos import MovimientoRepository
+
+    repo = MovimientoRepository()
+
+    consulta = db.session.query(MovimientoDetalle.i_id).distinct()
+    if not todos:
+        consulta = consulta.filter(db.or_(
+            MovimientoDetalle.m_stock_actual.is_(None),
+            MovimientoDetalle.m_valor_actual.is_(None)
+        ))
+    item_ids = [fila.i_id for fila in consulta.all()]
+
+    total = 0
+    for indice, item_id in enumerate(item_ids, 1):
+        try:
+            total += repo.recalcular_kardex(item_id, solo_faltantes=not todos)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f'Error en item {item_id}: {e}', err=True)
+            continue
+        # Liberar el mapa de identidades entre items para no acumular memoria
+        db.session.expunge_all()
+        if indice % 100 == 0:
+            click.echo(f'{indice}/{len(item_ids)} items procesados...')
+
+    click.echo(f'Kardex actualizado: {total} movimientos en {len(item_ids)} items.')
+
+
+@click.command('resumen-movimientos-rebuild')
+@with_appcontext
+def resumen_movimientos_rebuild():
+    """Reconstruye el resumen mensual de movimientos (tb_resumen_movimiento) desde cero"""
+    from app.database import db
+    from app.database.repositories.movimientos import MovimientoRepository
+
+    try:
+        filas = MovimientoRepository().reconstruir_resumen()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise click.ClickException(f'Error reconstruyendo el resumen: {e}')
+
+    click.echo(f'Resumen de movimientos reconstruido: {filas} filas (item/tipo/mes).')
+
+
+@click.command('db-indices')
+@click.option('--crear', is_flag=True, default=False, help='Crea los índices que faltan.')
+@click.option('--explain', 'explicar', is_flag=True, default=False,
+              help='Muestra el plan de ejecución de las consultas más usadas.')
+@with_appcontext
+def db_indices(crear, explicar):
+    """Verifica (y opcionalmente crea) los índices compuestos declarados en los modelos"""
+    from app.database.indices import obtener_indices_faltantes, crear_indices_faltantes, explicar_consultas
+
+    if crear:
+        creados = crear_indices_faltantes()
+        click.echo(f'Índices creados: {", ".join(creados) if creados else "ninguno"}')
+    else:
+        faltantes = obtener_indices_faltantes()
+        if faltantes:
+            for indice in faltantes:
+                columnas = ', '.join(columna.name for columna in indice.columns)
+                click.echo(f'FALTA {indice.table.name}.{indice.name} ({columnas})')
+        else:
+            click.echo('Todos los índices declarados existen.')
+
+    if explicar:
+        for nombre, filas in explicar_consultas().items():
+            click.echo(f'\n== {nombre}')
+            for fila in filas:
+                click.echo('  ' + ' | '.join(f'{clave}={valor}' for clave, valor in fila.items()))
+
+
+@click.command('secuencias-sincronizar')
+@with_appcontext
+def secuencias_sincronizar():
+    """Ajusta tb_secuencia al mayor código existente (tras importaciones o cargas manuales)"""
+    from app.database import db
+    from app.database.repositories.secuencias import SecuenciaRepository, SECUENCIAS
+
+    repo = SecuenciaRepository()
+    for nombre in SECUENCIAS:
+        try:
+            valor = repo.sincronizar(nombre)
+            db.session.commit()
+            click.echo(f'{nombre}: {valor}')
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f'Error sincronizando {nombre}: {e}', err=True)
+
+
+@click.command('periodo-cerrar')
+@click.option('--anio', type=int, default=None, help='Año del mes a cerrar.')
+@click.option('--mes', type=click.IntRange(1, 12), default=None, help='Mes a cerrar (1-12).')
+@with_appcontext
+def periodo_cerrar(anio, mes):
+    """Guarda el snapshot de inventario de fin de mes (por defecto, todos los meses pendientes)"""
+    from app.services.cierre_service import CierrePeriodoService
+
+    servicio = CierrePeriodoService()
+    if anio is not None or mes is not None:
+        if anio is None or mes is None:
+            raise click.UsageError('Indique --anio y --mes juntos.')
+        resultados = [servicio.cerrar_mes(anio, mes)]
+    else:
+        resultados = servicio.cerrar_pendientes()
+
+    if not resultados:
+        click.echo('No hay meses pendientes de cierre.')
+    for resultado in resultados:
+        if resultado['success']:
+            click.echo(f"Cierre {resultado['mes']:02d}/{resultado['anio']}: "
+                       f"{resultado['items']} items, valor total {resultado['valor_total']:.2f}")
+        else:
+            raise click.ClickException(resultado['error'])
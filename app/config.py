@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 from dotenv import load_dotenv
 
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -29,6 +30,32 @@ class Config:
             'write_timeout': 60
         }
     }
+    
+    # Caché del dashboard (nivel local + archivo SQLite compartido entre workers)
+    CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS') or 60)
+    CACHE_SHARED_PATH = os.environ.get('CACHE_SHARED_PATH', os.path.join(tempfile.gettempdir(), 'cardesk_cache.sqlite3'))
+    
+    # Exportaciones en segundo plano (estado y archivos compartidos entre workers)
+    EXPORT_JOBS_DIR = os.environ.get('EXPORT_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'cardesk_exportaciones'))
+    EXPORT_JOBS_WORKERS = int(os.environ.get('EXPORT_JOBS_WORKERS') or 2)
+    EXPORT_JOBS_TTL_SECONDS = int(os.environ.get('EXPORT_JOBS_TTL_SECONDS') or 3600)
+    
+    # Caché en disco de exportaciones por versión de datos (0 MB la deshabilita)
+    EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'cardesk_exportaciones_cache'))
+    EXPORT_CACHE_MAX_MB = int(os.environ.get('EXPORT_CACHE_MAX_MB') or 500)
+    EXPORT_CACHE_MAX_FILES = int(os.environ.get('EXPORT_CACHE_MAX_FILES') or 200)
+    
+    # Segundos que se reutiliza el total de filas de los listados paginados por cursor
+    CONTEO_LISTADOS_TTL = int(os.environ.get('CONTEO_LISTADOS_TTL') or 300)
+    
+    # Hilos (y conexiones) para obtener en paralelo las secciones del reporte completo
+    REPORTE_COMPLETO_HILOS = int(os.environ.get('REPORTE_COMPLETO_HILOS') or 4)
+    
+    # Verificar al iniciar que existan los índices declarados en los modelos
+    VERIFICAR_INDICES = os.environ.get('VERIFICAR_INDICES', 'true').lower() == 'true'
+    
+    # Verificar al iniciar que el resumen mensual de movimientos cubra el detalle
+    VERIFICAR_RESUMEN = os.environ.get('VERIFICAR_RESUMEN', 'true').lower() == 'true'
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -0,0 +1,100 @@
+"""
+Verificación y creación de los índices declarados en los modelos.
+
+db.create_all() solo crea índices al crear una tabla nueva; en bases de
+datos existentes los índices compuestos agregados después deben crearse
+con este módulo (flask db-indices --crear).
+"""
+
+import logging
+from sqlalchemy import inspect, text
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+# Consultas representativas de las rutas más usadas, para revisar su plan de ejecución
+CONSULTAS_PLAN = {
+    'kardex_item': (
+        "SELECT id, m_fecha, m_tipo FROM tb_movimiento_detalle "
+        "WHERE i_id = :i_id ORDER BY id DESC LIMIT 10"
+    ),
+    'movimientos_item_tipo': (
+        "SELECT id FROM tb_movimiento_detalle "
+        "WHERE i_id = :i_id AND m_tipo = 'entrada' AND m_fecha >= :desde"
+    ),
+    'movimientos_rango_fechas': (
+        "SELECT m_tipo, SUM(m_cantidad) FROM tb_movimiento_detalle "
+        "WHERE m_fecha >= :desde AND m_fecha < :hasta GROUP BY m_tipo"
+    ),
+    'asignaciones_por_estado': (
+        "SELECT id FROM tb_consumo WHERE c_estado = 'Asignado' "
+        "ORDER BY c_fecha DESC, c_hora DESC LIMIT 20"
+    ),
+    'asignaciones_por_persona': (
+        "SELECT id FROM tb_consumo WHERE pe_id = :pe_id "
+        "ORDER BY c_fecha DESC, c_hora DESC LIMIT 20"
+    ),
+    'codigos_articulo': (
+        "SELECT i_codigo FROM tb_item WHERE i_tipo = 'articulo' AND i_codigo LIKE 'ART%'"
+    ),
+}
+
+
+def obtener_indices_faltantes(bind=None):
+    """Devuelve la lista de índices declarados en los modelos que no existen en la base de datos"""
+    bind = bind or db.engine
+    inspector = inspect(bind)
+    tablas_existentes = set(inspector.get_table_names())
+    faltantes = []
+
+    for tabla in db.metadata.sorted_tables:
+        if not tabla.indexes or tabla.name not in tablas_existentes:
+            continue
+        existentes = {indice['name'] for indice in inspector.get_indexes(tabla.name)}
+        for indice in tabla.indexes:
+            if indice.name not in existentes:
+                faltantes.append(indice)
+
+    return faltantes
+
+
+def crear_indices_faltantes(bind=None):
+    """Crea los índices faltantes y devuelve sus nombres"""
+    bind = bind or db.engine
+    creados = []
+    for indice in obtener_indices_faltantes(bind):
+        indice.create(bind=bind)
+        creados.append(indice.name)
+        logger.info(f"Índice creado: {indice.table.name}.{indice.name}")
+    return creados
+
+
+def verificar_indices(app):
+    """Verificación al arrancar: informa en el log los índices que faltan"""
+    with app.app_context():
+        try:
+            faltantes = obtener_indices_faltantes()
+        except Exception as e:
+            app.logger.warning(f"No se pudo verificar los índices de la base de datos: {e}")
+            return []
+
+        if faltantes:
+            nombres = ', '.join(f"{indice.table.name}.{indice.name}" for indice in faltantes)
+            app.logger.warning(
+                f"Faltan {len(faltantes)} índices en la base de datos: {nombres}. "
+                f"Ejecute 'flask db-indices --crear' para crearlos."
+            )
+        return faltantes
+
+
+def explicar_consultas(parametros=None):
+    """Devuelve el plan de ejecución (EXPLAIN) de las consultas representativas"""
+    parametros = parametros or {'i_id': 1, 'pe_id': 1, 'desde': '2000-01-01', 'hasta': '2100-01-01'}
+    prefijo = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    planes = {}
+    with db.engine.connect() as conexion:
+        for nombre, sql in CONSULTAS_PLAN.items():
+            filas = conexion.execute(text(prefijo + sql), parametros).mappings().all()
+            planes[nombre] = [dict(fila) for fila in filas]
+    return planes
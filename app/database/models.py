@@ -81,6 +81,10 @@ class Proveedor(BaseModel):
 
 class Item(BaseModel):
     __tablename__ = 'tb_item'
+    __table_args__ = (
+        # Búsqueda de códigos por tipo (ART%, INS%)
+        db.Index('ix_item_tipo_codigo', 'i_tipo', 'i_codigo'),
+    )
     
     i_codigo = db.Column(db.String(20), unique=True, nullable=False)
     i_nombre = db.Column(db.String(200), nullable=False)
@@ -145,6 +149,12 @@ class Stock(BaseModel):
 
 class Consumo(BaseModel):
     __tablename__ = 'tb_consumo'
+    __table_args__ = (
+        # Listados de asignaciones filtrados por estado o persona, ordenados por fecha/hora
+        db.Index('ix_consumo_estado_fecha_hora', 'c_estado', 'c_fecha', 'c_hora'),
+        db.Index('ix_consumo_persona_fecha_hora', 'pe_id', 'c_fecha', 'c_hora'),
+        db.Index('ix_consumo_fecha_hora', 'c_fecha', 'c_hora'),
+    )
     
     c_numero = db.Column(db.Integer, nullable=False, default=1)
     c_fecha = db.Column(db.Date, nullable=False)
@@ -211,6 +221,15 @@ class Entrada(BaseModel):
 
 class MovimientoDetalle(BaseModel):
     __tablename__ = 'tb_movimiento_detalle'
+    __table_args__ = (
+        # Kardex por item (detalle de artículo, exportaciones)
+        db.Index('ix_movimiento_item_fecha', 'i_id', 'm_fecha'),
+        db.Index('ix_movimiento_item_tipo_fecha', 'i_id', 'm_tipo', 'm_fecha'),
+        # Kardex en el orden en que se calcularon los saldos
+        db.Index('ix_movimiento_item_id', 'i_id', 'id'),
+        # Reportes y listados por rango de fechas
+        db.Index('ix_movimiento_fecha', 'm_fecha'),
+    )
     
     m_fecha = db.Column(db.DateTime, nullable=False)
     m_tipo = db.Column(db.String(20), nullable=False)  # 'entrada', 'salida', 'ajuste'
@@ -226,4 +245,71 @@ class MovimientoDetalle(BaseModel):
     i_id = db.Column(db.Integer, db.ForeignKey('tb_item.id'), nullable=False)
     e_id = db.Column(db.Integer, db.ForeignKey('tb_entrada.id'))
     c_id = db.Column(db.Integer, db.ForeignKey('tb_consumo.id'))
-    u_id = db.Column(db.Integer, db.ForeignKey('tb_usuario.id'), nullable=False)
\ No newline at end of file
+    u_id = db.Column(db.Integer, db.ForeignKey('tb_usuario.id'), nullable=False)
+
+class ResumenMovimiento(BaseModel):
+    """Resumen materializado de movimientos por item, tipo y mes (item_movement_summary).
+    
+    Se actualiza en la misma transacción que cada inserción en
+    tb_movimiento_detalle; los reportes mensuales y anuales lo consultan en
+    lugar de recorrer todos los movimientos.
+    """
+    __tablename__ = 'tb_resumen_movimiento'
+    __table_args__ = (
+        db.UniqueConstraint('i_id', 'r_tipo', 'r_anio', 'r_mes', name='uq_resumen_item_tipo_mes'),
+    )
+    
+    i_id = db.Column(db.Integer, db.ForeignKey('tb_item.id'), nullable=False)
+    r_tipo = db.Column(db.String(20), nullable=False)
+    r_anio = db.Column(db.Integer, nullable=False)
+    r_mes = db.Column(db.Integer, nullable=False)
+    r_cantidad = db.Column(db.Integer, nullable=False, default=0)
+    r_valor_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    r_movimientos = db.Column(db.Integer, nullable=False, default=0)
+
+class CierrePeriodo(BaseModel):
+    """Cierre mensual de inventario: registra que el mes ya tiene su snapshot.
+    
+    Una vez creado no se modifica; los movimientos con fecha dentro de un mes
+    cerrado se rechazan para que los snapshots sigan siendo válidos.
+    """
+    __tablename__ = 'tb_cierre_periodo'
+    __table_args__ = (
+        db.UniqueConstraint('cp_anio', 'cp_mes', name='uq_cierre_anio_mes'),
+    )
+    
+    cp_anio = db.Column(db.Integer, nullable=False)
+    cp_mes = db.Column(db.Integer, nullable=False)
+    cp_items = db.Column(db.Integer, nullable=False, default=0)
+    cp_valor_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class SnapshotInventario(BaseModel):
+    """Estado de cada item al final de un mes cerrado (cantidad, valor unitario y total).
+    
+    Las valorizaciones históricas parten del snapshot más cercano y solo
+    recorren los movimientos posteriores a él.
+    """
+    __tablename__ = 'tb_snapshot_inventario'
+    __table_args__ = (
+        db.UniqueConstraint('si_anio', 'si_mes', 'i_id', name='uq_snapshot_mes_item'),
+    )
+    
+    si_anio = db.Column(db.Integer, nullable=False)
+    si_mes = db.Column(db.Integer, nullable=False)
+    si_cantidad = db.Column(db.Integer, nullable=False, default=0)
+    si_valor_unitario = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    si_valor_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    # Sin clave foránea: el snapshot es historia y no debe impedir eliminar el item
+    i_id = db.Column(db.Integer, nullable=False)
+
+class Secuencia(db.Model):
+    """Contador atómico para la asignación de códigos (ART, INS, PROV, PER).
+    
+    La fila se bloquea con SELECT ... FOR UPDATE dentro de la transacción que
+    crea el registro, por lo que dos workers nunca obtienen el mismo número.
+    """
+    __tablename__ = 'tb_secuencia'
+    
+    sq_nombre = db.Column(db.String(30), primary_key=True)
+    sq_valor = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
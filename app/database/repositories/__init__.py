@@ -3,11 +3,15 @@ from .instrumentos import InstrumentoRepository
 from .articulos import ArticuloRepository
 from .movimientos import MovimientoRepository
 from .proveedores import ProveedorRepository
+from .secuencias import SecuenciaRepository
+from .consumos import ConsumoRepository
 
 __all__ = [
     'BaseRepository',
     'InstrumentoRepository', 
     'ArticuloRepository',
     'MovimientoRepository',
-    'ProveedorRepository'
+    'ProveedorRepository',
+    'SecuenciaRepository',
+    'ConsumoRepository'
 ]
\ No newline at end of file
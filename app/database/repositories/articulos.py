@@ -22,6 +22,20 @@ class ArticuloRepository(BaseRepository):
         """Obtiene un artículo por ID con su información de item"""
         return db.session.query(Articulo, Item).join(Item, Articulo.i_id == Item.id).filter(Articulo.i_id == articulo_id).first()
 
+    def stream_exportacion(self, query, lote=None):
+        """Itera una consulta (Articulo, Item) filtrada como tuplas de columnas para exportar"""
+        return self.stream(query, (
+            Item.i_codigo,
+            Item.i_nombre,
+            Item.i_cantidad,
+            Item.i_vUnitario,
+            Item.i_vTotal,
+            Item.created_at,
+            Articulo.a_stockMin,
+            Articulo.a_stockMax,
+            Articulo.a_c_contable
+        ), lote)
+
     def search_by_name_or_code(self, termino):
         """Busca artículos por nombre o código"""
         termino = f"%{termino}%"
@@ -1,6 +1,9 @@
 from app.database import db
 
 class BaseRepository:
+    # Filas por lote al leer con cursor del lado del servidor
+    LOTE_STREAM = 1000
+
     def __init__(self, model):
         self.model = model
 
@@ -31,4 +34,51 @@ class BaseRepository:
             db.session.delete(instance)
             db.session.commit()
             return True
-        return False
\ No newline at end of file
+        return False
+
+    def stream(self, query, columnas, lote=None):
+        """Itera una consulta como tuplas de columnas con cursor del lado del servidor.
+
+        Se seleccionan solo las columnas indicadas (sin entidades ni identity
+        map) y se leen en lotes con yield_per, que activa stream_results: con
+        PyMySQL el dialecto usa SSCursor y el servidor envía las filas a
+        medida que se consumen. Mientras el generador esté abierto la conexión
+        está ocupada, así que no deben ejecutarse otras consultas en la sesión.
+
+        Args:
+            query: Consulta con los filtros, joins y orden ya aplicados
+            columnas: Columnas a seleccionar; cada fila expone sus atributos
+                por nombre (fila.i_codigo)
+            lote: Filas por lote (por defecto LOTE_STREAM)
+        """
+        return query.with_entities(*columnas).yield_per(lote or self.LOTE_STREAM)
+
+    def recorrer_por_clave(self, columnas, query=None, lote=None):
+        """Itera todas las filas como tuplas de columnas en páginas por clave primaria.
+
+        Cada página es una consulta corta `WHERE clave > última ORDER BY clave
+        LIMIT lote`: la memoria queda acotada por el tamaño de página y, a
+        diferencia de stream(), no queda un cursor abierto en el servidor
+        mientras se procesan las filas (un consumidor lento no choca con
+        net_write_timeout de MySQL). Dentro de una transacción REPEATABLE
+        READ todas las páginas ven el mismo snapshot.
+
+        Args:
+            columnas: Columnas a seleccionar
+            query: Consulta base con filtros (por defecto todas las filas del modelo)
+            lote: Filas por página (por defecto LOTE_STREAM)
+        """
+        clave = self.model.__mapper__.primary_key[0]
+        query = query if query is not None else db.session.query(self.model)
+        lote = lote or self.LOTE_STREAM
+        ultimo = None
+        while True:
+            pagina = query.with_entities(*columnas, clave)
+            if ultimo is not None:
+                pagina = pagina.filter(clave > ultimo)
+            filas = pagina.order_by(clave).limit(lote).all()
+            for fila in filas:
+                yield tuple(fila)[:-1]
+            if len(filas) < lote:
+                return
+            ultimo = filas[-1][-1]
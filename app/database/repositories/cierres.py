@@ -0,0 +1,78 @@
+from datetime import datetime
+from sqlalchemy import insert
+from app.database.models import CierrePeriodo, SnapshotInventario
+from app.database import db
+
+
+class CierreRepository:
+    """Acceso a los cierres mensuales y a sus snapshots de inventario"""
+
+    # Filas por sentencia INSERT al guardar un snapshot
+    LOTE_INSERT = 1000
+
+    def obtener(self, anio, mes):
+        return CierrePeriodo.query.filter_by(cp_anio=anio, cp_mes=mes).first()
+
+    def listar(self):
+        """Cierres registrados, del más reciente al más antiguo"""
+        return CierrePeriodo.query.order_by(
+            CierrePeriodo.cp_anio.desc(), CierrePeriodo.cp_mes.desc()
+        ).all()
+
+    def ultimo_cierre(self, hasta=None):
+        """Cierre más reciente cuyo mes termina en o antes de `hasta` (datetime o date)"""
+        query = CierrePeriodo.query
+        if hasta is not None:
+            # El mes (a, m) termina el día 1 del mes siguiente: solo cuentan
+            # los meses anteriores al mes de `hasta`
+            clave = CierrePeriodo.cp_anio * 12 + CierrePeriodo.cp_mes
+            query = query.filter(clave < hasta.year * 12 + hasta.month)
+        return query.order_by(CierrePeriodo.cp_anio.desc(), CierrePeriodo.cp_mes.desc()).first()
+
+    def mes_cerrado(self, fecha):
+        """Indica si el mes de `fecha` ya tiene cierre"""
+        return db.session.query(CierrePeriodo.id).filter_by(
+            cp_anio=fecha.year, cp_mes=fecha.month
+        ).first() is not None
+
+    def estado_snapshot(self, cierre):
+        """Estado {i_id: (cantidad, valor_unitario)} guardado en un cierre"""
+        filas = db.session.query(
+            SnapshotInventario.i_id,
+            SnapshotInventario.si_cantidad,
+            SnapshotInventario.si_valor_unitario
+        ).filter(
+            SnapshotInventario.si_anio == cierre.cp_anio,
+            SnapshotInventario.si_mes == cierre.cp_mes
+        ).yield_per(self.LOTE_INSERT)
+        return {fila.i_id: (fila.si_cantidad, fila.si_valor_unitario) for fila in filas}
+
+    def guardar_cierre(self, anio, mes, filas):
+        """Inserta el cierre y sus filas de snapshot con inserciones masivas. No hace commit.
+
+        Args:
+            filas: Lista de diccionarios {'i_id', 'cantidad', 'valor_unitario', 'valor_total'}
+        """
+        ahora = datetime.utcnow()
+        cierre = CierrePeriodo(
+            cp_anio=anio,
+            cp_mes=mes,
+            cp_items=len(filas),
+            cp_valor_total=sum((fila['valor_total'] for fila in filas), 0)
+        )
+        db.session.add(cierre)
+        # El flush falla con la restricción única si otro proceso cerró el mes
+        db.session.flush()
+
+        for inicio in range(0, len(filas), self.LOTE_INSERT):
+            db.session.execute(insert(SnapshotInventario), [{
+                'si_anio': anio,
+                'si_mes': mes,
+                'i_id': fila['i_id'],
+                'si_cantidad': fila['cantidad'],
+                'si_valor_unitario': fila['valor_unitario'],
+                'si_valor_total': fila['valor_total'],
+                'created_at': ahora,
+                'updated_at': ahora
+            } for fila in filas[inicio:inicio + self.LOTE_INSERT]])
+        return cierre
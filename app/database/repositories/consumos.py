@@ -0,0 +1,42 @@
+from .base import BaseRepository
+from app.database.models import Consumo, Item, Persona
+from app.database import db
+
+class ConsumoRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(Consumo)
+
+    def stream_asignaciones(self, query, lote=None):
+        """Itera una consulta (Consumo, Persona, Item) filtrada como tuplas de columnas"""
+        return self.stream(query, (
+            Consumo.c_fecha,
+            Consumo.c_hora,
+            Consumo.c_cantidad,
+            Consumo.c_valorUnitario,
+            Consumo.c_valorTotal,
+            Consumo.c_estado,
+            Consumo.c_fecha_devolucion,
+            Consumo.c_observaciones,
+            Persona.pe_nombre,
+            Persona.pe_apellido,
+            Item.i_nombre,
+            Item.i_codigo
+        ), lote)
+
+    def stream_por_persona(self, persona_id, lote=None):
+        """Itera las asignaciones de una persona (más recientes primero) como tuplas"""
+        query = db.session.query(Consumo).outerjoin(
+            Item, Consumo.i_id == Item.id
+        ).filter(
+            Consumo.pe_id == persona_id
+        ).order_by(Consumo.c_fecha.desc())
+        return self.stream(query, (
+            Consumo.c_fecha,
+            Consumo.c_cantidad,
+            Consumo.c_valorUnitario,
+            Consumo.c_valorTotal,
+            Consumo.c_estado,
+            Consumo.c_observaciones,
+            Item.i_nombre,
+            Item.i_codigo
+        ), lote)
@@ -1,6 +1,9 @@
 from .base import BaseRepository
-from app.database.models import MovimientoDetalle, Item, Entrada, Consumo
+from .cierres import CierreRepository
+from app.database.models import MovimientoDetalle, Item, Entrada, Consumo, ResumenMovimiento, Usuario, Proveedor
 from app.database import db
+from app.utils.cache import marcar_cambios_dashboard, marcar_cambios_exportaciones
+from sqlalchemy import func, extract, update, case, literal
 from datetime import datetime, date
 from decimal import Decimal
 
@@ -23,82 +26,395 @@ class MovimientoRepository(BaseRepository):
         """Obtiene movimientos por tipo (entrada, salida, ajuste)"""
         return MovimientoDetalle.query.filter_by(m_tipo=tipo).order_by(MovimientoDetalle.m_fecha.desc()).all()
     
-    def crear_entrada(self, item_id, cantidad, valor_unitario, usuario_id, entrada_id=None, observaciones=None, fecha_hora=None):
-        """Crea un movimiento de entrada"""
-        valor_unitario = Decimal(str(valor_unitario))
-        valor_total = Decimal(str(cantidad)) * valor_unitario
+    def stream_movimientos(self, query, lote=None):
+        """Itera los movimientos de una consulta (MovimientoDetalle, Item, Usuario) como tuplas.
+
+        Agrega el proveedor de la entrada con outer joins para no tener que
+        consultarlo fila por fila mientras el cursor está abierto.
+        """
+        query = query.outerjoin(
+            Entrada, MovimientoDetalle.e_id == Entrada.id
+        ).outerjoin(
+            Proveedor, Entrada.p_id == Proveedor.id
+        )
+        return self.stream(query, (
+            MovimientoDetalle.m_fecha,
+            MovimientoDetalle.m_tipo,
+            MovimientoDetalle.m_cantidad,
+            MovimientoDetalle.m_valorUnitario,
+            MovimientoDetalle.m_valorTotal,
+            MovimientoDetalle.m_observaciones,
+            Item.i_nombre,
+            Item.i_codigo,
+            Usuario.u_username,
+            Proveedor.p_razonsocial
+        ), lote)
+    
+    def stream_kardex(self, item_id, lote=None):
+        """Itera el historial completo de un item en orden de registro como tuplas.
         
-        if fecha_hora is None:
-            fecha_hora = datetime.now()
+        Se ordena por id y no por m_fecha: el saldo de cada movimiento se
+        calcula al insertarlo, y los movimientos antiguos solo guardan la fecha
+        (medianoche), así que un orden por fecha rompe la cadena de saldos.
+        """
+        query = db.session.query(MovimientoDetalle).filter(
+            MovimientoDetalle.i_id == item_id
+        ).order_by(MovimientoDetalle.id.asc())
+        return self.stream(query, (
+            MovimientoDetalle.m_fecha,
+            MovimientoDetalle.m_tipo,
+            MovimientoDetalle.m_cantidad,
+            MovimientoDetalle.m_valorUnitario,
+            MovimientoDetalle.m_valorTotal,
+            MovimientoDetalle.u_id,
+            MovimientoDetalle.m_observaciones
+        ), lote)
+    
+    def ultimos_kardex(self, item_id, limite):
+        """Últimos `limite` movimientos de un item, devueltos en orden de registro"""
+        filas = db.session.query(
+            MovimientoDetalle.m_fecha,
+            MovimientoDetalle.m_tipo,
+            MovimientoDetalle.m_cantidad,
+            MovimientoDetalle.m_valorUnitario,
+            MovimientoDetalle.m_valorTotal,
+            MovimientoDetalle.u_id,
+            MovimientoDetalle.m_observaciones
+        ).filter(
+            MovimientoDetalle.i_id == item_id
+        ).order_by(MovimientoDetalle.id.desc()).limit(limite).all()
+        return filas[::-1]
+    
+    @staticmethod
+    def capturar_estado(item):
+        """Devuelve (stock, valor unitario) del item antes de modificarlo"""
+        return item.i_cantidad or 0, Decimal(str(item.i_vUnitario or 0))
+    
+    def ajustar_stock(self, item_id, cantidad, valor_unitario_entrada=None):
+        """Modifica el stock de un item con un UPDATE condicional atómico.
         
-        movimiento = MovimientoDetalle(
-            m_fecha=fecha_hora,
-            m_tipo='entrada',
-            m_cantidad=cantidad,
-            m_valorUnitario=valor_unitario,
-            m_valorTotal=valor_total,
-            m_observaciones=observaciones,
-            i_id=item_id,
-            e_id=entrada_id,
-            u_id=usuario_id
+        Una cantidad negativa descuenta stock solo si alcanza
+        (`WHERE i_cantidad >= n`), de modo que dos workers no pueden entregar
+        la misma unidad ni pisarse la actualización. Con valor_unitario_entrada
+        se recalcula el costo promedio ponderado (si el stock resultante no es
+        positivo se toma el valor de la entrada); en otro caso
+        i_vTotal = i_cantidad * i_vUnitario. La fila queda bloqueada hasta
+        el commit del llamador.
+        
+        Returns:
+            tuple: (item recargado, stock_anterior, valor_unitario_anterior)
+        
+        Raises:
+            ValueError: si el item no existe o el stock es insuficiente
+        """
+        valor_anterior = None
+        if valor_unitario_entrada is not None:
+            # El promedio ponderado cambia el valor unitario: se bloquea antes
+            # para guardar el valor anterior exacto en el kardex
+            item = Item.query.filter_by(id=item_id).with_for_update().populate_existing().first()
+            if not item:
+                raise ValueError("Item no encontrado")
+            valor_anterior = Decimal(str(item.i_vUnitario or 0))
+        
+        nueva_cantidad = Item.i_cantidad + cantidad
+        if valor_unitario_entrada is not None:
+            valor_unitario_entrada = Decimal(str(valor_unitario_entrada))
+            valor_total_entrada = Decimal(str(cantidad)) * valor_unitario_entrada
+            nuevo_total = Item.i_vTotal + valor_total_entrada
+            hay_stock = nueva_cantidad > 0
+            valores = [
+                (Item.i_vUnitario, case(
+                    (hay_stock, nuevo_total / nueva_cantidad),
+                    else_=literal(valor_unitario_entrada, Item.i_vUnitario.type)
+                )),
+                (Item.i_vTotal, case(
+                    (hay_stock, nuevo_total),
+                    else_=literal(valor_total_entrada, Item.i_vTotal.type)
+                )),
+                (Item.i_cantidad, nueva_cantidad)
+            ]
+        else:
+            valores = [
+                (Item.i_vTotal, nueva_cantidad * Item.i_vUnitario),
+                (Item.i_cantidad, nueva_cantidad)
+            ]
+        
+        # MySQL evalúa el SET de izquierda a derecha: i_cantidad va al final para
+        # que las expresiones de valor usen la cantidad previa
+        sentencia = update(Item).where(Item.id == item_id)
+        if cantidad < 0:
+            sentencia = sentencia.where(Item.i_cantidad >= -cantidad)
+        resultado = db.session.execute(
+            sentencia.ordered_values(*valores).execution_options(synchronize_session=False)
         )
         
-        # Actualizar stock del item
-        item = Item.query.get(item_id)
-        if item:
-            # Calcular nuevo valor total ponderado
-            valor_total_anterior = Decimal(str(item.i_vTotal))
-            cantidad_anterior = item.i_cantidad
-            
-            # Actualizar cantidad
-            item.i_cantidad += cantidad
-            
-            # Calcular nuevo valor unitario promedio ponderado
-            if item.i_cantidad > 0:
-                nuevo_valor_total = valor_total_anterior + valor_total
-                item.i_vUnitario = nuevo_valor_total / item.i_cantidad
-                item.i_vTotal = nuevo_valor_total
-            else:
-                item.i_vUnitario = valor_unitario
-                item.i_vTotal = valor_total
+        if resultado.rowcount == 0:
+            disponible = db.session.query(Item.i_cantidad).filter(Item.id == item_id).scalar()
+            if disponible is None:
+                raise ValueError("Item no encontrado")
+            raise ValueError(f"Stock insuficiente. Disponible: {disponible}, Solicitado: {-cantidad}")
         
-        db.session.add(movimiento)
-        db.session.commit()
-        return movimiento
+        # El UPDATE directo no pasa por el flush del ORM
+        marcar_cambios_dashboard(db.session)
+        
+        item = Item.query.filter_by(id=item_id).populate_existing().one()
+        if valor_anterior is None:
+            valor_anterior = Decimal(str(item.i_vUnitario or 0))
+        return item, item.i_cantidad - cantidad, valor_anterior
     
-    def crear_salida(self, item_id, cantidad, valor_unitario, usuario_id, consumo_id=None, observaciones=None):
-        """Crea un movimiento de salida"""
-        # Verificar stock disponible
-        item = Item.query.get(item_id)
-        if not item or item.i_cantidad < cantidad:
-            raise ValueError("Stock insuficiente")
+    def actualizar_precio(self, item_id, nuevo_valor):
+        """Cambia el valor unitario recalculando i_vTotal con la cantidad vigente en la base"""
+        nuevo_valor = Decimal(str(nuevo_valor))
+        db.session.execute(
+            update(Item).where(Item.id == item_id).values(
+                i_vUnitario=nuevo_valor,
+                i_vTotal=Item.i_cantidad * nuevo_valor
+            ).execution_options(synchronize_session=False)
+        )
+        marcar_cambios_dashboard(db.session)
+        return Item.query.filter_by(id=item_id).populate_existing().one()
+    
+    def nuevo_movimiento(self, item, tipo, cantidad, valor_unitario, usuario_id,
+                         stock_anterior, valor_anterior, observaciones=None,
+                         entrada_id=None, consumo_id=None, fecha=None, valor_total=None):
+        """Agrega a la sesión un movimiento con las columnas de kardex calculadas.
+        
+        Debe llamarse después de aplicar el cambio de stock al item: el estado
+        actual del item se guarda como m_stock_actual/m_valor_actual. No hace
+        commit; el llamador confirma la transacción.
+        
+        Raises:
+            ValueError: si la fecha indicada cae en un mes ya cerrado
+        """
+        hoy = date.today()
+        if fecha is not None and (fecha.year, fecha.month) < (hoy.year, hoy.month) \
+                and CierreRepository().mes_cerrado(fecha):
+            # Solo los meses terminados pueden estar cerrados; un movimiento
+            # retroactivo en ellos invalidaría el snapshot del cierre
+            raise ValueError(f"El periodo {fecha.month:02d}/{fecha.year} está cerrado")
         
         valor_unitario = Decimal(str(valor_unitario))
-        valor_total = Decimal(str(cantidad)) * valor_unitario
+        if valor_total is None:
+            valor_total = Decimal(str(cantidad)) * valor_unitario
         
         movimiento = MovimientoDetalle(
-            m_fecha=date.today(),
-            m_tipo='salida',
+            m_fecha=fecha or datetime.now(),
+            m_tipo=tipo,
             m_cantidad=cantidad,
             m_valorUnitario=valor_unitario,
             m_valorTotal=valor_total,
             m_observaciones=observaciones,
-            i_id=item_id,
+            m_stock_anterior=stock_anterior,
+            m_stock_actual=item.i_cantidad,
+            m_valor_anterior=valor_anterior,
+            m_valor_actual=Decimal(str(item.i_vUnitario or 0)),
+            i_id=item.id,
+            e_id=entrada_id,
             c_id=consumo_id,
             u_id=usuario_id
         )
+        db.session.add(movimiento)
+        self.acumular_resumen(item.id, tipo, movimiento.m_fecha, cantidad, valor_total)
+        return movimiento
+    
+    def acumular_resumen(self, item_id, tipo, fecha, cantidad, valor_total, movimientos=1):
+        """Suma un movimiento al resumen mensual del item dentro de la transacción actual"""
+        valores = {
+            'i_id': item_id,
+            'r_tipo': tipo,
+            'r_anio': fecha.year,
+            'r_mes': fecha.month,
+            'r_cantidad': cantidad or 0,
+            'r_valor_total': Decimal(str(valor_total or 0)),
+            'r_movimientos': movimientos
+        }
         
-        # Actualizar stock del item
-        valor_total_salida = Decimal(str(item.i_vUnitario)) * Decimal(str(cantidad))
-        item.i_cantidad -= cantidad
+        if db.session.get_bind().dialect.name == 'mysql':
+            # Upsert atómico: no hay carrera entre workers al crear la fila del mes
+            from sqlalchemy.dialects.mysql import insert
+            ahora = datetime.utcnow()
+            sentencia = insert(ResumenMovimiento).values(created_at=ahora, updated_at=ahora, **valores)
+            sentencia = sentencia.on_duplicate_key_update(
+                r_cantidad=ResumenMovimiento.r_cantidad + sentencia.inserted.r_cantidad,
+                r_valor_total=ResumenMovimiento.r_valor_total + sentencia.inserted.r_valor_total,
+                r_movimientos=ResumenMovimiento.r_movimientos + sentencia.inserted.r_movimientos,
+                updated_at=sentencia.inserted.updated_at
+            )
+            db.session.execute(sentencia)
+            return
         
-        if item.i_cantidad > 0:
-            item.i_vTotal = Decimal(str(item.i_vTotal)) - valor_total_salida
-            # Mantener el valor unitario actual (no recalcular en salidas)
+        resumen = ResumenMovimiento.query.filter_by(
+            i_id=item_id, r_tipo=tipo, r_anio=fecha.year, r_mes=fecha.month
+        ).with_for_update().first()
+        if resumen is None:
+            db.session.add(ResumenMovimiento(**valores))
+            db.session.flush()
         else:
-            item.i_vUnitario = Decimal('0')
-            item.i_vTotal = Decimal('0')
+            resumen.r_cantidad += valores['r_cantidad']
+            resumen.r_valor_total = Decimal(str(resumen.r_valor_total)) + valores['r_valor_total']
+            resumen.r_movimientos += movimientos
+    
+    def obtener_resumen(self, item_id=None, tipo_item=None, desde=None, hasta=None):
+        """Totales por tipo de movimiento leídos del resumen mensual.
         
-        db.session.add(movimiento)
+        desde/hasta son tuplas (año, mes) inclusivas; None significa sin límite.
+        """
+        query = db.session.query(
+            ResumenMovimiento.r_tipo.label('m_tipo'),
+            func.sum(ResumenMovimiento.r_cantidad).label('total_cantidad'),
+            func.sum(ResumenMovimiento.r_valor_total).label('total_valor'),
+            func.sum(ResumenMovimiento.r_movimientos).label('total_movimientos')
+        )
+        
+        if tipo_item:
+            query = query.join(Item, ResumenMovimiento.i_id == Item.id).filter(Item.i_tipo == tipo_item)
+        if item_id:
+            query = query.filter(ResumenMovimiento.i_id == item_id)
+        
+        clave_mes = ResumenMovimiento.r_anio * 100 + ResumenMovimiento.r_mes
+        if desde:
+            query = query.filter(clave_mes >= desde[0] * 100 + desde[1])
+        if hasta:
+            query = query.filter(clave_mes <= hasta[0] * 100 + hasta[1])
+        
+        return query.group_by(ResumenMovimiento.r_tipo).all()
+    
+    def reconstruir_resumen(self):
+        """Recalcula el resumen mensual completo a partir de tb_movimiento_detalle. No hace commit."""
+        anio = extract('year', MovimientoDetalle.m_fecha)
+        mes = extract('month', MovimientoDetalle.m_fecha)
+        filas = db.session.query(
+            MovimientoDetalle.i_id,
+            MovimientoDetalle.m_tipo,
+            anio.label('anio'),
+            mes.label('mes'),
+            func.sum(MovimientoDetalle.m_cantidad).label('cantidad'),
+            func.sum(MovimientoDetalle.m_valorTotal).label('valor_total'),
+            func.count(MovimientoDetalle.id).label('movimientos')
+        ).group_by(MovimientoDetalle.i_id, MovimientoDetalle.m_tipo, anio, mes).all()
+        
+        ResumenMovimiento.query.delete(synchronize_session=False)
+        ahora = datetime.utcnow()
+        db.session.bulk_insert_mappings(ResumenMovimiento, [{
+            'i_id': fila.i_id,
+            'r_tipo': fila.m_tipo,
+            'r_anio': int(fila.anio),
+            'r_mes': int(fila.mes),
+            'r_cantidad': int(fila.cantidad or 0),
+            'r_valor_total': Decimal(str(fila.valor_total or 0)),
+            'r_movimientos': fila.movimientos,
+            'created_at': ahora,
+            'updated_at': ahora
+        } for fila in filas])
+        # Las inserciones masivas no pasan por el flush del ORM
+        marcar_cambios_exportaciones(db.session)
+        return len(filas)
+    
+    def obtener_totales_item(self, item_id):
+        """Calcula saldo y valores acumulados de un item desde el resumen mensual"""
+        totales = {fila.m_tipo: fila for fila in self.obtener_resumen(item_id=item_id)}
+        
+        def _total(tipo, campo):
+            fila = totales.get(tipo)
+            return (getattr(fila, campo) or 0) if fila else 0
+        
+        cantidad_entradas = int(_total('entrada', 'total_cantidad'))
+        cantidad_salidas = int(_total('salida', 'total_cantidad'))
+        valor_entradas = Decimal(str(_total('entrada', 'total_valor')))
+        valor_salidas = Decimal(str(_total('salida', 'total_valor')))
+        
+        return {
+            'saldo': cantidad_entradas - cantidad_salidas,
+            'valor_total_historico': valor_entradas,
+            'valor_total_actual': valor_entradas - valor_salidas
+        }
+    
+    @staticmethod
+    def aplicar_movimiento(stock, valor, tipo, cantidad, valor_total, valor_unitario):
+        """Devuelve (stock, valor unitario) después de un movimiento, con costo promedio ponderado.
+        
+        Reproduce ajustar_stock: una salida no cambia el valor unitario,
+        aunque el stock llegue a cero.
+        """
+        cantidad = cantidad or 0
+        if tipo == 'entrada':
+            nuevo_stock = stock + cantidad
+            if nuevo_stock > 0:
+                valor = (stock * valor + Decimal(str(valor_total or 0))) / nuevo_stock
+            else:
+                valor = Decimal(str(valor_unitario or 0))
+            stock = nuevo_stock
+        elif tipo == 'salida':
+            stock -= cantidad
+        elif tipo == 'ajuste_precio':
+            valor = Decimal(str(valor_unitario or 0))
+        return stock, valor
+    
+    def recalcular_kardex(self, item_id, solo_faltantes=True):
+        """Reconstruye las columnas de kardex de un item recorriendo su historial.
+        
+        El historial se recorre por id, el mismo orden en que ajustar_stock
+        aplica los movimientos. Con solo_faltantes=True los movimientos que ya tienen valores se toman
+        como punto de partida y solo se completan los que están en NULL.
+        Devuelve la cantidad de movimientos actualizados. No hace commit.
+        """
+        movimientos = MovimientoDetalle.query.filter_by(i_id=item_id).order_by(
+            MovimientoDetalle.id.asc()
+        ).all()
+        
+        stock = 0
+        valor = Decimal('0')
+        actualizados = 0
+        
+        for mov in movimientos:
+            completo = mov.m_stock_actual is not None and mov.m_valor_actual is not None
+            if solo_faltantes and completo:
+                stock = mov.m_stock_actual
+                valor = Decimal(str(mov.m_valor_actual))
+                continue
+            
+            stock_anterior, valor_anterior = stock, valor
+            stock, valor = self.aplicar_movimiento(
+                stock, valor, mov.m_tipo, mov.m_cantidad, mov.m_valorTotal, mov.m_valorUnitario
+            )
+            
+            mov.m_stock_anterior = stock_anterior
+            mov.m_stock_actual = stock
+            mov.m_valor_anterior = valor_anterior.quantize(Decimal('0.01'))
+            mov.m_valor_actual = valor.quantize(Decimal('0.01'))
+            actualizados += 1
+        
+        return actualizados
+    
+    def crear_entrada(self, item_id, cantidad, valor_unitario, usuario_id, entrada_id=None, observaciones=None, fecha_hora=None):
+        """Crea un movimiento de entrada"""
+        valor_unitario = Decimal(str(valor_unitario))
+        
+        if fecha_hora is None:
+            fecha_hora = datetime.now()
+        
+        # Suma atómica con recálculo del promedio ponderado
+        item, stock_anterior, valor_anterior = self.ajustar_stock(
+            item_id, cantidad, valor_unitario_entrada=valor_unitario
+        )
+        
+        movimiento = self.nuevo_movimiento(
+            item, 'entrada', cantidad, valor_unitario, usuario_id,
+            stock_anterior, valor_anterior,
+            observaciones=observaciones, entrada_id=entrada_id, fecha=fecha_hora
+        )
+        db.session.commit()
+        return movimiento
+    
+    def crear_salida(self, item_id, cantidad, valor_unitario, usuario_id, consumo_id=None, observaciones=None):
+        """Crea un movimiento de salida"""
+        # Descuento atómico: falla si no hay stock suficiente
+        item, stock_anterior, valor_anterior = self.ajustar_stock(item_id, -cantidad)
+        
+        movimiento = self.nuevo_movimiento(
+            item, 'salida', cantidad, valor_unitario, usuario_id,
+            stock_anterior, valor_anterior,
+            observaciones=observaciones, consumo_id=consumo_id, fecha=datetime.now()
+        )
         db.session.commit()
         return movimiento
\ No newline at end of file
@@ -5,6 +5,21 @@ class PersonalRepository(BaseRepository):
     def __init__(self):
         super().__init__(Persona)
     
+    def stream_exportacion(self, query, lote=None):
+        """Itera una consulta de personas filtrada como tuplas de columnas para exportar"""
+        return self.stream(query, (
+            Persona.pe_codigo,
+            Persona.pe_nombre,
+            Persona.pe_apellido,
+            Persona.pe_ci,
+            Persona.pe_telefono,
+            Persona.pe_correo,
+            Persona.pe_direccion,
+            Persona.pe_cargo,
+            Persona.pe_estado,
+            Persona.created_at
+        ), lote)
+    
     def get_by_codigo(self, codigo):
         """Busca una persona por código"""
         return Persona.query.filter_by(pe_codigo=codigo).first()
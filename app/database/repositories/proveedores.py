@@ -5,6 +5,19 @@ class ProveedorRepository(BaseRepository):
     def __init__(self):
         super().__init__(Proveedor)
     
+    def stream_exportacion(self, query, lote=None):
+        """Itera una consulta de proveedores filtrada como tuplas de columnas para exportar"""
+        return self.stream(query, (
+            Proveedor.p_codigo,
+            Proveedor.p_razonsocial,
+            Proveedor.p_ci_ruc,
+            Proveedor.p_direccion,
+            Proveedor.p_telefono,
+            Proveedor.p_correo,
+            Proveedor.p_estado,
+            Proveedor.created_at
+        ), lote)
+    
     def get_by_codigo(self, codigo):
         """Busca un proveedor por código"""
         return Proveedor.query.filter_by(p_codigo=codigo).first()
@@ -0,0 +1,81 @@
+from app.database.models import Secuencia, Item, Proveedor, Persona
+from app.database import db
+from sqlalchemy.exc import IntegrityError
+
+# nombre de secuencia -> (prefijo, columna del código, filtro adicional)
+SECUENCIAS = {
+    'articulo': ('ART', Item.i_codigo, Item.i_tipo == 'articulo'),
+    'instrumento': ('INS', Item.i_codigo, Item.i_tipo == 'instrumento'),
+    'proveedor': ('PROV', Proveedor.p_codigo, None),
+    'persona': ('PER', Persona.pe_codigo, None),
+}
+
+class SecuenciaRepository:
+    """Asignación atómica de códigos correlativos mediante tb_secuencia"""
+    
+    def generar_codigo(self, nombre):
+        """Reserva el siguiente código de la secuencia (p.ej. 'ART042')"""
+        return self.generar_codigos(nombre, 1)[0]
+    
+    def generar_codigos(self, nombre, cantidad):
+        """Reserva un bloque de `cantidad` códigos consecutivos con un solo UPDATE.
+        
+        La reserva forma parte de la transacción del llamador: si ésta se
+        revierte, los números vuelven a quedar libres. No hace commit.
+        """
+        if cantidad < 1:
+            return []
+        prefijo = SECUENCIAS[nombre][0]
+        inicio = self.reservar(nombre, cantidad)
+        return [f"{prefijo}{numero:03d}" for numero in range(inicio, inicio + cantidad)]
+    
+    def reservar(self, nombre, cantidad=1):
+        """Incrementa la secuencia en `cantidad` y devuelve el primer número reservado"""
+        secuencia = self._obtener_bloqueada(nombre)
+        inicio = secuencia.sq_valor + 1
+        secuencia.sq_valor += cantidad
+        db.session.flush()
+        return inicio
+    
+    def sincronizar(self, nombre):
+        """Ajusta la secuencia al máximo código existente (códigos cargados fuera de la secuencia). No hace commit."""
+        secuencia = self._obtener_bloqueada(nombre)
+        maximo = self._maximo_existente(nombre)
+        if maximo > secuencia.sq_valor:
+            secuencia.sq_valor = maximo
+            db.session.flush()
+        return secuencia.sq_valor
+    
+    def _obtener_bloqueada(self, nombre):
+        """Obtiene la fila de la secuencia con bloqueo; la crea la primera vez"""
+        if nombre not in SECUENCIAS:
+            raise ValueError(f"Secuencia desconocida: {nombre}")
+        
+        secuencia = Secuencia.query.filter_by(sq_nombre=nombre).with_for_update().first()
+        if secuencia is not None:
+            return secuencia
+        
+        # Primera vez: inicializar con el mayor código existente. Si otro worker
+        # la crea al mismo tiempo, el INSERT falla y se relee la fila bloqueada.
+        try:
+            with db.session.begin_nested():
+                db.session.add(Secuencia(sq_nombre=nombre, sq_valor=self._maximo_existente(nombre)))
+        except IntegrityError:
+            pass
+        
+        return Secuencia.query.filter_by(sq_nombre=nombre).with_for_update().one()
+    
+    def _maximo_existente(self, nombre):
+        """Mayor número usado en los códigos existentes (solo se usa al inicializar)"""
+        prefijo, columna, filtro = SECUENCIAS[nombre]
+        query = db.session.query(columna).filter(columna.like(f'{prefijo}%'))
+        if filtro is not None:
+            query = query.filter(filtro)
+        
+        maximo = 0
+        for (codigo,) in query:
+            try:
+                maximo = max(maximo, int(codigo[len(prefijo):]))
+            except (ValueError, TypeError):
+                continue
+        return maximo
@@ -0,0 +1,68 @@
+"""
+Verificación al arrancar del resumen mensual de movimientos (tb_resumen_movimiento).
+
+El resumen se mantiene en la misma transacción que cada movimiento, pero en
+una base de datos existente la tabla nace vacía: hasta reconstruirla
+(flask resumen-movimientos-rebuild) el saldo del detalle de artículo y los
+reportes por mes, año o histórico mostrarían totales en cero o parciales.
+"""
+
+from sqlalchemy import func, inspect
+
+from . import db
+from .models import MovimientoDetalle, ResumenMovimiento
+
+
+def contar_movimientos_resumidos():
+    """Devuelve (movimientos en el detalle, movimientos contados en el resumen),
+    o None si la tabla del resumen no existe"""
+    if ResumenMovimiento.__tablename__ not in inspect(db.engine).get_table_names():
+        return None
+    detalle = db.session.query(func.count(MovimientoDetalle.id)).scalar()
+    resumen = db.session.query(func.coalesce(func.sum(ResumenMovimiento.r_movimientos), 0)).scalar()
+    return int(detalle or 0), int(resumen or 0)
+
+
+def verificar_resumen(app):
+    """Reconstruye el resumen si está vacío y hay movimientos; informa en el log si está incompleto.
+
+    Returns:
+        bool: True si el resumen cubre todos los movimientos
+    """
+    from .repositories.movimientos import MovimientoRepository
+
+    with app.app_context():
+        try:
+            conteo = contar_movimientos_resumidos()
+            if conteo is None:
+                app.logger.warning(
+                    "Falta la tabla tb_resumen_movimiento: créela con db.create_all() "
+                    "y ejecute 'flask resumen-movimientos-rebuild'."
+                )
+                return False
+
+            detalle, resumen = conteo
+            if detalle == resumen:
+                return True
+
+            if resumen == 0:
+                # Instalación actualizada: el resumen nunca se llenó
+                filas = MovimientoRepository().reconstruir_resumen()
+                db.session.commit()
+                app.logger.warning(
+                    f"Resumen de movimientos vacío: reconstruido con {filas} filas "
+                    f"a partir de {detalle} movimientos."
+                )
+                return True
+
+            app.logger.warning(
+                f"El resumen de movimientos cubre {resumen} de {detalle} movimientos. "
+                f"Ejecute 'flask resumen-movimientos-rebuild' para reconstruirlo."
+            )
+            return False
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"No se pudo verificar el resumen de movimientos: {e}")
+            return False
+        finally:
+            db.session.remove()
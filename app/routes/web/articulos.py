@@ -2,28 +2,40 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app.services import ArticuloService
 from app.services.proveedor_service import ProveedorService
+from app.services.ingreso_service import IngresoFacturaService
+from app.database.repositories.articulos import ArticuloRepository
+from app.database.repositories.movimientos import MovimientoRepository
+from app.database.repositories.consumos import ConsumoRepository
 from sqlalchemy import desc, asc
 from app.database.models import Articulo, Item, Consumo, Persona
 from app.database import db
 import io
-from openpyxl import Workbook
+import itertools
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from datetime import datetime
 from app.utils.export_utils import (
-    crear_cabecera_excel, crear_estilos_excel, crear_cabecera_pdf,
-    crear_estilos_pdf, aplicar_estilo_tabla_pdf, ajustar_columnas_excel,
-    crear_tabla_detallada_excel, crear_tabla_detallada_pdf,
+    ExcelStreaming, FORMATOS_CSV, respuesta_csv, crear_cabecera_pdf,
+    crear_estilos_pdf, crear_tabla_detallada_pdf,
+    iterar_tabla_pdf, construir_pdf_incremental, ESTILO_TABLA_PDF,
     formatear_valor_moneda, formatear_fecha, truncar_texto
 )
-from openpyxl.styles import Font
+from app.utils.periodos import rango_fechas, filtrar_por_rango
+from app.utils.paginacion import paginar_por_clave, clave_filtros
 
 bp = Blueprint('articulos', __name__)
+
+# Movimientos incluidos en el PDF de detalle salvo que se pida el historial completo
+LIMITE_MOVIMIENTOS_PDF = 20
 articulo_service = ArticuloService()
 proveedor_service = ProveedorService()
+ingreso_service = IngresoFacturaService()
+articulo_repo = ArticuloRepository()
+movimiento_repo = MovimientoRepository()
+consumo_repo = ConsumoRepository()
 
 @bp.route('/')
 @login_required
@@ -73,12 +85,12 @@ def listar_articulos():
         query = query.order_by(desc(Item.created_at))
     
     # Manejar exportaciones
-    if export_format in ['excel', 'pdf']:
-        articulos = query.all()
-        if export_format == 'excel':
-            return _exportar_excel(articulos)
-        else:
-            return _exportar_pdf(articulos)
+    if export_format == 'excel':
+        return _exportar_excel(query)
+    elif export_format == 'pdf':
+        return _exportar_pdf(query.all())
+    elif export_format in FORMATOS_CSV:
+        return _exportar_csv(query, export_format)
     
     # Paginación
     pagination = query.paginate(
@@ -93,17 +105,12 @@ def listar_articulos():
                          pagination=pagination,
                          proveedores=proveedores)
 
-def _exportar_excel(articulos):
+def _exportar_excel(query):
     """Exporta artículos a Excel con formato detallado y profesional"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Artículos Detallado"
-    
-    # Configurar orientación horizontal
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
+    excel = ExcelStreaming("Artículos Detallado")
     
     # Crear cabecera institucional
-    current_row = crear_cabecera_excel(ws, "Reporte Detallado de Artículos")
+    excel.cabecera("Reporte Detallado de Artículos")
     
     # Preparar datos detallados con estadísticas
     headers = [
@@ -112,85 +119,88 @@ def _exportar_excel(articulos):
         'Fecha Creación', 'Diferencia vs Stock Min', 'Rotación Sugerida'
     ]
     
-    data = []
-    total_valor = 0
-    articulos_criticos = 0
-    articulos_bajos = 0
-    
-    for articulo, item in articulos:
-        # Determinar estado detallado
-        if item.i_cantidad < articulo.a_stockMin:
-            estado = "CRÍTICO"
-            articulos_criticos += 1
-        elif item.i_cantidad <= (articulo.a_stockMin * 1.2):
-            estado = "BAJO"
-            articulos_bajos += 1
-        else:
-            estado = "NORMAL"
-        
-        # Calcular diferencia con stock mínimo
-        diferencia = item.i_cantidad - articulo.a_stockMin
-        
-        # Sugerir rotación
-        if diferencia < 0:
-            rotacion = "URGENTE - Reabastecer"
-        elif diferencia <= 5:
-            rotacion = "Próximo a reabastecer"
-        else:
-            rotacion = "Stock suficiente"
-        
-        total_valor += float(item.i_vTotal)
-        
-        data.append([
-            item.i_codigo,
-            item.i_nombre,
-            item.i_cantidad,
-            formatear_valor_moneda(item.i_vUnitario),
-            formatear_valor_moneda(item.i_vTotal),
-            articulo.a_stockMin,
-            articulo.a_stockMax,
-            estado,
-            articulo.a_c_contable or 'N/A',
-            formatear_fecha(item.created_at),
-            diferencia,
-            rotacion
-        ])
+    # Estadísticas acumuladas mientras se escriben las filas
+    totales = {'valor': 0, 'criticos': 0, 'bajos': 0}
+    
+    def filas():
+        for fila in articulo_repo.stream_exportacion(query):
+            # Determinar estado detallado
+            if fila.i_cantidad < fila.a_stockMin:
+                estado = "CRÍTICO"
+                totales['criticos'] += 1
+            elif fila.i_cantidad <= (fila.a_stockMin * 1.2):
+                estado = "BAJO"
+                totales['bajos'] += 1
+            else:
+                estado = "NORMAL"
+            
+            # Calcular diferencia con stock mínimo
+            diferencia = fila.i_cantidad - fila.a_stockMin
+            
+            # Sugerir rotación
+            if diferencia < 0:
+                rotacion = "URGENTE - Reabastecer"
+            elif diferencia <= 5:
+                rotacion = "Próximo a reabastecer"
+            else:
+                rotacion = "Stock suficiente"
+            
+            totales['valor'] += float(fila.i_vTotal)
+            
+            yield [
+                fila.i_codigo,
+                fila.i_nombre,
+                fila.i_cantidad,
+                formatear_valor_moneda(fila.i_vUnitario),
+                formatear_valor_moneda(fila.i_vTotal),
+                fila.a_stockMin,
+                fila.a_stockMax,
+                estado,
+                fila.a_c_contable or 'N/A',
+                formatear_fecha(fila.created_at),
+                diferencia,
+                rotacion
+            ]
     
     # Crear tabla detallada
-    current_row = crear_tabla_detallada_excel(ws, headers, data, current_row, "INVENTARIO DETALLADO DE ARTÍCULOS")
+    total = excel.tabla(headers, filas(), "INVENTARIO DETALLADO DE ARTÍCULOS")
+    total_valor = totales['valor']
+    articulos_criticos = totales['criticos']
+    articulos_bajos = totales['bajos']
     
     # Agregar resumen estadístico completo
-    current_row += 2
-    ws[f'A{current_row}'] = "ANÁLISIS ESTADÍSTICO DEL INVENTARIO"
-    ws[f'A{current_row}'].font = Font(name='Calibri', size=14, bold=True, color="2E5984")
-    ws.merge_cells(f'A{current_row}:F{current_row}')
-    current_row += 2
+    excel.espacio(2)
+    excel.titulo("ANÁLISIS ESTADÍSTICO DEL INVENTARIO", columnas=6)
+    excel.espacio()
     
     resumen_headers = ['Métrica', 'Valor', 'Porcentaje', 'Observaciones']
     resumen_data = [
-        ['Total de Artículos', len(articulos), '100%', 'Inventario completo'],
-        ['Artículos en Estado Crítico', articulos_criticos, f"{(articulos_criticos/len(articulos)*100):.1f}%" if articulos else "0%", 'Requieren atención inmediata'],
-        ['Artículos con Stock Bajo', articulos_bajos, f"{(articulos_bajos/len(articulos)*100):.1f}%" if articulos else "0%", 'Próximos a reabastecimiento'],
-        ['Artículos con Stock Normal', len(articulos)-articulos_criticos-articulos_bajos, f"{((len(articulos)-articulos_criticos-articulos_bajos)/len(articulos)*100):.1f}%" if articulos else "0%", 'Stock adecuado'],
+        ['Total de Artículos', total, '100%', 'Inventario completo'],
+        ['Artículos en Estado Crítico', articulos_criticos, f"{(articulos_criticos/total*100):.1f}%" if total else "0%", 'Requieren atención inmediata'],
+        ['Artículos con Stock Bajo', articulos_bajos, f"{(articulos_bajos/total*100):.1f}%" if total else "0%", 'Próximos a reabastecimiento'],
+        ['Artículos con Stock Normal', total-articulos_criticos-articulos_bajos, f"{((total-articulos_criticos-articulos_bajos)/total*100):.1f}%" if total else "0%", 'Stock adecuado'],
         ['Valor Total del Inventario', formatear_valor_moneda(total_valor), '100%', 'Valor total en stock'],
-        ['Promedio Valor por Artículo', formatear_valor_moneda(total_valor/len(articulos)) if articulos else "$0.00", 'N/A', 'Valor promedio unitario']
+        ['Promedio Valor por Artículo', formatear_valor_moneda(total_valor/total) if total else "$0.00", 'N/A', 'Valor promedio unitario']
     ]
     
-    current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row)
-    
-    # Ajustar ancho de columnas
-    ajustar_columnas_excel(ws)
-    
-    # Crear respuesta
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    excel.tabla(resumen_headers, resumen_data)
     
-    response = make_response(output.read())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=CNM_Articulos_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return response
+    return excel.respuesta(f'CNM_Articulos_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
+
+def _exportar_csv(query, formato):
+    """Exporta artículos a CSV transmitido por partes"""
+    headers = [
+        'Código', 'Nombre', 'Stock Actual', 'Valor Unitario', 'Valor Total',
+        'Stock Mínimo', 'Stock Máximo', 'Cuenta Contable', 'Fecha Creación'
+    ]
+    filas = (
+        [
+            fila.i_codigo, fila.i_nombre, fila.i_cantidad, fila.i_vUnitario, fila.i_vTotal,
+            fila.a_stockMin, fila.a_stockMax, fila.a_c_contable or '', fila.created_at
+        ]
+        for fila in articulo_repo.stream_exportacion(query)
+    )
+    return respuesta_csv(f'CNM_Articulos_{datetime.now().strftime("%Y%m%d_%H%M%S")}', headers, filas, formato)
 
 def _exportar_pdf(articulos):
     """Exporta artículos a PDF con formato detallado y profesional"""
@@ -263,44 +273,6 @@ def _exportar_pdf(articulos):
     response.headers['Content-Disposition'] = f'attachment; filename=CNM_Articulos_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
     
     return response
-    
-    for articulo, item in articulos:
-        # Determinar estado
-        if item.i_cantidad < articulo.a_stockMin:
-            estado = "Crítico"
-        elif item.i_cantidad <= (articulo.a_stockMin * 1.2):
-            estado = "Bajo"
-        else:
-            estado = "Normal"
-        
-        data.append([
-            item.i_codigo,
-            item.i_nombre[:25] + '...' if len(item.i_nombre) > 25 else item.i_nombre,
-            str(item.i_cantidad),
-            f"${float(item.i_vUnitario):.2f}",
-            f"${float(item.i_vTotal):.2f}",
-            f"{articulo.a_stockMin}/{articulo.a_stockMax}",
-            estado,
-            articulo.a_c_contable
-        ])
-    
-    # Crear tabla
-    table = Table(data, colWidths=[0.8*inch, 2.2*inch, 0.6*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.7*inch, 0.8*inch])
-    
-    # Aplicar estilo estandarizado
-    aplicar_estilo_tabla_pdf(table)
-    
-    elements.append(table)
-    
-    # Construir PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
-    response = make_response(buffer.read())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=CNM_Articulos_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-    
-    return response
 
 @bp.route('/nuevo', methods=['GET', 'POST'])
 @login_required
@@ -326,13 +298,6 @@ def nuevo_articulo():
                     return redirect(url_for('articulos.nuevo_articulo'))
                     
                 proveedor_id = int(proveedor_id)
-            else:
-                # Para donaciones no se requiere proveedor ni factura
-                proveedor_id = None
-                numero_factura = "DONACIÓN"
-            
-            if not es_donacion:
-                proveedor_id = int(proveedor_id)
                 
                 # Verificar que el proveedor existe
                 proveedor = proveedor_service.obtener_por_id(proveedor_id)
@@ -340,150 +305,48 @@ def nuevo_articulo():
                     flash('El proveedor seleccionado no existe', 'error')
                     return redirect(url_for('articulos.nuevo_articulo'))
             else:
+                # Para donaciones no se requiere proveedor ni factura
+                proveedor_id = None
                 proveedor = None
+                numero_factura = "DONACIÓN"
             
-            articulos_data = []
-            articulos_procesados = set()
-            
-            # Procesar múltiples artículos del formulario
+            # Recoger las filas del formulario; la validación completa la hace el servicio
+            filas = []
             i = 0
             while f'nombre_{i}' in request.form:
-                nombre = request.form.get(f'nombre_{i}', '').strip()
-                cuenta_contable = request.form.get(f'cuenta_contable_{i}', '').strip()
-                cantidad = request.form.get(f'cantidad_{i}')
-                valor_unitario = request.form.get(f'valor_unitario_{i}')
-                stock_min = request.form.get(f'stock_min_{i}', '5')
-                stock_max = request.form.get(f'stock_max_{i}', '100')
-                
-                if nombre and cuenta_contable and cantidad and valor_unitario:
-                    try:
-                        cantidad = int(cantidad)
-                        valor_unitario = float(valor_unitario)
-                        stock_min = int(stock_min) if stock_min else 5
-                        stock_max = int(stock_max) if stock_max else 100
-                        
-                        # Validaciones básicas
-                        if cantidad <= 0:
-                            flash(f'La cantidad del artículo "{nombre}" debe ser mayor a 0', 'error')
-                            return redirect(url_for('articulos.nuevo_articulo'))
-                        
-                        if valor_unitario <= 0:
-                            flash(f'El valor unitario del artículo "{nombre}" debe ser mayor a 0', 'error')
-                            return redirect(url_for('articulos.nuevo_articulo'))
-                        
-                        if stock_min < 0 or stock_max <= 0 or stock_max <= stock_min:
-                            flash(f'Los valores de stock del artículo "{nombre}" no son válidos', 'error')
-                            return redirect(url_for('articulos.nuevo_articulo'))
-                        
-                        # Verificar duplicados por nombre
-                        nombre_lower = nombre.lower()
-                        if nombre_lower in articulos_procesados:
-                            flash(f'No puede agregar el mismo artículo "{nombre}" múltiples veces', 'error')
-                            return redirect(url_for('articulos.nuevo_articulo'))
-                        
-                        # Obtener campos opcionales
-                        serial = request.form.get(f'serial_{i}', '').strip()
-                        codigo_identificacion = request.form.get(f'codigo_identificacion_{i}', '').strip()
-                        
-                        articulos_data.append({
-                            'nombre': nombre,
-                            'cuenta_contable': cuenta_contable,
-                            'cantidad': cantidad,
-                            'valor_unitario': valor_unitario,
-                            'stock_min': stock_min,
-                            'stock_max': stock_max,
-                            'serial': serial if serial else None,
-                            'codigo_identificacion': codigo_identificacion if codigo_identificacion else None
-                        })
-                        articulos_procesados.add(nombre_lower)
-                        
-                    except (ValueError, TypeError) as e:
-                        flash(f'Error en los datos del artículo "{nombre}": valores inválidos', 'error')
-                        return redirect(url_for('articulos.nuevo_articulo'))
-                
+                fila = {
+                    campo: request.form.get(f'{campo}_{i}', '')
+                    for campo in ('nombre', 'cuenta_contable', 'cantidad', 'valor_unitario',
+                                  'stock_min', 'stock_max', 'serial', 'codigo_identificacion')
+                }
+                # Las filas totalmente vacías del formulario se ignoran
+                if any(fila[campo].strip() for campo in ('nombre', 'cuenta_contable', 'cantidad', 'valor_unitario')):
+                    filas.append(fila)
                 i += 1
             
-            # Validar que se hayan agregado artículos
-            if not articulos_data:
-                flash('Debe agregar al menos un artículo válido', 'error')
+            # Validar todas las filas e ingresarlas en una sola transacción
+            resultado = ingreso_service.registrar_factura(
+                filas, current_user.id,
+                proveedor_id=proveedor_id,
+                numero_factura=numero_factura,
+                es_donacion=es_donacion,
+                observaciones_donacion=observaciones_donacion
+            )
+            
+            if not resultado['success']:
+                for error in resultado['errores']:
+                    flash(f"Fila {error['fila']} ({error['nombre']}): {error['error']}", 'error')
+                if resultado['error']:
+                    flash(f"No se registraron artículos: {resultado['error']}", 'error')
                 return redirect(url_for('articulos.nuevo_articulo'))
             
-            # Procesar todos los artículos
-            articulos_creados = 0
-            errores = []
+            articulos_creados = len(resultado['codigos'])
+            if es_donacion:
+                flash(f'Se registraron {articulos_creados} artículo(s) como DONACIÓN exitosamente', 'success')
+            else:
+                flash(f'Se crearon {articulos_creados} artículo(s) exitosamente - COMPRA del proveedor {proveedor.p_razonsocial} - Factura: {numero_factura}', 'success')
             
-            try:
-                # Usar transacción para asegurar consistencia
-                for articulo_data in articulos_data:
-                    try:
-                        # Crear el artículo (ya incluye el stock inicial)
-                        articulo, item = articulo_service.crear_articulo(
-                            nombre=articulo_data['nombre'],
-                            cantidad=articulo_data['cantidad'],
-                            valor_unitario=articulo_data['valor_unitario'],
-                            cuenta_contable=articulo_data['cuenta_contable'],
-                            stock_min=articulo_data['stock_min'],
-                            stock_max=articulo_data['stock_max'],
-                            usuario_id=current_user.id,
-                            serial=articulo_data.get('serial'),
-                            codigo_identificacion=articulo_data.get('codigo_identificacion')
-                        )
-                        
-                        # CORRECCIÓN: No registrar entrada adicional
-                        # El artículo ya se crea con el stock inicial correcto
-                        # Solo registrar el movimiento de entrada inicial para auditoría
-                        from app.database.models import MovimientoDetalle
-                        from datetime import datetime
-                        
-                        # Preparar observaciones con información de donación
-                        if es_donacion:
-                            observaciones_entrada = f"Stock inicial - DONACIÓN - {articulo_data['cuenta_contable']}"
-                            if observaciones_donacion:
-                                observaciones_entrada += f" - {observaciones_donacion}"
-                        else:
-                            observaciones_entrada = f"Stock inicial - Factura: {numero_factura} - {articulo_data['cuenta_contable']}"
-                        
-                        # Registrar movimiento de entrada inicial para auditoría (sin duplicar stock)
-                        movimiento = MovimientoDetalle(
-                            m_fecha=datetime.now().date(),
-                            m_tipo='entrada',
-                            m_cantidad=articulo_data['cantidad'],
-                            m_valorUnitario=articulo_data['valor_unitario'],
-                            m_valorTotal=articulo_data['cantidad'] * articulo_data['valor_unitario'],
-                            m_observaciones=observaciones_entrada,
-                            i_id=item.id,
-                            u_id=current_user.id
-                        )
-                        db.session.add(movimiento)
-                        
-                        articulos_creados += 1
-                        
-                    except Exception as e:
-                        errores.append(f"{articulo_data['nombre']}: {str(e)}")
-                        db.session.rollback()
-                        continue
-                
-                # Mostrar resultados
-                if articulos_creados > 0:
-                    if es_donacion:
-                        flash(f'Se registraron {articulos_creados} artículo(s) como DONACIÓN exitosamente', 'success')
-                    else:
-                        flash(f'Se crearon {articulos_creados} artículo(s) exitosamente - COMPRA del proveedor {proveedor.p_razonsocial} - Factura: {numero_factura}', 'success')
-                
-                if errores:
-                    for error in errores:
-                        flash(f'Error: {error}', 'warning')
-                
-                # Redirigir según el resultado
-                if articulos_creados > 0:
-                    return redirect(url_for('articulos.listar_articulos'))
-                else:
-                    return redirect(url_for('articulos.nuevo_articulo'))
-                    
-            except Exception as e:
-                db.session.rollback()
-                flash(f'Error general en el procesamiento: {str(e)}', 'error')
-                return redirect(url_for('articulos.nuevo_articulo'))
+            return redirect(url_for('articulos.listar_articulos'))
             
         except Exception as e:
             flash(f'Error al crear artículos: {str(e)}', 'error')
@@ -520,34 +383,15 @@ def detalle_articulo(articulo_id):
     tipo_mov = request.args.get('tipo_mov', '')
     fecha_desde_mov = request.args.get('fecha_desde_mov', '')
     fecha_hasta_mov = request.args.get('fecha_hasta_mov', '')
-    page_mov = int(request.args.get('page_mov', 1))
     per_page_mov = int(request.args.get('per_page_mov', 10))
     
-    # Obtener TODOS los movimientos para cálculos (sin filtros)
+    # Totales con una consulta agregada; el stock anterior/actual de cada
+    # movimiento ya se guarda al registrarlo (columnas de kardex)
     from app.database.models import MovimientoDetalle
-    todos_movimientos = db.session.query(MovimientoDetalle).filter_by(
-        i_id=item.id
-    ).order_by(MovimientoDetalle.m_fecha.asc(), MovimientoDetalle.id.asc()).all()
-    
-    # Calcular valores totales con TODOS los movimientos
-    stock_actual = 0
-    saldo_calculado = 0
-    valor_total_historico = 0
-    valor_total_actual = 0
-    
-    for mov in todos_movimientos:
-        mov.m_stock_anterior = stock_actual
-        
-        if mov.m_tipo == 'entrada':
-            stock_actual += mov.m_cantidad
-            saldo_calculado += mov.m_cantidad
-            valor_total_historico += mov.m_valorTotal
-            valor_total_actual += mov.m_valorTotal
-        elif mov.m_tipo == 'salida':
-            stock_actual -= mov.m_cantidad
-            valor_total_actual -= mov.m_valorTotal
-        
-        mov.m_stock_actual = stock_actual
+    totales = articulo_service.movimiento_repo.obtener_totales_item(item.id)
+    saldo_calculado = totales['saldo']
+    valor_total_historico = totales['valor_total_historico']
+    valor_total_actual = totales['valor_total_actual']
     
     # Query para movimientos con filtros y paginación
     query_mov = db.session.query(MovimientoDetalle).filter_by(i_id=item.id)
@@ -555,47 +399,31 @@ def detalle_articulo(articulo_id):
     if tipo_mov:
         query_mov = query_mov.filter(MovimientoDetalle.m_tipo == tipo_mov)
     
-    if fecha_desde_mov:
-        try:
-            from datetime import datetime
-            fecha_desde_obj = datetime.strptime(fecha_desde_mov, '%Y-%m-%d').date()
-            query_mov = query_mov.filter(MovimientoDetalle.m_fecha >= fecha_desde_obj)
-        except ValueError:
-            pass
+    # Rango de fechas semiabierto [desde, hasta + 1 día)
+    inicio_mov, fin_mov = rango_fechas(fecha_desde_mov, fecha_hasta_mov)
+    query_mov = filtrar_por_rango(query_mov, MovimientoDetalle.m_fecha, inicio_mov, fin_mov)
     
-    if fecha_hasta_mov:
-        try:
-            from datetime import datetime
-            fecha_hasta_obj = datetime.strptime(fecha_hasta_mov, '%Y-%m-%d').date()
-            query_mov = query_mov.filter(MovimientoDetalle.m_fecha <= fecha_hasta_obj)
-        except ValueError:
-            pass
-    
-    # Paginación de movimientos
-    pagination_mov = query_mov.order_by(MovimientoDetalle.m_fecha.desc()).paginate(
-        page=page_mov, per_page=per_page_mov, error_out=False
+    # Paginación por id (orden en que se escribieron los saldos) sobre ix_movimiento_item_id
+    pagination_mov = paginar_por_clave(
+        query_mov, (MovimientoDetalle.id,),
+        cursor=request.args.get('cursor_mov'), per_page=per_page_mov, parametro='cursor_mov',
+        clave_conteo=clave_filtros('movimientos_item', item=item.id, tipo=tipo_mov,
+                                   desde=fecha_desde_mov, hasta=fecha_hasta_mov)
     )
     
-    # Aplicar cálculos de stock a movimientos paginados
-    movimientos_dict = {mov.id: mov for mov in todos_movimientos}
-    for mov in pagination_mov.items:
-        if mov.id in movimientos_dict:
-            mov.m_stock_anterior = movimientos_dict[mov.id].m_stock_anterior
-            mov.m_stock_actual = movimientos_dict[mov.id].m_stock_actual
-    
     # Obtener auditoría de cambios (movimientos que registran cambios)
     auditoria = db.session.query(MovimientoDetalle).filter_by(
         i_id=item.id
     ).filter(
         MovimientoDetalle.m_tipo.in_(['ajuste_precio', 'entrada', 'salida'])
-    ).order_by(MovimientoDetalle.m_fecha.desc()).limit(20).all()
+    ).order_by(MovimientoDetalle.id.desc()).limit(20).all()
     
     # Manejar exportaciones
-    if export_format in ['excel', 'pdf']:
-        if export_format == 'excel':
-            return _exportar_articulos_excel(articulo, item, todos_movimientos, saldo_calculado)
-        else:
-            return _exportar_articulos_pdf(articulo, item, todos_movimientos, saldo_calculado)
+    if export_format == 'excel':
+        return _exportar_articulos_excel(articulo, item, saldo_calculado)
+    elif export_format == 'pdf':
+        completo = request.args.get('detalle') == 'completo'
+        return _exportar_articulos_pdf(articulo, item, saldo_calculado, completo)
     
     # Obtener todos los proveedores para el modal
     proveedores = proveedor_service.obtener_todos()
@@ -783,7 +611,6 @@ def listar_asignaciones():
     estado = request.args.get('estado', '').strip()
     articulo = request.args.get('articulo', '').strip()
     persona = request.args.get('persona', '').strip()
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
     # Query base
@@ -813,9 +640,12 @@ def listar_asignaciones():
             )
         )
     
-    # Ordenar por fecha descendente (más recientes primero) y paginar
-    pagination = query.order_by(Consumo.c_fecha.desc(), Consumo.c_hora.desc())\
-                     .paginate(page=page, per_page=per_page, error_out=False)
+    # Más recientes primero, paginado por clave (c_fecha, c_hora, id)
+    pagination = paginar_por_clave(
+        query, (Consumo.c_fecha, Consumo.c_hora, Consumo.id),
+        cursor=request.args.get('cursor'), per_page=per_page,
+        clave_conteo=clave_filtros('asignaciones', estado=estado, articulo=articulo, persona=persona)
+    )
     
     return render_template('articulos/asignaciones.html',
                          asignaciones=pagination.items,
@@ -834,18 +664,19 @@ def asignaciones_por_persona(persona_id):
         flash('Persona no encontrada', 'error')
         return redirect(url_for('articulos.listar_asignaciones'))
     
-    # Paginación
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    # Obtener asignaciones de la persona con paginación
-    pagination = db.session.query(Consumo, Persona, Item).join(
+    # Asignaciones de la persona paginadas por clave (ix_consumo_persona_fecha_hora)
+    query = db.session.query(Consumo, Persona, Item).join(
         Persona, Consumo.pe_id == Persona.id
     ).join(
         Item, Consumo.i_id == Item.id
-    ).filter(Consumo.pe_id == persona_id).order_by(
-        Consumo.c_fecha.desc(), Consumo.c_hora.desc()
-    ).paginate(page=page, per_page=per_page, error_out=False)
+    ).filter(Consumo.pe_id == persona_id)
+    pagination = paginar_por_clave(
+        query, (Consumo.c_fecha, Consumo.c_hora, Consumo.id),
+        cursor=request.args.get('cursor'), per_page=per_page,
+        clave_conteo=clave_filtros('asignaciones_persona', persona=persona_id)
+    )
     
     return render_template('articulos/asignaciones.html',
                          asignaciones=pagination.items,
@@ -856,7 +687,7 @@ def asignaciones_por_persona(persona_id):
 @login_required
 def cambiar_estado_asignacion(consumo_id):
     """Cambia el estado de una asignación con lógica de retorno de stock"""
-    from app.database.models import Consumo, Item
+    from app.database.models import Consumo
     from datetime import datetime
     
     try:
@@ -874,25 +705,6 @@ def cambiar_estado_asignacion(consumo_id):
         observaciones = request.form.get('observaciones', '')
         estado_anterior = consumo.c_estado
         
-        # Solo "Devuelto" retorna stock al inventario
-        if nuevo_estado == 'Devuelto' and estado_anterior != 'Devuelto':
-            item = Item.query.get(consumo.i_id)
-            if item:
-                # Solo retornar la cantidad física al stock
-                item.i_cantidad += consumo.c_cantidad
-                consumo.c_fecha_devolucion = datetime.utcnow()
-        
-        # Si se cambia de "Devuelto" a cualquier otro estado, descontar stock
-        elif estado_anterior == 'Devuelto' and nuevo_estado != 'Devuelto':
-            item = Item.query.get(consumo.i_id)
-            if item:
-                if item.i_cantidad >= consumo.c_cantidad:
-                    item.i_cantidad -= consumo.c_cantidad
-                    consumo.c_fecha_devolucion = None
-                else:
-                    flash(f'No hay suficiente stock disponible. Stock actual: {item.i_cantidad}', 'error')
-                    return redirect(request.referrer or url_for('articulos.listar_asignaciones'))
-        
         # Actualizar el estado
         consumo.c_estado = nuevo_estado
         
@@ -902,7 +714,29 @@ def cambiar_estado_asignacion(consumo_id):
             timestamp = datetime.now().strftime('%d/%m/%Y %H:%M')
             consumo.c_observaciones = f"{obs_anterior}\n[{timestamp} - {nuevo_estado}] {observaciones}".strip()
         
-        db.session.commit()
+        # Solo "Devuelto" retorna stock al inventario (el servicio confirma la transacción)
+        if nuevo_estado == 'Devuelto' and estado_anterior != 'Devuelto':
+            consumo.c_fecha_devolucion = datetime.utcnow()
+            articulo_service.registrar_movimiento_devolucion(
+                consumo.i_id, consumo.c_cantidad, consumo.c_valorUnitario, current_user.id,
+                observaciones=observaciones or None, consumo_id=consumo.id
+            )
+        
+        # Si se cambia de "Devuelto" a cualquier otro estado, descontar stock
+        elif estado_anterior == 'Devuelto' and nuevo_estado != 'Devuelto':
+            consumo.c_fecha_devolucion = None
+            try:
+                articulo_service.registrar_movimiento_salida(
+                    consumo.i_id, consumo.c_cantidad, consumo.c_valorUnitario, current_user.id,
+                    observaciones=observaciones or None, consumo_id=consumo.id
+                )
+            except ValueError as e:
+                db.session.rollback()
+                flash(str(e), 'error')
+                return redirect(request.referrer or url_for('articulos.listar_asignaciones'))
+        
+        else:
+            db.session.commit()
         
         flash(f'Estado cambiado a "{nuevo_estado}" exitosamente', 'success')
     except Exception as e:
@@ -916,7 +750,6 @@ def cambiar_estado_asignacion(consumo_id):
 def listar_movimientos():
     """Lista todos los movimientos de inventario con filtros y paginación"""
     from app.database.models import MovimientoDetalle, Item, Usuario, Entrada, Proveedor
-    from datetime import datetime
     
     # Parámetros de filtrado
     buscar = request.args.get('buscar', '').strip()
@@ -924,7 +757,6 @@ def listar_movimientos():
     fecha_desde = request.args.get('fecha_desde', '')
     fecha_hasta = request.args.get('fecha_hasta', '')
     per_page = 20
-    page = int(request.args.get('page', 1))
     export_format = request.args.get('export')
     
     # Query base con joins
@@ -947,51 +779,39 @@ def listar_movimientos():
     if tipo:
         query = query.filter(MovimientoDetalle.m_tipo == tipo)
     
-    if fecha_desde:
-        try:
-            fecha_desde_obj = datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-            query = query.filter(MovimientoDetalle.m_fecha >= fecha_desde_obj)
-        except ValueError:
-            pass
-    
-    if fecha_hasta:
-        try:
-            fecha_hasta_obj = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-            query = query.filter(MovimientoDetalle.m_fecha <= fecha_hasta_obj)
-        except ValueError:
-            pass
+    # Rango de fechas semiabierto [desde, hasta + 1 día)
+    inicio, fin = rango_fechas(fecha_desde, fecha_hasta)
+    query = filtrar_por_rango(query, MovimientoDetalle.m_fecha, inicio, fin)
     
     # Ordenar por fecha descendente
     query = query.order_by(desc(MovimientoDetalle.m_fecha), desc(MovimientoDetalle.id))
     
     # Manejar exportaciones
-    if export_format in ['excel', 'pdf']:
-        movimientos = query.all()
-        if export_format == 'excel':
-            return _exportar_movimientos_excel(movimientos)
-        else:
-            return _exportar_movimientos_pdf(movimientos)
-    
-    # Paginación
-    pagination = query.paginate(
-        page=page, per_page=per_page, error_out=False
+    if export_format == 'excel':
+        return _exportar_movimientos_excel(query)
+    elif export_format == 'pdf':
+        return _exportar_movimientos_pdf(query.all())
+    elif export_format in FORMATOS_CSV:
+        return _exportar_movimientos_csv(query, export_format)
+    
+    # Paginación por clave (m_fecha, id): las páginas profundas cuestan lo mismo que la primera
+    pagination = paginar_por_clave(
+        query, (MovimientoDetalle.m_fecha, MovimientoDetalle.id),
+        cursor=request.args.get('cursor'), per_page=per_page,
+        clave_conteo=clave_filtros('movimientos', buscar=buscar, tipo=tipo,
+                                   desde=fecha_desde, hasta=fecha_hasta)
     )
     
     return render_template('articulos/movimientos.html',
                          movimientos=pagination.items,
                          pagination=pagination)
 
-def _exportar_movimientos_excel(movimientos):
+def _exportar_movimientos_excel(query):
     """Exporta movimientos a Excel con formato detallado y análisis estadístico"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Movimientos Detallado"
-    
-    # Configurar orientación horizontal
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
+    excel = ExcelStreaming("Movimientos Detallado")
     
     # Crear cabecera institucional
-    current_row = crear_cabecera_excel(ws, "Reporte Detallado de Movimientos de Inventario")
+    excel.cabecera("Reporte Detallado de Movimientos de Inventario")
     
     # Preparar datos detallados con estadísticas
     headers = [
@@ -999,89 +819,86 @@ def _exportar_movimientos_excel(movimientos):
         'Valor Unitario', 'Valor Total', 'Usuario', 'Proveedor', 'Observaciones', 'Impacto'
     ]
     
-    data = []
-    total_entradas = 0
-    total_salidas = 0
-    valor_total_entradas = 0
-    valor_total_salidas = 0
+    totales = {'entradas': 0, 'salidas': 0, 'valor_entradas': 0, 'valor_salidas': 0}
     movimientos_por_tipo = {}
     
-    for movimiento, item, usuario in movimientos:
-        # Obtener proveedor si existe
-        proveedor_nombre = "N/A"
-        if movimiento.e_id and movimiento.entrada and movimiento.entrada.proveedor:
-            proveedor_nombre = movimiento.entrada.proveedor.p_razonsocial
-        
-        # Determinar impacto del movimiento
-        if movimiento.m_tipo == 'entrada':
-            impacto = "Incrementa stock"
-            total_entradas += movimiento.m_cantidad
-            valor_total_entradas += float(movimiento.m_valorTotal)
-        elif movimiento.m_tipo == 'salida':
-            impacto = "Reduce stock"
-            total_salidas += movimiento.m_cantidad
-            valor_total_salidas += float(movimiento.m_valorTotal)
-        else:
-            impacto = "Ajuste de inventario"
-        
-        # Contar movimientos por tipo
-        tipo_mov = movimiento.m_tipo.title()
-        movimientos_por_tipo[tipo_mov] = movimientos_por_tipo.get(tipo_mov, 0) + 1
-        
-        data.append([
-            formatear_fecha(movimiento.m_fecha),
-            movimiento.m_hora.strftime('%H:%M:%S') if hasattr(movimiento, 'm_hora') and movimiento.m_hora else 'N/A',
-            item.i_nombre,
-            item.i_codigo,
-            tipo_mov,
-            movimiento.m_cantidad,
-            formatear_valor_moneda(movimiento.m_valorUnitario),
-            formatear_valor_moneda(movimiento.m_valorTotal),
-            usuario.u_username,
-            truncar_texto(proveedor_nombre, 20),
-            truncar_texto(movimiento.m_observaciones or 'Sin observaciones', 30),
-            impacto
-        ])
+    def filas():
+        for movimiento in movimiento_repo.stream_movimientos(query):
+            # Determinar impacto del movimiento
+            if movimiento.m_tipo == 'entrada':
+                impacto = "Incrementa stock"
+                totales['entradas'] += movimiento.m_cantidad
+                totales['valor_entradas'] += float(movimiento.m_valorTotal)
+            elif movimiento.m_tipo == 'salida':
+                impacto = "Reduce stock"
+                totales['salidas'] += movimiento.m_cantidad
+                totales['valor_salidas'] += float(movimiento.m_valorTotal)
+            else:
+                impacto = "Ajuste de inventario"
+            
+            # Contar movimientos por tipo
+            tipo_mov = movimiento.m_tipo.title()
+            movimientos_por_tipo[tipo_mov] = movimientos_por_tipo.get(tipo_mov, 0) + 1
+            
+            yield [
+                formatear_fecha(movimiento.m_fecha),
+                movimiento.m_fecha.strftime('%H:%M:%S') if isinstance(movimiento.m_fecha, datetime) else 'N/A',
+                movimiento.i_nombre,
+                movimiento.i_codigo,
+                tipo_mov,
+                movimiento.m_cantidad,
+                formatear_valor_moneda(movimiento.m_valorUnitario),
+                formatear_valor_moneda(movimiento.m_valorTotal),
+                movimiento.u_username,
+                truncar_texto(movimiento.p_razonsocial or "N/A", 20),
+                truncar_texto(movimiento.m_observaciones or 'Sin observaciones', 30),
+                impacto
+            ]
     
     # Crear tabla detallada
-    current_row = crear_tabla_detallada_excel(ws, headers, data, current_row, "HISTORIAL DETALLADO DE MOVIMIENTOS")
+    total = excel.tabla(headers, filas(), "HISTORIAL DETALLADO DE MOVIMIENTOS")
+    total_entradas = totales['entradas']
+    total_salidas = totales['salidas']
+    valor_total_entradas = totales['valor_entradas']
+    valor_total_salidas = totales['valor_salidas']
     
     # Agregar análisis estadístico completo
-    current_row += 2
-    ws[f'A{current_row}'] = "ANÁLISIS ESTADÍSTICO DE MOVIMIENTOS"
-    ws[f'A{current_row}'].font = Font(name='Calibri', size=14, bold=True, color="2E5984")
-    ws.merge_cells(f'A{current_row}:F{current_row}')
-    current_row += 2
+    excel.espacio(2)
+    excel.titulo("ANÁLISIS ESTADÍSTICO DE MOVIMIENTOS", columnas=6)
+    excel.espacio()
     
     resumen_headers = ['Métrica', 'Cantidad', 'Valor', 'Porcentaje', 'Observaciones']
     resumen_data = [
-        ['Total de Movimientos', len(movimientos), formatear_valor_moneda(valor_total_entradas + valor_total_salidas), '100%', 'Actividad total del inventario'],
+        ['Total de Movimientos', total, formatear_valor_moneda(valor_total_entradas + valor_total_salidas), '100%', 'Actividad total del inventario'],
         ['Total Entradas', total_entradas, formatear_valor_moneda(valor_total_entradas), f"{(total_entradas/(total_entradas+total_salidas)*100):.1f}%" if (total_entradas+total_salidas) > 0 else "0%", 'Incrementos de stock'],
         ['Total Salidas', total_salidas, formatear_valor_moneda(valor_total_salidas), f"{(total_salidas/(total_entradas+total_salidas)*100):.1f}%" if (total_entradas+total_salidas) > 0 else "0%", 'Reducciones de stock'],
         ['Diferencia Neta', total_entradas - total_salidas, formatear_valor_moneda(valor_total_entradas - valor_total_salidas), 'N/A', 'Balance de inventario'],
-        ['Promedio por Movimiento', f"{(valor_total_entradas + valor_total_salidas)/len(movimientos):.2f}" if movimientos else "0", formatear_valor_moneda((valor_total_entradas + valor_total_salidas)/len(movimientos)) if movimientos else "$0.00", 'N/A', 'Valor promedio por transacción']
+        ['Promedio por Movimiento', f"{(valor_total_entradas + valor_total_salidas)/total:.2f}" if total else "0", formatear_valor_moneda((valor_total_entradas + valor_total_salidas)/total) if total else "$0.00", 'N/A', 'Valor promedio por transacción']
     ]
     
     # Agregar desglose por tipo de movimiento
     for tipo, cantidad in movimientos_por_tipo.items():
-        porcentaje = f"{(cantidad/len(movimientos)*100):.1f}%" if movimientos else "0%"
+        porcentaje = f"{(cantidad/total*100):.1f}%" if total else "0%"
         resumen_data.append([f'Movimientos tipo {tipo}', cantidad, 'N/A', porcentaje, f'Frecuencia de {tipo.lower()}'])
     
-    current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row)
+    excel.tabla(resumen_headers, resumen_data)
     
-    # Ajustar ancho de columnas
-    ajustar_columnas_excel(ws)
-    
-    # Crear respuesta
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    response = make_response(output.read())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=CNM_Movimientos_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return response
+    return excel.respuesta(f'CNM_Movimientos_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
+
+def _exportar_movimientos_csv(query, formato):
+    """Exporta movimientos a CSV transmitido por partes"""
+    headers = [
+        'Fecha', 'Tipo', 'Artículo', 'Código', 'Cantidad', 'Valor Unitario',
+        'Valor Total', 'Usuario', 'Proveedor', 'Observaciones'
+    ]
+    filas = (
+        [
+            mov.m_fecha, mov.m_tipo, mov.i_nombre, mov.i_codigo, mov.m_cantidad, mov.m_valorUnitario,
+            mov.m_valorTotal, mov.u_username, mov.p_razonsocial or '', mov.m_observaciones or ''
+        ]
+        for mov in movimiento_repo.stream_movimientos(query)
+    )
+    return respuesta_csv(f'CNM_Movimientos_{datetime.now().strftime("%Y%m%d_%H%M%S")}', headers, filas, formato)
 
 def _exportar_movimientos_pdf(movimientos):
     """Exporta movimientos a PDF con formato detallado y análisis estadístico"""
@@ -1149,32 +966,14 @@ def _exportar_movimientos_pdf(movimientos):
     
     return response
 
-def _exportar_articulos_excel(articulo, item, movimientos, saldo_calculado):
+def _exportar_articulos_excel(articulo, item, saldo_calculado):
     """Exporta detalle de artículo a Excel con cabecera institucional"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Detalle {item.i_codigo}"
-    
-    # Configurar orientación horizontal
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
+    excel = ExcelStreaming(f"Detalle {item.i_codigo}")
     
     # Crear cabecera institucional
-    current_row = crear_cabecera_excel(ws, f"Detalle de Artículo - {item.i_codigo}")
-    
-    # Obtener estilos
-    estilos = crear_estilos_excel()
+    excel.cabecera(f"Detalle de Artículo - {item.i_codigo}")
     
     # Información del artículo
-    info_headers = ['Campo', 'Valor']
-    for col, header in enumerate(info_headers, 1):
-        cell = ws.cell(row=current_row, column=col, value=header)
-        cell.font = estilos['header_font']
-        cell.fill = estilos['header_fill']
-        cell.alignment = estilos['header_alignment']
-        cell.border = estilos['header_border']
-    current_row += 1
-    
-    # Datos del artículo
     info_data = [
         ['Código', item.i_codigo],
         ['Nombre', item.i_nombre],
@@ -1185,65 +984,32 @@ def _exportar_articulos_excel(articulo, item, movimientos, saldo_calculado):
         ['Stock Máximo', articulo.a_stockMax],
         ['Cuenta Contable', articulo.a_c_contable]
     ]
+    excel.tabla(['Campo', 'Valor'], info_data)
     
-    for campo, valor in info_data:
-        ws.cell(row=current_row, column=1, value=campo).font = estilos['data_font']
-        ws.cell(row=current_row, column=2, value=valor).font = estilos['data_font']
-        current_row += 1
-    
-    current_row += 2  # Espacio antes de movimientos
-    
-    # Título de movimientos
-    ws.cell(row=current_row, column=1, value="HISTORIAL DE MOVIMIENTOS").font = estilos['header_font']
-    current_row += 2
-    
-    # Encabezados de movimientos
-    row_start = current_row
+    # Historial de movimientos leído por lotes
     headers = ['Fecha', 'Tipo', 'Cantidad', 'Valor Unit.', 'Valor Total', 'Usuario', 'Observaciones']
+    filas = (
+        [
+            mov.m_fecha.strftime('%Y-%m-%d'),
+            mov.m_tipo.title(),
+            mov.m_cantidad,
+            float(mov.m_valorUnitario),
+            float(mov.m_valorTotal),
+            mov.u_id,
+            mov.m_observaciones or ''
+        ]
+        for mov in movimiento_repo.stream_kardex(item.id)
+    )
+    excel.tabla(headers, filas, "HISTORIAL DE MOVIMIENTOS")
     
-    # Escribir encabezados de movimientos
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row_start, column=col, value=header)
-        cell.font = estilos['header_font']
-        cell.fill = estilos['header_fill']
-        cell.alignment = estilos['header_alignment']
-        cell.border = estilos['header_border']
-    row_start += 1
-    
-    # Escribir datos de movimientos
-    for mov in movimientos:
-        ws.cell(row=row_start, column=1, value=mov.m_fecha.strftime('%Y-%m-%d'))
-        ws.cell(row=row_start, column=2, value=mov.m_tipo.title())
-        ws.cell(row=row_start, column=3, value=mov.m_cantidad)
-        ws.cell(row=row_start, column=4, value=float(mov.m_valorUnitario))
-        ws.cell(row=row_start, column=5, value=float(mov.m_valorTotal))
-        ws.cell(row=row_start, column=6, value=mov.u_id)
-        ws.cell(row=row_start, column=7, value=mov.m_observaciones or '')
-        
-        # Aplicar estilos a los datos
-        for col in range(1, 8):
-            cell = ws.cell(row=row_start, column=col)
-            cell.font = estilos['data_font']
-            cell.border = estilos['data_border']
-        
-        row_start += 1
-    
-    # Ajustar ancho de columnas
-    ajustar_columnas_excel(ws)
-    
-    # Crear respuesta
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    response = make_response(output.read())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=CNM_Detalle_{item.i_codigo}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return response
+    return excel.respuesta(f'CNM_Detalle_{item.i_codigo}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
-def _exportar_articulos_pdf(articulo, item, movimientos, saldo_calculado):
-    """Exporta detalle de artículo a PDF con cabecera institucional"""
+def _exportar_articulos_pdf(articulo, item, saldo_calculado, completo=False):
+    """Exporta detalle de artículo a PDF con cabecera institucional.
+
+    Incluye los últimos LIMITE_MOVIMIENTOS_PDF movimientos o, con completo=True,
+    el historial entero leído por lotes mientras se arman las páginas.
+    """
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4),
                           rightMargin=0.5*inch, leftMargin=0.5*inch,
@@ -1285,37 +1051,40 @@ def _exportar_articulos_pdf(articulo, item, movimientos, saldo_calculado):
     
     # Título de movimientos
     elements.append(Paragraph("HISTORIAL DE MOVIMIENTOS", styles['TituloSeccion']))
-    elements.append(Paragraph(f"Mostrando los últimos 20 movimientos", styles['Normal']))
+    if completo:
+        elements.append(Paragraph("Historial completo en orden cronológico", styles['Normal']))
+        movimientos = movimiento_repo.stream_kardex(item.id)
+    else:
+        elements.append(Paragraph(f"Mostrando los últimos {LIMITE_MOVIMIENTOS_PDF} movimientos", styles['Normal']))
+        movimientos = movimiento_repo.ultimos_kardex(item.id, LIMITE_MOVIMIENTOS_PDF)
     elements.append(Spacer(1, 12))
     
-    # Tabla de movimientos
-    mov_data = [['Fecha', 'Tipo', 'Cantidad', 'Valor Unit.', 'Valor Total', 'Observaciones']]
-    
-    for mov in movimientos[:20]:  # Limitar a 20 movimientos más recientes
-        mov_data.append([
+    # Tabla de movimientos (por bloques, leída a medida que se arman las páginas)
+    mov_headers = ['Fecha', 'Tipo', 'Cantidad', 'Valor Unit.', 'Valor Total', 'Observaciones']
+    mov_data = (
+        [
             mov.m_fecha.strftime('%d/%m/%Y'),
             mov.m_tipo.title(),
             str(mov.m_cantidad),
             f"${float(mov.m_valorUnitario):.2f}",
             f"${float(mov.m_valorTotal):.2f}",
             (mov.m_observaciones or '')[:30] + '...' if mov.m_observaciones and len(mov.m_observaciones) > 30 else (mov.m_observaciones or '')
-        ])
-    
-    mov_table = Table(mov_data, colWidths=[0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 2.5*inch])
-    
-    # Aplicar estilo estandarizado
-    aplicar_estilo_tabla_pdf(mov_table)
-    
-    elements.append(mov_table)
+        ]
+        for mov in movimientos
+    )
+    tablas = iterar_tabla_pdf(
+        mov_headers, mov_data,
+        [0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 2.5*inch],
+        estilo=ESTILO_TABLA_PDF
+    )
     
     # Construir PDF
-    doc.build(elements)
+    construir_pdf_incremental(doc, itertools.chain(elements, tablas))
     buffer.seek(0)
     
     response = make_response(buffer.read())
     response.headers['Content-Type'] = 'application/pdf'
     response.headers['Content-Disposition'] = f'attachment; filename=CNM_Detalle_{item.i_codigo}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-    
     return response
 
 @bp.route('/<int:articulo_id>/salida', methods=['POST'])
@@ -1383,30 +1152,46 @@ def exportar_asignaciones():
             )
         )
 
-    # Obtener los resultados con los filtros aplicados
-    asignaciones = query.order_by(Consumo.c_fecha.desc(), Consumo.c_hora.desc()).all()
+    query = query.order_by(Consumo.c_fecha.desc(), Consumo.c_hora.desc())
 
     # Manejo de exportación a Excel o PDF
     if export_format == 'excel':
-        return _exportar_asignaciones_excel(asignaciones)
+        return _exportar_asignaciones_excel(query)
     elif export_format == 'pdf':
-        return _exportar_asignaciones_pdf(asignaciones)
+        return _exportar_asignaciones_pdf(query.all())
+    elif export_format in FORMATOS_CSV:
+        return _exportar_asignaciones_csv(query, export_format)
     else:
         flash("Formato de exportación no soportado.", "error")
         return redirect(url_for('articulos.listar_asignaciones'))
 
 
-def _exportar_asignaciones_excel(asignaciones):
+def _exportar_asignaciones_csv(query, formato):
+    """Exporta el historial de asignaciones a CSV transmitido por partes"""
+    headers = [
+        'Fecha', 'Hora', 'Artículo', 'Código', 'Personal Asignado', 'Cantidad',
+        'Valor Unitario', 'Valor Total', 'Estado', 'Fecha Devolución', 'Observaciones'
+    ]
+    filas = (
+        [
+            consumo.c_fecha, consumo.c_hora, consumo.i_nombre, consumo.i_codigo,
+            f"{consumo.pe_nombre} {consumo.pe_apellido or ''}".strip(), consumo.c_cantidad,
+            consumo.c_valorUnitario, consumo.c_valorTotal, consumo.c_estado,
+            consumo.c_fecha_devolucion or '', consumo.c_observaciones or ''
+        ]
+        for consumo in consumo_repo.stream_asignaciones(query)
+    )
+    return respuesta_csv(f'CNM_Asignaciones_{datetime.now().strftime("%Y%m%d_%H%M%S")}', headers, filas, formato)
+
+
+def _exportar_asignaciones_excel(query):
     """Exporta el historial de asignaciones a Excel con formato detallado y análisis estadístico"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Asignaciones Detallado"
+    from datetime import date
     
-    # Configurar orientación horizontal
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
+    excel = ExcelStreaming("Asignaciones Detallado")
     
     # Crear cabecera institucional
-    current_row = crear_cabecera_excel(ws, "Reporte Detallado de Asignaciones de Artículos")
+    excel.cabecera("Reporte Detallado de Asignaciones de Artículos")
     
     # Preparar datos detallados con estadísticas
     headers = [
@@ -1415,81 +1200,78 @@ def _exportar_asignaciones_excel(asignaciones):
         'Fecha Devolución', 'Observaciones'
     ]
     
-    data = []
-    valor_total_asignaciones = 0
+    totales = {'valor': 0, 'cantidad': 0}
     asignaciones_por_estado = {}
     asignaciones_por_persona = {}
-    total_cantidad = 0
+    hoy = datetime.now().date()
     
-    for consumo, persona, item in asignaciones:
-        # Calcular días transcurridos
-        from datetime import datetime, date
-        if isinstance(consumo.c_fecha, date):
-            fecha_asignacion = consumo.c_fecha
-        else:
-            fecha_asignacion = consumo.c_fecha.date()
-        
-        dias_transcurridos = (datetime.now().date() - fecha_asignacion).days
-        
-        # Estadísticas
-        valor_total_asignaciones += float(consumo.c_valorTotal)
-        total_cantidad += consumo.c_cantidad
-        
-        # Contar por estado
-        estado = consumo.c_estado
-        asignaciones_por_estado[estado] = asignaciones_por_estado.get(estado, 0) + 1
-        
-        # Contar por persona
-        nombre_completo = f"{persona.pe_nombre} {persona.pe_apellido}"
-        asignaciones_por_persona[nombre_completo] = asignaciones_por_persona.get(nombre_completo, 0) + 1
-        
-        data.append([
-            formatear_fecha(consumo.c_fecha),
-            consumo.c_hora.strftime('%H:%M:%S') if hasattr(consumo, 'c_hora') and consumo.c_hora else 'N/A',
-            item.i_nombre,
-            item.i_codigo,
-            nombre_completo,
-            consumo.c_cantidad,
-            formatear_valor_moneda(consumo.c_valorUnitario),
-            formatear_valor_moneda(consumo.c_valorTotal),
-            estado,
-            dias_transcurridos,
-            formatear_fecha(consumo.c_fecha_devolucion) if hasattr(consumo, 'c_fecha_devolucion') and consumo.c_fecha_devolucion else 'N/A',
-            truncar_texto(consumo.c_observaciones or 'Sin observaciones', 40)
-        ])
+    def filas():
+        for consumo in consumo_repo.stream_asignaciones(query):
+            # Calcular días transcurridos
+            if isinstance(consumo.c_fecha, date):
+                fecha_asignacion = consumo.c_fecha
+            else:
+                fecha_asignacion = consumo.c_fecha.date()
+            
+            dias_transcurridos = (hoy - fecha_asignacion).days
+            
+            # Estadísticas
+            totales['valor'] += float(consumo.c_valorTotal)
+            totales['cantidad'] += consumo.c_cantidad
+            
+            # Contar por estado
+            estado = consumo.c_estado
+            asignaciones_por_estado[estado] = asignaciones_por_estado.get(estado, 0) + 1
+            
+            # Contar por persona
+            nombre_completo = f"{consumo.pe_nombre} {consumo.pe_apellido}"
+            asignaciones_por_persona[nombre_completo] = asignaciones_por_persona.get(nombre_completo, 0) + 1
+            
+            yield [
+                formatear_fecha(consumo.c_fecha),
+                consumo.c_hora.strftime('%H:%M:%S') if consumo.c_hora else 'N/A',
+                consumo.i_nombre,
+                consumo.i_codigo,
+                nombre_completo,
+                consumo.c_cantidad,
+                formatear_valor_moneda(consumo.c_valorUnitario),
+                formatear_valor_moneda(consumo.c_valorTotal),
+                estado,
+                dias_transcurridos,
+                formatear_fecha(consumo.c_fecha_devolucion) if consumo.c_fecha_devolucion else 'N/A',
+                truncar_texto(consumo.c_observaciones or 'Sin observaciones', 40)
+            ]
     
     # Crear tabla detallada
-    current_row = crear_tabla_detallada_excel(ws, headers, data, current_row, "HISTORIAL DETALLADO DE ASIGNACIONES")
+    total = excel.tabla(headers, filas(), "HISTORIAL DETALLADO DE ASIGNACIONES")
+    valor_total_asignaciones = totales['valor']
+    total_cantidad = totales['cantidad']
     
     # Agregar análisis estadístico completo
-    current_row += 2
-    ws[f'A{current_row}'] = "ANÁLISIS ESTADÍSTICO DE ASIGNACIONES"
-    ws[f'A{current_row}'].font = Font(name='Calibri', size=14, bold=True, color="2E5984")
-    ws.merge_cells(f'A{current_row}:F{current_row}')
-    current_row += 2
+    excel.espacio(2)
+    excel.titulo("ANÁLISIS ESTADÍSTICO DE ASIGNACIONES", columnas=6)
+    excel.espacio()
     
     resumen_headers = ['Métrica', 'Cantidad', 'Valor', 'Porcentaje', 'Observaciones']
     resumen_data = [
-        ['Total de Asignaciones', len(asignaciones), formatear_valor_moneda(valor_total_asignaciones), '100%', 'Asignaciones totales registradas'],
+        ['Total de Asignaciones', total, formatear_valor_moneda(valor_total_asignaciones), '100%', 'Asignaciones totales registradas'],
         ['Cantidad Total Asignada', total_cantidad, 'N/A', '100%', 'Unidades totales asignadas'],
-        ['Valor Promedio por Asignación', f"{valor_total_asignaciones/len(asignaciones):.2f}" if asignaciones else "0", formatear_valor_moneda(valor_total_asignaciones/len(asignaciones)) if asignaciones else "$0.00", 'N/A', 'Valor promedio por asignación'],
-        ['Personal Único Involucrado', len(asignaciones_por_persona), 'N/A', f"{(len(asignaciones_por_persona)/len(asignaciones)*100):.1f}%" if asignaciones else "0%", 'Personas diferentes con asignaciones']
+        ['Valor Promedio por Asignación', f"{valor_total_asignaciones/total:.2f}" if total else "0", formatear_valor_moneda(valor_total_asignaciones/total) if total else "$0.00", 'N/A', 'Valor promedio por asignación'],
+        ['Personal Único Involucrado', len(asignaciones_por_persona), 'N/A', f"{(len(asignaciones_por_persona)/total*100):.1f}%" if total else "0%", 'Personas diferentes con asignaciones']
     ]
     
     # Agregar desglose por estado
     for estado, cantidad in asignaciones_por_estado.items():
-        porcentaje = f"{(cantidad/len(asignaciones)*100):.1f}%" if asignaciones else "0%"
+        porcentaje = f"{(cantidad/total*100):.1f}%" if total else "0%"
         resumen_data.append([f'Asignaciones "{estado}"', cantidad, 'N/A', porcentaje, f'Estado: {estado}'])
     
-    current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row)
+    excel.tabla(resumen_headers, resumen_data)
     
     # Agregar ranking de personal con más asignaciones
     if asignaciones_por_persona:
-        current_row += 2
-        ws[f'A{current_row}'] = "RANKING DE PERSONAL CON MÁS ASIGNACIONES"
-        ws[f'A{current_row}'].font = Font(name='Calibri', size=12, bold=True, color="2E5984")
-        ws.merge_cells(f'A{current_row}:D{current_row}')
-        current_row += 2
+        excel.espacio(2)
+        excel.titulo("RANKING DE PERSONAL CON MÁS ASIGNACIONES", columnas=4, estilo='cnm_subseccion')
+        excel.espacio()
         
         ranking_headers = ['Personal', 'Cantidad de Asignaciones', 'Porcentaje', 'Observaciones']
         ranking_data = []
@@ -1498,7 +1280,7 @@ def _exportar_asignaciones_excel(asignaciones):
         top_personal = sorted(asignaciones_por_persona.items(), key=lambda x: x[1], reverse=True)[:10]
         
         for nombre, cantidad in top_personal:
-            porcentaje = f"{(cantidad/len(asignaciones)*100):.1f}%" if asignaciones else "0%"
+            porcentaje = f"{(cantidad/total*100):.1f}%" if total else "0%"
             ranking_data.append([
                 nombre,
                 cantidad,
@@ -1506,21 +1288,9 @@ def _exportar_asignaciones_excel(asignaciones):
                 'Personal activo' if cantidad > 1 else 'Asignación única'
             ])
         
-        current_row = crear_tabla_detallada_excel(ws, ranking_headers, ranking_data, current_row)
-    
-    # Ajustar ancho de columnas
-    ajustar_columnas_excel(ws)
+        excel.tabla(ranking_headers, ranking_data)
     
-    # Crear respuesta
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    response = make_response(output.read())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=CNM_Asignaciones_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return response
+    return excel.respuesta(f'CNM_Asignaciones_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 
 def _exportar_asignaciones_pdf(asignaciones):
@@ -1625,20 +1395,10 @@ def asignacion_multiple():
             
             persona_id = int(persona_id)
             
-            # Verificar que la persona existe y está activa
-            persona = Persona.query.get(persona_id)
-            if not persona:
-                flash('La persona seleccionada no existe', 'error')
-                return redirect(url_for('articulos.asignacion_multiple'))
-            
-            if persona.pe_estado != 'Activo':
-                flash('Solo se puede asignar artículos a personal activo', 'error')
-                return redirect(url_for('articulos.asignacion_multiple'))
-            
             articulos_data = []
-            articulos_procesados = set()
             
-            # Procesar múltiples artículos del formulario
+            # Procesar múltiples artículos del formulario; el stock se valida en el
+            # servicio con las filas ya bloqueadas
             i = 0
             while f'articulo_id_{i}' in request.form:
                 articulo_id = request.form.get(f'articulo_id_{i}')
@@ -1650,104 +1410,50 @@ def asignacion_multiple():
                         articulo_id = int(articulo_id)
                         cantidad = int(cantidad)
                         valor_unitario = float(valor_unitario)
-                        
-                        # Validaciones básicas
-                        if cantidad <= 0:
-                            flash('La cantidad debe ser mayor a 0', 'error')
-                            return redirect(url_for('articulos.asignacion_multiple'))
-                        
-                        if valor_unitario <= 0:
-                            flash('El valor unitario debe ser mayor a 0', 'error')
-                            return redirect(url_for('articulos.asignacion_multiple'))
-                        
-                        # Verificar duplicados
-                        if articulo_id in articulos_procesados:
-                            flash('No puede seleccionar el mismo artículo múltiples veces', 'error')
-                            return redirect(url_for('articulos.asignacion_multiple'))
-                        
-                        # Verificar que el artículo existe y tiene stock
-                        resultado = articulo_service.obtener_por_id(articulo_id)
-                        if not resultado:
-                            flash(f'Artículo con ID {articulo_id} no encontrado', 'error')
-                            return redirect(url_for('articulos.asignacion_multiple'))
-                        
-                        articulo, item = resultado
-                        
-                        # Verificar stock disponible
-                        if item.i_cantidad < cantidad:
-                            flash(f'Stock insuficiente para {item.i_nombre}. Disponible: {item.i_cantidad}, Solicitado: {cantidad}', 'error')
-                            return redirect(url_for('articulos.asignacion_multiple'))
-                        
-                        articulos_data.append({
-                            'articulo_id': articulo_id,
-                            'cantidad': cantidad,
-                            'valor_unitario': valor_unitario,
-                            'nombre': item.i_nombre,
-                            'codigo': item.i_codigo
-                        })
-                        articulos_procesados.add(articulo_id)
-                        
-                    except (ValueError, TypeError) as e:
+                    except (ValueError, TypeError):
                         flash(f'Error en los datos del artículo {i+1}: valores inválidos', 'error')
                         return redirect(url_for('articulos.asignacion_multiple'))
+                    
+                    # Validaciones básicas
+                    if cantidad <= 0:
+                        flash('La cantidad debe ser mayor a 0', 'error')
+                        return redirect(url_for('articulos.asignacion_multiple'))
+                    
+                    if valor_unitario <= 0:
+                        flash('El valor unitario debe ser mayor a 0', 'error')
+                        return redirect(url_for('articulos.asignacion_multiple'))
+                    
+                    articulos_data.append({
+                        'articulo_id': articulo_id,
+                        'cantidad': cantidad,
+                        'valor_unitario': valor_unitario
+                    })
                 
                 i += 1
             
-            # Validar que se hayan agregado artículos
-            if not articulos_data:
-                flash('Debe agregar al menos un artículo válido', 'error')
-                return redirect(url_for('articulos.asignacion_multiple'))
-            
             observaciones = request.form.get('observaciones', '').strip()
             
-            # Procesar todas las asignaciones
-            asignaciones_exitosas = 0
-            errores = []
+            # Todas las asignaciones en una sola transacción (todo o nada)
+            resultado = articulo_service.registrar_asignacion_multiple(
+                persona_id, articulos_data, current_user.id, observaciones or None
+            )
             
-            try:
-                # Usar transacción para asegurar consistencia
-                for articulo_data in articulos_data:
-                    try:
-                        # Registrar la asignación
-                        movimiento, consumo = articulo_service.registrar_salida_con_asignacion(
-                            articulo_data['articulo_id'],
-                            articulo_data['cantidad'],
-                            articulo_data['valor_unitario'],
-                            current_user.id,
-                            persona_id,
-                            f"Asignación múltiple - {observaciones}" if observaciones else "Asignación múltiple"
-                        )
-                        asignaciones_exitosas += 1
-                        
-                    except Exception as e:
-                        errores.append(f"{articulo_data['codigo']} - {articulo_data['nombre']}: {str(e)}")
-                        db.session.rollback()
-                        continue
-                
-                # Mostrar resultados
-                if asignaciones_exitosas > 0:
-                    flash(f'Se procesaron {asignaciones_exitosas} asignación(es) exitosamente para {persona.pe_nombre}', 'success')
-                
-                if errores:
-                    for error in errores:
-                        flash(f'Error: {error}', 'warning')
-                
-                # Redirigir según el resultado
-                if asignaciones_exitosas > 0:
-                    # Redirigir a vista previa con datos de las asignaciones procesadas
-                    articulos_procesados_ids = [str(data['articulo_id']) for data in articulos_data]
-                    return redirect(url_for('articulos.vista_previa_asignaciones',
-                                          persona_id=persona_id,
-                                          articulos=','.join(articulos_procesados_ids),
-                                          observaciones=observaciones))
-                else:
-                    return redirect(url_for('articulos.asignacion_multiple'))
-                    
-            except Exception as e:
-                db.session.rollback()
-                flash(f'Error general en el procesamiento: {str(e)}', 'error')
+            if not resultado['success']:
+                flash(resultado['error'], 'error')
+                for error in resultado['errores']:
+                    flash(f"Error: {error['error']}", 'warning')
                 return redirect(url_for('articulos.asignacion_multiple'))
             
+            persona = Persona.query.get(persona_id)
+            flash(f"Se procesaron {len(resultado['consumos'])} asignación(es) exitosamente para {persona.pe_nombre}", 'success')
+            
+            # Redirigir a vista previa con datos de las asignaciones procesadas
+            articulos_procesados_ids = [str(data['articulo_id']) for data in articulos_data]
+            return redirect(url_for('articulos.vista_previa_asignaciones',
+                                  persona_id=persona_id,
+                                  articulos=','.join(articulos_procesados_ids),
+                                  observaciones=observaciones))
+            
         except Exception as e:
             flash(f'Error en la asignación múltiple: {str(e)}', 'error')
             return redirect(url_for('articulos.asignacion_multiple'))
@@ -1938,15 +1644,7 @@ def _exportar_vista_previa_pdf(persona, asignaciones, observaciones, total_artic
     elements.append(Spacer(1, 20))
     
     # Nota final
-    nota_style = ParagraphStyle(
-        'NotaFinal',
-        parent=crear_estilos_pdf()['Normal'],
-        fontSize=8,
-        fontName='Helvetica-Oblique',
-        textColor=colors.HexColor('#666666'),
-        alignment=1
-    )
-    elements.append(Paragraph("Este documento certifica la entrega y recepción de los artículos detallados anteriormente.", nota_style))
+    elements.append(Paragraph("Este documento certifica la entrega y recepción de los artículos detallados anteriormente.", crear_estilos_pdf()['NotaFinal']))
     
     # Construir PDF
     doc.build(elements)
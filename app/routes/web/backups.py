@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, send_file, current_app
 from app.services.backup_service import BackupService
 from app.services.google_drive_service import GoogleDriveService
 from app.services.backup_scheduler import backup_scheduler
@@ -286,7 +286,7 @@ def setup_google_drive():
 @bp.route('/scheduler/start', methods=['POST'])
 def start_scheduler():
     """Iniciar scheduler de backups automáticos"""
-    backup_scheduler.start()
+    backup_scheduler.start(current_app._get_current_object())
     flash('Scheduler de backups automáticos iniciado', 'success')
     return redirect(url_for('backups.index'))
 
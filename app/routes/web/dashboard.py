@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template
 from flask_login import login_required
-from app.services import InstrumentoService, ArticuloService, ProveedorService
+from app.services import DashboardService
 
 bp = Blueprint('dashboard', __name__)
 
@@ -8,25 +8,13 @@ bp = Blueprint('dashboard', __name__)
 @login_required
 def index():
     """Dashboard principal del sistema"""
-    instrumento_service = InstrumentoService()
-    articulo_service = ArticuloService()
-    proveedor_service = ProveedorService()
+    dashboard_service = DashboardService()
     
-    # Estadísticas básicas
-    total_instrumentos = len(instrumento_service.obtener_todos())
-    total_articulos = len(articulo_service.obtener_todos())
-    total_proveedores = len(proveedor_service.obtener_todos())
-    articulos_stock_bajo = len(articulo_service.obtener_stock_bajo())
+    # Estadísticas básicas (una sola consulta agregada)
+    estadisticas = dashboard_service.obtener_estadisticas()
     
-    estadisticas = {
-        'total_instrumentos': total_instrumentos,
-        'total_articulos': total_articulos,
-        'total_proveedores': total_proveedores,
-        'articulos_stock_bajo': articulos_stock_bajo
-    }
-    
-    # Artículos con stock bajo para alertas
-    alertas_stock = articulo_service.obtener_stock_bajo()
+    # Artículos con mayor déficit de stock para alertas
+    alertas_stock = dashboard_service.obtener_alertas_stock()
     
     return render_template('dashboard/index.html', 
                          estadisticas=estadisticas, 
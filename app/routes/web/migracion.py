@@ -6,6 +6,8 @@ from flask import Blueprint, render_template, request, jsonify, make_response, f
 from flask_login import login_required
 from datetime import datetime
 from werkzeug.utils import secure_filename
+from app.utils.cache import invalidar_datos
+from app.services.backup_service import BackupService
 import mysql.connector
 from mysql.connector import Error
 import logging
@@ -253,6 +255,10 @@ def importar_base():
             flash(f'Error al eliminar archivo temporal: {str(e)}', 'warning')
 
         if success:
+            # Los datos cambiaron por fuera del ORM: invalidar dashboard y exportaciones
+            invalidar_datos()
+            # Las marcas de agua de la cadena incremental ya no describen la base importada
+            BackupService().incremental.invalidar_cadena()
             flash('Base de datos importada exitosamente', 'success')
         else:
             flash(f'Error al importar la base de datos: {message}', 'error')
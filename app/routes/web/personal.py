@@ -1,27 +1,29 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, make_response
 from flask_login import login_required
 from app.services.personal_service import PersonalService
+from app.database.repositories.personal import PersonalRepository
+from app.database.repositories.consumos import ConsumoRepository
 from datetime import date, datetime
 from sqlalchemy import or_, and_
 from app.database.models import Persona
 from app.database import db
 import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+import itertools
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from app.utils.export_utils import (
-    crear_cabecera_excel, crear_estilos_excel, crear_cabecera_pdf,
-    crear_estilos_pdf, aplicar_estilo_tabla_pdf, ajustar_columnas_excel,
-    crear_tabla_detallada_excel, crear_tabla_detallada_pdf,
+    ExcelStreaming, FORMATOS_CSV, respuesta_csv, crear_cabecera_pdf,
+    crear_estilos_pdf, aplicar_estilo_tabla_pdf, crear_tabla_detallada_pdf,
     formatear_valor_moneda, formatear_fecha, truncar_texto
 )
 
 bp = Blueprint('personal', __name__)
 personal_service = PersonalService()
+personal_repo = PersonalRepository()
+consumo_repo = ConsumoRepository()
 
 @bp.route('/')
 @login_required
@@ -39,7 +41,7 @@ def listar_personal():
     
     # Verificar si es exportación
     export_type = request.args.get('export')
-    if export_type in ['excel', 'pdf']:
+    if export_type in ['excel', 'pdf', *FORMATOS_CSV]:
         # Para exportación, obtener todos los registros sin paginación
         query = Persona.query
         
@@ -70,12 +72,12 @@ def listar_personal():
         elif ordenar == 'estado':
             query = query.order_by(Persona.pe_estado.asc())
         
-        personal_export = query.all()
-        
         if export_type == 'excel':
-            return _exportar_personal_excel(personal_export)
+            return _exportar_personal_excel(query)
         elif export_type == 'pdf':
-            return _exportar_personal_pdf(personal_export)
+            return _exportar_personal_pdf(query.all())
+        else:
+            return _exportar_personal_csv(query, export_type)
     
     # Consulta base
     query = Persona.query
@@ -166,16 +168,16 @@ def detalle_personal(persona_id):
         flash('Persona no encontrada', 'error')
         return redirect(url_for('personal.listar_personal'))
     
+    # Verificar si es exportación
+    export_type = request.args.get('export')
+    if export_type == 'excel':
+        return _exportar_detalle_personal_excel(persona)
+    
     # Obtener historial de consumos
     consumos = personal_service.obtener_historial_consumos(persona_id)
     
-    # Verificar si es exportación
-    export_type = request.args.get('export')
-    if export_type in ['excel', 'pdf']:
-        if export_type == 'excel':
-            return _exportar_detalle_personal_excel(persona, consumos)
-        elif export_type == 'pdf':
-            return _exportar_detalle_personal_pdf(persona, consumos)
+    if export_type == 'pdf':
+        return _exportar_detalle_personal_pdf(persona, consumos)
     
     today = date.today().strftime('%Y-%m-%d')
     return render_template('personal/detail.html', persona=persona, consumos=consumos, today=today)
@@ -304,17 +306,29 @@ def api_personal_activo():
             'personal': []
         }), 500
 
-def _exportar_personal_excel(personal):
+def _exportar_personal_csv(query, formato):
+    """Exporta personal a CSV transmitido por partes"""
+    headers = [
+        'Código', 'Nombre', 'Apellido', 'Cédula de Identidad', 'Teléfono',
+        'Correo Electrónico', 'Dirección', 'Cargo', 'Estado', 'Fecha Registro'
+    ]
+    filas = (
+        [
+            persona.pe_codigo or '', persona.pe_nombre or '', persona.pe_apellido or '',
+            persona.pe_ci or '', persona.pe_telefono or '', persona.pe_correo or '',
+            persona.pe_direccion or '', persona.pe_cargo or '', persona.pe_estado or '',
+            persona.created_at
+        ]
+        for persona in personal_repo.stream_exportacion(query)
+    )
+    return respuesta_csv(f'CNM_Personal_{datetime.now().strftime("%Y%m%d_%H%M%S")}', headers, filas, formato)
+
+def _exportar_personal_excel(query):
     """Exporta personal a Excel con formato detallado y análisis estadístico"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Personal Detallado"
-    
-    # Configurar orientación horizontal
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
+    excel = ExcelStreaming("Personal Detallado")
     
     # Crear cabecera institucional
-    current_row = crear_cabecera_excel(ws, "Reporte Detallado de Personal")
+    excel.cabecera("Reporte Detallado de Personal")
     
     # Preparar datos detallados con estadísticas
     headers = [
@@ -323,115 +337,106 @@ def _exportar_personal_excel(personal):
         'Fecha Registro', 'Antigüedad (días)', 'Perfil Completo'
     ]
     
-    data = []
     personal_por_cargo = {}
     personal_por_estado = {}
-    total_activos = 0
-    total_inactivos = 0
-    
-    for persona in personal:
-        # Calcular antigüedad
-        if hasattr(persona, 'created_at') and persona.created_at:
-            fecha_registro = persona.created_at
-            antiguedad = (datetime.now().date() - fecha_registro.date()).days if isinstance(fecha_registro, datetime) else (datetime.now().date() - fecha_registro).days
-        else:
-            fecha_registro = None
-            antiguedad = 0
-        
-        # Determinar si el perfil está completo
-        campos_requeridos = [persona.pe_nombre, persona.pe_ci, persona.pe_telefono, persona.pe_correo, persona.pe_cargo]
-        perfil_completo = "Completo" if all(campo for campo in campos_requeridos) else "Incompleto"
-        
-        # Estadísticas
-        cargo = persona.pe_cargo or 'Sin cargo'
-        estado = persona.pe_estado or 'Sin estado'
-        
-        personal_por_cargo[cargo] = personal_por_cargo.get(cargo, 0) + 1
-        personal_por_estado[estado] = personal_por_estado.get(estado, 0) + 1
-        
-        if estado.lower() == 'activo':
-            total_activos += 1
-        else:
-            total_inactivos += 1
-        
-        data.append([
-            persona.pe_codigo or 'N/A',
-            f"{persona.pe_nombre or ''} {persona.pe_apellido or ''}".strip(),
-            persona.pe_ci or 'N/A',
-            persona.pe_telefono or 'N/A',
-            persona.pe_correo or 'N/A',
-            truncar_texto(persona.pe_direccion or 'N/A', 30),
-            cargo,
-            estado,
-            formatear_fecha(fecha_registro) if fecha_registro else 'N/A',
-            antiguedad,
-            perfil_completo
-        ])
+    totales = {'activos': 0, 'inactivos': 0, 'completos': 0}
+    hoy = datetime.now().date()
+    
+    def filas():
+        for persona in personal_repo.stream_exportacion(query):
+            # Calcular antigüedad
+            if persona.created_at:
+                fecha_registro = persona.created_at
+                antiguedad = (hoy - fecha_registro.date()).days if isinstance(fecha_registro, datetime) else (hoy - fecha_registro).days
+            else:
+                fecha_registro = None
+                antiguedad = 0
+            
+            # Determinar si el perfil está completo
+            campos_requeridos = [persona.pe_nombre, persona.pe_ci, persona.pe_telefono, persona.pe_correo, persona.pe_cargo]
+            perfil_completo = "Completo" if all(campo for campo in campos_requeridos) else "Incompleto"
+            if perfil_completo == "Completo":
+                totales['completos'] += 1
+            
+            # Estadísticas
+            cargo = persona.pe_cargo or 'Sin cargo'
+            estado = persona.pe_estado or 'Sin estado'
+            
+            personal_por_cargo[cargo] = personal_por_cargo.get(cargo, 0) + 1
+            personal_por_estado[estado] = personal_por_estado.get(estado, 0) + 1
+            
+            if estado.lower() == 'activo':
+                totales['activos'] += 1
+            else:
+                totales['inactivos'] += 1
+            
+            yield [
+                persona.pe_codigo or 'N/A',
+                f"{persona.pe_nombre or ''} {persona.pe_apellido or ''}".strip(),
+                persona.pe_ci or 'N/A',
+                persona.pe_telefono or 'N/A',
+                persona.pe_correo or 'N/A',
+                truncar_texto(persona.pe_direccion or 'N/A', 30),
+                cargo,
+                estado,
+                formatear_fecha(fecha_registro) if fecha_registro else 'N/A',
+                antiguedad,
+                perfil_completo
+            ]
     
     # Crear tabla detallada
-    current_row = crear_tabla_detallada_excel(ws, headers, data, current_row, "DIRECTORIO DETALLADO DE PERSONAL")
+    total = excel.tabla(headers, filas(), "DIRECTORIO DETALLADO DE PERSONAL")
+    total_activos = totales['activos']
+    total_inactivos = totales['inactivos']
+    perfiles_completos = totales['completos']
+    perfiles_incompletos = total - perfiles_completos
     
     # Agregar análisis estadístico completo
-    current_row += 2
-    ws[f'A{current_row}'] = "ANÁLISIS ESTADÍSTICO DEL PERSONAL"
-    ws[f'A{current_row}'].font = Font(name='Calibri', size=14, bold=True, color="2E5984")
-    ws.merge_cells(f'A{current_row}:F{current_row}')
-    current_row += 2
+    excel.espacio(2)
+    excel.titulo("ANÁLISIS ESTADÍSTICO DEL PERSONAL", columnas=6)
+    excel.espacio()
     
     resumen_headers = ['Métrica', 'Cantidad', 'Porcentaje', 'Observaciones']
     resumen_data = [
-        ['Total de Personal', len(personal), '100%', 'Personal registrado en el sistema'],
-        ['Personal Activo', total_activos, f"{(total_activos/len(personal)*100):.1f}%" if personal else "0%", 'Personal en estado activo'],
-        ['Personal Inactivo', total_inactivos, f"{(total_inactivos/len(personal)*100):.1f}%" if personal else "0%", 'Personal en estado inactivo'],
-        ['Perfiles Completos', sum(1 for row in data if row[10] == 'Completo'), f"{(sum(1 for row in data if row[10] == 'Completo')/len(personal)*100):.1f}%" if personal else "0%", 'Personal con información completa'],
-        ['Perfiles Incompletos', sum(1 for row in data if row[10] == 'Incompleto'), f"{(sum(1 for row in data if row[10] == 'Incompleto')/len(personal)*100):.1f}%" if personal else "0%", 'Personal con información faltante']
+        ['Total de Personal', total, '100%', 'Personal registrado en el sistema'],
+        ['Personal Activo', total_activos, f"{(total_activos/total*100):.1f}%" if total else "0%", 'Personal en estado activo'],
+        ['Personal Inactivo', total_inactivos, f"{(total_inactivos/total*100):.1f}%" if total else "0%", 'Personal en estado inactivo'],
+        ['Perfiles Completos', perfiles_completos, f"{(perfiles_completos/total*100):.1f}%" if total else "0%", 'Personal con información completa'],
+        ['Perfiles Incompletos', perfiles_incompletos, f"{(perfiles_incompletos/total*100):.1f}%" if total else "0%", 'Personal con información faltante']
     ]
     
     # Agregar desglose por cargo
     for cargo, cantidad in personal_por_cargo.items():
-        porcentaje = f"{(cantidad/len(personal)*100):.1f}%" if personal else "0%"
+        porcentaje = f"{(cantidad/total*100):.1f}%" if total else "0%"
         resumen_data.append([f'Personal en "{cargo}"', cantidad, porcentaje, f'Personas con cargo: {cargo}'])
     
-    current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row)
+    excel.tabla(resumen_headers, resumen_data)
     
     # Agregar ranking de cargos más comunes
     if personal_por_cargo:
-        current_row += 2
-        ws[f'A{current_row}'] = "DISTRIBUCIÓN POR CARGOS"
-        ws[f'A{current_row}'].font = Font(name='Calibri', size=12, bold=True, color="2E5984")
-        ws.merge_cells(f'A{current_row}:D{current_row}')
-        current_row += 2
+        excel.espacio(2)
+        excel.titulo("DISTRIBUCIÓN POR CARGOS", columnas=4, estilo='cnm_subseccion')
+        excel.espacio()
         
         cargo_headers = ['Cargo', 'Cantidad de Personal', 'Porcentaje', 'Observaciones']
         cargo_data = []
         
         # Ordenar por cantidad de personal
         top_cargos = sorted(personal_por_cargo.items(), key=lambda x: x[1], reverse=True)
+        maximo = max(personal_por_cargo.values())
         
         for cargo, cantidad in top_cargos:
-            porcentaje = f"{(cantidad/len(personal)*100):.1f}%" if personal else "0%"
+            porcentaje = f"{(cantidad/total*100):.1f}%" if total else "0%"
             cargo_data.append([
                 cargo,
                 cantidad,
                 porcentaje,
-                'Cargo principal' if cantidad == max(personal_por_cargo.values()) else 'Cargo secundario'
+                'Cargo principal' if cantidad == maximo else 'Cargo secundario'
             ])
         
-        current_row = crear_tabla_detallada_excel(ws, cargo_headers, cargo_data, current_row)
-    
-    # Ajustar ancho de columnas
-    ajustar_columnas_excel(ws)
+        excel.tabla(cargo_headers, cargo_data)
     
-    # Crear respuesta
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    response = make_response(output.read())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=CNM_Personal_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return response
+    return excel.respuesta(f'CNM_Personal_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 def _exportar_personal_pdf(personal):
     """Exporta personal a PDF con formato detallado y análisis estadístico"""
@@ -508,17 +513,12 @@ def _exportar_personal_pdf(personal):
     
     return response
 
-def _exportar_detalle_personal_excel(persona, consumos):
+def _exportar_detalle_personal_excel(persona):
     """Exporta detalle de personal a Excel con formato detallado y análisis estadístico"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Detalle_{persona.pe_nombre}"
-    
-    # Configurar orientación horizontal
-    ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
+    excel = ExcelStreaming(f"Detalle_{persona.pe_nombre}")
     
     # Crear cabecera institucional
-    current_row = crear_cabecera_excel(ws, f"Detalle de Personal - {persona.pe_nombre}")
+    excel.cabecera(f"Detalle de Personal - {persona.pe_nombre}")
     
     # Información personal detallada
     info_headers = ['Campo', 'Valor', 'Estado', 'Observaciones']
@@ -534,11 +534,13 @@ def _exportar_detalle_personal_excel(persona, consumos):
     ]
     
     # Crear tabla detallada de información personal
-    current_row = crear_tabla_detallada_excel(ws, info_headers, info_data, current_row, "INFORMACIÓN PERSONAL DETALLADA")
+    excel.tabla(info_headers, info_data, "INFORMACIÓN PERSONAL DETALLADA")
     
-    # Análisis de asignaciones si existen
-    if consumos:
-        current_row += 2
+    # Análisis de asignaciones si existen (se mira la primera fila sin cargar el resto)
+    consumos = iter(consumo_repo.stream_por_persona(persona.id))
+    primera = next(consumos, None)
+    if primera is not None:
+        excel.espacio(2)
         
         # Preparar datos de asignaciones con análisis
         asig_headers = [
@@ -546,87 +548,74 @@ def _exportar_detalle_personal_excel(persona, consumos):
             'Estado', 'Días Transcurridos', 'Observaciones', 'Clasificación'
         ]
         
-        asig_data = []
-        valor_total_asignaciones = 0
+        totales = {'valor': 0, 'cantidad': 0}
         asignaciones_por_estado = {}
-        cantidad_total = 0
-        
-        for consumo in consumos:
-            # Calcular días transcurridos
-            if consumo.c_fecha:
-                if isinstance(consumo.c_fecha, date):
-                    fecha_asignacion = consumo.c_fecha
+        hoy = datetime.now().date()
+        
+        def filas():
+            for consumo in itertools.chain([primera], consumos):
+                # Calcular días transcurridos
+                if consumo.c_fecha:
+                    if isinstance(consumo.c_fecha, date):
+                        fecha_asignacion = consumo.c_fecha
+                    else:
+                        fecha_asignacion = consumo.c_fecha.date()
+                    dias_transcurridos = (hoy - fecha_asignacion).days
                 else:
-                    fecha_asignacion = consumo.c_fecha.date()
-                dias_transcurridos = (datetime.now().date() - fecha_asignacion).days
-            else:
-                dias_transcurridos = 0
-            
-            # Clasificar asignación
-            if dias_transcurridos > 365:
-                clasificacion = "Asignación antigua"
-            elif dias_transcurridos > 90:
-                clasificacion = "Asignación reciente"
-            else:
-                clasificacion = "Asignación nueva"
-            
-            # Estadísticas
-            valor_total_asignaciones += float(consumo.c_valorTotal) if consumo.c_valorTotal else 0
-            cantidad_total += consumo.c_cantidad or 0
-            estado = consumo.c_estado or 'Sin estado'
-            asignaciones_por_estado[estado] = asignaciones_por_estado.get(estado, 0) + 1
-            
-            asig_data.append([
-                formatear_fecha(consumo.c_fecha) if consumo.c_fecha else 'N/A',
-                consumo.item.i_nombre if consumo.item else 'N/A',
-                consumo.item.i_codigo if consumo.item else 'N/A',
-                consumo.c_cantidad or 0,
-                formatear_valor_moneda(consumo.c_valorUnitario) if consumo.c_valorUnitario else '$0.00',
-                formatear_valor_moneda(consumo.c_valorTotal) if consumo.c_valorTotal else '$0.00',
-                estado,
-                dias_transcurridos,
-                truncar_texto(consumo.c_observaciones or 'Sin observaciones', 30),
-                clasificacion
-            ])
+                    dias_transcurridos = 0
+                
+                # Clasificar asignación
+                if dias_transcurridos > 365:
+                    clasificacion = "Asignación antigua"
+                elif dias_transcurridos > 90:
+                    clasificacion = "Asignación reciente"
+                else:
+                    clasificacion = "Asignación nueva"
+                
+                # Estadísticas
+                totales['valor'] += float(consumo.c_valorTotal) if consumo.c_valorTotal else 0
+                totales['cantidad'] += consumo.c_cantidad or 0
+                estado = consumo.c_estado or 'Sin estado'
+                asignaciones_por_estado[estado] = asignaciones_por_estado.get(estado, 0) + 1
+                
+                yield [
+                    formatear_fecha(consumo.c_fecha) if consumo.c_fecha else 'N/A',
+                    consumo.i_nombre or 'N/A',
+                    consumo.i_codigo or 'N/A',
+                    consumo.c_cantidad or 0,
+                    formatear_valor_moneda(consumo.c_valorUnitario) if consumo.c_valorUnitario else '$0.00',
+                    formatear_valor_moneda(consumo.c_valorTotal) if consumo.c_valorTotal else '$0.00',
+                    estado,
+                    dias_transcurridos,
+                    truncar_texto(consumo.c_observaciones or 'Sin observaciones', 30),
+                    clasificacion
+                ]
         
         # Crear tabla detallada de asignaciones
-        current_row = crear_tabla_detallada_excel(ws, asig_headers, asig_data, current_row, "HISTORIAL DETALLADO DE ASIGNACIONES")
+        total = excel.tabla(asig_headers, filas(), "HISTORIAL DETALLADO DE ASIGNACIONES")
+        valor_total_asignaciones = totales['valor']
         
         # Análisis estadístico de asignaciones
-        current_row += 2
-        ws[f'A{current_row}'] = "ANÁLISIS DE ASIGNACIONES DEL PERSONAL"
-        ws[f'A{current_row}'].font = Font(name='Calibri', size=14, bold=True, color="2E5984")
-        ws.merge_cells(f'A{current_row}:F{current_row}')
-        current_row += 2
+        excel.espacio(2)
+        excel.titulo("ANÁLISIS DE ASIGNACIONES DEL PERSONAL", columnas=6)
+        excel.espacio()
         
         analisis_headers = ['Métrica', 'Valor', 'Porcentaje', 'Observaciones']
         analisis_data = [
-            ['Total de Asignaciones', len(consumos), '100%', 'Asignaciones registradas'],
-            ['Cantidad Total Asignada', cantidad_total, 'N/A', 'Unidades totales asignadas'],
+            ['Total de Asignaciones', total, '100%', 'Asignaciones registradas'],
+            ['Cantidad Total Asignada', totales['cantidad'], 'N/A', 'Unidades totales asignadas'],
             ['Valor Total Asignado', formatear_valor_moneda(valor_total_asignaciones), '100%', 'Valor monetario total'],
-            ['Promedio por Asignación', formatear_valor_moneda(valor_total_asignaciones/len(consumos)) if consumos else '$0.00', 'N/A', 'Valor promedio por asignación']
+            ['Promedio por Asignación', formatear_valor_moneda(valor_total_asignaciones/total) if total else '$0.00', 'N/A', 'Valor promedio por asignación']
         ]
         
         # Agregar desglose por estado
         for estado, cantidad in asignaciones_por_estado.items():
-            porcentaje = f"{(cantidad/len(consumos)*100):.1f}%" if consumos else "0%"
+            porcentaje = f"{(cantidad/total*100):.1f}%" if total else "0%"
             analisis_data.append([f'Asignaciones "{estado}"', cantidad, porcentaje, f'Estado: {estado}'])
         
-        current_row = crear_tabla_detallada_excel(ws, analisis_headers, analisis_data, current_row)
+        excel.tabla(analisis_headers, analisis_data)
     
-    # Ajustar ancho de columnas
-    ajustar_columnas_excel(ws)
-    
-    # Crear respuesta
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    response = make_response(output.read())
-    response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    response.headers['Content-Disposition'] = f'attachment; filename=CNM_Detalle_{persona.pe_nombre}_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return response
+    return excel.respuesta(f'CNM_Detalle_{persona.pe_nombre}_Detallado_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx')
 
 def _exportar_detalle_personal_pdf(persona, consumos):
     """Exporta detalle de personal a PDF con formato detallado y análisis estadístico"""
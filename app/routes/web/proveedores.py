@@ -1,19 +1,45 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
+from datetime import datetime
 from app.services import ProveedorService
+from app.database.models import Proveedor
+from app.database.repositories.proveedores import ProveedorRepository
+from app.utils.export_utils import FORMATOS_CSV, respuesta_csv
 
 
 bp = Blueprint('proveedores', __name__)
 proveedor_service = ProveedorService()
+proveedor_repo = ProveedorRepository()
 
 @bp.route('/')
 @login_required
 def listar_proveedores():
     """Lista todos los proveedores"""
     incluir_inactivos = request.args.get('incluir_inactivos', 'true').lower() == 'true'
+    export_format = request.args.get('export')
+    if export_format in FORMATOS_CSV:
+        return _exportar_csv(incluir_inactivos, export_format)
+    
     proveedores = proveedor_service.obtener_todos(incluir_inactivos=incluir_inactivos)
     return render_template('proveedores/list.html', proveedores=proveedores, incluir_inactivos=incluir_inactivos)
 
+def _exportar_csv(incluir_inactivos, formato):
+    """Exporta proveedores a CSV transmitido por partes"""
+    query = Proveedor.query
+    if not incluir_inactivos:
+        query = query.filter(Proveedor.p_estado == 'Activo')
+    query = query.order_by(Proveedor.p_codigo)
+    
+    headers = ['Código', 'Razón Social', 'CI/RUC', 'Dirección', 'Teléfono', 'Correo', 'Estado', 'Fecha Registro']
+    filas = (
+        [
+            proveedor.p_codigo, proveedor.p_razonsocial, proveedor.p_ci_ruc, proveedor.p_direccion or '',
+            proveedor.p_telefono or '', proveedor.p_correo or '', proveedor.p_estado or '', proveedor.created_at
+        ]
+        for proveedor in proveedor_repo.stream_exportacion(query)
+    )
+    return respuesta_csv(f'CNM_Proveedores_{datetime.now().strftime("%Y%m%d_%H%M%S")}', headers, filas, formato)
+
 @bp.route('/nuevo', methods=['GET', 'POST'])
 @login_required
 def nuevo_proveedor():
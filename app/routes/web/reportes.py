@@ -1,27 +1,60 @@
-from flask import Blueprint, render_template, request, jsonify, make_response
+from flask import Blueprint, render_template, request, jsonify, send_file, url_for, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, date
-from sqlalchemy import func, extract, and_
+from sqlalchemy import func, and_
 from app.database.models import (
     MovimientoDetalle, Item, Articulo, Instrumento,
     Proveedor, Persona, Consumo, Entrada, Usuario
 )
 from app.database import db
+from app.database.repositories.movimientos import MovimientoRepository
+from app.services.exportacion_service import exportaciones, cache_exportaciones, ESTADO_COMPLETADO
+from app.services.cierre_service import CierrePeriodoService
+from app.utils.cache import cache, ESPACIO_EXPORTACIONES
+from app.utils.periodos import resolver_periodo, filtrar_por_rango, meses_completos
 from app.utils.export_utils import (
-    crear_cabecera_excel, crear_estilos_excel, ajustar_columnas_excel,
-    crear_cabecera_pdf, crear_estilos_pdf, aplicar_estilo_tabla_pdf,
-    crear_tabla_detallada_excel, crear_tabla_detallada_pdf,
+    ExcelStreaming, crear_cabecera_pdf, crear_estilos_pdf, aplicar_estilo_tabla_pdf,
+    crear_tabla_detallada_pdf, iterar_tabla_detallada_pdf, construir_pdf_incremental,
     formatear_valor_moneda, formatear_fecha, truncar_texto
 )
-import io
-from openpyxl import Workbook
+import itertools
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 
 bp = Blueprint('reportes', __name__)
 
+# Secciones del reporte completo, en el orden en que se arman
+SECCIONES_REPORTE_COMPLETO = ('movimientos', 'inventario_articulos', 'inventario_instrumentos', 'proveedores', 'consumos')
+TIPOS_REPORTE = SECCIONES_REPORTE_COMPLETO + ('completo',)
+
+# Reportes que admiten valorización a una fecha de corte
+TIPOS_CON_FECHA_CORTE = ('inventario_articulos', 'inventario_instrumentos', 'completo')
+
+# Límites del detalle de movimientos en modo resumen. Con detalle=completo las
+# exportaciones incluyen todas las filas, leídas de la base por lotes
+LIMITE_DETALLES_VISTA = 50
+LIMITE_DETALLES_PDF = 15
+MODO_DETALLE_COMPLETO = 'completo'
+
+COLUMNAS_DETALLE_MOVIMIENTOS = (
+    MovimientoDetalle.m_fecha,
+    MovimientoDetalle.m_tipo,
+    MovimientoDetalle.m_cantidad,
+    MovimientoDetalle.m_valorUnitario,
+    MovimientoDetalle.m_valorTotal,
+    MovimientoDetalle.m_observaciones,
+    Item.i_codigo,
+    Item.i_nombre,
+    Proveedor.p_razonsocial,
+    Persona.pe_nombre
+)
+
 def _mapear_tipo_movimiento(tipo_original):
     """Mapear tipos de movimiento para mostrar solo ingresos y egresos"""
     mapeo = {
@@ -41,73 +74,209 @@ def index():
 def generar_reporte():
     """Generar reporte según los parámetros seleccionados"""
     data = request.get_json()
+    if data.get('tipo_reporte') not in TIPOS_REPORTE:
+        return jsonify({'error': 'Tipo de reporte no válido'}), 400
+    
+    try:
+        tiempos = {}
+        response = jsonify(_generar_datos_reporte(data, tiempos=tiempos))
+        response.headers['Server-Timing'] = _server_timing(tiempos)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _generar_datos_reporte(data, completo=False, tiempos=None):
+    """Obtiene los datos del reporte indicado en data['tipo_reporte'].
+
+    Con completo=True el detalle de movimientos es un generador sobre un
+    cursor (sin límite de filas) en lugar de una lista. Si se pasa el
+    diccionario `tiempos` se registra la duración de cada sección.
+    """
     tipo_reporte = data.get('tipo_reporte')
+    if tipo_reporte == 'completo':
+        return _generar_reporte_completo(data, completo, tiempos)
+    
+    inicio = time.perf_counter()
+    resultado = _generar_datos_seccion(tipo_reporte, data, completo)
+    if tiempos is not None:
+        tiempos[tipo_reporte] = time.perf_counter() - inicio
+    return resultado
+
+def _generar_datos_seccion(tipo_reporte, data, completo=False):
+    """Obtiene los datos de un reporte individual"""
     periodo = data.get('periodo')
     fecha_inicio = data.get('fecha_inicio')
     fecha_fin = data.get('fecha_fin')
-    articulo_id = data.get('articulo_id')
-    tipo_item = data.get('tipo_item')
     
+    if tipo_reporte == 'movimientos':
+        return _generar_reporte_movimientos(periodo, fecha_inicio, fecha_fin, data.get('articulo_id'),
+                                            data.get('tipo_item'), completo)
+    elif tipo_reporte == 'inventario_articulos':
+        return _generar_reporte_inventario_articulos(_fecha_corte(data))
+    elif tipo_reporte == 'inventario_instrumentos':
+        return _generar_reporte_inventario_instrumentos(_fecha_corte(data))
+    elif tipo_reporte == 'proveedores':
+        return _generar_reporte_proveedores(periodo, fecha_inicio, fecha_fin)
+    elif tipo_reporte == 'consumos':
+        return _generar_reporte_consumos(periodo, fecha_inicio, fecha_fin)
+    raise ValueError('Tipo de reporte no válido')
+
+def _generar_reporte_completo(data, completo=False, tiempos=None):
+    """Obtiene todas las secciones en paralelo, cada una con su propia sesión de base de datos.
+
+    En modo completo el detalle de movimientos no se lee en los hilos: su
+    sesión se cierra al terminar la sección y copiar el cursor cargaría todo
+    el historial en memoria. Se arma en el hilo que llama y se consume por
+    lotes mientras se escribe el archivo.
+    """
+    app = current_app._get_current_object()
+    hilos = app.config.get('REPORTE_COMPLETO_HILOS', 4)
+    
+    def obtener(seccion):
+        inicio = time.perf_counter()
+        # Contexto de aplicación propio: sesión y conexión independientes por hilo
+        with app.app_context():
+            # El generador del detalle completo de este hilo nunca se recorre
+            # (la consulta no llega a ejecutarse): se reemplaza abajo
+            resultado = _generar_datos_seccion(seccion, data, completo)
+        return resultado, time.perf_counter() - inicio
+    
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='reporte') as pool:
+        futuros = [(seccion, pool.submit(obtener, seccion)) for seccion in SECCIONES_REPORTE_COMPLETO]
+        secciones = {}
+        for seccion, futuro in futuros:
+            secciones[seccion], duracion = futuro.result()
+            if tiempos is not None:
+                tiempos[seccion] = duracion
+    
+    if completo and 'movimientos' in secciones:
+        inicio, fin = resolver_periodo(data.get('periodo'), data.get('fecha_inicio'), data.get('fecha_fin'))
+        secciones['movimientos']['detalles'] = _detalles_movimientos_completos(
+            _consulta_detalle_movimientos(inicio, fin, data.get('articulo_id'), data.get('tipo_item'))
+        )
+    
+    return {
+        'tipo': 'completo',
+        'orden': list(SECCIONES_REPORTE_COMPLETO),
+        'secciones': secciones
+    }
+
+def _titulo_reporte(tipo_reporte):
+    if tipo_reporte == 'completo':
+        return 'Reporte Completo'
+    return f"Reporte de {tipo_reporte.replace('_', ' ').title()}"
+
+def _server_timing(tiempos):
+    """Valor de la cabecera Server-Timing (duraciones en milisegundos)"""
+    return ', '.join(f'{nombre};dur={segundos * 1000:.1f}' for nombre, segundos in tiempos.items())
+
+def _fecha_corte(data):
+    """Fecha de valorización del inventario; None (estado actual) si no se indicó o no es pasada"""
+    valor = data.get('fecha_corte')
+    if not valor:
+        return None
     try:
-        if tipo_reporte == 'movimientos':
-            resultado = _generar_reporte_movimientos(periodo, fecha_inicio, fecha_fin, articulo_id, tipo_item)
-        elif tipo_reporte == 'inventario_articulos':
-            resultado = _generar_reporte_inventario_articulos()
-        elif tipo_reporte == 'inventario_instrumentos':
-            resultado = _generar_reporte_inventario_instrumentos()
-        elif tipo_reporte == 'proveedores':
-            resultado = _generar_reporte_proveedores(periodo, fecha_inicio, fecha_fin)
-        elif tipo_reporte == 'consumos':
-            resultado = _generar_reporte_consumos(periodo, fecha_inicio, fecha_fin)
-        else:
-            return jsonify({'error': 'Tipo de reporte no válido'}), 400
-            
-        return jsonify(resultado)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        fecha = datetime.strptime(str(valor).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('Fecha de corte inválida')
+    return fecha if fecha < date.today() else None
+
+def _valores_a_fecha(fecha_corte):
+    """Valorización {i_id: valores} a la fecha de corte (snapshot más cercano + movimientos posteriores)"""
+    if fecha_corte is None:
+        return None
+    return CierrePeriodoService().valorizar(fecha_corte)
+
+def _valores_item(item, valores):
+    """(cantidad, valor unitario, valor total) del item, actuales o a la fecha de corte.
+
+    Devuelve None si el item no existía en la fecha de corte.
+    """
+    if valores is None:
+        return item.i_cantidad, item.i_vUnitario, item.i_vTotal
+    valor = valores.get(item.id)
+    if valor is None:
+        return None
+    return valor['cantidad'], valor['valor_unitario'], valor['valor_total']
 
-def _generar_reporte_movimientos(periodo, fecha_inicio, fecha_fin, articulo_id=None, tipo_item=None):
+def _texto_fecha_corte(resultado):
+    return formatear_fecha(date.fromisoformat(resultado['fecha_corte']))
+
+def _modo_completo(data):
+    """Indica si la exportación pidió el detalle completo (sin límite de filas)"""
+    return data.get('detalle') == MODO_DETALLE_COMPLETO
+
+def _nombre_archivo_reporte(tipo_reporte, extension):
+    return f'CNM_Reporte_{tipo_reporte.title()}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+
+def _sin_progreso(porcentaje, mensaje=None):
+    pass
+
+def _generar_reporte_movimientos(periodo, fecha_inicio, fecha_fin, articulo_id=None, tipo_item=None, completo=False):
     """Generar reporte de movimientos (ingresos/egresos)"""
-    query = db.session.query(
-        MovimientoDetalle.m_tipo,
-        func.sum(MovimientoDetalle.m_cantidad).label('total_cantidad'),
-        func.sum(MovimientoDetalle.m_valorTotal).label('total_valor'),
-        func.count(MovimientoDetalle.id).label('total_movimientos')
-    )
+    inicio, fin = resolver_periodo(periodo, fecha_inicio, fecha_fin)
     
-    # Filtrar por tipo de ítem si se especifica
-    if tipo_item:
-        query = query.join(Item, MovimientoDetalle.i_id == Item.id).filter(Item.i_tipo == tipo_item)
-    
-    # Filtrar por fechas
-    if periodo == 'personalizado' and fecha_inicio and fecha_fin:
-        fecha_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-        fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-        query = query.filter(MovimientoDetalle.m_fecha.between(fecha_inicio, fecha_fin))
-    elif periodo == 'mes_actual':
-        hoy = date.today()
-        query = query.filter(
-            extract('year', MovimientoDetalle.m_fecha) == hoy.year,
-            extract('month', MovimientoDetalle.m_fecha) == hoy.month
+    meses = meses_completos(inicio, fin)
+    if meses is not None:
+        # Periodo de meses completos: leer el resumen materializado
+        movimientos = MovimientoRepository().obtener_resumen(
+            item_id=articulo_id, tipo_item=tipo_item, desde=meses[0], hasta=meses[1]
         )
-    elif periodo == 'año_actual':
-        hoy = date.today()
-        query = query.filter(extract('year', MovimientoDetalle.m_fecha) == hoy.year)
+    else:
+        query = db.session.query(
+            MovimientoDetalle.m_tipo,
+            func.sum(MovimientoDetalle.m_cantidad).label('total_cantidad'),
+            func.sum(MovimientoDetalle.m_valorTotal).label('total_valor'),
+            func.count(MovimientoDetalle.id).label('total_movimientos')
+        )
+        
+        # Filtrar por tipo de ítem si se especifica
+        if tipo_item:
+            query = query.join(Item, MovimientoDetalle.i_id == Item.id).filter(Item.i_tipo == tipo_item)
+        
+        # Filtrar por fechas (rango personalizado parcial)
+        query = filtrar_por_rango(query, MovimientoDetalle.m_fecha, inicio, fin)
+        
+        # Filtrar por artículo específico
+        if articulo_id:
+            query = query.filter(MovimientoDetalle.i_id == articulo_id)
+        
+        # Agrupar por tipo de movimiento
+        movimientos = query.group_by(MovimientoDetalle.m_tipo).all()
     
-    # Filtrar por artículo específico
-    if articulo_id:
-        query = query.filter(MovimientoDetalle.i_id == articulo_id)
+    # Obtener detalles de movimientos
+    query_detalle = _consulta_detalle_movimientos(inicio, fin, articulo_id, tipo_item)
     
-    # Agrupar por tipo de movimiento
-    movimientos = query.group_by(MovimientoDetalle.m_tipo).all()
+    resumen = [
+        {
+            'tipo_movimiento': _mapear_tipo_movimiento(mov.m_tipo),
+            'total_cantidad': int(mov.total_cantidad),
+            'total_valor': float(mov.total_valor),
+            'total_movimientos': int(mov.total_movimientos)
+        } for mov in movimientos if _mapear_tipo_movimiento(mov.m_tipo) is not None
+    ]
     
-    # Obtener detalles de movimientos
-    query_detalle = db.session.query(
-        MovimientoDetalle,
-        Item.i_codigo,
-        Item.i_nombre,
-        Proveedor.p_razonsocial,
-        Persona.pe_nombre
+    if completo:
+        detalles = _detalles_movimientos_completos(query_detalle)
+    else:
+        filas = query_detalle.limit(LIMITE_DETALLES_VISTA).all()
+        detalles = [
+            _detalle_movimiento(fila) for fila in filas
+            if _mapear_tipo_movimiento(fila.m_tipo) is not None
+        ]
+    
+    return {
+        'tipo': 'movimientos',
+        'resumen': resumen,
+        'detalles': detalles,
+        # El resumen ya cuenta las filas del detalle (avance de exportaciones)
+        'total_detalles': sum(item['total_movimientos'] for item in resumen)
+    }
+
+def _consulta_detalle_movimientos(inicio, fin, articulo_id=None, tipo_item=None):
+    """Consulta del detalle de movimientos del periodo (en la sesión del hilo actual)"""
+    query_detalle = db.session.query(*COLUMNAS_DETALLE_MOVIMIENTOS).select_from(
+        MovimientoDetalle
     ).join(Item, MovimientoDetalle.i_id == Item.id)\
      .outerjoin(Entrada, MovimientoDetalle.e_id == Entrada.id)\
      .outerjoin(Proveedor, Entrada.p_id == Proveedor.id)\
@@ -119,94 +288,96 @@ def _generar_reporte_movimientos(periodo, fecha_inicio, fecha_fin, articulo_id=N
         query_detalle = query_detalle.filter(Item.i_tipo == tipo_item)
     
     # Aplicar los mismos filtros de fecha
-    if periodo == 'personalizado' and fecha_inicio and fecha_fin:
-        query_detalle = query_detalle.filter(MovimientoDetalle.m_fecha.between(fecha_inicio, fecha_fin))
-    elif periodo == 'mes_actual':
-        hoy = date.today()
-        query_detalle = query_detalle.filter(
-            extract('year', MovimientoDetalle.m_fecha) == hoy.year,
-            extract('month', MovimientoDetalle.m_fecha) == hoy.month
-        )
-    elif periodo == 'año_actual':
-        hoy = date.today()
-        query_detalle = query_detalle.filter(extract('year', MovimientoDetalle.m_fecha) == hoy.year)
+    query_detalle = filtrar_por_rango(query_detalle, MovimientoDetalle.m_fecha, inicio, fin)
     
     if articulo_id:
         query_detalle = query_detalle.filter(MovimientoDetalle.i_id == articulo_id)
     
-    detalles = query_detalle.order_by(MovimientoDetalle.m_fecha.desc()).limit(50).all()
-    
+    return query_detalle.order_by(MovimientoDetalle.m_fecha.desc(), MovimientoDetalle.id.desc())
+
+def _detalles_movimientos_completos(query_detalle):
+    """Todas las filas del detalle, leídas por lotes a medida que se escribe el archivo"""
+    filas = MovimientoRepository().stream(query_detalle, COLUMNAS_DETALLE_MOVIMIENTOS)
+    return (
+        _detalle_movimiento(fila) for fila in filas
+        if _mapear_tipo_movimiento(fila.m_tipo) is not None
+    )
+
+def _detalle_movimiento(fila):
+    """Convierte una fila de COLUMNAS_DETALLE_MOVIMIENTOS en el diccionario del reporte"""
     return {
-        'tipo': 'movimientos',
-        'resumen': [
-            {
-                'tipo_movimiento': _mapear_tipo_movimiento(mov.m_tipo),
-                'total_cantidad': int(mov.total_cantidad),
-                'total_valor': float(mov.total_valor),
-                'total_movimientos': mov.total_movimientos
-            } for mov in movimientos if _mapear_tipo_movimiento(mov.m_tipo) is not None
-        ],
-        'detalles': [
-            {
-                'fecha': mov.m_fecha.strftime('%Y-%m-%d'),
-                'tipo': _mapear_tipo_movimiento(mov.m_tipo),
-                'codigo_item': codigo,
-                'nombre_item': nombre,
-                'cantidad': mov.m_cantidad,
-                'valor_unitario': float(mov.m_valorUnitario),
-                'valor_total': float(mov.m_valorTotal),
-                'proveedor': proveedor or 'N/A',
-                'persona': persona or 'N/A',
-                'observaciones': mov.m_observaciones or ''
-            } for mov, codigo, nombre, proveedor, persona in detalles if _mapear_tipo_movimiento(mov.m_tipo) is not None
-        ]
+        'fecha': fila.m_fecha.strftime('%Y-%m-%d'),
+        'tipo': _mapear_tipo_movimiento(fila.m_tipo),
+        'codigo_item': fila.i_codigo,
+        'nombre_item': fila.i_nombre,
+        'cantidad': fila.m_cantidad,
+        'valor_unitario': float(fila.m_valorUnitario),
+        'valor_total': float(fila.m_valorTotal),
+        'proveedor': fila.p_razonsocial or 'N/A',
+        'persona': fila.pe_nombre or 'N/A',
+        'observaciones': fila.m_observaciones or ''
     }
 
-def _generar_reporte_inventario_articulos():
-    """Generar reporte de inventario de artículos"""
+def _generar_reporte_inventario_articulos(fecha_corte=None):
+    """Generar reporte de inventario de artículos (actual o valorizado a fecha_corte)"""
     articulos = db.session.query(
         Item, Articulo
     ).join(Articulo, Item.id == Articulo.i_id)\
      .filter(Item.i_tipo == 'articulo').all()
+    valores = _valores_a_fecha(fecha_corte)
+    
+    filas = []
+    for item, articulo in articulos:
+        estado = _valores_item(item, valores)
+        if estado is None:
+            continue
+        cantidad, valor_unitario, valor_total = estado
+        filas.append({
+            'codigo': item.i_codigo,
+            'nombre': item.i_nombre,
+            'cantidad': cantidad,
+            'valor_unitario': float(valor_unitario),
+            'valor_total': float(valor_total),
+            'stock_min': articulo.a_stockMin,
+            'stock_max': articulo.a_stockMax,
+            'cuenta_contable': articulo.a_c_contable,
+            'estado_stock': 'Bajo' if cantidad <= articulo.a_stockMin else 'Normal'
+        })
     
     return {
         'tipo': 'inventario_articulos',
-        'articulos': [
-            {
-                'codigo': item.i_codigo,
-                'nombre': item.i_nombre,
-                'cantidad': item.i_cantidad,
-                'valor_unitario': float(item.i_vUnitario),
-                'valor_total': float(item.i_vTotal),
-                'stock_min': articulo.a_stockMin,
-                'stock_max': articulo.a_stockMax,
-                'cuenta_contable': articulo.a_c_contable,
-                'estado_stock': 'Bajo' if item.i_cantidad <= articulo.a_stockMin else 'Normal'
-            } for item, articulo in articulos
-        ]
+        'fecha_corte': fecha_corte.isoformat() if fecha_corte else None,
+        'articulos': filas
     }
 
-def _generar_reporte_inventario_instrumentos():
-    """Generar reporte de inventario de instrumentos"""
+def _generar_reporte_inventario_instrumentos(fecha_corte=None):
+    """Generar reporte de inventario de instrumentos (actual o valorizado a fecha_corte)"""
     instrumentos = db.session.query(
         Item, Instrumento
     ).join(Instrumento, Item.id == Instrumento.i_id)\
      .filter(Item.i_tipo == 'instrumento').all()
+    valores = _valores_a_fecha(fecha_corte)
+    
+    filas = []
+    for item, instrumento in instrumentos:
+        estado = _valores_item(item, valores)
+        if estado is None:
+            continue
+        filas.append({
+            'codigo': item.i_codigo,
+            'nombre': item.i_nombre,
+            'marca': instrumento.i_marca,
+            'modelo': instrumento.i_modelo,
+            'serie': instrumento.i_serie,
+            'estado': instrumento.i_estado,
+            'valor_unitario': float(estado[1]),
+            'valor_total': float(estado[2])
+        })
     
     return {
         'tipo': 'inventario_instrumentos',
-        'instrumentos': [
-            {
-                'codigo': item.i_codigo,
-                'nombre': item.i_nombre,
-                'marca': instrumento.i_marca,
-                'modelo': instrumento.i_modelo,
-                'serie': instrumento.i_serie,
-                'estado': instrumento.i_estado,
-                'valor_unitario': float(item.i_vUnitario),
-                'valor_total': float(item.i_vTotal)
-            } for item, instrumento in instrumentos
-        ]
+        'fecha_corte': fecha_corte.isoformat() if fecha_corte else None,
+        'instrumentos': filas
     }
 
 def _generar_reporte_proveedores(periodo, fecha_inicio, fecha_fin):
@@ -218,20 +389,9 @@ def _generar_reporte_proveedores(periodo, fecha_inicio, fecha_fin):
     ).outerjoin(Entrada, Proveedor.id == Entrada.p_id)\
      .outerjoin(MovimientoDetalle, Entrada.id == MovimientoDetalle.e_id)
     
-    # Filtrar por fechas
-    if periodo == 'personalizado' and fecha_inicio and fecha_fin:
-        fecha_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-        fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-        query = query.filter(Entrada.e_fecha.between(fecha_inicio, fecha_fin))
-    elif periodo == 'mes_actual':
-        hoy = date.today()
-        query = query.filter(
-            extract('year', Entrada.e_fecha) == hoy.year,
-            extract('month', Entrada.e_fecha) == hoy.month
-        )
-    elif periodo == 'año_actual':
-        hoy = date.today()
-        query = query.filter(extract('year', Entrada.e_fecha) == hoy.year)
+    # Filtrar por fechas (rango semiabierto)
+    inicio, fin = resolver_periodo(periodo, fecha_inicio, fecha_fin)
+    query = filtrar_por_rango(query, Entrada.e_fecha, inicio, fin)
     
     proveedores = query.group_by(Proveedor.id).all()
     
@@ -261,20 +421,9 @@ def _generar_reporte_consumos(periodo, fecha_inicio, fecha_fin):
     ).outerjoin(Consumo, Persona.id == Consumo.pe_id)\
      .outerjoin(MovimientoDetalle, Consumo.id == MovimientoDetalle.c_id)
     
-    # Filtrar por fechas
-    if periodo == 'personalizado' and fecha_inicio and fecha_fin:
-        fecha_inicio = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-        fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-        query = query.filter(Consumo.c_fecha.between(fecha_inicio, fecha_fin))
-    elif periodo == 'mes_actual':
-        hoy = date.today()
-        query = query.filter(
-            extract('year', Consumo.c_fecha) == hoy.year,
-            extract('month', Consumo.c_fecha) == hoy.month
-        )
-    elif periodo == 'año_actual':
-        hoy = date.today()
-        query = query.filter(extract('year', Consumo.c_fecha) == hoy.year)
+    # Filtrar por fechas (rango semiabierto)
+    inicio, fin = resolver_periodo(periodo, fecha_inicio, fecha_fin)
+    query = filtrar_por_rango(query, Consumo.c_fecha, inicio, fin)
     
     personas = query.group_by(Persona.id).all()
     
@@ -312,162 +461,126 @@ def obtener_articulos_select():
         } for art in articulos
     ])
 
+def _clave_exportacion(data, extension, usuario):
+    """Clave de caché de una exportación: tipo, filtros normalizados y versión de los datos"""
+    tipo_reporte = data.get('tipo_reporte')
+    # Los periodos relativos ('mes_actual', ...) se resuelven a fechas concretas
+    inicio, fin = resolver_periodo(data.get('periodo'), data.get('fecha_inicio'), data.get('fecha_fin'))
+    filtros = {
+        'periodo': data.get('periodo') or None,
+        'inicio': inicio,
+        'fin': fin,
+        # La cabecera del archivo indica quién lo generó
+        'usuario': usuario
+    }
+    if tipo_reporte in ('movimientos', 'completo'):
+        filtros.update({
+            'articulo_id': data.get('articulo_id') or None,
+            'tipo_item': data.get('tipo_item') or None,
+            'completo': _modo_completo(data)
+        })
+    if tipo_reporte in TIPOS_CON_FECHA_CORTE:
+        fecha_corte = _fecha_corte(data)
+        filtros['fecha_corte'] = fecha_corte.isoformat() if fecha_corte else None
+    return cache_exportaciones.clave(
+        tipo_reporte, filtros, extension, cache.version(ESPACIO_EXPORTACIONES)
+    )
+
+def _respuesta_exportacion(data, extension, generar, tiempos=None):
+    """Sirve la exportación desde la caché en disco o la genera con generar(destino).
+
+    `tiempos` es el diccionario que generar completa con la duración de cada
+    sección; se publica en la cabecera Server-Timing junto al total.
+    """
+    tiempos = tiempos if tiempos is not None else {}
+    inicio = time.perf_counter()
+    nombre_archivo = _nombre_archivo_reporte(data.get('tipo_reporte'), extension)
+    clave = _clave_exportacion(data, extension, current_user.username)
+    
+    ruta = cache_exportaciones.obtener(clave, extension)
+    estado_cache = 'HIT'
+    if ruta is None and clave is not None:
+        ruta = cache_exportaciones.generar(clave, extension, generar)
+        estado_cache = 'MISS'
+    
+    if ruta is not None:
+        response = send_file(ruta, as_attachment=True, download_name=nombre_archivo)
+    else:
+        # Caché deshabilitada o sin versión de datos: archivo temporal
+        archivo = tempfile.SpooledTemporaryFile(max_size=ExcelStreaming.TAMANO_SPOOL)
+        generar(archivo)
+        archivo.seek(0)
+        response = send_file(archivo, as_attachment=True, download_name=nombre_archivo)
+        estado_cache = 'BYPASS'
+    
+    tiempos['total'] = time.perf_counter() - inicio
+    response.headers['X-Export-Cache'] = estado_cache
+    response.headers['Server-Timing'] = _server_timing(tiempos)
+    return response
+
 @bp.route('/exportar/excel', methods=['POST'])
 @login_required
 def exportar_excel():
     """Exportar reporte a Excel con cabecera institucional estandarizada"""
     data = request.form.to_dict()
     tipo_reporte = data.get('tipo_reporte')
-    periodo = data.get('periodo')
-    fecha_inicio = data.get('fecha_inicio')
-    fecha_fin = data.get('fecha_fin')
-    articulo_id = data.get('articulo_id')
-    tipo_item = data.get('tipo_item')
+    if tipo_reporte not in TIPOS_REPORTE:
+        return jsonify({'error': 'Tipo de reporte no válido'}), 400
     
+    usuario = current_user.username
+    tiempos = {}
     try:
-        # Generar los datos del reporte
-        if tipo_reporte == 'movimientos':
-            resultado = _generar_reporte_movimientos(periodo, fecha_inicio, fecha_fin, articulo_id, tipo_item)
-        elif tipo_reporte == 'inventario_articulos':
-            resultado = _generar_reporte_inventario_articulos()
-        elif tipo_reporte == 'inventario_instrumentos':
-            resultado = _generar_reporte_inventario_instrumentos()
-        elif tipo_reporte == 'proveedores':
-            resultado = _generar_reporte_proveedores(periodo, fecha_inicio, fecha_fin)
-        elif tipo_reporte == 'consumos':
-            resultado = _generar_reporte_consumos(periodo, fecha_inicio, fecha_fin)
-        else:
-            return jsonify({'error': 'Tipo de reporte no válido'}), 400
-        
-        # Crear archivo Excel
-        output = io.BytesIO()
-        workbook = Workbook()
-        ws = workbook.active
-        ws.title = f"Reporte {tipo_reporte.title()}"
-        
-        # Crear cabecera institucional estandarizada
-        current_row = crear_cabecera_excel(
-            ws,
-            f"Reporte de {tipo_reporte.replace('_', ' ').title()}",
-            current_user.username if current_user.is_authenticated else 'Sistema'
+        return _respuesta_exportacion(
+            data, 'xlsx', lambda destino: _construir_excel(data, usuario, tiempos=tiempos).guardar(destino),
+            tiempos
         )
-        
-        # Crear reporte completo
-        _crear_reporte_completo_optimizado(ws, tipo_reporte, periodo, fecha_inicio, fecha_fin, resultado, current_row)
-        
-        # Ajustar columnas
-        ajustar_columnas_excel(ws)
-        
-        # Guardar workbook
-        workbook.save(output)
-        output.seek(0)
-        
-        # Crear respuesta
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        response.headers['Content-Disposition'] = f'attachment; filename=CNM_Reporte_{tipo_reporte.title()}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        
-        return response
-        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def _crear_reporte_completo_optimizado(ws, tipo_reporte, periodo, fecha_inicio, fecha_fin, resultado, current_row):
-    """Crear reporte completo optimizado usando las utilidades centralizadas"""
-    estilos = crear_estilos_excel()
-    
-    # Contenido específico según el tipo de reporte
-    if tipo_reporte == 'movimientos':
-        current_row = _agregar_seccion_movimientos(ws, resultado, current_row, estilos)
-    elif tipo_reporte == 'inventario_articulos':
-        current_row = _agregar_seccion_inventario_articulos(ws, resultado, current_row, estilos)
-    elif tipo_reporte == 'inventario_instrumentos':
-        current_row = _agregar_seccion_inventario_instrumentos(ws, resultado, current_row, estilos)
-    elif tipo_reporte == 'proveedores':
-        current_row = _agregar_seccion_proveedores(ws, resultado, current_row, estilos)
-    elif tipo_reporte == 'consumos':
-        current_row = _agregar_seccion_consumos(ws, resultado, current_row, estilos)
+def _construir_excel(data, usuario, progreso=_sin_progreso, tiempos=None):
+    """Genera el libro Excel del reporte (usable dentro o fuera de una petición)"""
+    tipo_reporte = data.get('tipo_reporte')
+    periodo = data.get('periodo')
     
-    return current_row
-
-# Funciones auxiliares para Excel (mantenidas para compatibilidad)
-def _aplicar_estilos_excel():
-    """Definir estilos para Excel"""
-    return {
-        'header_font': Font(name='Calibri', size=12, bold=True, color="FFFFFF"),
-        'header_fill': PatternFill(start_color="2E5984", end_color="2E5984", fill_type="solid"),
-        'header_alignment': Alignment(horizontal="center", vertical="center"),
-        'header_border': Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin')),
-        'title_font': Font(name='Calibri', size=16, bold=True, color="2E5984"),
-        'subtitle_font': Font(name='Calibri', size=14, bold=True, color="4472C4"),
-        'title_alignment': Alignment(horizontal="center", vertical="center"),
-        'data_font': Font(name='Calibri', size=10),
-        'data_alignment': Alignment(horizontal="center", vertical="center"),
-        'data_border': Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    }
-
-def _crear_reporte_completo(workbook, tipo_reporte, periodo, fecha_inicio, fecha_fin, resultado):
-    """Crear reporte completo en una sola hoja"""
-    ws = workbook.active
-    ws.title = f"Reporte {tipo_reporte.title()}"
-    estilos = _aplicar_estilos_excel()
-    
-    current_row = 1
-    
-    # Encabezado principal
-    ws[f'A{current_row}'] = "CONSERVATORIO NACIONAL DE MÚSICA"
-    ws[f'A{current_row}'].font = estilos['title_font']
-    ws[f'A{current_row}'].alignment = estilos['title_alignment']
-    ws.merge_cells(f'A{current_row}:H{current_row}')
-    current_row += 1
-    
-    ws[f'A{current_row}'] = "Sistema de Gestión de Inventario"
-    ws[f'A{current_row}'].font = Font(name='Calibri', size=12, bold=True, color="4472C4")
-    ws[f'A{current_row}'].alignment = Alignment(horizontal="center")
-    ws.merge_cells(f'A{current_row}:H{current_row}')
-    current_row += 3
-    
-    # Información del reporte
-    ws[f'A{current_row}'] = "INFORMACIÓN DEL REPORTE"
-    ws[f'A{current_row}'].font = estilos['subtitle_font']
-    ws.merge_cells(f'A{current_row}:H{current_row}')
-    current_row += 1
-    
-    info_data = [
-        ["Tipo de Reporte:", tipo_reporte.replace('_', ' ').title()],
-        ["Generado por:", current_user.username if current_user.is_authenticated else 'Sistema'],
-        ["Fecha:", datetime.now().strftime('%d/%m/%Y %H:%M:%S')],
-        ["Período:", periodo.replace('_', ' ').title() if periodo else 'N/A']
-    ]
+    progreso(5, 'Consultando datos')
+    resultado = _generar_datos_reporte(data, _modo_completo(data), tiempos)
     
-    for label, value in info_data:
-        ws[f'A{current_row}'] = label
-        ws[f'A{current_row}'].font = Font(bold=True)
-        ws[f'B{current_row}'] = value
-        current_row += 1
+    # Crear archivo Excel en modo streaming
+    progreso(40, 'Escribiendo Excel')
+    excel = ExcelStreaming(f"Reporte {tipo_reporte.title()}", usuario=usuario)
     
-    current_row += 2
+    # Crear cabecera institucional estandarizada
+    datos_cabecera = [("Período:", periodo.replace('_', ' ').title() if periodo else 'N/A')]
+    fecha_corte = _fecha_corte(data) if tipo_reporte in TIPOS_CON_FECHA_CORTE else None
+    if fecha_corte:
+        datos_cabecera.append(("Inventario valorizado al:", formatear_fecha(fecha_corte)))
+    excel.cabecera(_titulo_reporte(tipo_reporte), datos_cabecera)
     
-    # Contenido específico según el tipo de reporte
-    if tipo_reporte == 'movimientos':
-        current_row = _agregar_seccion_movimientos(ws, resultado, current_row, estilos)
+    # Crear reporte completo
+    _crear_reporte_completo_optimizado(excel, tipo_reporte, resultado)
+    progreso(90, 'Guardando archivo')
+    return excel
+
+def _crear_reporte_completo_optimizado(excel, tipo_reporte, resultado):
+    """Escribe el contenido específico de cada tipo de reporte en el libro"""
+    if tipo_reporte == 'completo':
+        for seccion in resultado['orden']:
+            excel.titulo(_titulo_reporte(seccion).upper())
+            excel.espacio()
+            _crear_reporte_completo_optimizado(excel, seccion, resultado['secciones'][seccion])
+    elif tipo_reporte == 'movimientos':
+        _agregar_seccion_movimientos(excel, resultado)
     elif tipo_reporte == 'inventario_articulos':
-        current_row = _agregar_seccion_inventario_articulos(ws, resultado, current_row, estilos)
+        _agregar_seccion_inventario_articulos(excel, resultado)
     elif tipo_reporte == 'inventario_instrumentos':
-        current_row = _agregar_seccion_inventario_instrumentos(ws, resultado, current_row, estilos)
+        _agregar_seccion_inventario_instrumentos(excel, resultado)
     elif tipo_reporte == 'proveedores':
-        current_row = _agregar_seccion_proveedores(ws, resultado, current_row, estilos)
+        _agregar_seccion_proveedores(excel, resultado)
     elif tipo_reporte == 'consumos':
-        current_row = _agregar_seccion_consumos(ws, resultado, current_row, estilos)
-    
-    # Ajustar anchos de columnas
-    for col in range(1, 9):
-        ws.column_dimensions[chr(64 + col)].width = 15
+        _agregar_seccion_consumos(excel, resultado)
 
-def _agregar_seccion_movimientos(ws, resultado, start_row, estilos):
+def _agregar_seccion_movimientos(excel, resultado):
     """Agregar sección de movimientos con formato detallado"""
-    current_row = start_row
-    
     # Resumen estadístico si existe
     if resultado.get('resumen'):
         # Calcular estadísticas adicionales
@@ -507,30 +620,30 @@ def _agregar_seccion_movimientos(ws, resultado, start_row, estilos):
             'Positivo' if balance >= 0 else 'Negativo'
         ])
         
-        current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row, "ANÁLISIS DE MOVIMIENTOS")
-        current_row += 2
+        excel.tabla(resumen_headers, resumen_data, "ANÁLISIS DE MOVIMIENTOS")
+        excel.espacio(2)
     
-    # Detalles con análisis si existen
-    if resultado.get('detalles'):
-        # Preparar datos detallados con análisis
+    # Detalles con análisis si existen (en modo completo es un generador: se escribe fila por fila)
+    detalles = _filas_si_hay(resultado.get('detalles'))
+    if detalles is not None:
         detalle_headers = [
             'Fecha', 'Tipo', 'Código', 'Artículo', 'Cantidad', 'V. Unitario',
             'V. Total', 'Proveedor/Persona', 'Días Transcurridos', 'Observaciones'
         ]
+        hoy = datetime.now().date()
         
-        detalle_data = []
-        for detalle in resultado['detalles']:
+        def _fila(detalle):
             # Calcular días transcurridos
             try:
                 fecha_mov = datetime.strptime(detalle.get('fecha', ''), '%Y-%m-%d').date()
-                dias_transcurridos = (datetime.now().date() - fecha_mov).days
+                dias_transcurridos = (hoy - fecha_mov).days
             except:
                 dias_transcurridos = 0
             
             # Determinar responsable
             responsable = detalle.get('proveedor', 'N/A') if detalle.get('tipo') == 'Ingreso' else detalle.get('persona', 'N/A')
             
-            detalle_data.append([
+            return [
                 formatear_fecha(detalle.get('fecha', '')),
                 detalle.get('tipo', ''),
                 detalle.get('codigo_item', ''),
@@ -541,19 +654,16 @@ def _agregar_seccion_movimientos(ws, resultado, start_row, estilos):
                 truncar_texto(responsable, 20),
                 dias_transcurridos,
                 truncar_texto(detalle.get('observaciones', 'Sin observaciones'), 25)
-            ])
+            ]
         
-        current_row = crear_tabla_detallada_excel(ws, detalle_headers, detalle_data, current_row, "DETALLE DE MOVIMIENTOS")
-    
-    return current_row
+        excel.tabla(detalle_headers, (_fila(detalle) for detalle in detalles), "DETALLE DE MOVIMIENTOS")
 
-def _agregar_seccion_inventario_articulos(ws, resultado, start_row, estilos):
+def _agregar_seccion_inventario_articulos(excel, resultado):
     """Agregar sección de inventario de artículos con análisis detallado"""
-    current_row = start_row
     articulos = resultado.get('articulos', [])
     
     if not articulos:
-        return current_row
+        return
     
     # Calcular estadísticas del inventario
     total_articulos = len(articulos)
@@ -571,8 +681,8 @@ def _agregar_seccion_inventario_articulos(ws, resultado, start_row, estilos):
         ['Artículos Stock Normal', total_articulos - articulos_stock_bajo, f"{((total_articulos-articulos_stock_bajo)/total_articulos*100):.1f}%" if total_articulos > 0 else "0%", 'Normal', 'Stock dentro de parámetros normales']
     ]
     
-    current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row, "ANÁLISIS DE INVENTARIO DE ARTÍCULOS")
-    current_row += 2
+    excel.tabla(resumen_headers, resumen_data, "ANÁLISIS DE INVENTARIO DE ARTÍCULOS")
+    excel.espacio(2)
     
     # Detalle de artículos con análisis
     detalle_headers = [
@@ -610,17 +720,14 @@ def _agregar_seccion_inventario_articulos(ws, resultado, start_row, estilos):
             prioridad
         ])
     
-    current_row = crear_tabla_detallada_excel(ws, detalle_headers, detalle_data, current_row, "DETALLE DE INVENTARIO DE ARTÍCULOS")
-    
-    return current_row
+    excel.tabla(detalle_headers, detalle_data, "DETALLE DE INVENTARIO DE ARTÍCULOS")
 
-def _agregar_seccion_inventario_instrumentos(ws, resultado, start_row, estilos):
+def _agregar_seccion_inventario_instrumentos(excel, resultado):
     """Agregar sección de inventario de instrumentos con análisis detallado"""
-    current_row = start_row
     instrumentos = resultado.get('instrumentos', [])
     
     if not instrumentos:
-        return current_row
+        return
     
     # Calcular estadísticas de instrumentos
     total_instrumentos = len(instrumentos)
@@ -649,8 +756,8 @@ def _agregar_seccion_inventario_instrumentos(ws, resultado, start_row, estilos):
         porcentaje = f"{(cantidad/total_instrumentos*100):.1f}%" if total_instrumentos > 0 else "0%"
         resumen_data.append([f'Estado "{estado}"', cantidad, porcentaje, f'Instrumentos en estado {estado.lower()}'])
     
-    current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row, "ANÁLISIS DE INVENTARIO DE INSTRUMENTOS")
-    current_row += 2
+    excel.tabla(resumen_headers, resumen_data, "ANÁLISIS DE INVENTARIO DE INSTRUMENTOS")
+    excel.espacio(2)
     
     # Detalle de instrumentos con análisis
     detalle_headers = [
@@ -695,17 +802,14 @@ def _agregar_seccion_inventario_instrumentos(ws, resultado, start_row, estilos):
             truncar_texto(observacion, 30)
         ])
     
-    current_row = crear_tabla_detallada_excel(ws, detalle_headers, detalle_data, current_row, "DETALLE DE INVENTARIO DE INSTRUMENTOS")
-    
-    return current_row
+    excel.tabla(detalle_headers, detalle_data, "DETALLE DE INVENTARIO DE INSTRUMENTOS")
 
-def _agregar_seccion_proveedores(ws, resultado, start_row, estilos):
+def _agregar_seccion_proveedores(excel, resultado):
     """Agregar sección de proveedores con análisis detallado"""
-    current_row = start_row
     proveedores = resultado.get('datos', [])
     
     if not proveedores:
-        return current_row
+        return
     
     # Calcular estadísticas de proveedores
     total_proveedores = len(proveedores)
@@ -724,8 +828,8 @@ def _agregar_seccion_proveedores(ws, resultado, start_row, estilos):
         ['Promedio por Proveedor', formatear_valor_moneda(total_compras_general/proveedores_activos) if proveedores_activos > 0 else '$0.00', 'N/A', 'Calculado', 'Valor promedio de compras por proveedor activo']
     ]
     
-    current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row, "ANÁLISIS DE PROVEEDORES")
-    current_row += 2
+    excel.tabla(resumen_headers, resumen_data, "ANÁLISIS DE PROVEEDORES")
+    excel.espacio(2)
     
     # Detalle de proveedores con análisis
     detalle_headers = [
@@ -778,17 +882,14 @@ def _agregar_seccion_proveedores(ws, resultado, start_row, estilos):
             truncar_texto(observacion, 30)
         ])
     
-    current_row = crear_tabla_detallada_excel(ws, detalle_headers, detalle_data, current_row, "DETALLE DE PROVEEDORES")
-    
-    return current_row
+    excel.tabla(detalle_headers, detalle_data, "DETALLE DE PROVEEDORES")
 
-def _agregar_seccion_consumos(ws, resultado, start_row, estilos):
+def _agregar_seccion_consumos(excel, resultado):
     """Agregar sección de consumos con análisis detallado"""
-    current_row = start_row
     consumos = resultado.get('datos', [])
     
     if not consumos:
-        return current_row
+        return
     
     # Calcular estadísticas de consumos
     total_personas = len(consumos)
@@ -809,8 +910,8 @@ def _agregar_seccion_consumos(ws, resultado, start_row, estilos):
         ['Promedio por Persona Activa', formatear_valor_moneda(total_valor_general/personas_activas) if personas_activas > 0 else '$0.00', 'N/A', 'Calculado', 'Valor promedio de consumos por persona activa']
     ]
     
-    current_row = crear_tabla_detallada_excel(ws, resumen_headers, resumen_data, current_row, "ANÁLISIS DE CONSUMOS POR PERSONAL")
-    current_row += 2
+    excel.tabla(resumen_headers, resumen_data, "ANÁLISIS DE CONSUMOS POR PERSONAL")
+    excel.espacio(2)
     
     # Detalle de consumos con análisis
     detalle_headers = [
@@ -868,9 +969,7 @@ def _agregar_seccion_consumos(ws, resultado, start_row, estilos):
             truncar_texto(observacion, 30)
         ])
     
-    current_row = crear_tabla_detallada_excel(ws, detalle_headers, detalle_data, current_row, "DETALLE DE CONSUMOS POR PERSONAL")
-    
-    return current_row
+    excel.tabla(detalle_headers, detalle_data, "DETALLE DE CONSUMOS POR PERSONAL")
 
 @bp.route('/exportar/pdf', methods=['POST'])
 @login_required
@@ -878,67 +977,218 @@ def exportar_pdf():
     """Exportar reporte a PDF con cabecera institucional estandarizada"""
     data = request.form.to_dict()
     tipo_reporte = data.get('tipo_reporte')
-    periodo = data.get('periodo')
-    fecha_inicio = data.get('fecha_inicio')
-    fecha_fin = data.get('fecha_fin')
-    articulo_id = data.get('articulo_id')
-    tipo_item = data.get('tipo_item')
+    if tipo_reporte not in TIPOS_REPORTE:
+        return jsonify({'error': 'Tipo de reporte no válido'}), 400
     
+    usuario = current_user.username
+    tiempos = {}
     try:
-        # Generar los datos del reporte
-        if tipo_reporte == 'movimientos':
-            resultado = _generar_reporte_movimientos(periodo, fecha_inicio, fecha_fin, articulo_id, tipo_item)
-        elif tipo_reporte == 'inventario_articulos':
-            resultado = _generar_reporte_inventario_articulos()
-        elif tipo_reporte == 'inventario_instrumentos':
-            resultado = _generar_reporte_inventario_instrumentos()
-        elif tipo_reporte == 'proveedores':
-            resultado = _generar_reporte_proveedores(periodo, fecha_inicio, fecha_fin)
-        elif tipo_reporte == 'consumos':
-            resultado = _generar_reporte_consumos(periodo, fecha_inicio, fecha_fin)
-        else:
-            return jsonify({'error': 'Tipo de reporte no válido'}), 400
-        
-        # Crear archivo PDF
-        output = io.BytesIO()
-        doc = SimpleDocTemplate(output, pagesize=A4)
-        elements = []
-        
-        # Crear cabecera institucional estandarizada
-        elements.extend(crear_cabecera_pdf(f"Reporte de {tipo_reporte.replace('_', ' ').title()}"))
-        
-        # Crear estilos
-        styles = crear_estilos_pdf()
-        
-        # Agregar contenido según el tipo de reporte
-        if tipo_reporte == 'movimientos':
-            if resultado.get('resumen'):
-                elements.extend(_crear_tabla_resumen_pdf(resultado['resumen'], styles))
-            if resultado.get('detalles'):
-                elements.extend(_crear_tabla_detalles_pdf(resultado['detalles'], styles))
-        elif tipo_reporte == 'inventario_articulos':
-            elements.extend(_crear_tabla_inventario_articulos_pdf(resultado['articulos'], styles))
-        elif tipo_reporte == 'inventario_instrumentos':
-            elements.extend(_crear_tabla_inventario_instrumentos_pdf(resultado['instrumentos'], styles))
-        elif tipo_reporte == 'proveedores':
-            elements.extend(_crear_tabla_proveedores_pdf(resultado['datos'], styles))
-        elif tipo_reporte == 'consumos':
-            elements.extend(_crear_tabla_consumos_pdf(resultado['datos'], styles))
-        
-        # Construir PDF
-        doc.build(elements)
-        output.seek(0)
-        
-        # Crear respuesta
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=CNM_Reporte_{tipo_reporte.title()}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        
-        return response
-        
+        return _respuesta_exportacion(
+            data, 'pdf', lambda destino: _construir_pdf(data, destino, usuario, tiempos=tiempos),
+            tiempos
+        )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _construir_pdf(data, destino, usuario, progreso=_sin_progreso, tiempos=None):
+    """Genera el PDF del reporte en destino (ruta o archivo abierto).
+
+    Los elementos se producen de forma perezosa: en modo completo las filas
+    se leen del cursor a medida que reportlab arma las páginas.
+    """
+    tipo_reporte = data.get('tipo_reporte')
+    completo = _modo_completo(data)
+    
+    progreso(5, 'Consultando datos')
+    resultado = _generar_datos_reporte(data, completo, tiempos)
+    
+    progreso(30, 'Armando documento')
+    doc = SimpleDocTemplate(destino, pagesize=A4)
+    elementos = _elementos_reporte_pdf(tipo_reporte, resultado, usuario, completo)
+    construir_pdf_incremental(doc, _con_avance_pdf(elementos, _total_filas_reporte(resultado), progreso))
+
+def _elementos_reporte_pdf(tipo_reporte, resultado, usuario, completo=False):
+    """Genera en orden los elementos del PDF de un reporte"""
+    # Crear cabecera institucional estandarizada
+    yield from crear_cabecera_pdf(_titulo_reporte(tipo_reporte), usuario)
+    
+    # Crear estilos
+    styles = crear_estilos_pdf()
+    
+    if tipo_reporte == 'completo':
+        # Secciones en orden, cada una desde una página nueva
+        for indice, seccion in enumerate(resultado['orden']):
+            if indice:
+                yield PageBreak()
+            yield Paragraph(_titulo_reporte(seccion).upper(), styles['TituloSeccion'])
+            yield from _elementos_seccion_pdf(seccion, resultado['secciones'][seccion], styles, completo)
+    else:
+        yield from _elementos_seccion_pdf(tipo_reporte, resultado, styles, completo)
+
+def _elementos_seccion_pdf(tipo_reporte, resultado, styles, completo=False):
+    """Genera los elementos del PDF de un reporte individual"""
+    if tipo_reporte == 'movimientos':
+        if resultado.get('resumen'):
+            yield from _crear_tabla_resumen_pdf(resultado['resumen'], styles)
+        detalles = resultado.get('detalles')
+        if completo:
+            # En modo completo es un generador (siempre verdadero): se mira la primera fila
+            detalles = _filas_si_hay(detalles)
+        if detalles:
+            yield from _crear_tabla_detalles_pdf(detalles, styles, completo)
+    elif tipo_reporte in ('inventario_articulos', 'inventario_instrumentos'):
+        if resultado.get('fecha_corte'):
+            yield Paragraph(f"Inventario valorizado al {_texto_fecha_corte(resultado)}", styles['Normal'])
+            yield Spacer(1, 10)
+        if tipo_reporte == 'inventario_articulos':
+            yield from _crear_tabla_inventario_articulos_pdf(resultado['articulos'], styles)
+        else:
+            yield from _crear_tabla_inventario_instrumentos_pdf(resultado['instrumentos'], styles)
+    elif tipo_reporte == 'proveedores':
+        yield from _crear_tabla_proveedores_pdf(resultado['datos'], styles)
+    elif tipo_reporte == 'consumos':
+        yield from _crear_tabla_consumos_pdf(resultado['datos'], styles)
+
+_SIN_FILAS = object()
+
+def _filas_si_hay(filas):
+    """Iterador con las mismas filas, o None si no hay ninguna.
+
+    Un generador siempre es verdadero: se adelanta la primera fila para
+    saber si la tabla tiene datos sin cargar el resto en memoria.
+    """
+    if not filas:
+        return None
+    filas = iter(filas)
+    primera = next(filas, _SIN_FILAS)
+    if primera is _SIN_FILAS:
+        return None
+    return itertools.chain((primera,), filas)
+
+def _total_filas_reporte(resultado):
+    """Filas de datos estimadas del reporte (para informar el avance)"""
+    if 'secciones' in resultado:
+        return sum(_total_filas_reporte(seccion) for seccion in resultado['secciones'].values())
+    total = resultado.get('total_detalles', 0)
+    for clave, valor in resultado.items():
+        if isinstance(valor, list) and clave != 'detalles':
+            total += len(valor)
+    return total or 1
+
+def _con_avance_pdf(elementos, total_filas, progreso):
+    """Informa el avance según las filas de tabla ya entregadas a reportlab"""
+    filas = 0
+    for elemento in elementos:
+        if isinstance(elemento, LongTable):
+            filas += len(elemento._cellvalues) - 1
+            progreso(40 + 55 * min(filas, total_filas) / total_filas, 'Generando páginas')
+        yield elemento
+
+@bp.route('/exportar/<formato>/trabajo', methods=['POST'])
+@login_required
+def encolar_exportacion(formato):
+    """Encola la exportación de un reporte y devuelve el ID del trabajo de inmediato"""
+    if formato not in ('excel', 'pdf'):
+        return jsonify({'success': False, 'error': 'Formato de exportación no soportado'}), 400
+    
+    data = request.form.to_dict()
+    tipo_reporte = data.get('tipo_reporte')
+    if tipo_reporte not in TIPOS_REPORTE:
+        return jsonify({'success': False, 'error': 'Tipo de reporte no válido'}), 400
+    
+    # El hilo del trabajo no tiene sesión de usuario: se captura el nombre aquí
+    usuario = current_user.username
+    if formato == 'excel':
+        extension = 'xlsx'
+        def construir(destino, progreso):
+            _construir_excel(data, usuario, progreso).guardar(destino)
+    else:
+        extension = 'pdf'
+        def construir(destino, progreso):
+            _construir_pdf(data, destino, usuario, progreso)
+    
+    nombre_archivo = _nombre_archivo_reporte(tipo_reporte, extension)
+    descripcion = f"{_titulo_reporte(tipo_reporte)} ({formato.upper()})"
+    
+    # Misma consulta sin escrituras desde la última exportación: trabajo ya terminado
+    clave = _clave_exportacion(data, extension, usuario)
+    ruta = cache_exportaciones.obtener(clave, extension)
+    if ruta is not None:
+        trabajo = exportaciones.registrar_completado(
+            ruta, nombre_archivo, extension, current_user.id, descripcion=descripcion
+        )
+        return jsonify({'success': True, 'trabajo': _estado_trabajo(trabajo)}), 200
+    
+    def generar(destino, progreso):
+        construir(destino, progreso)
+        cache_exportaciones.guardar(clave, extension, destino)
+    
+    trabajo = exportaciones.encolar(
+        generar, nombre_archivo, extension, current_user.id, descripcion=descripcion
+    )
+    return jsonify({'success': True, 'trabajo': _estado_trabajo(trabajo)}), 202
+
+@bp.route('/trabajos/<trabajo_id>')
+@login_required
+def estado_exportacion(trabajo_id):
+    """Consulta el progreso de un trabajo de exportación"""
+    trabajo = exportaciones.obtener(trabajo_id)
+    if not trabajo or trabajo['usuario_id'] != current_user.id:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado o expirado'}), 404
+    return jsonify({'success': True, 'trabajo': _estado_trabajo(trabajo)})
+
+@bp.route('/trabajos/<trabajo_id>/descargar')
+@login_required
+def descargar_exportacion(trabajo_id):
+    """Descarga el archivo de un trabajo de exportación terminado"""
+    trabajo = exportaciones.obtener(trabajo_id)
+    if not trabajo or trabajo['usuario_id'] != current_user.id:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado o expirado'}), 404
+    
+    ruta = exportaciones.ruta_archivo(trabajo)
+    if trabajo['estado'] != ESTADO_COMPLETADO or not os.path.exists(ruta):
+        return jsonify({'success': False, 'error': 'El archivo todavía no está disponible'}), 409
+    
+    return send_file(ruta, as_attachment=True, download_name=trabajo['nombre_archivo'])
+
+@bp.route('/cache-exportaciones')
+@login_required
+def estado_cache_exportaciones():
+    """Uso de la caché en disco de exportaciones"""
+    return jsonify({
+        'success': True,
+        'version_datos': cache.version(ESPACIO_EXPORTACIONES),
+        'cache': cache_exportaciones.estadisticas()
+    })
+
+@bp.route('/cache-exportaciones/purgar', methods=['POST'])
+@login_required
+def purgar_cache_exportaciones():
+    """Elimina todos los archivos de la caché de exportaciones"""
+    try:
+        resultado = cache_exportaciones.purgar()
+        return jsonify({'success': True, **resultado})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _estado_trabajo(trabajo):
+    """Estado público de un trabajo (sin rutas internas) con sus URLs"""
+    estado = {
+        'id': trabajo['id'],
+        'estado': trabajo['estado'],
+        'progreso': trabajo['progreso'],
+        'mensaje': trabajo['mensaje'],
+        'descripcion': trabajo.get('descripcion'),
+        'nombre_archivo': trabajo['nombre_archivo'],
+        'error': trabajo.get('error'),
+        'url_estado': url_for('reportes.estado_exportacion', trabajo_id=trabajo['id'])
+    }
+    if trabajo['estado'] == ESTADO_COMPLETADO:
+        estado['url_descarga'] = url_for('reportes.descargar_exportacion', trabajo_id=trabajo['id'])
+        estado['tamano'] = trabajo.get('tamano')
+        estado['duracion'] = trabajo.get('duracion')
+    return estado
+
 # Funciones auxiliares para PDF (optimizadas con utilidades centralizadas)
 
 def _crear_tabla_resumen_pdf(resumen, styles):
@@ -981,21 +1231,25 @@ def _crear_tabla_resumen_pdf(resumen, styles):
         [1.2*inch, 1*inch, 1.2*inch, 1*inch, 1*inch]
     )
 
-def _crear_tabla_detalles_pdf(detalles, styles):
-    """Crear tabla de detalles para PDF con análisis detallado"""
-    # Preparar datos detallados con análisis (limitamos a 15 registros para PDF)
+def _crear_tabla_detalles_pdf(detalles, styles, completo=False):
+    """Crear tabla de detalles para PDF con análisis detallado.
+
+    En modo resumen muestra LIMITE_DETALLES_PDF registros; en modo completo
+    devuelve un generador con todas las filas.
+    """
     detalle_headers = ['Fecha', 'Tipo', 'Código', 'Artículo', 'Cantidad', 'V. Total', 'Días']
-    detalle_data = []
+    col_widths = [0.8*inch, 0.8*inch, 0.8*inch, 1.5*inch, 0.7*inch, 1*inch, 0.5*inch]
+    hoy = datetime.now().date()
     
-    for detalle in detalles[:15]:  # Limitar registros para PDF
+    def _fila(detalle):
         # Calcular días transcurridos
         try:
             fecha_mov = datetime.strptime(detalle.get('fecha', ''), '%Y-%m-%d').date()
-            dias_transcurridos = (datetime.now().date() - fecha_mov).days
+            dias_transcurridos = (hoy - fecha_mov).days
         except:
             dias_transcurridos = 0
         
-        detalle_data.append([
+        return [
             formatear_fecha(detalle.get('fecha', '')),
             detalle.get('tipo', ''),
             detalle.get('codigo_item', ''),
@@ -1003,16 +1257,24 @@ def _crear_tabla_detalles_pdf(detalles, styles):
             str(detalle.get('cantidad', 0)),
             formatear_valor_moneda(detalle.get('valor_total', 0)),
             str(dias_transcurridos)
-        ])
+        ]
+    
+    if completo:
+        return iterar_tabla_detallada_pdf(
+            detalle_headers, (_fila(detalle) for detalle in detalles),
+            "DETALLE DE MOVIMIENTOS", col_widths
+        )
     
     elements = crear_tabla_detallada_pdf(
-        detalle_headers, detalle_data,
-        "DETALLE DE MOVIMIENTOS",
-        [0.8*inch, 0.8*inch, 0.8*inch, 1.5*inch, 0.7*inch, 1*inch, 0.5*inch]
+        detalle_headers, [_fila(detalle) for detalle in detalles[:LIMITE_DETALLES_PDF]],
+        "DETALLE DE MOVIMIENTOS", col_widths
     )
     
-    if len(detalles) > 15:
-        elements.append(Paragraph(f"Mostrando 15 de {len(detalles)} registros", styles['Normal']))
+    if len(detalles) > LIMITE_DETALLES_PDF:
+        elements.append(Paragraph(
+            f"Mostrando {LIMITE_DETALLES_PDF} de {len(detalles)} registros "
+            f"(exporte con detalle completo para incluir todos)", styles['Normal']
+        ))
         elements.append(Spacer(1, 10))
     
     return elements
@@ -1,9 +1,11 @@
 from .instrumento_service import InstrumentoService
 from .articulo_service import ArticuloService
 from .proveedor_service import ProveedorService
+from .dashboard_service import DashboardService
 
 __all__ = [
     'InstrumentoService',
     'ArticuloService', 
-    'ProveedorService'
+    'ProveedorService',
+    'DashboardService'
 ]
\ No newline at end of file
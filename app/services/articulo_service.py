@@ -1,59 +1,9 @@
 from app.database.repositories.articulos import ArticuloRepository
+from app.database.repositories.secuencias import SecuenciaRepository
 from app.database.repositories.movimientos import MovimientoRepository
 from app.database.models import Item
 from app.database import db
 from datetime import datetime
-def _registrar_movimiento_con_auditoria(item_id, tipo, cantidad, valor_unitario, usuario_id, observaciones=None, entrada_id=None, consumo_id=None):
-    """Registra un movimiento con auditoría completa de valores anteriores y actuales"""
-    from app.database.models import MovimientoDetalle
-    
-    item = Item.query.get(item_id)
-    if not item:
-        raise ValueError("Item no encontrado")
-    
-    # Capturar valores anteriores
-    stock_anterior = item.i_cantidad
-    valor_anterior = float(item.i_vUnitario)
-    
-    # Calcular nuevos valores
-    if tipo == 'entrada':
-        stock_actual = stock_anterior + cantidad
-    elif tipo == 'salida':
-        stock_actual = stock_anterior - cantidad
-    else:  # ajuste
-        stock_actual = cantidad
-    
-    valor_actual = float(valor_unitario)
-    valor_total = cantidad * valor_unitario
-    
-    # Crear movimiento con auditoría
-    movimiento = MovimientoDetalle(
-        m_fecha=datetime.now().date(),
-        m_tipo=tipo,
-        m_cantidad=cantidad,
-        m_valorUnitario=valor_unitario,
-        m_valorTotal=valor_total,
-        m_observaciones=observaciones,
-        m_stock_anterior=stock_anterior,
-        m_stock_actual=stock_actual,
-        m_valor_anterior=valor_anterior,
-        m_valor_actual=valor_actual,
-        i_id=item_id,
-        e_id=entrada_id,
-        c_id=consumo_id,
-        u_id=usuario_id
-    )
-    
-    # Actualizar item
-    item.i_cantidad = stock_actual
-    item.i_vUnitario = valor_unitario
-    item.i_vTotal = stock_actual * valor_unitario
-    
-    db.session.add(movimiento)
-    db.session.commit()
-    
-    return movimiento
-
 
 class ArticuloService:
     def __init__(self):
@@ -85,30 +35,8 @@ class ArticuloService:
         return self.obtener_articulos_stock_bajo()
 
     def _generar_codigo_articulo(self):
-        """Genera un código automático para artículo"""
-        # Buscar todos los códigos de artículos existentes
-        items = db.session.query(Item).filter(
-            Item.i_tipo == 'articulo',
-            Item.i_codigo.like('ART%')
-        ).all()
-        
-        # Extraer números de los códigos existentes
-        numeros_existentes = []
-        for item in items:
-            try:
-                numero_str = item.i_codigo[3:]  # Quitar 'ART'
-                numero = int(numero_str)
-                numeros_existentes.append(numero)
-            except (ValueError, IndexError):
-                continue
-        
-        # Encontrar el siguiente número disponible
-        if numeros_existentes:
-            numero = max(numeros_existentes) + 1
-        else:
-            numero = 1
-        
-        return f"ART{numero:03d}"
+        """Reserva el siguiente código de artículo en tb_secuencia (atómico entre workers)"""
+        return SecuenciaRepository().generar_codigo('articulo')
 
     def crear_articulo(self, nombre, cantidad, valor_unitario, cuenta_contable, stock_min=0, stock_max=100, usuario_id=1, serial=None, codigo_identificacion=None):
         """Crea un nuevo artículo con código automático y stock inicial"""
@@ -162,7 +90,7 @@ class ArticuloService:
 
     def actualizar_valor_unitario(self, articulo_id, nuevo_valor, usuario_id, observaciones=None):
         """Actualiza el valor unitario de un artículo y registra el cambio"""
-        from app.database.models import Item, MovimientoDetalle, Usuario
+        from app.database.models import Usuario
         from app import db
         from datetime import datetime
         
@@ -176,29 +104,24 @@ class ArticuloService:
         
         # Solo actualizar si el valor es diferente
         if abs(valor_anterior - nuevo_valor) > 0.01:  # Tolerancia para decimales
-            # Actualizar el valor unitario
-            item.i_vUnitario = nuevo_valor
-            # Recalcular valor total con el nuevo precio
-            item.i_vTotal = item.i_cantidad * nuevo_valor
+            stock_anterior, valor_unitario_anterior = self.movimiento_repo.capturar_estado(item)
             
-            db.session.commit()
+            # Actualizar el valor unitario; el valor total se recalcula en la base
+            # con la cantidad vigente para no pisar salidas concurrentes
+            item = self.movimiento_repo.actualizar_precio(item.id, nuevo_valor)
             
-            # Registrar el cambio en el historial
+            # Registrar el cambio en el historial (misma transacción que el ajuste)
             usuario = Usuario.query.get(usuario_id) or Usuario.query.first()
             if usuario:
-                movimiento = MovimientoDetalle(
-                    m_fecha=datetime.now().date(),
-                    m_tipo='ajuste_precio',
-                    m_cantidad=0,  # Los ajustes de precio no afectan cantidad
-                    m_valorUnitario=nuevo_valor,
-                    m_valorTotal=0.0,
-                    m_observaciones=f'Valor unitario actualizado de ${valor_anterior:.2f} a ${nuevo_valor:.2f}. {observaciones or ""}',
-                    i_id=item.id,
-                    u_id=usuario.id
+                self.movimiento_repo.nuevo_movimiento(
+                    item, 'ajuste_precio', 0, nuevo_valor, usuario.id,  # Los ajustes de precio no afectan cantidad
+                    stock_anterior, valor_unitario_anterior,
+                    observaciones=f'Valor unitario actualizado de ${valor_anterior:.2f} a ${nuevo_valor:.2f}. {observaciones or ""}',
+                    fecha=datetime.now(),
+                    valor_total=0
                 )
-                
-                db.session.add(movimiento)
-                db.session.commit()
+            
+            db.session.commit()
             
             return item
         else:
@@ -262,7 +185,7 @@ class ArticuloService:
 
     def registrar_salida_con_asignacion(self, articulo_id, cantidad, valor_unitario, usuario_id, persona_id, observaciones=None):
         """Registra una salida de artículo con asignación a personal"""
-        from app.database.models import Consumo, Persona, MovimientoDetalle
+        from app.database.models import Consumo, Persona
         from app import db
         from datetime import datetime
         
@@ -301,73 +224,163 @@ class ArticuloService:
         db.session.add(consumo)
         db.session.flush()  # Para obtener el ID del consumo
         
+        # Descuento atómico del stock (UPDATE condicional)
+        item, stock_anterior, valor_anterior = self.movimiento_repo.ajustar_stock(item_id, -cantidad)
+        
         # Crear movimiento detalle vinculado al consumo
-        movimiento = MovimientoDetalle(
-            m_fecha=datetime.now().date(),
-            m_tipo='salida',
-            m_cantidad=cantidad,
-            m_valorUnitario=valor_unitario,
-            m_valorTotal=cantidad * valor_unitario,
-            m_observaciones=f"Asignado a: {persona.pe_nombre} {persona.pe_apellido or ''} - {observaciones or ''}",
-            i_id=item_id,
-            c_id=consumo.id,  # Vincular con el consumo
-            u_id=usuario_id
+        movimiento = self.movimiento_repo.nuevo_movimiento(
+            item, 'salida', cantidad, valor_unitario, usuario_id,
+            stock_anterior, valor_anterior,
+            observaciones=f"Asignado a: {persona.pe_nombre} {persona.pe_apellido or ''} - {observaciones or ''}",
+            consumo_id=consumo.id,  # Vincular con el consumo
+            fecha=datetime.now()
         )
         
-        db.session.add(movimiento)
-        
-        # Actualizar stock del artículo
-        if item.i_cantidad >= cantidad:
-            item.i_cantidad -= cantidad
-            item.i_vTotal = item.i_cantidad * item.i_vUnitario
-        else:
-            raise ValueError(f"Stock insuficiente. Disponible: {item.i_cantidad}, Solicitado: {cantidad}")
-        
         db.session.commit()
         
         return movimiento, consumo
 
-    def registrar_movimiento_devolucion(self, item_id, cantidad, valor_unitario, usuario_id, observaciones=None):
-        """Registra un movimiento de entrada por devolución"""
-        from app.database.models import MovimientoDetalle
+    def registrar_asignacion_multiple(self, persona_id, lineas, usuario_id, observaciones=None):
+        """Asigna varios artículos a una persona en una sola transacción.
+
+        Bloquea todas las filas de tb_item involucradas con SELECT ... FOR UPDATE
+        en orden de ID (evita interbloqueos entre asignaciones concurrentes) y
+        valida el stock ya bloqueado. Si alguna línea falla no se escribe nada.
+
+        Args:
+            persona_id: ID de la persona que recibe los artículos
+            lineas: Lista de diccionarios {'articulo_id', 'cantidad', 'valor_unitario'}
+            usuario_id: Usuario que registra la asignación
+            observaciones: Observaciones comunes a todas las líneas
+
+        Returns:
+            dict: {'success': bool, 'consumos': [...], 'errores': [...], 'error': str}
+        """
+        from app.database.models import Articulo, Consumo, Persona
+
+        if not lineas:
+            return {'success': False, 'consumos': [], 'errores': [],
+                    'error': 'Debe agregar al menos un artículo válido'}
+
+        ids = [linea['articulo_id'] for linea in lineas]
+        if len(set(ids)) != len(ids):
+            return {'success': False, 'consumos': [], 'errores': [],
+                    'error': 'No puede seleccionar el mismo artículo múltiples veces'}
+
+        try:
+            persona = Persona.query.get(persona_id)
+            if not persona:
+                return {'success': False, 'consumos': [], 'errores': [],
+                        'error': 'La persona seleccionada no existe'}
+            if persona.pe_estado != 'Activo':
+                return {'success': False, 'consumos': [], 'errores': [],
+                        'error': 'Solo se puede asignar artículos a personal activo'}
+
+            # Bloqueo en orden determinista; populate_existing descarta el
+            # estado que la sesión pudiera tener en caché antes del bloqueo
+            items = db.session.query(Item).join(
+                Articulo, Articulo.i_id == Item.id
+            ).filter(
+                Item.id.in_(ids)
+            ).order_by(Item.id).with_for_update().populate_existing().all()
+            items = {item.id: item for item in items}
+
+            errores = []
+            for linea in lineas:
+                item = items.get(linea['articulo_id'])
+                if item is None:
+                    errores.append({'articulo_id': linea['articulo_id'], 'codigo': None,
+                                    'error': f"Artículo con ID {linea['articulo_id']} no encontrado"})
+                elif item.i_cantidad < linea['cantidad']:
+                    errores.append({'articulo_id': item.id, 'codigo': item.i_codigo,
+                                    'error': f"Stock insuficiente para {item.i_nombre}. "
+                                             f"Disponible: {item.i_cantidad}, Solicitado: {linea['cantidad']}"})
+            if errores:
+                db.session.rollback()
+                return {'success': False, 'consumos': [], 'errores': errores,
+                        'error': f'{len(errores)} artículo(s) no se pueden asignar'}
+
+            ahora = datetime.now()
+            texto_observaciones = f"Asignación múltiple - {observaciones}" if observaciones else "Asignación múltiple"
+            consumos = []
+            for linea in lineas:
+                consumo = Consumo(
+                    c_numero=1,
+                    c_fecha=ahora.date(),
+                    c_hora=ahora.time(),
+                    c_descripcion=f"Asignación de {linea['cantidad']} unidades de artículo a {persona.pe_nombre}"[:200],
+                    c_cantidad=linea['cantidad'],
+                    c_valorUnitario=linea['valor_unitario'],
+                    c_valorTotal=linea['cantidad'] * linea['valor_unitario'],
+                    c_observaciones=texto_observaciones[:500],
+                    c_estado='Asignado',
+                    pe_id=persona.id,
+                    i_id=linea['articulo_id'],
+                    u_id=usuario_id
+                )
+                db.session.add(consumo)
+                consumos.append(consumo)
+
+            # Un solo flush para obtener los IDs de todos los consumos
+            db.session.flush()
+
+            destinatario = f"{persona.pe_nombre} {persona.pe_apellido or ''}".strip()
+            for linea, consumo in zip(lineas, consumos):
+                item, stock_anterior, valor_anterior = self.movimiento_repo.ajustar_stock(
+                    linea['articulo_id'], -linea['cantidad']
+                )
+                self.movimiento_repo.nuevo_movimiento(
+                    item, 'salida', linea['cantidad'], linea['valor_unitario'], usuario_id,
+                    stock_anterior, valor_anterior,
+                    observaciones=f"Asignado a: {destinatario} - {texto_observaciones}"[:200],
+                    consumo_id=consumo.id,
+                    fecha=ahora
+                )
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'consumos': [], 'errores': [], 'error': str(e)}
+
+        return {'success': True, 'consumos': [consumo.id for consumo in consumos],
+                'errores': [], 'error': None}
+
+    def registrar_movimiento_devolucion(self, item_id, cantidad, valor_unitario, usuario_id, observaciones=None, consumo_id=None):
+        """Registra la devolución de un artículo: retorna el stock y crea el movimiento de entrada"""
         from app import db
         from datetime import datetime
         
-        movimiento = MovimientoDetalle(
-            m_fecha=datetime.now().date(),
-            m_tipo='entrada',
-            m_cantidad=cantidad,
-            m_valorUnitario=valor_unitario,
-            m_valorTotal=cantidad * valor_unitario,
-            m_observaciones=f"DEVOLUCIÓN: {observaciones or 'Artículo devuelto al inventario'}",
-            i_id=item_id,
-            u_id=usuario_id
+        # Solo retornar la cantidad física al stock (suma atómica)
+        item, stock_anterior, valor_anterior = self.movimiento_repo.ajustar_stock(item_id, cantidad)
+        
+        movimiento = self.movimiento_repo.nuevo_movimiento(
+            item, 'entrada', cantidad, valor_unitario, usuario_id,
+            stock_anterior, valor_anterior,
+            observaciones=f"DEVOLUCIÓN: {observaciones or 'Artículo devuelto al inventario'}",
+            consumo_id=consumo_id,
+            fecha=datetime.now()
         )
         
-        db.session.add(movimiento)
         db.session.commit()
         
         return movimiento
 
-    def registrar_movimiento_salida(self, item_id, cantidad, valor_unitario, usuario_id, observaciones=None):
-        """Registra un movimiento de salida por reasignación"""
-        from app.database.models import MovimientoDetalle
+    def registrar_movimiento_salida(self, item_id, cantidad, valor_unitario, usuario_id, observaciones=None, consumo_id=None):
+        """Registra la reasignación de un artículo devuelto: descuenta stock y crea el movimiento de salida"""
         from app import db
         from datetime import datetime
         
-        movimiento = MovimientoDetalle(
-            m_fecha=datetime.now().date(),
-            m_tipo='salida',
-            m_cantidad=cantidad,
-            m_valorUnitario=valor_unitario,
-            m_valorTotal=cantidad * valor_unitario,
-            m_observaciones=f"REASIGNACIÓN: {observaciones or 'Artículo reasignado desde devolución'}",
-            i_id=item_id,
-            u_id=usuario_id
+        # Descuento atómico: falla si el stock ya no alcanza
+        item, stock_anterior, valor_anterior = self.movimiento_repo.ajustar_stock(item_id, -cantidad)
+        
+        movimiento = self.movimiento_repo.nuevo_movimiento(
+            item, 'salida', cantidad, valor_unitario, usuario_id,
+            stock_anterior, valor_anterior,
+            observaciones=f"REASIGNACIÓN: {observaciones or 'Artículo reasignado desde devolución'}",
+            consumo_id=consumo_id,
+            fecha=datetime.now()
         )
         
-        db.session.add(movimiento)
         db.session.commit()
         
-        return movimiento
-    
\ No newline at end of file
+        return movimiento
\ No newline at end of file
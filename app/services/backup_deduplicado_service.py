@@ -0,0 +1,316 @@
+"""
+Almacén de backups deduplicado por contenido.
+
+Cada backup se guarda como un manifiesto JSON (manifests/<nombre>.json) que
+lista, por cada entrada lógica (el dump SQL, los NDJSON, backup_info.json),
+los bloques que la forman. Los bloques se guardan una sola vez, comprimidos
+y nombrados por el SHA-256 de su contenido (chunks/<ab>/<hash>): un backup
+repetido solo escribe los bloques que no existían.
+
+Los cortes entre bloques dependen del contenido (content-defined chunking),
+así que insertar o borrar filas solo cambia los bloques vecinos y el resto
+del dump se sigue deduplicando. Un hash rodante byte a byte (Rabin / gear,
+como restic o borg) en Python puro no pasa de unos pocos MB/s; en su lugar
+solo se corta en separadores de registro (fin de línea y `),(` entre filas
+de un INSERT extendido) y el corte se decide con el CRC32 de los bytes que
+preceden al separador. Todo lo que se guarda es texto con esos separadores;
+los tramos sin separadores se cortan por tamaño máximo.
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+# Separadores donde se permite cortar: fin de línea y límite entre filas de un INSERT extendido
+SEPARADOR = re.compile(rb"\n|\),\(")
+
+
+class Fragmentador:
+    """Corta un flujo de bytes en bloques definidos por el contenido.
+
+    Tras MINIMO bytes, cada separador es candidato a corte con probabilidad
+    proporcional al tamaño del registro que cierra, de modo que el tamaño
+    medio del bloque ronda PROMEDIO sin importar si los registros son filas
+    cortas o líneas de un INSERT extendido.
+    """
+
+    MINIMO = 512 * 1024
+    PROMEDIO = 1024 * 1024
+    MAXIMO = 4 * 1024 * 1024
+    # Bytes previos al separador que deciden el corte (ventana del hash)
+    VENTANA = 32
+
+    def __init__(self, emitir):
+        self._emitir = emitir
+        self._buffer = bytearray()
+        # Posición desde la que seguir buscando separadores y último separador visto
+        self._desde = self.MINIMO
+        self._anterior = self.MINIMO
+        self._umbral = (1 << 32) / (self.PROMEDIO - self.MINIMO)
+
+    def write(self, datos):
+        self._buffer += datos
+        self._cortar(final=False)
+        return len(datos)
+
+    def close(self):
+        self._cortar(final=True)
+
+    def _cortar(self, final):
+        buffer = self._buffer
+        inicio = 0
+        while True:
+            corte = self._buscar_corte(buffer, inicio)
+            if corte is None:
+                if final and inicio < len(buffer):
+                    self._emitir(bytes(buffer[inicio:]))
+                    inicio = len(buffer)
+                break
+            self._emitir(bytes(buffer[inicio:corte]))
+            inicio = corte
+            self._desde = self._anterior = inicio + self.MINIMO
+        # Se descarta lo ya emitido y las posiciones pasan a ser relativas al nuevo inicio
+        del buffer[:inicio]
+        self._desde -= inicio
+        self._anterior -= inicio
+
+    def _buscar_corte(self, buffer, inicio):
+        """Posición del próximo corte o None si hacen falta más datos"""
+        limite = inicio + self.MAXIMO
+        fin = min(len(buffer), limite)
+        if self._desde < fin:
+            # Bucle caliente: una iteración por fila del dump, con nombres locales
+            crc32, umbral, ventana = zlib.crc32, self._umbral, self.VENTANA
+            anterior = self._anterior
+            for separador in SEPARADOR.finditer(buffer, self._desde, fin):
+                posicion = separador.end()
+                # posicion - ventana >= inicio: la búsqueda empieza MINIMO bytes después
+                if crc32(buffer[posicion - ventana:posicion]) < (posicion - anterior) * umbral:
+                    self._anterior = posicion
+                    return posicion
+                anterior = posicion
+            self._anterior = anterior
+            self._desde = fin
+        if len(buffer) >= limite:
+            return limite
+        return None
+
+
+class _EntradaDeduplicada(io.BufferedIOBase):
+    """Entrada de un backup abierta para escritura (como zipf.open(..., "w"))"""
+
+    def __init__(self, escritor, nombre):
+        super().__init__()
+        self._escritor = escritor
+        self._nombre = nombre
+        self._bloques = []
+        self._tamano = 0
+        self._fragmentador = Fragmentador(self._guardar)
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        if self.closed:
+            raise ValueError("Escritura en una entrada cerrada")
+        self._tamano += len(datos)
+        return self._fragmentador.write(datos)
+
+    def _guardar(self, bloque):
+        self._bloques.append([self._escritor.guardar_bloque(bloque), len(bloque)])
+
+    def close(self):
+        if self.closed:
+            return
+        self._fragmentador.close()
+        self._escritor.entradas[self._nombre] = {"size": self._tamano, "chunks": self._bloques}
+        super().close()
+
+
+class EscritorDeduplicado:
+    """Destino de un backup con la interfaz de ZipFile que usa create_backup (open, writestr).
+
+    El manifiesto se escribe al cerrar sin errores: un backup fallido no
+    deja manifiesto y sus bloques nuevos quedan para la recolección.
+    """
+
+    def __init__(self, almacen, nombre):
+        self.almacen = almacen
+        self.nombre = nombre
+        self.entradas = {}
+        self.bloques_nuevos = 0
+        self.bytes_nuevos = 0
+
+    @property
+    def tamano_logico(self):
+        return sum(entrada["size"] for entrada in self.entradas.values())
+
+    def open(self, nombre, modo="w", force_zip64=False):
+        if modo != "w":
+            raise ValueError("El almacén deduplicado solo admite entradas de escritura")
+        return _EntradaDeduplicada(self, nombre)
+
+    def writestr(self, nombre, datos):
+        if isinstance(datos, str):
+            datos = datos.encode("utf-8")
+        with self.open(nombre) as entrada:
+            entrada.write(datos)
+
+    def guardar_bloque(self, datos):
+        clave, nuevo = self.almacen.guardar_bloque(datos)
+        if nuevo:
+            self.bloques_nuevos += 1
+            self.bytes_nuevos += nuevo
+        return clave
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.almacen.guardar_manifiesto(self.nombre, {
+                "name": self.nombre,
+                "created_at": datetime.now().isoformat(),
+                "logical_size": self.tamano_logico,
+                "physical_size": self.bytes_nuevos,
+                "new_chunks": self.bloques_nuevos,
+                "files": self.entradas
+            })
+        return False
+
+
+class AlmacenDeduplicado:
+    """Bloques direccionados por contenido y manifiestos de backups en `directorio`"""
+
+    # Nivel de zlib de cada bloque (mismo criterio que NIVEL_COMPRESION del ZIP)
+    NIVEL_COMPRESION = 1
+    # Bloques sin referencias más nuevos que esto no se recolectan: pueden
+    # pertenecer a un backup en curso que aún no escribió su manifiesto
+    MARGEN_RECOLECCION = 24 * 3600
+
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self.dir_bloques = self.directorio / "chunks"
+        self.dir_manifiestos = self.directorio / "manifests"
+
+    def _ruta_bloque(self, clave):
+        return self.dir_bloques / clave[:2] / clave
+
+    def ruta_manifiesto(self, nombre):
+        return self.dir_manifiestos / f"{nombre}.json"
+
+    def es_manifiesto(self, ruta):
+        ruta = Path(ruta)
+        return ruta.suffix == ".json" and ruta.parent.resolve() == self.dir_manifiestos.resolve()
+
+    def escritor(self, nombre):
+        self.dir_manifiestos.mkdir(parents=True, exist_ok=True)
+        return EscritorDeduplicado(self, nombre)
+
+    def guardar_bloque(self, datos):
+        """Guarda un bloque si no existe.
+
+        Returns:
+            tuple: (hash SHA-256, bytes escritos en disco; 0 si ya existía)
+        """
+        clave = hashlib.sha256(datos).hexdigest()
+        ruta = self._ruta_bloque(clave)
+        if ruta.exists():
+            # Renovar la fecha protege al bloque de una recolección concurrente
+            os.utime(ruta)
+            return clave, 0
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        comprimido = zlib.compress(datos, self.NIVEL_COMPRESION)
+        temporal = ruta.with_name(f"{clave}.{os.getpid()}.tmp")
+        with open(temporal, "wb") as destino:
+            destino.write(comprimido)
+        os.replace(temporal, ruta)
+        return clave, len(comprimido)
+
+    def leer_bloque(self, clave):
+        datos = zlib.decompress(self._ruta_bloque(clave).read_bytes())
+        if hashlib.sha256(datos).hexdigest() != clave:
+            raise ValueError(f"Bloque corrupto en el almacén: {clave}")
+        return datos
+
+    def guardar_manifiesto(self, nombre, manifiesto):
+        ruta = self.ruta_manifiesto(nombre)
+        temporal = ruta.with_suffix(".tmp")
+        with open(temporal, "w") as destino:
+            json.dump(manifiesto, destino)
+        os.replace(temporal, ruta)
+
+    def leer_manifiesto(self, ruta):
+        with open(ruta, "r") as origen:
+            return json.load(origen)
+
+    def manifiestos(self):
+        if not self.dir_manifiestos.exists():
+            return []
+        return sorted(self.dir_manifiestos.glob("*.json"))
+
+    def reconstruir(self, ruta_manifiesto, destino):
+        """Arma en `destino` el ZIP original del backup (sin comprimir) para restaurarlo"""
+        manifiesto = self.leer_manifiesto(ruta_manifiesto)
+        with zipfile.ZipFile(destino, "w", zipfile.ZIP_STORED) as zipf:
+            for nombre, entrada in manifiesto["files"].items():
+                with zipf.open(nombre, "w", force_zip64=True) as salida:
+                    for clave, _ in entrada["chunks"]:
+                        salida.write(self.leer_bloque(clave))
+        return destino
+
+    def recolectar(self):
+        """Borra los bloques que ningún manifiesto referencia.
+
+        Returns:
+            dict: {'bloques', 'bytes'} liberados
+        """
+        referenciados = set()
+        for ruta in self.manifiestos():
+            for entrada in self.leer_manifiesto(ruta)["files"].values():
+                referenciados.update(clave for clave, _ in entrada["chunks"])
+
+        limite = time.time() - self.MARGEN_RECOLECCION
+        borrados = liberados = 0
+        if self.dir_bloques.exists():
+            for ruta in self.dir_bloques.glob("*/*"):
+                if ruta.name in referenciados:
+                    continue
+                stat = ruta.stat()
+                if stat.st_mtime < limite:
+                    ruta.unlink()
+                    borrados += 1
+                    liberados += stat.st_size
+        return {"bloques": borrados, "bytes": liberados}
+
+    def tamano_fisico(self):
+        """Bytes que ocupan todos los bloques del almacén"""
+        if not self.dir_bloques.exists():
+            return 0
+        return sum(ruta.stat().st_size for ruta in self.dir_bloques.glob("*/*"))
+
+    def vaciar(self):
+        """Elimina todos los manifiestos y bloques; devuelve cuántos backups había"""
+        cantidad = len(self.manifiestos())
+        shutil.rmtree(self.dir_manifiestos, ignore_errors=True)
+        shutil.rmtree(self.dir_bloques, ignore_errors=True)
+        return cantidad
+
+    def restaurable(self, ruta_manifiesto):
+        """ZIP temporal reconstruido a partir del manifiesto (el llamador lo borra)"""
+        descriptor, temporal = tempfile.mkstemp(suffix=".zip")
+        os.close(descriptor)
+        try:
+            return Path(self.reconstruir(ruta_manifiesto, temporal))
+        except Exception:
+            os.unlink(temporal)
+            raise
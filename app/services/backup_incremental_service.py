@@ -0,0 +1,363 @@
+"""
+Backups incrementales por marca de agua de updated_at.
+
+Cada backup completo local registra, por tabla, el mayor updated_at visto
+(la marca de agua). Un backup incremental (delta) exporta solo las filas con
+updated_at posterior a la marca del backup anterior de la cadena, más la
+lista de claves primarias vigentes de cada tabla para poder reproducir los
+borrados. Restaurar un delta aplica el backup completo base y luego cada
+delta de la cadena en orden.
+
+Estructura de un delta (ZIP):
+- delta/<tabla>.ndjson: una fila por línea, como lista de valores en el
+  orden de columnas indicado en backup_info.json
+- ids/<tabla>.json: claves primarias vigentes (rangos si son enteras)
+- backup_info.json: cadena de archivos, marcas de agua y columnas
+"""
+
+import bisect
+import io
+import json
+import logging
+import zipfile
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import func, insert
+from app.database import db
+
+logger = logging.getLogger(__name__)
+
+
+def valor_json(valor):
+    """`default` de JSON para los backups: fechas a ISO 8601, Decimal a texto
+    (sin perder precisión al restaurar) y el resto de los tipos, a texto"""
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    return str(valor)
+
+
+# `default` solo se invoca para los valores que JSON no admite
+_ENCODER_JSON = json.JSONEncoder(default=valor_json)
+
+
+def _valor_columna(columna, valor):
+    """Convierte un valor leído del JSON al tipo Python de la columna"""
+    if valor is None:
+        return None
+    try:
+        tipo = columna.type.python_type
+    except NotImplementedError:
+        return valor
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    if tipo is time:
+        return time.fromisoformat(valor)
+    if tipo is Decimal:
+        return Decimal(valor)
+    return valor
+
+
+def _comprimir_ids(ids):
+    """Claves primarias ordenadas como rangos [inicio, fin] si son enteras, o como lista"""
+    if not ids or not all(isinstance(valor, int) for valor in ids):
+        return {"tipo": "lista", "valores": ids}
+    rangos = []
+    for valor in ids:
+        if rangos and valor == rangos[-1][1] + 1:
+            rangos[-1][1] = valor
+        else:
+            rangos.append([valor, valor])
+    return {"tipo": "rangos", "valores": rangos}
+
+
+class ConjuntoIds:
+    """Pertenencia a un conjunto de claves guardado con _comprimir_ids, sin expandir los rangos"""
+
+    def __init__(self, datos):
+        self.rangos = datos["tipo"] == "rangos"
+        if self.rangos:
+            self.inicios = [inicio for inicio, _ in datos["valores"]]
+            self.fines = [fin for _, fin in datos["valores"]]
+        else:
+            self.valores = set(datos["valores"])
+
+    def __contains__(self, valor):
+        if not self.rangos:
+            return valor in self.valores
+        posicion = bisect.bisect_right(self.inicios, valor) - 1
+        return posicion >= 0 and valor <= self.fines[posicion]
+
+
+class BackupIncrementalService:
+    """Cadena de backups: un completo local como base y deltas por marca de agua"""
+
+    # Nombre del archivo de estado de la cadena dentro del directorio de backups locales
+    ARCHIVO_ESTADO = "incremental_state.json"
+    # Las filas modificadas hasta este tiempo antes de la marca se vuelven a
+    # exportar: cubre transacciones que confirmaron tarde con un updated_at anterior
+    MARGEN_MARCA = timedelta(minutes=10)
+    # Deltas máximos por cadena antes de exigir un nuevo backup completo
+    MAX_DELTAS = 30
+    # Filas por lectura con cursor y por sentencia de escritura al restaurar
+    LOTE = 1000
+
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self.ruta_estado = self.directorio / self.ARCHIVO_ESTADO
+
+    @staticmethod
+    def tablas():
+        """Tablas del modelo ordenadas por dependencias (padres primero)"""
+        return [tabla for tabla in db.metadata.sorted_tables if "updated_at" in tabla.columns]
+
+    @staticmethod
+    def _clave(tabla):
+        clave = list(tabla.primary_key.columns)
+        if len(clave) != 1:
+            raise ValueError(f"La tabla {tabla.name} no tiene clave primaria simple")
+        return clave[0]
+
+    def marcas_de_agua(self):
+        """Mayor updated_at de cada tabla: {tabla: ISO 8601 o None si no hay filas}"""
+        marcas = {}
+        for tabla in self.tablas():
+            maximo = db.session.query(func.max(tabla.c.updated_at)).scalar()
+            marcas[tabla.name] = maximo.isoformat() if maximo else None
+        return marcas
+
+    # --- Estado de la cadena ---
+
+    def leer_estado(self):
+        """Estado de la cadena actual o None si hay que empezar con un backup completo"""
+        if not self.ruta_estado.exists():
+            return None
+        try:
+            with open(self.ruta_estado, "r") as f:
+                estado = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Estado de backups incrementales ilegible: {e}")
+            return None
+        # Si falta algún archivo de la cadena no se puede seguir agregando deltas
+        if not all((self.directorio / nombre).exists() for nombre in estado.get("cadena", [])):
+            return None
+        return estado
+
+    def _guardar_estado(self, cadena, marcas):
+        with open(self.ruta_estado, "w") as f:
+            json.dump({"cadena": cadena, "marcas": marcas}, f, indent=2)
+
+    def registrar_base(self, backup_path, marcas):
+        """Inicia una cadena nueva con un backup completo local"""
+        self._guardar_estado([Path(backup_path).name], marcas)
+
+    def invalidar_cadena(self):
+        """Descarta la cadena actual: tras una restauración las marcas ya no describen la base.
+
+        El próximo backup incremental será un backup completo.
+        """
+        if self.ruta_estado.exists():
+            self.ruta_estado.unlink()
+
+    def requiere_base(self):
+        estado = self.leer_estado()
+        return estado is None or len(estado["cadena"]) - 1 >= self.MAX_DELTAS
+
+    # --- Creación de deltas ---
+
+    def crear_delta(self, backup_path, database_name):
+        """Exporta las filas modificadas desde el último backup de la cadena.
+
+        Todas las lecturas se hacen en una misma transacción, así que con
+        InnoDB (REPEATABLE READ) ven un mismo snapshot de la base.
+
+        Returns:
+            dict: {'success', 'backup_path', 'backup_name', 'size', 'rows', 'error'}
+        """
+        estado = self.leer_estado()
+        if estado is None:
+            return {"success": False, "error": "No hay un backup completo base para el incremental"}
+
+        backup_path = Path(backup_path)
+        # Transacción nueva: el snapshot no debe ser anterior a esta llamada
+        db.session.rollback()
+        try:
+            marcas_nuevas = self.marcas_de_agua()
+            columnas_info = {}
+            total_filas = 0
+            with zipfile.ZipFile(backup_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+                for tabla in self.tablas():
+                    clave = self._clave(tabla)
+                    ids = [fila[0] for fila in db.session.query(clave).order_by(clave).yield_per(self.LOTE)]
+                    zipf.writestr(f"ids/{tabla.name}.json", json.dumps(_comprimir_ids(ids)))
+
+                    query = db.session.query(*tabla.columns).filter(tabla.c.updated_at.isnot(None))
+                    marca = estado["marcas"].get(tabla.name)
+                    if marca:
+                        query = query.filter(
+                            tabla.c.updated_at >= datetime.fromisoformat(marca) - self.MARGEN_MARCA
+                        )
+                    filas = 0
+                    with io.TextIOWrapper(zipf.open(f"delta/{tabla.name}.ndjson", "w", force_zip64=True),
+                                          encoding="utf-8") as destino:
+                        for fila in query.yield_per(self.LOTE):
+                            destino.write(_ENCODER_JSON.encode(list(fila)) + "\n")
+                            filas += 1
+                    columnas_info[tabla.name] = {
+                        "columns": [columna.name for columna in tabla.columns],
+                        "rows": filas
+                    }
+                    total_filas += filas
+
+                backup_info = {
+                    "created_at": datetime.now().isoformat(),
+                    "backup_type": "incremental",
+                    "version": "2.0",
+                    "database_type": "mysql",
+                    "database_name": database_name,
+                    "base": estado["cadena"][0],
+                    "chain": estado["cadena"],
+                    "watermarks_from": estado["marcas"],
+                    "watermarks": marcas_nuevas,
+                    "tables": columnas_info
+                }
+                zipf.writestr("backup_info.json", json.dumps(backup_info, indent=2))
+        except Exception:
+            backup_path.unlink(missing_ok=True)
+            raise
+        finally:
+            db.session.rollback()
+
+        self._guardar_estado(estado["cadena"] + [backup_path.name], marcas_nuevas)
+        return {
+            "success": True,
+            "backup_path": str(backup_path),
+            "backup_name": backup_path.stem,
+            "size": backup_path.stat().st_size,
+            "rows": total_filas,
+            "chain_length": len(estado["cadena"]) + 1
+        }
+
+    # --- Restauración ---
+
+    @staticmethod
+    def leer_info(backup_path):
+        """backup_info.json de un backup (None si no lo tiene)"""
+        with zipfile.ZipFile(backup_path, "r") as zipf:
+            if "backup_info.json" not in zipf.namelist():
+                return None
+            return json.loads(zipf.read("backup_info.json"))
+
+    @classmethod
+    def es_delta(cls, backup_path):
+        info = cls.leer_info(backup_path)
+        return info is not None and info.get("backup_type") == "incremental"
+
+    def cadena(self, backup_path):
+        """Archivos a aplicar para restaurar un delta: [base, delta 1, ..., backup_path]
+
+        Los archivos de la cadena se buscan en el mismo directorio que el delta.
+        """
+        backup_path = Path(backup_path)
+        info = self.leer_info(backup_path)
+        archivos = [backup_path.parent / nombre for nombre in info["chain"]] + [backup_path]
+        faltantes = [archivo.name for archivo in archivos if not archivo.exists()]
+        if faltantes:
+            raise ValueError(f"Faltan backups de la cadena: {', '.join(faltantes)}")
+        return archivos
+
+    def aplicar_delta(self, backup_path):
+        """Aplica un delta sobre la base actual y confirma.
+
+        Primero borra, de hijos a padres, las filas que ya no existían al
+        crear el delta (así un código único reutilizado no choca con la fila
+        borrada) y luego inserta o actualiza las filas exportadas, de padres a
+        hijos.
+
+        Returns:
+            dict: {'insertadas_o_actualizadas': n, 'borradas': n}
+        """
+        db.session.rollback()
+        info = self.leer_info(backup_path)
+        tablas = [tabla for tabla in self.tablas() if tabla.name in info["tables"]]
+        borradas = escritas = 0
+        try:
+            with zipfile.ZipFile(backup_path, "r") as zipf:
+                for tabla in reversed(tablas):
+                    vigentes = ConjuntoIds(json.loads(zipf.read(f"ids/{tabla.name}.json")))
+                    clave = self._clave(tabla)
+                    # Se reúnen antes de borrar: la conexión está ocupada mientras se lee con cursor
+                    sobrantes = [
+                        fila[0] for fila in db.session.query(clave).yield_per(self.LOTE)
+                        if fila[0] not in vigentes
+                    ]
+                    for inicio in range(0, len(sobrantes), self.LOTE):
+                        db.session.execute(tabla.delete().where(clave.in_(sobrantes[inicio:inicio + self.LOTE])))
+                    borradas += len(sobrantes)
+
+                for tabla in tablas:
+                    nombres = info["tables"][tabla.name]["columns"]
+                    columnas = [tabla.c[nombre] for nombre in nombres]
+                    lote = []
+                    with io.TextIOWrapper(zipf.open(f"delta/{tabla.name}.ndjson"), encoding="utf-8") as origen:
+                        for linea in origen:
+                            valores = json.loads(linea)
+                            lote.append({
+                                columna.name: _valor_columna(columna, valor)
+                                for columna, valor in zip(columnas, valores)
+                            })
+                            if len(lote) >= self.LOTE:
+                                self._upsert(tabla, lote)
+                                escritas += len(lote)
+                                lote = []
+                    if lote:
+                        self._upsert(tabla, lote)
+                        escritas += len(lote)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {"insertadas_o_actualizadas": escritas, "borradas": borradas}
+
+    @classmethod
+    def _upsert(cls, tabla, filas):
+        """INSERT ... ON DUPLICATE KEY UPDATE (u ON CONFLICT en SQLite) de un lote de filas"""
+        clave = cls._clave(tabla)
+        dialecto = db.session.get_bind().dialect.name
+        if dialecto == "mysql":
+            from sqlalchemy.dialects.mysql import insert as insert_dialecto
+            sentencia = insert_dialecto(tabla)
+            sentencia = sentencia.on_duplicate_key_update({
+                columna.name: sentencia.inserted[columna.name]
+                for columna in tabla.columns if columna is not clave
+            })
+        elif dialecto == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+            sentencia = insert_dialecto(tabla)
+            sentencia = sentencia.on_conflict_do_update(index_elements=[clave], set_={
+                columna.name: sentencia.excluded[columna.name]
+                for columna in tabla.columns if columna is not clave
+            })
+        else:
+            # Sin upsert nativo: se reemplaza la fila
+            ids = [fila[clave.name] for fila in filas]
+            db.session.execute(tabla.delete().where(clave.in_(ids)))
+            sentencia = insert(tabla)
+        db.session.execute(sentencia, filas)
+
+    # --- Retención ---
+
+    def archivos_requeridos(self, archivos):
+        """Nombres de los backups de los que dependen los deltas indicados"""
+        requeridos = set()
+        for archivo in archivos:
+            try:
+                info = self.leer_info(archivo)
+            except (OSError, zipfile.BadZipFile):
+                continue
+            if info and info.get("backup_type") == "incremental":
+                requeridos.update(info.get("chain", []))
+        return requeridos
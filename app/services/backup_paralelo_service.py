@@ -0,0 +1,322 @@
+"""
+Backup por tabla y restauración paralela.
+
+El dump sigue siendo un único mysqldump --single-transaction: varios
+mysqldump concurrentes verían cada uno un snapshot distinto y el backup no
+sería consistente entre tablas. Su salida se divide al vuelo en una entrada
+del ZIP por tabla (database/tablas/<tabla>.sql) usando los comentarios
+"-- Table structure for table" que emite mysqldump, y se guarda un
+manifiesto (database/manifest.json) con el orden de dependencias.
+
+La restauración carga las tablas en paralelo, cada una con su propio
+proceso mysql, con las verificaciones de claves foráneas y de unicidad
+desactivadas (el encabezado del dump ya lo hace por sesión). Los índices
+secundarios y las claves foráneas se quitan del CREATE TABLE y se agregan
+al final con un ALTER TABLE por tabla, que construye cada índice de una vez
+en lugar de mantenerlo fila por fila.
+"""
+
+import json
+import re
+import subprocess
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+PREFIJO = "database"
+MIEMBRO_MANIFIESTO = f"{PREFIJO}/manifest.json"
+MIEMBRO_ENCABEZADO = f"{PREFIJO}/encabezado.sql"
+
+MARCADOR_TABLA = re.compile(rb"^-- Table structure for table `(.+)`$")
+MARCADOR_OTROS = re.compile(
+    rb"^-- (Temporary (?:view|table) structure for view|Final view structure for view|Dumping routines|Dumping events)"
+)
+REFERENCIA = re.compile(rb"REFERENCES `([^`]+)`")
+# Definiciones del CREATE TABLE que se difieren al final de la carga
+INDICE_DIFERIDO = (b"KEY ", b"UNIQUE KEY ", b"FULLTEXT KEY ", b"SPATIAL KEY ")
+
+
+def es_backup_por_tabla(zipf):
+    return MIEMBRO_MANIFIESTO in zipf.namelist()
+
+
+def orden_por_dependencias(dependencias):
+    """Orden topológico (padres primero); los ciclos se agregan al final en su orden original"""
+    orden, visitadas = [], set()
+    pendientes = list(dependencias)
+    while pendientes:
+        listas = [
+            tabla for tabla in pendientes
+            if all(padre in visitadas or padre not in dependencias or padre == tabla
+                   for padre in dependencias[tabla])
+        ]
+        if not listas:
+            listas = pendientes[:1]
+        for tabla in listas:
+            orden.append(tabla)
+            visitadas.add(tabla)
+            pendientes.remove(tabla)
+    return orden
+
+
+class DivisorDumpPorTabla:
+    """Archivo binario de solo escritura que reparte la salida de mysqldump en entradas del ZIP.
+
+    Las entradas se escriben una después de otra (zipfile admite una sola
+    entrada abierta para escritura), en el mismo orden en que llegan del
+    dump: encabezado, una entrada por tabla y las secciones de vistas y
+    rutinas, que se restauran en orden al final.
+    """
+
+    def __init__(self, zipf):
+        self.zipf = zipf
+        self._pendiente = b""
+        self._destino = None
+        self._seccion = None
+        self.tablas = {}
+        self.otros = []
+        self._abrir(MIEMBRO_ENCABEZADO, None)
+
+    def _abrir(self, miembro, tabla):
+        if self._destino is not None:
+            self._destino.close()
+        self._destino = self.zipf.open(miembro, "w", force_zip64=True)
+        self._seccion = tabla
+        if tabla is not None:
+            self.tablas[tabla] = {"miembro": miembro, "bytes": 0, "depende_de": []}
+
+    def write(self, bloque):
+        lineas = (self._pendiente + bloque).split(b"\n")
+        self._pendiente = lineas.pop()
+        self._procesar(lineas)
+        return len(bloque)
+
+    def _procesar(self, lineas):
+        # Las líneas entre marcadores se escriben juntas: los INSERT extendidos son largos
+        acumuladas = []
+        for linea in lineas:
+            if linea.startswith(b"-- "):
+                tabla = MARCADOR_TABLA.match(linea)
+                if tabla or MARCADOR_OTROS.match(linea):
+                    self._escribir(acumuladas)
+                    acumuladas = []
+                    if tabla:
+                        nombre = tabla.group(1).decode()
+                        self._abrir(f"{PREFIJO}/tablas/{nombre}.sql", nombre)
+                    else:
+                        miembro = f"{PREFIJO}/otros/{len(self.otros):03d}.sql"
+                        self.otros.append(miembro)
+                        self._abrir(miembro, None)
+            elif self._seccion is not None and linea.startswith(b"  CONSTRAINT "):
+                referencia = REFERENCIA.search(linea)
+                if referencia:
+                    self.tablas[self._seccion]["depende_de"].append(referencia.group(1).decode())
+            acumuladas.append(linea)
+        self._escribir(acumuladas)
+
+    def _escribir(self, lineas):
+        if not lineas:
+            return
+        datos = b"\n".join(lineas) + b"\n"
+        self._destino.write(datos)
+        if self._seccion is not None:
+            self.tablas[self._seccion]["bytes"] += len(datos)
+
+    def close(self):
+        """Escribe lo que quedó pendiente y cierra la última entrada"""
+        if self._pendiente:
+            self._escribir([self._pendiente])
+            self._pendiente = b""
+        if self._destino is not None:
+            self._destino.close()
+            self._destino = None
+
+    def manifiesto(self):
+        dependencias = {tabla: datos["depende_de"] for tabla, datos in self.tablas.items()}
+        return {
+            "formato": "por_tabla",
+            "encabezado": MIEMBRO_ENCABEZADO,
+            "orden": orden_por_dependencias(dependencias),
+            "tablas": self.tablas,
+            "otros": self.otros
+        }
+
+
+def separar_diferidos(lineas):
+    """Quita índices secundarios y claves foráneas del CREATE TABLE de una sección.
+
+    Args:
+        lineas: Iterable de líneas (bytes, sin el salto)
+
+    Returns:
+        tuple: (generador de líneas filtradas, índices, claves foráneas); las
+        dos listas se completan a medida que se consume el generador
+    """
+    indices, foraneas = [], []
+
+    def filtrar():
+        en_create = False
+        columnas = []
+        for linea in lineas:
+            if not en_create:
+                if linea.startswith(b"CREATE TABLE "):
+                    en_create = True
+                    columnas = []
+                yield linea
+                continue
+            if linea.startswith(b")"):
+                # Fin del CREATE TABLE: la última definición conservada no lleva coma
+                if columnas:
+                    columnas[-1] = columnas[-1].rstrip(b",")
+                yield from columnas
+                yield linea
+                en_create = False
+                continue
+            definicion = linea.strip()
+            if definicion.startswith(INDICE_DIFERIDO):
+                indices.append(definicion.rstrip(b","))
+            elif definicion.startswith(b"CONSTRAINT ") and b" FOREIGN KEY " in definicion:
+                foraneas.append(definicion.rstrip(b","))
+            else:
+                columnas.append(linea if linea.endswith(b",") else linea + b",")
+        if en_create:
+            yield from columnas
+
+    return filtrar(), indices, foraneas
+
+
+def _lineas(origen, bloque=1024 * 1024):
+    """Líneas (sin salto) de un archivo binario leído por bloques"""
+    pendiente = b""
+    while True:
+        datos = origen.read(bloque)
+        if not datos:
+            break
+        partes = (pendiente + datos).split(b"\n")
+        pendiente = partes.pop()
+        yield from partes
+    if pendiente:
+        yield pendiente
+
+
+class RestauracionParalela:
+    """Restaura un backup por tabla con varios procesos mysql en paralelo"""
+
+    # Bytes por escritura en la entrada estándar de mysql
+    BLOQUE = 1024 * 1024
+
+    def __init__(self, comando_mysql, workers, timeout, logger):
+        self.comando_mysql = comando_mysql
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.logger = logger
+
+    def restaurar(self, backup_path):
+        """Carga las tablas en paralelo y luego índices, claves foráneas, vistas y rutinas.
+
+        Lanza RuntimeError si falla algún proceso mysql.
+
+        Returns:
+            dict: {'success', 'tablas'}
+        """
+        with zipfile.ZipFile(backup_path, "r") as zipf:
+            manifiesto = json.loads(zipf.read(MIEMBRO_MANIFIESTO))
+            encabezado = zipf.read(manifiesto["encabezado"])
+            otros = b"".join(zipf.read(miembro) for miembro in manifiesto["otros"])
+
+        # 1. Estructura sin índices secundarios ni claves foráneas, y datos (en paralelo)
+        diferidos = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futuros = {
+                tabla: executor.submit(self._cargar_tabla, backup_path, manifiesto["tablas"][tabla]["miembro"], encabezado)
+                for tabla in manifiesto["orden"]
+            }
+            try:
+                for tabla, futuro in futuros.items():
+                    diferidos[tabla] = futuro.result()
+            except Exception:
+                # No seguir cargando tablas si una falló
+                for futuro in futuros.values():
+                    futuro.cancel()
+                raise
+
+        # 2. Índices secundarios: un ALTER TABLE por tabla, en paralelo
+        sentencias_indices = [
+            self._alter(tabla, [b"ADD " + indice for indice in indices])
+            for tabla, (indices, _) in diferidos.items() if indices
+        ]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for futuro in [executor.submit(self._ejecutar, encabezado + sentencia) for sentencia in sentencias_indices]:
+                futuro.result()
+
+        # 3. Claves foráneas (sin verificar filas: FOREIGN_KEY_CHECKS=0 en el encabezado)
+        # y 4. vistas y rutinas; en una sola sesión para no competir por bloqueos de metadatos
+        sentencias_foraneas = b"".join(
+            self._alter(tabla, [b"ADD " + foranea for foranea in foraneas])
+            for tabla, (_, foraneas) in diferidos.items() if foraneas
+        )
+        self._ejecutar(encabezado + sentencias_foraneas + otros)
+        return {"success": True, "tablas": len(diferidos)}
+
+    @staticmethod
+    def _alter(tabla, definiciones):
+        return b"ALTER TABLE `" + tabla.encode() + b"` " + b", ".join(definiciones) + b";\n"
+
+    def _cargar_tabla(self, backup_path, miembro, encabezado):
+        """Envía la sección de una tabla a un proceso mysql propio.
+
+        Returns:
+            tuple: (índices diferidos, claves foráneas diferidas)
+        """
+        # Un ZipFile por hilo: cada uno lee y descomprime su entrada en paralelo
+        with zipfile.ZipFile(backup_path, "r") as zipf, zipf.open(miembro) as origen:
+            lineas, indices, foraneas = separar_diferidos(_lineas(origen, self.BLOQUE))
+            self._ejecutar(encabezado, lineas)
+        self.logger.debug(f"Tabla restaurada desde {miembro}")
+        return indices, foraneas
+
+    def _ejecutar(self, sql, lineas=()):
+        """Ejecuta `sql` y luego `lineas` en un proceso mysql; lanza RuntimeError si falla"""
+        vencido = threading.Event()
+        with tempfile.TemporaryFile() as errores:
+            proceso = subprocess.Popen(
+                self.comando_mysql, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=errores
+            )
+
+            def cancelar():
+                vencido.set()
+                proceso.kill()
+
+            temporizador = threading.Timer(self.timeout, cancelar)
+            temporizador.start()
+            try:
+                try:
+                    proceso.stdin.write(sql)
+                    bloque = []
+                    tamano = 0
+                    for linea in lineas:
+                        bloque.append(linea)
+                        tamano += len(linea)
+                        if tamano >= self.BLOQUE:
+                            proceso.stdin.write(b"\n".join(bloque) + b"\n")
+                            bloque, tamano = [], 0
+                    if bloque:
+                        proceso.stdin.write(b"\n".join(bloque) + b"\n")
+                    proceso.stdin.close()
+                except BrokenPipeError:
+                    # mysql terminó antes de tiempo: el error queda en stderr
+                    pass
+                returncode = proceso.wait()
+            finally:
+                temporizador.cancel()
+                if proceso.poll() is None:
+                    proceso.kill()
+                    proceso.wait()
+            errores.seek(0)
+            stderr = errores.read().decode("utf-8", errors="replace")
+
+        if vencido.is_set():
+            raise RuntimeError("Timeout en mysql import - la operación tardó demasiado")
+        if returncode != 0:
+            raise RuntimeError(f"Error en mysql import: {stderr}")
@@ -5,6 +5,7 @@ import os
 from datetime import datetime, timedelta
 from pathlib import Path
 import logging
+from contextlib import nullcontext
 from .backup_service import BackupService
 from .google_drive_service import GoogleDriveService
 
@@ -19,11 +20,19 @@ class BackupScheduler:
         self.logger = logging.getLogger(__name__)
         self.running = False
         self.thread = None
+        self.app = None
         self.config_file = Path("backup_schedule_config.json")
         self.load_schedule_config()
         
-    def start(self):
-        """Inicia el scheduler de backups"""
+    def start(self, app=None):
+        """Inicia el scheduler de backups
+        
+        Args:
+            app: Aplicación Flask; sin ella no se ejecutan las tareas que
+                usan la base de datos (cierre de periodos)
+        """
+        if app is not None:
+            self.app = app
         if self.running:
             return
             
@@ -53,6 +62,11 @@ class BackupScheduler:
     def load_schedule_config(self):
         """Carga configuración de horarios desde archivo"""
         default_config = {
+            "daily": {
+                "enabled": True,
+                "hour": 1,
+                "minute": 0
+            },
             "weekly": {
                 "enabled": True,
                 "day": 6,  # 0=Lunes, 6=Domingo
@@ -69,6 +83,9 @@ class BackupScheduler:
                 "enabled": True,
                 "hour": 4,
                 "minute": 0
+            },
+            "period_close": {
+                "enabled": True
             }
         }
         
@@ -111,6 +128,13 @@ class BackupScheduler:
         """Verifica si es momento de ejecutar backups"""
         now = datetime.now()
         
+        # Backup incremental diario
+        daily_config = self.schedule_config.get("daily", {})
+        if (daily_config.get("enabled", True) and
+            now.hour == daily_config.get("hour", 1) and
+            now.minute < 5):
+            self._run_daily_backup()
+        
         # Backup semanal
         weekly_config = self.schedule_config.get("weekly", {})
         if (weekly_config.get("enabled", True) and
@@ -134,12 +158,39 @@ class BackupScheduler:
             now.hour == cleanup_config.get("hour", 4) and
             now.minute < 5):
             self._run_cleanup()
+        
+        # Cierre de meses terminados (idempotente: solo cierra los pendientes)
+        period_close_config = self.schedule_config.get("period_close", {})
+        if period_close_config.get("enabled", True):
+            self._run_period_close()
+    
+    def _app_context(self):
+        """Contexto de la aplicación para las tareas que consultan la base"""
+        return self.app.app_context() if self.app is not None else nullcontext()
+    
+    def _run_daily_backup(self):
+        """Ejecuta backup incremental diario (completo si no hay base vigente)"""
+        try:
+            self.logger.info("Iniciando backup incremental automático")
+            with self._app_context():
+                result = self.backup_service.create_backup("incremental")
+            
+            if result['success']:
+                self.logger.info(f"Backup diario creado: {result['backup_name']}")
+            else:
+                self.logger.error(f"Error en backup diario: {result['error']}")
+            return result
+                
+        except Exception as e:
+            self.logger.error(f"Error ejecutando backup diario: {str(e)}")
+            return {"success": False, "error": str(e)}
     
     def _run_weekly_backup(self):
         """Ejecuta backup semanal local"""
         try:
             self.logger.info("Iniciando backup semanal automático")
-            result = self.backup_service.create_backup("local")
+            with self._app_context():
+                result = self.backup_service.create_backup("local")
             
             if result['success']:
                 self.logger.info(f"Backup semanal creado: {result['backup_name']}")
@@ -155,7 +206,8 @@ class BackupScheduler:
             self.logger.info("Iniciando backup mensual automático")
             
             # Crear backup local primero
-            result = self.backup_service.create_backup("cloud")
+            with self._app_context():
+                result = self.backup_service.create_backup("cloud")
             
             if result['success']:
                 self.logger.info(f"Backup mensual creado: {result['backup_name']}")
@@ -189,12 +241,31 @@ class BackupScheduler:
         except Exception as e:
             self.logger.error(f"Error en limpieza de backups: {str(e)}")
     
+    def _run_period_close(self):
+        """Guarda los snapshots de inventario de los meses que faltan cerrar"""
+        if self.app is None:
+            return
+        try:
+            from .cierre_service import CierrePeriodoService
+            
+            with self.app.app_context():
+                for result in CierrePeriodoService().cerrar_pendientes():
+                    if result['success']:
+                        self.logger.info(f"Cierre de periodo {result['mes']:02d}/{result['anio']}: {result['items']} items")
+                    else:
+                        self.logger.error(f"Error en cierre de periodo: {result['error']}")
+                        
+        except Exception as e:
+            self.logger.error(f"Error ejecutando cierre de periodo: {str(e)}")
+    
     def force_backup(self, backup_type="local"):
         """Fuerza la ejecución de un backup"""
         try:
             self.logger.info(f"Forzando backup {backup_type}")
             
-            if backup_type == "weekly":
+            if backup_type == "daily":
+                return self._run_daily_backup()
+            elif backup_type == "weekly":
                 self._run_weekly_backup()
             elif backup_type == "monthly":
                 self._run_monthly_backup()
@@ -210,6 +281,13 @@ class BackupScheduler:
         """Retorna información sobre próximos backups programados"""
         now = datetime.now()
         
+        # Próximo backup diario
+        daily_config = self.schedule_config.get("daily", {})
+        next_daily = now.replace(hour=daily_config.get("hour", 1), minute=daily_config.get("minute", 0),
+                                 second=0, microsecond=0)
+        if next_daily <= now:
+            next_daily += timedelta(days=1)
+        
         # Configuración semanal
         weekly_config = self.schedule_config.get("weekly", {})
         weekly_day = weekly_config.get("day", 6)
@@ -245,6 +323,7 @@ class BackupScheduler:
             next_monthly = next_month.replace(hour=monthly_hour, minute=monthly_minute, second=0, microsecond=0) + timedelta(days=days_to_target)
         
         return {
+            "next_daily": next_daily.isoformat() if daily_config.get("enabled", True) else None,
             "next_weekly": next_weekly.isoformat() if weekly_config.get("enabled", True) else None,
             "next_monthly": next_monthly.isoformat() if monthly_config.get("enabled", True) else None,
             "scheduler_running": self.running,
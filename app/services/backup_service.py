@@ -1,19 +1,77 @@
 import os
+import io
+import sys
 import json
 import subprocess
+import threading
 import zipfile
 import logging
 import tempfile
 from datetime import datetime, timedelta
 from pathlib import Path
+from time import monotonic
 import shutil
 import mysql.connector
 from mysql.connector import Error
 from app.database import db
 from app.database.models import Persona, Item, Articulo, Instrumento, Proveedor, MovimientoDetalle, Consumo, Entrada, Usuario
+from app.database.repositories.base import BaseRepository
+from app.utils.cache import invalidar_datos
 from .google_drive_service import GoogleDriveService
+from .backup_incremental_service import BackupIncrementalService, valor_json
+from .backup_deduplicado_service import AlmacenDeduplicado
+from .backup_paralelo_service import (
+    DivisorDumpPorTabla, RestauracionParalela, MIEMBRO_MANIFIESTO, es_backup_por_tabla
+)
+
+try:
+    import resource
+except ImportError:  # Windows: sin métricas de memoria
+    resource = None
+
+
+def _rss_maximo_mb():
+    """Pico de memoria residente (MB) del proceso actual"""
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa kilobytes; macOS, bytes
+    divisor = 1048576 if sys.platform == 'darwin' else 1024
+    return round(maximo / divisor, 1)
+
+
+def _rss_maximo_hijo_mb(pid):
+    """Pico de memoria residente (MB) de un proceso en ejecución, leído de /proc (solo Linux).
+
+    RUSAGE_CHILDREN no sirve: el hijo hereda en el fork el RSS del proceso padre.
+    """
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for linea in status:
+                if linea.startswith('VmHWM:'):
+                    return round(int(linea.split()[1]) / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+# Un solo codificador para todas las filas (json.dumps con argumentos crea uno
+# por llamada); `default` solo se invoca para los valores que JSON no admite
+_ENCODER_JSON = json.JSONEncoder(default=valor_json, ensure_ascii=False)
+
 
 class BackupService:
+    # Nivel de deflate de las entradas del ZIP: con 1 el dump se comprime unas
+    # 3 veces más rápido que con el nivel por defecto (6) y el ZIP crece ~35%
+    NIVEL_COMPRESION = 1
+    # Bytes leídos de la salida de mysqldump por iteración
+    BLOQUE_DUMP = 1024 * 1024
+    # Duración máxima de mysqldump (y de cada proceso mysql al restaurar) en segundos
+    TIMEOUT_DUMP = 3600
+    # Procesos mysql concurrentes al restaurar un backup por tabla; con 1 el
+    # dump se guarda en un único archivo SQL (configurable en backup_config.json)
+    WORKERS_PARALELOS = 4
+
     def __init__(self):
         # Configuración de directorios
         self.config_file = Path("backup_config.json")
@@ -58,10 +116,12 @@ class BackupService:
             with open(self.config_file, 'r') as f:
                 config = json.load(f)
                 self.local_backup_dir = Path(config.get('local_backup_dir', 'backups/local'))
+                self.parallel_workers = int(config.get('parallel_workers', self.WORKERS_PARALELOS))
                 self.first_time_setup = False
         else:
             # Primera vez - usar directorio por defecto pero marcar para configuración
             self.local_backup_dir = Path.cwd() / "backups" / "local"
+            self.parallel_workers = self.WORKERS_PARALELOS
             self.first_time_setup = True
         
         # Directorio cloud siempre en el proyecto
@@ -123,7 +183,7 @@ class BackupService:
     
     def _save_default_config(self):
         """Guarda configuración por defecto"""
-        config = {'local_backup_dir': str(self.local_backup_dir)}
+        config = {'local_backup_dir': str(self.local_backup_dir), 'parallel_workers': self.parallel_workers}
         with open(self.config_file, 'w') as f:
             json.dump(config, f, indent=2)
         self.first_time_setup = False
@@ -135,7 +195,7 @@ class BackupService:
             new_dir.mkdir(parents=True, exist_ok=True)
             
             # Guardar configuración
-            config = {'local_backup_dir': str(new_dir)}
+            config = {'local_backup_dir': str(new_dir), 'parallel_workers': self.parallel_workers}
             with open(self.config_file, 'w') as f:
                 json.dump(config, f, indent=2)
             
@@ -157,7 +217,8 @@ class BackupService:
         
         return {
             "custom_directory": config.get('local_backup_dir'),
-            "use_custom_directory": bool(config.get('local_backup_dir'))
+            "use_custom_directory": bool(config.get('local_backup_dir')),
+            "parallel_workers": config.get('parallel_workers', self.WORKERS_PARALELOS)
         }
     
     def reset_config(self):
@@ -191,17 +252,40 @@ class BackupService:
                     backup_file.unlink()
                     deleted_count += 1
             
+            # Limpiar almacén deduplicado
+            deleted_count += self.almacen.vaciar()
+            
             return {"success": True, "message": f"Se eliminaron {deleted_count} backups"}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    @property
+    def incremental(self):
+        """Cadena de backups incrementales del directorio local configurado"""
+        return BackupIncrementalService(self.local_backup_dir)
+
+    @property
+    def almacen(self):
+        """Almacén deduplicado por contenido dentro del directorio local configurado"""
+        return AlmacenDeduplicado(self.local_backup_dir / "almacen")
+    
     def create_backup(self, backup_type="local"):
-        """Crea un backup completo del sistema usando MySQL"""
+        """Crea un backup completo del sistema usando MySQL
+        
+        backup_type "incremental" crea un delta sobre la cadena local (ver
+        create_incremental_backup) y "deduplicado" guarda el backup en el
+        almacén por contenido: solo se escriben los bloques que no existían.
+        """
+        if backup_type == "incremental":
+            return self.create_incremental_backup()
+        
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_name = f"kardex_backup_{backup_type}_{timestamp}"
         
         if backup_type == "local":
             backup_path = self.local_backup_dir / f"{backup_name}.zip"
+        elif backup_type == "deduplicado":
+            backup_path = self.almacen.ruta_manifiesto(backup_name)
         else:
             backup_path = self.cloud_backup_dir / f"{backup_name}.zip"
         
@@ -211,45 +295,71 @@ class BackupService:
             if not is_connected:
                 return {"success": False, "error": f"Error de conexión a MySQL: {message}"}
             
-            # Crear directorio temporal
-            temp_dir = tempfile.mkdtemp()
             sql_filename = f'{self.db_config["database"]}_backup_{timestamp}.sql'
-            temp_sql_path = os.path.join(temp_dir, sql_filename)
             
-            # Crear backup de MySQL usando mysqldump
-            mysqldump_result = self._create_mysql_dump(temp_sql_path)
-            if not mysqldump_result["success"]:
-                shutil.rmtree(temp_dir)
-                return mysqldump_result
+            # Marcas de agua antes del dump: lo que cambie durante el dump entra en el próximo delta
+            watermarks = self.incremental.marcas_de_agua()
             
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # 1. Backup de la base de datos MySQL
-                zipf.write(temp_sql_path, f"database/{sql_filename}")
-                
-                # 2. Backup de datos en JSON (para compatibilidad)
-                data_backup = self._export_data_to_json()
-                zipf.writestr("data/backup_data.json", json.dumps(data_backup, indent=2, default=str))
+            if backup_type == "deduplicado":
+                contenedor = self.almacen.escritor(backup_name)
+            else:
+                contenedor = zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED,
+                                             compresslevel=self.NIVEL_COMPRESION)
+            with contenedor as zipf:
+                # 1. Backup de la base de datos MySQL: la salida de mysqldump se
+                # comprime directamente en el ZIP, sin archivo intermedio; en modo
+                # paralelo se reparte en una entrada por tabla con un manifiesto
+                por_tabla = self.parallel_workers > 1
+                if por_tabla:
+                    divisor = DivisorDumpPorTabla(zipf)
+                    try:
+                        mysqldump_result = self._create_mysql_dump(divisor)
+                    finally:
+                        divisor.close()
+                    zipf.writestr(MIEMBRO_MANIFIESTO, json.dumps(divisor.manifiesto(), indent=2))
+                else:
+                    with zipf.open(f"database/{sql_filename}", "w", force_zip64=True) as destino:
+                        mysqldump_result = self._create_mysql_dump(destino)
                 
-                # 3. Información del backup
-                backup_info = {
-                    "created_at": datetime.now().isoformat(),
-                    "backup_type": backup_type,
-                    "version": "2.0",
-                    "database_type": "mysql",
-                    "database_name": self.db_config["database"],
-                    "tables_included": ["personal", "articulos", "instrumentos", "proveedores", "movimientos", "consumos"]
-                }
-                zipf.writestr("backup_info.json", json.dumps(backup_info, indent=2))
+                if mysqldump_result["success"]:
+                    # 2. Backup de datos en NDJSON (para compatibilidad), una entrada por tabla
+                    self._export_data_to_json(zipf)
+                    
+                    # 3. Información del backup
+                    backup_info = {
+                        "created_at": datetime.now().isoformat(),
+                        "backup_type": backup_type,
+                        "version": "2.0",
+                        "database_type": "mysql",
+                        "database_name": self.db_config["database"],
+                        "tables_included": ["personal", "articulos", "instrumentos", "proveedores", "movimientos", "consumos"],
+                        "data_format": "ndjson",
+                        "database_format": "por_tabla" if por_tabla else "sql",
+                        "mysqldump": mysqldump_result["stats"],
+                        "watermarks": watermarks
+                    }
+                    zipf.writestr("backup_info.json", json.dumps(backup_info, indent=2))
+            
+            if not mysqldump_result["success"]:
+                # En el almacén se borra el manifiesto; los bloques quedan para la recolección
+                backup_path.unlink(missing_ok=True)
+                return mysqldump_result
             
-            # Limpiar archivos temporales
-            shutil.rmtree(temp_dir)
+            # Los backups completos locales son la base de los incrementales siguientes
+            if backup_type == "local":
+                self.incremental.registrar_base(backup_path, watermarks)
             
             result = {
                 "success": True,
                 "backup_path": str(backup_path),
                 "backup_name": backup_name,
-                "size": os.path.getsize(backup_path)
+                "size": os.path.getsize(backup_path),
+                "mysqldump": mysqldump_result["stats"]
             }
+            if backup_type == "deduplicado":
+                # Tamaño físico: solo los bloques nuevos que escribió este backup
+                result["size"] = contenedor.bytes_nuevos
+                result["logical_size"] = contenedor.tamano_logico
             
             # Si es backup para la nube, intentar subir a Google Drive
             if backup_type == "cloud" and self.drive_service.is_configured():
@@ -258,10 +368,56 @@ class BackupService:
             
             return result
         except Exception as e:
+            backup_path.unlink(missing_ok=True)
             return {"success": False, "error": str(e)}
     
-    def _create_mysql_dump(self, output_path):
-        """Crear dump de MySQL usando mysqldump"""
+    def create_incremental_backup(self):
+        """Crea un backup incremental con las filas modificadas desde el último backup local.
+        
+        Si no hay cadena (primer backup, tras una restauración o al llegar a
+        MAX_DELTAS deltas) se crea un backup completo local, que pasa a ser la
+        nueva base.
+        """
+        incremental = self.incremental
+        if incremental.requiere_base():
+            self.logger.info("Backup incremental sin base vigente: se crea un backup completo")
+            result = self.create_backup("local")
+            result["incremental"] = False
+            return result
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_name = f"kardex_backup_incremental_{timestamp}"
+        # Dos deltas en el mismo segundo no deben pisarse: la cadena los referencia por nombre
+        sufijo = 1
+        while (self.local_backup_dir / f"{backup_name}.zip").exists():
+            sufijo += 1
+            backup_name = f"kardex_backup_incremental_{timestamp}_{sufijo}"
+        backup_path = self.local_backup_dir / f"{backup_name}.zip"
+        try:
+            inicio = monotonic()
+            result = incremental.crear_delta(backup_path, self.db_config["database"])
+            if result["success"]:
+                result["incremental"] = True
+                self.logger.info(
+                    f"Backup incremental {backup_name}: {result['rows']} filas, "
+                    f"{result['size'] / 1048576:.1f} MB en {monotonic() - inicio:.1f} s"
+                )
+            return result
+        except Exception as e:
+            self.logger.error(f"Error en backup incremental: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    def _create_mysql_dump(self, destino):
+        """Ejecuta mysqldump y copia su salida en `destino` (archivo binario) por bloques.
+        
+        mysqldump --quick envía las filas a medida que las lee y el compresor
+        consume la tubería en paralelo, así que la memoria queda acotada por
+        BLOQUE_DUMP y el dump nunca se escribe sin comprimir en disco.
+        
+        Returns:
+            dict: {'success', 'stats': {bytes, segundos, mb_por_segundo, rss_max_mb,
+            rss_max_mysqldump_mb}, 'error'}
+        """
         try:
             # Construir comando mysqldump
             mysqldump_command = [
@@ -280,136 +436,146 @@ class BackupService:
             
             self.logger.debug(f"Ejecutando mysqldump: {' '.join(mysqldump_command)}")
             
-            # Ejecutar mysqldump
-            with open(output_path, 'w') as output_file:
-                result = subprocess.run(
-                    mysqldump_command,
-                    stdout=output_file,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    timeout=300  # 5 minutos timeout
-                )
-            
-            if result.returncode != 0:
-                self.logger.error(f"Error en mysqldump: {result.stderr}")
-                return {"success": False, "error": f"Error en mysqldump: {result.stderr}"}
-            
-            # Verificar que el archivo se creó correctamente
-            if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-                self.logger.error("El archivo de backup MySQL está vacío o no se pudo crear")
-                return {"success": False, "error": "El archivo de backup MySQL está vacío o no se pudo crear"}
-            
-            return {"success": True, "sql_file": output_path}
+            inicio = monotonic()
+            total = 0
+            rss_mysqldump = None
+            vencido = threading.Event()
+            
+            def cancelar():
+                vencido.set()
+                proceso.kill()
+            
+            # stderr va a un archivo temporal: una tubería sin leer podría llenarse y bloquear a mysqldump
+            with tempfile.TemporaryFile() as errores:
+                proceso = subprocess.Popen(mysqldump_command, stdout=subprocess.PIPE, stderr=errores)
+                # La lectura de la tubería no tiene timeout: un temporizador mata el proceso
+                temporizador = threading.Timer(self.TIMEOUT_DUMP, cancelar)
+                temporizador.start()
+                try:
+                    while True:
+                        bloque = proceso.stdout.read(self.BLOQUE_DUMP)
+                        if not bloque:
+                            break
+                        destino.write(bloque)
+                        total += len(bloque)
+                        # VmHWM ya es un máximo: basta la última lectura antes de que termine
+                        rss_mysqldump = _rss_maximo_hijo_mb(proceso.pid) or rss_mysqldump
+                    returncode = proceso.wait()
+                finally:
+                    temporizador.cancel()
+                    if proceso.poll() is None:
+                        proceso.kill()
+                        proceso.wait()
+                    proceso.stdout.close()
+                errores.seek(0)
+                stderr = errores.read().decode('utf-8', errors='replace')
+            
+            if vencido.is_set():
+                self.logger.error("Timeout en mysqldump")
+                return {"success": False, "error": "Timeout en mysqldump - la operación tardó demasiado"}
+            
+            if returncode != 0:
+                self.logger.error(f"Error en mysqldump: {stderr}")
+                return {"success": False, "error": f"Error en mysqldump: {stderr}"}
+            
+            # Verificar que mysqldump produjo contenido
+            if total == 0:
+                self.logger.error("El backup MySQL está vacío")
+                return {"success": False, "error": "El backup MySQL está vacío o no se pudo crear"}
+            
+            segundos = monotonic() - inicio
+            stats = {
+                "bytes": total,
+                "segundos": round(segundos, 2),
+                "mb_por_segundo": round(total / 1048576 / segundos, 2) if segundos else None,
+                "rss_max_mb": _rss_maximo_mb(),
+                "rss_max_mysqldump_mb": rss_mysqldump
+            }
+            self.logger.info(
+                f"mysqldump: {total / 1048576:.1f} MB en {stats['segundos']} s "
+                f"({stats['mb_por_segundo']} MB/s), RSS máximo {stats['rss_max_mb']} MB "
+                f"(mysqldump {stats['rss_max_mysqldump_mb']} MB)"
+            )
+            return {"success": True, "stats": stats}
             
-        except subprocess.TimeoutExpired:
-            self.logger.error("Timeout en mysqldump")
-            return {"success": False, "error": "Timeout en mysqldump - la operación tardó demasiado"}
         except Exception as e:
             self.logger.error(f"Error ejecutando mysqldump: {str(e)}")
             return {"success": False, "error": f"Error ejecutando mysqldump: {str(e)}"}
 
-    def _export_data_to_json(self):
-        """Exporta todos los datos importantes a JSON"""
-        data = {}
-        
-        # Personal
-        personal = Persona.query.all()
-        data["personal"] = [{
-            "id": p.id,
-            "codigo": p.pe_codigo,
-            "nombre": p.pe_nombre,
-            "apellido": p.pe_apellido,
-            "ci": p.pe_ci,
-            "telefono": p.pe_telefono,
-            "correo": p.pe_correo,
-            "direccion": p.pe_direccion,
-            "cargo": p.pe_cargo,
-            "estado": p.pe_estado,
-            "created_at": p.created_at.isoformat() if p.created_at else None
-        } for p in personal]
-        
+    # Filas por página (y por escritura) al exportar data/*.ndjson
+    LOTE_JSON = 2000
+
+    # Tablas exportadas a data/<clave>.ndjson: (clave, modelo, [(campo, columna), ...])
+    TABLAS_JSON = (
+        ("personal", Persona, [
+            ("id", Persona.id), ("codigo", Persona.pe_codigo), ("nombre", Persona.pe_nombre),
+            ("apellido", Persona.pe_apellido), ("ci", Persona.pe_ci), ("telefono", Persona.pe_telefono),
+            ("correo", Persona.pe_correo), ("direccion", Persona.pe_direccion), ("cargo", Persona.pe_cargo),
+            ("estado", Persona.pe_estado), ("created_at", Persona.created_at)
+        ]),
         # Items (base para artículos e instrumentos)
-        items = Item.query.all()
-        data["items"] = [{
-            "id": i.id,
-            "codigo": i.i_codigo,
-            "nombre": i.i_nombre,
-            "tipo": i.i_tipo,
-            "cantidad": i.i_cantidad,
-            "valor_unitario": float(i.i_vUnitario),
-            "valor_total": float(i.i_vTotal),
-            "created_at": i.created_at.isoformat() if i.created_at else None
-        } for i in items]
-        
-        # Artículos
-        articulos = Articulo.query.all()
-        data["articulos"] = [{
-            "item_id": a.i_id,
-            "cuenta_contable": a.a_c_contable,
-            "stock_min": a.a_stockMin,
-            "stock_max": a.a_stockMax,
-            "created_at": a.created_at.isoformat() if a.created_at else None
-        } for a in articulos]
-        
-        # Instrumentos
-        instrumentos = Instrumento.query.all()
-        data["instrumentos"] = [{
-            "item_id": i.i_id,
-            "marca": i.i_marca,
-            "modelo": i.i_modelo,
-            "serie": i.i_serie,
-            "estado": i.i_estado,
-            "created_at": i.created_at.isoformat() if i.created_at else None
-        } for i in instrumentos]
-        
-        # Proveedores
-        proveedores = Proveedor.query.all()
-        data["proveedores"] = [{
-            "id": p.id,
-            "codigo": p.p_codigo,
-            "razon_social": p.p_razonsocial,
-            "ci_ruc": p.p_ci_ruc,
-            "direccion": p.p_direccion,
-            "telefono": p.p_telefono,
-            "correo": p.p_correo,
-            "created_at": p.created_at.isoformat() if p.created_at else None
-        } for p in proveedores]
-        
-        # Movimientos
-        movimientos = MovimientoDetalle.query.all()
-        data["movimientos"] = [{
-            "id": m.id,
-            "fecha": m.m_fecha.isoformat() if m.m_fecha else None,
-            "tipo": m.m_tipo,
-            "cantidad": m.m_cantidad,
-            "valor_unitario": float(m.m_valorUnitario),
-            "valor_total": float(m.m_valorTotal),
-            "observaciones": m.m_observaciones,
-            "item_id": m.i_id,
-            "usuario_id": m.u_id,
-            "created_at": m.created_at.isoformat() if m.created_at else None
-        } for m in movimientos]
-        
+        ("items", Item, [
+            ("id", Item.id), ("codigo", Item.i_codigo), ("nombre", Item.i_nombre), ("tipo", Item.i_tipo),
+            ("cantidad", Item.i_cantidad), ("valor_unitario", Item.i_vUnitario),
+            ("valor_total", Item.i_vTotal), ("created_at", Item.created_at)
+        ]),
+        ("articulos", Articulo, [
+            ("item_id", Articulo.i_id), ("cuenta_contable", Articulo.a_c_contable),
+            ("stock_min", Articulo.a_stockMin), ("stock_max", Articulo.a_stockMax),
+            ("created_at", Articulo.created_at)
+        ]),
+        ("instrumentos", Instrumento, [
+            ("item_id", Instrumento.i_id), ("marca", Instrumento.i_marca), ("modelo", Instrumento.i_modelo),
+            ("serie", Instrumento.i_serie), ("estado", Instrumento.i_estado),
+            ("created_at", Instrumento.created_at)
+        ]),
+        ("proveedores", Proveedor, [
+            ("id", Proveedor.id), ("codigo", Proveedor.p_codigo), ("razon_social", Proveedor.p_razonsocial),
+            ("ci_ruc", Proveedor.p_ci_ruc), ("direccion", Proveedor.p_direccion),
+            ("telefono", Proveedor.p_telefono), ("correo", Proveedor.p_correo),
+            ("created_at", Proveedor.created_at)
+        ]),
+        ("movimientos", MovimientoDetalle, [
+            ("id", MovimientoDetalle.id), ("fecha", MovimientoDetalle.m_fecha), ("tipo", MovimientoDetalle.m_tipo),
+            ("cantidad", MovimientoDetalle.m_cantidad), ("valor_unitario", MovimientoDetalle.m_valorUnitario),
+            ("valor_total", MovimientoDetalle.m_valorTotal), ("observaciones", MovimientoDetalle.m_observaciones),
+            ("item_id", MovimientoDetalle.i_id), ("usuario_id", MovimientoDetalle.u_id),
+            ("created_at", MovimientoDetalle.created_at)
+        ]),
         # Consumos/Asignaciones
-        consumos = Consumo.query.all()
-        data["consumos"] = [{
-            "id": c.id,
-            "numero": c.c_numero,
-            "fecha": c.c_fecha.isoformat() if c.c_fecha else None,
-            "hora": c.c_hora.isoformat() if c.c_hora else None,
-            "descripcion": c.c_descripcion,
-            "cantidad": c.c_cantidad,
-            "valor_unitario": float(c.c_valorUnitario),
-            "valor_total": float(c.c_valorTotal),
-            "observaciones": c.c_observaciones,
-            "estado": c.c_estado,
-            "persona_id": c.pe_id,
-            "item_id": c.i_id,
-            "usuario_id": c.u_id,
-            "created_at": c.created_at.isoformat() if c.created_at else None
-        } for c in consumos]
-        
-        return data
+        ("consumos", Consumo, [
+            ("id", Consumo.id), ("numero", Consumo.c_numero), ("fecha", Consumo.c_fecha), ("hora", Consumo.c_hora),
+            ("descripcion", Consumo.c_descripcion), ("cantidad", Consumo.c_cantidad),
+            ("valor_unitario", Consumo.c_valorUnitario), ("valor_total", Consumo.c_valorTotal),
+            ("observaciones", Consumo.c_observaciones), ("estado", Consumo.c_estado),
+            ("persona_id", Consumo.pe_id), ("item_id", Consumo.i_id), ("usuario_id", Consumo.u_id),
+            ("created_at", Consumo.created_at)
+        ]),
+    )
+
+    def _export_data_to_json(self, zipf):
+        """Escribe cada tabla de TABLAS_JSON como NDJSON en data/<tabla>.ndjson dentro del ZIP.
+
+        Cada tabla se recorre en páginas por clave primaria y cada página se
+        escribe directamente en la entrada del ZIP abierta para escritura: la
+        memoria queda acotada por LOTE_JSON filas sin importar el tamaño de
+        la tabla.
+        """
+        for clave, modelo, campos in self.TABLAS_JSON:
+            nombres = [campo for campo, _ in campos]
+            filas = BaseRepository(modelo).recorrer_por_clave(
+                [columna for _, columna in campos], lote=self.LOTE_JSON
+            )
+            with io.TextIOWrapper(zipf.open(f"data/{clave}.ndjson", "w", force_zip64=True),
+                                  encoding="utf-8") as destino:
+                pagina = []
+                for fila in filas:
+                    pagina.append(_ENCODER_JSON.encode(dict(zip(nombres, fila))))
+                    if len(pagina) >= self.LOTE_JSON:
+                        destino.write("\n".join(pagina) + "\n")
+                        pagina = []
+                if pagina:
+                    destino.write("\n".join(pagina) + "\n")
 
     def list_backups(self, backup_type="all"):
         """Lista backups disponibles filtrados por configuración actual"""
@@ -421,6 +587,9 @@ class BackupService:
                 for backup_file in self.local_backup_dir.glob("*.zip"):
                     backups.append(self._get_backup_info(backup_file, "local"))
         
+        if backup_type in ["all", "local", "deduplicado"]:
+            backups.extend(self._get_deduplicated_backups())
+        
         # Backups cloud: solo los relacionados con la cuenta de Google Drive configurada
         if backup_type in ["all", "cloud"]:
             # Obtener backups locales en directorio cloud
@@ -459,6 +628,28 @@ class BackupService:
             self.logger.error(f"Error obteniendo backups de Drive: {e}")
             return []
 
+    def _get_deduplicated_backups(self):
+        """Backups del almacén deduplicado con su tamaño lógico y el físico que aportaron"""
+        backups = []
+        for manifest_path in self.almacen.manifiestos():
+            try:
+                manifiesto = self.almacen.leer_manifiesto(manifest_path)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Manifiesto ilegible {manifest_path.name}: {e}")
+                continue
+            backups.append({
+                "name": manifiesto["name"],
+                "path": str(manifest_path),
+                "type": "deduplicado",
+                # Físico: bytes de los bloques nuevos que escribió (comprimidos)
+                "size": manifiesto["physical_size"],
+                "created_at": datetime.fromisoformat(manifiesto["created_at"]),
+                "size_mb": round(manifiesto["physical_size"] / (1024 * 1024), 2),
+                "logical_size": manifiesto["logical_size"],
+                "logical_size_mb": round(manifiesto["logical_size"] / (1024 * 1024), 2)
+            })
+        return backups
+
     def _get_backup_info(self, backup_path, backup_type):
         """Obtiene información de un backup"""
         stat = backup_path.stat()
@@ -487,12 +678,21 @@ class BackupService:
                     return {"success": False, "error": "Archivo de backup no encontrado"}
                 backup_path = found_path
             
+            # Los backups del almacén deduplicado se rearman como ZIP antes de restaurar
+            if self.almacen.es_manifiesto(backup_path):
+                return self._restore_deduplicado(backup_path)
+            
             # Validar que es un archivo ZIP válido
             if not zipfile.is_zipfile(backup_path):
                 return {"success": False, "error": "El archivo no es un backup válido"}
             
+            # Los deltas se restauran aplicando su cadena sobre el backup completo base
+            if self.incremental.es_delta(backup_path):
+                return self._restore_incremental(backup_path)
+            
             # Validar contenido del backup antes de proceder
             with zipfile.ZipFile(backup_path, 'r') as zipf:
+                por_tabla = es_backup_por_tabla(zipf)
                 files_in_backup = zipf.namelist()
                 sql_files = [f for f in files_in_backup if f.startswith("database/") and f.endswith(".sql")]
                 
@@ -519,20 +719,31 @@ class BackupService:
             temp_dir = tempfile.mkdtemp()
             
             try:
-                with zipfile.ZipFile(backup_path, 'r') as zipf:
-                    # Extraer archivo SQL
-                    sql_file = sql_files[0]  # Tomar el primer archivo SQL encontrado
-                    zipf.extract(sql_file, temp_dir)
-                    sql_path = os.path.join(temp_dir, sql_file)
-                    
-                    # Verificar que el archivo extraído existe y tiene contenido
-                    if not os.path.exists(sql_path) or os.path.getsize(sql_path) == 0:
-                        return {"success": False, "error": "El archivo SQL en el backup está corrupto"}
-                    
-                    # Restaurar base de datos MySQL
-                    restore_result = self._restore_mysql_dump(sql_path)
+                if por_tabla:
+                    # Backup por tabla: carga paralela directamente desde el ZIP
+                    restore_result = self._restore_parallel(backup_path)
                     if not restore_result["success"]:
                         return restore_result
+                else:
+                    with zipfile.ZipFile(backup_path, 'r') as zipf:
+                        # Extraer archivo SQL
+                        sql_file = sql_files[0]  # Tomar el primer archivo SQL encontrado
+                        zipf.extract(sql_file, temp_dir)
+                        sql_path = os.path.join(temp_dir, sql_file)
+                    
+                        # Verificar que el archivo extraído existe y tiene contenido
+                        if not os.path.exists(sql_path) or os.path.getsize(sql_path) == 0:
+                            return {"success": False, "error": "El archivo SQL en el backup está corrupto"}
+                    
+                        # Restaurar base de datos MySQL
+                        restore_result = self._restore_mysql_dump(sql_path)
+                        if not restore_result["success"]:
+                            return restore_result
+                
+                # Los datos cambiaron por fuera del ORM: invalidar dashboard y exportaciones
+                invalidar_datos()
+                # Las marcas de agua de la cadena ya no describen la base restaurada
+                self.incremental.invalidar_cadena()
                 
                 return {
                     "success": True,
@@ -553,6 +764,51 @@ class BackupService:
         except Exception as e:
             return {"success": False, "error": f"Error durante la restauración: {str(e)}"}
     
+    def _restore_incremental(self, backup_path):
+        """Restaura el backup completo base de un delta y aplica en orden los deltas de su cadena"""
+        try:
+            cadena = self.incremental.cadena(backup_path)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        
+        result = self.restore_backup(str(cadena[0]))
+        if not result["success"]:
+            return result
+        
+        for delta in cadena[1:]:
+            try:
+                aplicado = self.incremental.aplicar_delta(delta)
+            except Exception as e:
+                invalidar_datos()
+                return {"success": False, "error": f"Error aplicando {delta.name}: {str(e)}"}
+            self.logger.info(
+                f"Delta {delta.name}: {aplicado['insertadas_o_actualizadas']} filas escritas, "
+                f"{aplicado['borradas']} borradas"
+            )
+        
+        invalidar_datos()
+        return {
+            "success": True,
+            "safety_backup_created": result.get("safety_backup_created", False),
+            "message": f"Backup incremental restaurado (base y {len(cadena) - 1} delta(s))",
+            "restored_from": str(backup_path)
+        }
+    
+    def _restore_deduplicado(self, manifest_path):
+        """Restaura un backup del almacén a partir de un ZIP temporal reconstruido"""
+        try:
+            temporal = self.almacen.restaurable(manifest_path)
+        except Exception as e:
+            return {"success": False, "error": f"Error reconstruyendo el backup deduplicado: {str(e)}"}
+        
+        try:
+            result = self.restore_backup(str(temporal))
+            if result["success"]:
+                result["restored_from"] = str(manifest_path)
+            return result
+        finally:
+            temporal.unlink(missing_ok=True)
+    
     def _create_safety_backup(self):
         """Crear backup de seguridad antes de restaurar"""
         try:
@@ -562,18 +818,39 @@ class BackupService:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def _comando_mysql(self):
+        """Comando del cliente mysql para importar en la base configurada"""
+        return [
+            'mysql',
+            f'-h{self.db_config["host"]}',
+            f'-P{self.db_config["port"]}',
+            f'-u{self.db_config["user"]}',
+            f'-p{self.db_config["password"]}',
+            self.db_config['database']
+        ]
+    
+    def _restore_parallel(self, backup_path):
+        """Restaurar un backup por tabla cargando las tablas en paralelo"""
+        try:
+            inicio = monotonic()
+            restauracion = RestauracionParalela(
+                self._comando_mysql(), self.parallel_workers, self.TIMEOUT_DUMP, self.logger
+            )
+            result = restauracion.restaurar(backup_path)
+            self.logger.info(
+                f"Restauración paralela: {result['tablas']} tablas con {self.parallel_workers} "
+                f"procesos en {monotonic() - inicio:.1f} s"
+            )
+            return result
+        except Exception as e:
+            self.logger.error(f"Error en restauración paralela: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
     def _restore_mysql_dump(self, sql_file_path):
         """Restaurar base de datos MySQL desde archivo SQL"""
         try:
             # Construir comando mysql para importar
-            mysql_command = [
-                'mysql',
-                f'-h{self.db_config["host"]}',
-                f'-P{self.db_config["port"]}',
-                f'-u{self.db_config["user"]}',
-                f'-p{self.db_config["password"]}',
-                self.db_config['database']
-            ]
+            mysql_command = self._comando_mysql()
             
             self.logger.debug(f"Ejecutando mysql import: {' '.join(mysql_command)}")
             
@@ -661,10 +938,26 @@ class BackupService:
         # Mantener backups locales por 30 días
         cutoff_date = datetime.now() - timedelta(days=30)
         
-        for backup_file in self.local_backup_dir.glob("*.zip"):
-            if datetime.fromtimestamp(backup_file.stat().st_mtime) < cutoff_date:
+        locales = list(self.local_backup_dir.glob("*.zip"))
+        vigentes = [f for f in locales if datetime.fromtimestamp(f.stat().st_mtime) >= cutoff_date]
+        # No borrar la base ni los deltas anteriores de los incrementales que se conservan
+        requeridos = self.incremental.archivos_requeridos(vigentes)
+        for backup_file in locales:
+            if backup_file not in vigentes and backup_file.name not in requeridos:
                 backup_file.unlink()
         
+        # Almacén deduplicado: misma retención y luego se borran los bloques sin referencias
+        almacen = self.almacen
+        for manifest_path in almacen.manifiestos():
+            if datetime.fromtimestamp(manifest_path.stat().st_mtime) < cutoff_date:
+                manifest_path.unlink()
+        recolectado = almacen.recolectar()
+        if recolectado["bloques"]:
+            self.logger.info(
+                f"Almacén deduplicado: {recolectado['bloques']} bloques sin uso eliminados "
+                f"({recolectado['bytes'] / 1048576:.1f} MB)"
+            )
+        
         # Mantener backups en la nube por 6 meses
         cloud_cutoff = datetime.now() - timedelta(days=180)
         for backup_file in self.cloud_backup_dir.glob("*.zip"):
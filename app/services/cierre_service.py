@@ -0,0 +1,200 @@
+"""
+Cierre mensual de inventario y valorización a una fecha.
+
+Al cerrar un mes se guarda una fila inmutable por item con su cantidad,
+valor unitario y valor total al final del mes (tb_snapshot_inventario). La
+valorización a cualquier fecha parte del cierre anterior más cercano y solo
+recorre los movimientos posteriores a él, en lugar de reproducir todo el
+historial.
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy.exc import IntegrityError
+from app.database import db
+from app.database.models import Item, MovimientoDetalle
+from app.database.repositories.cierres import CierreRepository
+from app.database.repositories.movimientos import MovimientoRepository
+
+CENTAVOS = Decimal('0.01')
+
+
+def limite_mes(anio, mes):
+    """Primer instante posterior al mes: el snapshot describe el estado en ese instante"""
+    if mes == 12:
+        return datetime(anio + 1, 1, 1)
+    return datetime(anio, mes + 1, 1)
+
+
+def mes_siguiente(anio, mes):
+    return (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def mes_anterior(anio, mes):
+    return (anio - 1, 12) if mes == 1 else (anio, mes - 1)
+
+
+class CierrePeriodoService:
+    """Cierres mensuales con snapshot por item y valorización histórica"""
+
+    # Items por consulta IN al buscar el estado de items sin movimientos previos
+    LOTE_ITEMS = 500
+
+    def __init__(self):
+        self.repo = CierreRepository()
+        self.movimiento_repo = MovimientoRepository()
+
+    def cerrar_mes(self, anio, mes, hoy=None):
+        """Guarda el snapshot de todos los items al final del mes indicado.
+
+        Returns:
+            dict: {'success': bool, 'anio', 'mes', 'items', 'valor_total', 'error'}
+        """
+        hoy = hoy or date.today()
+        etiqueta = f'{mes:02d}/{anio}'
+        limite = limite_mes(anio, mes)
+        if limite.date() > hoy:
+            return {'success': False, 'error': f'El mes {etiqueta} aún no termina'}
+        if self.repo.obtener(anio, mes):
+            return {'success': False, 'error': f'El mes {etiqueta} ya está cerrado'}
+
+        try:
+            filas = [{
+                'i_id': item_id,
+                **self._valores(cantidad, valor_unitario)
+            } for item_id, (cantidad, valor_unitario) in self.estado_en(limite).items()]
+            cierre = self.repo.guardar_cierre(anio, mes, filas)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return {'success': False, 'error': f'El mes {etiqueta} ya está cerrado'}
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e)}
+
+        return {
+            'success': True,
+            'anio': anio,
+            'mes': mes,
+            'items': cierre.cp_items,
+            'valor_total': float(cierre.cp_valor_total),
+            'error': None
+        }
+
+    def cerrar_pendientes(self, hoy=None):
+        """Cierra en orden los meses terminados desde el último cierre.
+
+        Sin cierres previos solo se cierra el mes anterior: ese primer cierre
+        es el único que recorre el historial completo. Se detiene en el primer
+        error y devuelve la lista de resultados de cerrar_mes.
+        """
+        hoy = hoy or date.today()
+        ultimo_mes = mes_anterior(hoy.year, hoy.month)
+        ultimo = self.repo.ultimo_cierre()
+        actual = ultimo_mes if ultimo is None else mes_siguiente(ultimo.cp_anio, ultimo.cp_mes)
+
+        resultados = []
+        while actual <= ultimo_mes:
+            resultado = self.cerrar_mes(*actual, hoy=hoy)
+            resultados.append(resultado)
+            if not resultado['success']:
+                break
+            actual = mes_siguiente(*actual)
+        return resultados
+
+    def valorizar(self, fecha_corte):
+        """Valorización de cada item al final del día `fecha_corte`.
+
+        Returns:
+            dict: {i_id: {'cantidad', 'valor_unitario', 'valor_total'}} con
+            los items que existían en esa fecha
+        """
+        limite = datetime.combine(fecha_corte + timedelta(days=1), time.min)
+        return {
+            item_id: self._valores(cantidad, valor_unitario)
+            for item_id, (cantidad, valor_unitario) in self.estado_en(limite).items()
+        }
+
+    def estado_en(self, limite):
+        """Estado {i_id: (cantidad, valor unitario)} de los items justo antes de `limite`.
+
+        Parte del cierre más reciente que termina en o antes de `limite` y
+        aplica solo los movimientos entre ese cierre y el límite. Cada
+        movimiento ya trae el estado resultante en sus columnas de kardex; los
+        que no las tienen se reproducen con costo promedio ponderado. Se
+        recorren por id, el orden en que se calcularon esos estados (los
+        movimientos antiguos guardan solo la fecha, a medianoche).
+        """
+        base = self.repo.ultimo_cierre(hasta=limite)
+        estado = self.repo.estado_snapshot(base) if base is not None else {}
+
+        query = db.session.query(MovimientoDetalle).filter(MovimientoDetalle.m_fecha < limite)
+        if base is not None:
+            query = query.filter(MovimientoDetalle.m_fecha >= limite_mes(base.cp_anio, base.cp_mes))
+        query = query.order_by(MovimientoDetalle.id.asc())
+
+        for fila in self.movimiento_repo.stream(query, (
+            MovimientoDetalle.i_id,
+            MovimientoDetalle.m_tipo,
+            MovimientoDetalle.m_cantidad,
+            MovimientoDetalle.m_valorUnitario,
+            MovimientoDetalle.m_valorTotal,
+            MovimientoDetalle.m_stock_actual,
+            MovimientoDetalle.m_valor_actual
+        )):
+            if fila.m_stock_actual is not None and fila.m_valor_actual is not None:
+                estado[fila.i_id] = (fila.m_stock_actual, fila.m_valor_actual)
+            else:
+                stock, valor = estado.get(fila.i_id, (0, Decimal('0')))
+                estado[fila.i_id] = self.movimiento_repo.aplicar_movimiento(
+                    stock, Decimal(str(valor)), fila.m_tipo, fila.m_cantidad,
+                    fila.m_valorTotal, fila.m_valorUnitario
+                )
+
+        self._completar_sin_movimientos(estado, limite)
+        return estado
+
+    def _completar_sin_movimientos(self, estado, limite):
+        """Agrega los items creados antes del límite que no tienen estado conocido.
+
+        Sin movimientos anteriores al límite, su estado es el previo a su
+        primer movimiento posterior o, si nunca se movieron, el actual.
+        """
+        faltantes = {
+            fila.id: (fila.i_cantidad or 0, fila.i_vUnitario or Decimal('0'))
+            for fila in db.session.query(Item.id, Item.i_cantidad, Item.i_vUnitario).filter(
+                Item.created_at < limite
+            )
+            if fila.id not in estado
+        }
+
+        ids = list(faltantes)
+        for inicio in range(0, len(ids), self.LOTE_ITEMS):
+            vistos = set()
+            filas = db.session.query(
+                MovimientoDetalle.i_id,
+                MovimientoDetalle.m_stock_anterior,
+                MovimientoDetalle.m_valor_anterior
+            ).filter(
+                MovimientoDetalle.i_id.in_(ids[inicio:inicio + self.LOTE_ITEMS]),
+                MovimientoDetalle.m_fecha >= limite
+            ).order_by(
+                MovimientoDetalle.i_id, MovimientoDetalle.id.asc()
+            ).all()
+            for fila in filas:
+                if fila.i_id in vistos:
+                    continue
+                vistos.add(fila.i_id)
+                if fila.m_stock_anterior is not None:
+                    faltantes[fila.i_id] = (fila.m_stock_anterior, fila.m_valor_anterior or Decimal('0'))
+
+        estado.update(faltantes)
+
+    @staticmethod
+    def _valores(cantidad, valor_unitario):
+        valor_unitario = Decimal(str(valor_unitario or 0)).quantize(CENTAVOS)
+        return {
+            'cantidad': int(cantidad or 0),
+            'valor_unitario': valor_unitario,
+            'valor_total': (valor_unitario * int(cantidad or 0)).quantize(CENTAVOS)
+        }
@@ -0,0 +1,80 @@
+from sqlalchemy import func, case, select
+from app.database import db
+from app.database.models import Item, Articulo, Instrumento, Proveedor
+from app.utils.cache import cache, ESPACIO_DASHBOARD
+
+
+class DashboardService:
+    """Servicio de estadísticas agregadas para el dashboard"""
+
+    LIMITE_ALERTAS = 10
+
+    def obtener_estadisticas(self):
+        """Obtiene los contadores del dashboard (cacheados entre escrituras)"""
+        return cache.obtener_o_calcular(
+            ESPACIO_DASHBOARD, 'estadisticas', self._calcular_estadisticas
+        )
+
+    def obtener_alertas_stock(self, limite=None):
+        """Obtiene los artículos con mayor déficit de stock (cacheados entre escrituras)"""
+        limite = limite or self.LIMITE_ALERTAS
+        return cache.obtener_o_calcular(
+            ESPACIO_DASHBOARD, f'alertas:{limite}',
+            lambda: self._calcular_alertas_stock(limite)
+        )
+
+    def _calcular_estadisticas(self):
+        """Calcula los contadores del dashboard en una sola consulta agregada"""
+        # Proveedores activos como subconsulta escalar para no hacer un segundo viaje
+        total_proveedores = select(func.count(Proveedor.id)).where(
+            Proveedor.p_estado == 'Activo'
+        ).scalar_subquery()
+
+        fila = db.session.query(
+            func.count(Instrumento.i_id).label('total_instrumentos'),
+            func.count(Articulo.i_id).label('total_articulos'),
+            func.coalesce(func.sum(case(
+                (Item.i_cantidad <= Articulo.a_stockMin, 1),
+                else_=0
+            )), 0).label('articulos_stock_bajo'),
+            total_proveedores.label('total_proveedores')
+        ).select_from(Item).outerjoin(
+            Articulo, Articulo.i_id == Item.id
+        ).outerjoin(
+            Instrumento, Instrumento.i_id == Item.id
+        ).one()
+
+        return {
+            'total_instrumentos': int(fila.total_instrumentos or 0),
+            'total_articulos': int(fila.total_articulos or 0),
+            'total_proveedores': int(fila.total_proveedores or 0),
+            'articulos_stock_bajo': int(fila.articulos_stock_bajo or 0)
+        }
+
+    def _calcular_alertas_stock(self, limite):
+        """Calcula los artículos con mayor déficit de stock (top-N)"""
+        deficit = (Articulo.a_stockMin - Item.i_cantidad).label('deficit')
+
+        filas = db.session.query(
+            Item.id,
+            Item.i_codigo,
+            Item.i_nombre,
+            Item.i_cantidad,
+            Articulo.a_stockMin,
+            deficit
+        ).join(
+            Articulo, Articulo.i_id == Item.id
+        ).filter(
+            Item.i_cantidad <= Articulo.a_stockMin
+        ).order_by(
+            deficit.desc(), Item.i_codigo
+        ).limit(limite).all()
+
+        # Diccionarios simples: la vista no necesita las entidades completas
+        return [{
+            'id': fila.id,
+            'codigo': fila.i_codigo,
+            'nombre': fila.i_nombre,
+            'cantidad': fila.i_cantidad,
+            'stock_minimo': fila.a_stockMin
+        } for fila in filas]
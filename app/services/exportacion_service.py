@@ -0,0 +1,364 @@
+"""
+Cola de exportaciones en segundo plano.
+
+Los reportes pesados (Excel/PDF) se generan en hilos del proceso que
+recibió la petición, fuera del ciclo request/response, para no bloquear
+el worker síncrono de gunicorn más allá de su `timeout`.
+
+El estado de cada trabajo se guarda en disco (un JSON por trabajo junto
+al archivo generado), de modo que cualquier worker puede responder la
+consulta de progreso y servir la descarga. Los trabajos vencidos se
+eliminan por TTL.
+
+`CacheExportaciones` guarda además los archivos terminados indexados por
+(tipo de reporte, filtros, versión de los datos) para servir las descargas
+repetidas sin volver a generarlas.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+ESTADO_PENDIENTE = 'pendiente'
+ESTADO_PROCESANDO = 'procesando'
+ESTADO_COMPLETADO = 'completado'
+ESTADO_ERROR = 'error'
+
+
+def _enlazar_o_copiar(origen, destino):
+    """Crea un hard link (sin copiar datos) o copia el archivo si no es posible"""
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copyfile(origen, destino)
+
+
+class ExportacionService:
+    """Cola de trabajos de exportación respaldada por un directorio"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.directorio = None
+        self.hilos = 2
+        self.ttl = 3600
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directorio = app.config.get(
+            'EXPORT_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'cardesk_exportaciones')
+        )
+        self.hilos = app.config.get('EXPORT_JOBS_WORKERS', 2)
+        self.ttl = app.config.get('EXPORT_JOBS_TTL_SECONDS', 3600)
+        os.makedirs(self.directorio, exist_ok=True)
+        app.extensions['exportaciones'] = self
+
+    def _pool(self):
+        """Pool de hilos del proceso actual (se recrea tras un fork de gunicorn)"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.hilos, thread_name_prefix='exportacion'
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _ruta_estado(self, trabajo_id):
+        return os.path.join(self.directorio, f'{trabajo_id}.json')
+
+    def ruta_archivo(self, trabajo):
+        """Ruta del archivo generado por un trabajo"""
+        return os.path.join(self.directorio, f"{trabajo['id']}.{trabajo['extension']}")
+
+    def _guardar_estado(self, trabajo):
+        """Escribe el estado de forma atómica (archivo temporal + os.replace)"""
+        trabajo['actualizado'] = datetime.now().isoformat()
+        ruta = self._ruta_estado(trabajo['id'])
+        temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(trabajo, archivo)
+        os.replace(temporal, ruta)
+
+    def obtener(self, trabajo_id):
+        """Devuelve el estado de un trabajo o None si no existe (o ya expiró)"""
+        # Los IDs son hexadecimales: nada de rutas arbitrarias
+        if not trabajo_id or not all(c in '0123456789abcdef' for c in trabajo_id):
+            return None
+        try:
+            with open(self._ruta_estado(trabajo_id), encoding='utf-8') as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError):
+            return None
+
+    def encolar(self, generar, nombre_archivo, extension, usuario_id, descripcion=None):
+        """Registra un trabajo y lo ejecuta en segundo plano.
+
+        Args:
+            generar: Función generar(ruta_destino, progreso) que escribe el
+                archivo; progreso(porcentaje, mensaje=None) actualiza el estado.
+                Se ejecuta dentro de un contexto de aplicación propio.
+            nombre_archivo: Nombre con el que se descargará el archivo
+            extension: Extensión del archivo generado ('xlsx', 'pdf', ...)
+            usuario_id: Usuario dueño del trabajo (único que puede descargarlo)
+            descripcion: Texto opcional para mostrar en la interfaz
+
+        Returns:
+            dict: Estado inicial del trabajo
+        """
+        self.limpiar_expirados()
+
+        trabajo = self._nuevo_trabajo(nombre_archivo, extension, usuario_id, descripcion)
+        self._guardar_estado(trabajo)
+        estado_inicial = dict(trabajo)
+        self._pool().submit(self._ejecutar, trabajo, generar)
+        return estado_inicial
+
+    def registrar_completado(self, origen, nombre_archivo, extension, usuario_id, descripcion=None):
+        """Registra como terminado un trabajo cuyo archivo ya existe (p. ej. en la caché).
+
+        Returns:
+            dict: Estado del trabajo, listo para descargar
+        """
+        self.limpiar_expirados()
+
+        trabajo = self._nuevo_trabajo(nombre_archivo, extension, usuario_id, descripcion)
+        destino = self.ruta_archivo(trabajo)
+        _enlazar_o_copiar(origen, destino)
+        trabajo.update({
+            'estado': ESTADO_COMPLETADO,
+            'progreso': 100,
+            'mensaje': 'Listo para descargar',
+            'tamano': os.path.getsize(destino),
+            'duracion': 0
+        })
+        self._guardar_estado(trabajo)
+        return dict(trabajo)
+
+    @staticmethod
+    def _nuevo_trabajo(nombre_archivo, extension, usuario_id, descripcion):
+        return {
+            'id': uuid.uuid4().hex,
+            'estado': ESTADO_PENDIENTE,
+            'progreso': 0,
+            'mensaje': 'En cola',
+            'descripcion': descripcion,
+            'nombre_archivo': nombre_archivo,
+            'extension': extension,
+            'usuario_id': usuario_id,
+            'creado': datetime.now().isoformat(),
+            'error': None
+        }
+
+    def _ejecutar(self, trabajo, generar):
+        """Ejecuta un trabajo en el hilo del pool y registra el resultado"""
+        def progreso(porcentaje, mensaje=None):
+            trabajo['progreso'] = max(0, min(99, int(porcentaje)))
+            if mensaje:
+                trabajo['mensaje'] = mensaje
+            self._guardar_estado(trabajo)
+
+        inicio = time.monotonic()
+        trabajo['estado'] = ESTADO_PROCESANDO
+        progreso(0, 'Generando')
+        destino = self.ruta_archivo(trabajo)
+        try:
+            with self.app.app_context():
+                generar(destino, progreso)
+            trabajo['estado'] = ESTADO_COMPLETADO
+            trabajo['progreso'] = 100
+            trabajo['mensaje'] = 'Listo para descargar'
+            trabajo['tamano'] = os.path.getsize(destino)
+            trabajo['duracion'] = round(time.monotonic() - inicio, 2)
+        except Exception as e:
+            logger.exception(f"Error en exportación {trabajo['id']}")
+            trabajo['estado'] = ESTADO_ERROR
+            trabajo['mensaje'] = 'Error al generar el archivo'
+            trabajo['error'] = str(e)
+            if os.path.exists(destino):
+                os.remove(destino)
+        self._guardar_estado(trabajo)
+
+    def limpiar_expirados(self):
+        """Elimina estados y archivos de trabajos sin actividad por más de `ttl` segundos"""
+        limite = time.time() - self.ttl
+        eliminados = 0
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return 0
+        for nombre in nombres:
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                if os.path.getmtime(ruta) < limite:
+                    os.remove(ruta)
+                    eliminados += 1
+            except OSError:
+                # Otro worker pudo eliminarlo primero
+                continue
+        return eliminados
+
+
+class CacheExportaciones:
+    """Caché en disco de archivos exportados con expulsión LRU.
+
+    La clave incluye la versión de los datos (contador compartido que crece
+    con cada escritura de movimientos e items), por lo que una entrada nunca
+    se invalida en sitio: tras una escritura simplemente deja de pedirse y
+    la política LRU la elimina. El uso de cada archivo se marca con su mtime.
+    """
+
+    # Temporales huérfanos (proceso interrumpido) se eliminan tras este tiempo
+    TTL_TEMPORALES = 3600
+
+    def __init__(self, app=None):
+        self.directorio = None
+        self.max_bytes = 500 * 1024 * 1024
+        self.max_archivos = 200
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directorio = app.config.get(
+            'EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'cardesk_exportaciones_cache')
+        )
+        self.max_bytes = app.config.get('EXPORT_CACHE_MAX_MB', 500) * 1024 * 1024
+        self.max_archivos = app.config.get('EXPORT_CACHE_MAX_FILES', 200)
+        os.makedirs(self.directorio, exist_ok=True)
+        app.extensions['cache_exportaciones'] = self
+
+    def clave(self, tipo, filtros, formato, version):
+        """Clave de caché de una exportación o None si no hay versión de datos disponible"""
+        if version is None or not self.max_bytes or not self.max_archivos:
+            return None
+        contenido = json.dumps(
+            {'tipo': tipo, 'filtros': filtros, 'formato': formato, 'version': version},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def _ruta(self, clave, extension):
+        return os.path.join(self.directorio, f'{clave}.{extension}')
+
+    def _temporal(self, ruta):
+        return f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    def obtener(self, clave, extension):
+        """Ruta del archivo cacheado (marcándolo como usado) o None si no existe"""
+        if clave is None:
+            return None
+        ruta = self._ruta(clave, extension)
+        try:
+            os.utime(ruta, None)
+        except OSError:
+            return None
+        return ruta
+
+    def generar(self, clave, extension, generar):
+        """Genera el archivo directamente en la caché con generar(destino) y devuelve su ruta"""
+        ruta = self._ruta(clave, extension)
+        temporal = self._temporal(ruta)
+        try:
+            generar(temporal)
+            os.replace(temporal, ruta)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        self.recortar()
+        return ruta
+
+    def guardar(self, clave, extension, origen):
+        """Agrega a la caché un archivo ya generado (enlazado, no copiado, si es posible)"""
+        if clave is None:
+            return None
+        ruta = self._ruta(clave, extension)
+        temporal = self._temporal(ruta)
+        try:
+            _enlazar_o_copiar(origen, temporal)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la exportación en caché: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return None
+        self.recortar()
+        return ruta
+
+    def _archivos(self):
+        """(mtime, tamaño, ruta) de los archivos de la caché, sin temporales"""
+        archivos = []
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return archivos
+        limite_temporales = time.time() - self.TTL_TEMPORALES
+        for nombre in nombres:
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                estado = os.stat(ruta)
+                if nombre.endswith('.tmp'):
+                    if estado.st_mtime < limite_temporales:
+                        os.remove(ruta)
+                    continue
+            except OSError:
+                continue
+            archivos.append((estado.st_mtime, estado.st_size, ruta))
+        return archivos
+
+    def recortar(self):
+        """Elimina los archivos usados hace más tiempo hasta respetar los límites"""
+        archivos = sorted(self._archivos())
+        total_bytes = sum(tamano for _, tamano, _ in archivos)
+        total_archivos = len(archivos)
+        eliminados = 0
+        for _, tamano, ruta in archivos:
+            if total_bytes <= self.max_bytes and total_archivos <= self.max_archivos:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                # Otro worker pudo eliminarlo primero
+                pass
+            total_bytes -= tamano
+            total_archivos -= 1
+            eliminados += 1
+        return eliminados
+
+    def purgar(self):
+        """Elimina todos los archivos de la caché"""
+        archivos = 0
+        total_bytes = 0
+        for _, tamano, ruta in self._archivos():
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            archivos += 1
+            total_bytes += tamano
+        return {'archivos': archivos, 'bytes': total_bytes}
+
+    def estadisticas(self):
+        archivos = self._archivos()
+        return {
+            'archivos': len(archivos),
+            'bytes': sum(tamano for _, tamano, _ in archivos),
+            'max_archivos': self.max_archivos,
+            'max_bytes': self.max_bytes
+        }
+
+
+exportaciones = ExportacionService()
+cache_exportaciones = CacheExportaciones()
@@ -0,0 +1,193 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert
+from app.database import db
+from app.database.models import Item, Articulo, Entrada, MovimientoDetalle, ResumenMovimiento, Proveedor
+from app.database.repositories.secuencias import SecuenciaRepository
+from app.utils.cache import marcar_cambios_dashboard
+
+
+class IngresoFacturaService:
+    """Ingreso masivo de artículos de una factura (o donación) en una sola transacción"""
+
+    STOCK_MIN_DEFECTO = 5
+    STOCK_MAX_DEFECTO = 100
+
+    def validar_filas(self, filas):
+        """Valida todas las filas antes de escribir nada.
+
+        Args:
+            filas: Lista de diccionarios con los valores del formulario
+                (nombre, cuenta_contable, cantidad, valor_unitario, stock_min,
+                stock_max, serial, codigo_identificacion)
+
+        Returns:
+            tuple: (filas_validas, errores) donde errores es una lista de
+            diccionarios {'fila': n, 'nombre': ..., 'error': ...}
+        """
+        validas = []
+        errores = []
+        nombres_vistos = set()
+
+        for numero, fila in enumerate(filas, 1):
+            nombre = (fila.get('nombre') or '').strip()
+            cuenta_contable = (fila.get('cuenta_contable') or '').strip()
+
+            def error(mensaje):
+                errores.append({'fila': numero, 'nombre': nombre or f'Fila {numero}', 'error': mensaje})
+
+            if not nombre or not cuenta_contable or not fila.get('cantidad') or not fila.get('valor_unitario'):
+                error('Nombre, cuenta contable, cantidad y valor unitario son obligatorios')
+                continue
+
+            try:
+                cantidad = int(fila.get('cantidad'))
+                valor_unitario = Decimal(str(fila.get('valor_unitario')))
+                stock_min = int(fila.get('stock_min') or self.STOCK_MIN_DEFECTO)
+                stock_max = int(fila.get('stock_max') or self.STOCK_MAX_DEFECTO)
+            except (ValueError, TypeError, InvalidOperation):
+                error('Valores inválidos')
+                continue
+
+            if cantidad <= 0:
+                error('La cantidad debe ser mayor a 0')
+                continue
+            if valor_unitario <= 0:
+                error('El valor unitario debe ser mayor a 0')
+                continue
+            if stock_min < 0 or stock_max <= 0 or stock_max <= stock_min:
+                error('Los valores de stock no son válidos')
+                continue
+
+            nombre_lower = nombre.lower()
+            if nombre_lower in nombres_vistos:
+                error('No puede agregar el mismo artículo múltiples veces')
+                continue
+            nombres_vistos.add(nombre_lower)
+
+            validas.append({
+                'nombre': nombre,
+                'cuenta_contable': cuenta_contable,
+                'cantidad': cantidad,
+                'valor_unitario': valor_unitario.quantize(Decimal('0.01')),
+                'stock_min': stock_min,
+                'stock_max': stock_max,
+                'serial': (fila.get('serial') or '').strip() or None,
+                'codigo_identificacion': (fila.get('codigo_identificacion') or '').strip() or None
+            })
+
+        return validas, errores
+
+    def registrar_factura(self, filas, usuario_id, proveedor_id=None, numero_factura=None,
+                          es_donacion=False, observaciones_donacion=None):
+        """Crea todos los artículos de la factura con inserciones masivas y un único commit.
+
+        Si alguna fila es inválida no se escribe nada y se devuelven los
+        errores de todas las filas.
+
+        Returns:
+            dict: {'success': bool, 'codigos': [...], 'errores': [...], 'error': str}
+        """
+        validas, errores = self.validar_filas(filas)
+        if errores:
+            return {'success': False, 'codigos': [], 'errores': errores,
+                    'error': f'{len(errores)} fila(s) con errores'}
+        if not validas:
+            return {'success': False, 'codigos': [], 'errores': [],
+                    'error': 'Debe agregar al menos un artículo válido'}
+
+        if not es_donacion:
+            if not proveedor_id or not Proveedor.query.get(proveedor_id):
+                return {'success': False, 'codigos': [], 'errores': [],
+                        'error': 'El proveedor seleccionado no existe'}
+            if not numero_factura:
+                return {'success': False, 'codigos': [], 'errores': [],
+                        'error': 'Debe ingresar el número de factura para compras'}
+
+        ahora = datetime.now()
+        try:
+            # Códigos reservados en un solo bloque (tb_secuencia)
+            codigos = SecuenciaRepository().generar_codigos('articulo', len(validas))
+
+            db.session.execute(insert(Item), [{
+                'i_codigo': codigo,
+                'i_nombre': fila['nombre'],
+                'i_tipo': 'articulo',
+                'i_cantidad': fila['cantidad'],
+                'i_vUnitario': fila['valor_unitario'],
+                'i_vTotal': fila['cantidad'] * fila['valor_unitario'],
+                'i_serial': fila['serial'],
+                'i_codigo_identificacion': fila['codigo_identificacion']
+            } for codigo, fila in zip(codigos, validas)])
+
+            # Recuperar los IDs generados con una sola consulta por código
+            ids = dict(db.session.query(Item.i_codigo, Item.id).filter(Item.i_codigo.in_(codigos)).all())
+
+            db.session.execute(insert(Articulo), [{
+                'i_id': ids[codigo],
+                'a_c_contable': fila['cuenta_contable'],
+                'a_stockMin': fila['stock_min'],
+                'a_stockMax': fila['stock_max']
+            } for codigo, fila in zip(codigos, validas)])
+
+            entrada_id = None
+            if not es_donacion:
+                entrada = Entrada(
+                    e_fecha=ahora.date(),
+                    e_hora=ahora.time(),
+                    e_descripcion=f"Ingreso de {len(validas)} artículo(s) - Factura: {numero_factura}"[:200],
+                    e_numFactura=numero_factura[:20],
+                    p_id=proveedor_id
+                )
+                db.session.add(entrada)
+                db.session.flush()
+                entrada_id = entrada.id
+
+            movimientos = []
+            resumenes = []
+            for codigo, fila in zip(codigos, validas):
+                if es_donacion:
+                    observaciones = f"Stock inicial - DONACIÓN - {fila['cuenta_contable']}"
+                    if observaciones_donacion:
+                        observaciones += f" - {observaciones_donacion}"
+                else:
+                    observaciones = f"Stock inicial - Factura: {numero_factura} - {fila['cuenta_contable']}"
+
+                valor_total = fila['cantidad'] * fila['valor_unitario']
+                movimientos.append({
+                    'm_fecha': ahora,
+                    'm_tipo': 'entrada',
+                    'm_cantidad': fila['cantidad'],
+                    'm_valorUnitario': fila['valor_unitario'],
+                    'm_valorTotal': valor_total,
+                    'm_observaciones': observaciones[:200],
+                    'm_stock_anterior': 0,
+                    'm_stock_actual': fila['cantidad'],
+                    'm_valor_anterior': Decimal('0'),
+                    'm_valor_actual': fila['valor_unitario'],
+                    'i_id': ids[codigo],
+                    'e_id': entrada_id,
+                    'u_id': usuario_id
+                })
+                # Items nuevos: su fila de resumen mensual todavía no existe
+                resumenes.append({
+                    'i_id': ids[codigo],
+                    'r_tipo': 'entrada',
+                    'r_anio': ahora.year,
+                    'r_mes': ahora.month,
+                    'r_cantidad': fila['cantidad'],
+                    'r_valor_total': valor_total,
+                    'r_movimientos': 1
+                })
+
+            db.session.execute(insert(MovimientoDetalle), movimientos)
+            db.session.execute(insert(ResumenMovimiento), resumenes)
+
+            # Las inserciones masivas no pasan por el flush del ORM
+            marcar_cambios_dashboard(db.session)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'codigos': [], 'errores': [], 'error': str(e)}
+
+        return {'success': True, 'codigos': codigos, 'errores': [], 'error': None}
@@ -1,4 +1,5 @@
 from app.database.repositories.instrumentos import InstrumentoRepository
+from app.database.repositories.secuencias import SecuenciaRepository
 from app.database.repositories.movimientos import MovimientoRepository
 from app.database.models import Item
 from app.database import db
@@ -25,30 +26,8 @@ class InstrumentoService:
         return self.repo.get_by_status(estado)
 
     def _generar_codigo_instrumento(self):
-        """Genera un código automático para instrumento"""
-        # Buscar todos los códigos de instrumentos existentes
-        items = db.session.query(Item).filter(
-            Item.i_tipo == 'instrumento',
-            Item.i_codigo.like('INS%')
-        ).all()
-        
-        # Extraer números de los códigos existentes
-        numeros_existentes = []
-        for item in items:
-            try:
-                numero_str = item.i_codigo[3:]  # Quitar 'INS'
-                numero = int(numero_str)
-                numeros_existentes.append(numero)
-            except (ValueError, IndexError):
-                continue
-        
-        # Encontrar el siguiente número disponible
-        if numeros_existentes:
-            numero = max(numeros_existentes) + 1
-        else:
-            numero = 1
-        
-        return f"INS{numero:03d}"
+        """Reserva el siguiente código de instrumento en tb_secuencia (atómico entre workers)"""
+        return SecuenciaRepository().generar_codigo('instrumento')
 
     def crear_instrumento(self, nombre, marca, modelo, serie, estado, valor_unitario=0):
         """Crea un nuevo instrumento con código automático"""
@@ -126,25 +105,22 @@ class InstrumentoService:
             resultado = self.repo.update(instrumento_id, i_estado=nuevo_estado)
             
             # Registrar el cambio de estado en el historial de movimientos
-            from app.database.models import Usuario, MovimientoDetalle
+            from app.database.models import Usuario
             from app.database import db
-            from datetime import date
+            from datetime import datetime
             
             # Obtener el primer usuario disponible (en una implementación real vendría de la sesión)
             usuario = Usuario.query.first()
-            if usuario:
-                movimiento = MovimientoDetalle(
-                    m_fecha=date.today(),
-                    m_tipo='cambio_estado',
-                    m_cantidad=0,  # Los cambios de estado no afectan cantidad
-                    m_valorUnitario=0.0,
-                    m_valorTotal=0.0,
-                    m_observaciones=f'Estado cambiado de "{estado_anterior}" a "{nuevo_estado}"',
-                    i_id=instrumento.i_id,
-                    u_id=usuario.id
+            item = Item.query.get(instrumento.i_id)
+            if usuario and item:
+                stock_anterior, valor_anterior = self.movimiento_repo.capturar_estado(item)
+                self.movimiento_repo.nuevo_movimiento(
+                    item, 'cambio_estado', 0, 0, usuario.id,  # Los cambios de estado no afectan cantidad
+                    stock_anterior, valor_anterior,
+                    observaciones=f'Estado cambiado de "{estado_anterior}" a "{nuevo_estado}"',
+                    fecha=datetime.now(),
+                    valor_total=0
                 )
-                
-                db.session.add(movimiento)
                 db.session.commit()
             
             return resultado
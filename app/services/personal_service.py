@@ -1,4 +1,5 @@
 from app.database.repositories.personal import PersonalRepository
+from app.database.repositories.secuencias import SecuenciaRepository
 from app.database.models import Persona
 from app.database import db
 
@@ -106,23 +107,8 @@ class PersonalService:
         return True
 
     def _generar_codigo_persona(self):
-        """Genera un código único para la persona (PER001, PER002, etc.)"""
-        # Obtener el último código
-        ultima_persona = Persona.query.filter(
-            Persona.pe_codigo.like('PER%')
-        ).order_by(Persona.pe_codigo.desc()).first()
-        
-        if ultima_persona:
-            # Extraer el número del código (PER001 -> 001)
-            try:
-                ultimo_numero = int(ultima_persona.pe_codigo[3:])
-                nuevo_numero = ultimo_numero + 1
-            except (ValueError, IndexError):
-                nuevo_numero = 1
-        else:
-            nuevo_numero = 1
-        
-        return f"PER{nuevo_numero:03d}"
+        """Reserva el siguiente código de persona en tb_secuencia (atómico entre workers)"""
+        return SecuenciaRepository().generar_codigo('persona')
 
     def obtener_cargos_disponibles(self):
         """Retorna la lista de cargos disponibles"""
@@ -1,4 +1,5 @@
 from app.database.repositories.proveedores import ProveedorRepository
+from app.database.repositories.secuencias import SecuenciaRepository
 from app.database.models import Proveedor
 from app.database import db
 
@@ -26,29 +27,8 @@ class ProveedorService:
         return self.repo.search_by_name(nombre)
 
     def _generar_codigo_proveedor(self):
-        """Genera un código automático para proveedor"""
-        # Buscar todos los códigos de proveedores existentes
-        proveedores = db.session.query(Proveedor).filter(
-            Proveedor.p_codigo.like('PROV%')
-        ).all()
-        
-        # Extraer números de los códigos existentes
-        numeros_existentes = []
-        for proveedor in proveedores:
-            try:
-                numero_str = proveedor.p_codigo[4:]  # Quitar 'PROV'
-                numero = int(numero_str)
-                numeros_existentes.append(numero)
-            except (ValueError, IndexError):
-                continue
-        
-        # Encontrar el siguiente número disponible
-        if numeros_existentes:
-            numero = max(numeros_existentes) + 1
-        else:
-            numero = 1
-        
-        return f"PROV{numero:03d}"
+        """Reserva el siguiente código de proveedor en tb_secuencia (atómico entre workers)"""
+        return SecuenciaRepository().generar_codigo('proveedor')
 
     def crear_proveedor(self, razon_social, ci_ruc, direccion=None, telefono=None, correo=None):
         """Crea un nuevo proveedor con código automático"""
@@ -0,0 +1,288 @@
+"""
+Caché ligera de dos niveles para datos de lectura frecuente (dashboard).
+
+- Nivel local: diccionario en memoria del proceso con TTL.
+- Nivel compartido (opcional): archivo SQLite visible para todos los
+  workers de gunicorn, sin servicios externos.
+
+La invalidación se hace por "generación": cada escritura relevante
+incrementa un contador en el nivel compartido y las entradas locales de
+una generación anterior dejan de leerse y se purgan al vencer su TTL.
+"""
+
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Modelos cuyas escrituras invalidan las estadísticas del dashboard
+MODELOS_DASHBOARD = ('Item', 'Articulo', 'Instrumento', 'Proveedor')
+
+# Modelos cuyas escrituras cambian el contenido de los reportes exportados
+MODELOS_EXPORTACIONES = (
+    'Item', 'Articulo', 'Instrumento', 'Proveedor', 'Persona', 'Entrada',
+    'Consumo', 'MovimientoDetalle', 'ResumenMovimiento'
+)
+
+
+class CacheLocal:
+    """Caché en memoria del proceso con expiración por TTL y tamaño acotado.
+
+    Las claves de generaciones anteriores no se vuelven a leer: al llegar a
+    MAXIMO_ENTRADAS se descartan las vencidas y, si no alcanza, la cuarta
+    parte más próxima a vencer.
+    """
+
+    MAXIMO_ENTRADAS = 1000
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] < time.monotonic():
+                del self._datos[clave]
+                return None
+            return entrada[1]
+
+    def guardar(self, clave, valor, ttl):
+        ahora = time.monotonic()
+        with self._lock:
+            if len(self._datos) >= self.MAXIMO_ENTRADAS and clave not in self._datos:
+                self._purgar(ahora)
+            self._datos[clave] = (ahora + ttl, valor)
+
+    def _purgar(self, ahora):
+        vencidas = [clave for clave, (expira, _) in self._datos.items() if expira < ahora]
+        for clave in vencidas:
+            del self._datos[clave]
+        if len(self._datos) >= self.MAXIMO_ENTRADAS:
+            proximas = heapq.nsmallest(
+                self.MAXIMO_ENTRADAS // 4, self._datos, key=lambda clave: self._datos[clave][0]
+            )
+            for clave in proximas:
+                del self._datos[clave]
+
+    def __len__(self):
+        return len(self._datos)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+class CacheCompartido:
+    """Caché compartida entre procesos respaldada por un archivo SQLite"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = self._conexion()
+        conexion.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)'
+        )
+        conexion.execute(
+            'CREATE TABLE IF NOT EXISTS generacion ('
+            'espacio TEXT PRIMARY KEY, valor INTEGER NOT NULL)'
+        )
+
+    def _conexion(self):
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)"""
+        # Se reabre tras un fork (gunicorn con preload_app) comparando el PID
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    def obtener_generacion(self, espacio):
+        fila = self._conexion().execute(
+            'SELECT valor FROM generacion WHERE espacio = ?', (espacio,)
+        ).fetchone()
+        return fila[0] if fila else 0
+
+    def incrementar_generacion(self, espacio):
+        conexion = self._conexion()
+        conexion.execute(
+            'INSERT INTO generacion (espacio, valor) VALUES (?, 1) '
+            'ON CONFLICT(espacio) DO UPDATE SET valor = valor + 1',
+            (espacio,)
+        )
+        conexion.execute('DELETE FROM cache WHERE clave LIKE ?', (f'{espacio}:%',))
+
+    def obtener(self, clave):
+        fila = self._conexion().execute(
+            'SELECT valor, expira FROM cache WHERE clave = ?', (clave,)
+        ).fetchone()
+        if fila is None or fila[1] < time.time():
+            return None
+        return json.loads(fila[0])
+
+    def guardar(self, clave, valor, ttl):
+        self._conexion().execute(
+            'INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)',
+            (clave, json.dumps(valor, default=str), time.time() + ttl)
+        )
+
+
+class Cache:
+    """Fachada de la caché de dos niveles"""
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.local = CacheLocal()
+        self.compartido = None
+        self._generaciones_locales = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CACHE_TTL_SECONDS', 60)
+        ruta = app.config.get('CACHE_SHARED_PATH')
+        if ruta:
+            try:
+                self.compartido = CacheCompartido(ruta)
+            except sqlite3.Error as e:
+                logger.warning(f"Caché compartida deshabilitada ({ruta}): {e}")
+                self.compartido = None
+        app.extensions['cache'] = self
+        _registrar_invalidacion(self)
+
+    def _generacion(self, espacio):
+        if self.compartido is None:
+            return self._generaciones_locales.get(espacio, 0)
+        try:
+            return self.compartido.obtener_generacion(espacio)
+        except sqlite3.Error as e:
+            logger.warning(f"Error leyendo caché compartida: {e}")
+            return None
+
+    def version(self, espacio):
+        """Versión de los datos de un espacio compartida por todos los procesos.
+
+        Es un contador monótono que crece con cada invalidación. Devuelve
+        None si no hay nivel compartido: un contador local no es comparable
+        entre workers y no sirve como versión.
+        """
+        if self.compartido is None:
+            return None
+        return self._generacion(espacio)
+
+    def obtener_o_calcular(self, espacio, clave, calcular, ttl=None):
+        """Devuelve el valor cacheado o lo calcula y lo guarda en ambos niveles"""
+        ttl = ttl or self.ttl
+        generacion = self._generacion(espacio)
+        if generacion is None:
+            return calcular()
+
+        # La generación forma parte de la clave: un valor calculado justo antes
+        # de una invalidación nunca se sirve en la generación siguiente
+        clave_completa = f'{espacio}:{generacion}:{clave}'
+        valor = self.local.obtener(clave_completa)
+        if valor is not None:
+            return valor
+
+        valor = None
+        if self.compartido is not None:
+            try:
+                valor = self.compartido.obtener(clave_completa)
+            except sqlite3.Error:
+                valor = None
+
+        if valor is None:
+            valor = calcular()
+            if self.compartido is not None:
+                try:
+                    self.compartido.guardar(clave_completa, valor, ttl)
+                except sqlite3.Error as e:
+                    logger.warning(f"Error escribiendo caché compartida: {e}")
+
+        self.local.guardar(clave_completa, valor, ttl)
+        return valor
+
+    def invalidar(self, espacio):
+        """Invalida todas las entradas de un espacio en todos los procesos"""
+        self._generaciones_locales[espacio] = self._generaciones_locales.get(espacio, 0) + 1
+        if self.compartido is not None:
+            try:
+                self.compartido.incrementar_generacion(espacio)
+            except sqlite3.Error as e:
+                logger.warning(f"Error invalidando caché compartida: {e}")
+                self.local.limpiar()
+
+
+cache = Cache()
+
+ESPACIO_DASHBOARD = 'dashboard'
+ESPACIO_EXPORTACIONES = 'exportaciones'
+# Conteos de los listados paginados: solo expiran por TTL (se aceptan aproximados)
+ESPACIO_LISTADOS = 'listados'
+
+
+def marcar_cambios_dashboard(session):
+    """Marca la sesión para invalidar el dashboard al confirmar la transacción.
+
+    Necesario cuando se modifica stock con sentencias UPDATE directas que no
+    pasan por el flush del ORM. También invalida los reportes exportados.
+    """
+    _marcar(session, ESPACIO_DASHBOARD, ESPACIO_EXPORTACIONES)
+
+
+def marcar_cambios_exportaciones(session):
+    """Marca la sesión para invalidar los reportes exportados al confirmar (escrituras masivas)"""
+    _marcar(session, ESPACIO_EXPORTACIONES)
+
+
+def invalidar_datos():
+    """Invalida todos los espacios derivados de la base (tras restaurar o importar datos)"""
+    cache.invalidar(ESPACIO_DASHBOARD)
+    cache.invalidar(ESPACIO_EXPORTACIONES)
+    cache.invalidar(ESPACIO_LISTADOS)
+
+
+def _marcar(session, *espacios):
+    session.info.setdefault('invalidar', set()).update(espacios)
+
+
+def _registrar_invalidacion(instancia):
+    """Conecta los eventos de sesión que invalidan la caché tras cada commit"""
+    if getattr(_registrar_invalidacion, 'registrado', False):
+        return
+    _registrar_invalidacion.registrado = True
+
+    @event.listens_for(Session, 'after_flush')
+    def _detectar_cambios(session, flush_context):
+        for objeto in list(session.new) + list(session.dirty) + list(session.deleted):
+            nombre = type(objeto).__name__
+            if nombre in MODELOS_DASHBOARD:
+                _marcar(session, ESPACIO_DASHBOARD)
+            if nombre in MODELOS_EXPORTACIONES:
+                _marcar(session, ESPACIO_EXPORTACIONES)
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidar_tras_commit(session):
+        for espacio in session.info.pop('invalidar', ()):
+            instancia.invalidar(espacio)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _descartar_tras_rollback(session):
+        session.info.pop('invalidar', None)
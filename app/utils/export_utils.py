@@ -1,205 +1,386 @@
 """
 Utilidades para exportación de reportes con cabeceras institucionales estandarizadas
 """
-from datetime import datetime
+import csv
+import io
+import itertools
+import tempfile
+import zlib
+from datetime import datetime, time
+from flask import Response, send_file, stream_with_context
 from flask_login import current_user
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
-from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import Paragraph, Spacer, Table, LongTable, TableStyle
 from reportlab.lib.units import inch
 
-def crear_cabecera_excel(ws, titulo_reporte, current_row=1):
-    """
-    Crea cabecera institucional estandarizada para Excel
-    
-    Args:
-        ws: Worksheet de openpyxl
-        titulo_reporte: Título específico del reporte
-        current_row: Fila inicial (por defecto 1)
-    
-    Returns:
-        int: Siguiente fila disponible después de la cabecera
-    """
-    # Estilos
-    title_font = Font(name='Calibri', size=16, bold=True, color="2E5984")
-    subtitle_font = Font(name='Calibri', size=12, bold=True, color="4472C4")
-    info_font = Font(name='Calibri', size=10, bold=True)
-    title_alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Encabezado principal
-    ws[f'A{current_row}'] = "CONSERVATORIO NACIONAL DE MÚSICA"
-    ws[f'A{current_row}'].font = title_font
-    ws[f'A{current_row}'].alignment = title_alignment
-    ws.merge_cells(f'A{current_row}:H{current_row}')
-    current_row += 1
-    
-    ws[f'A{current_row}'] = "Sistema de Gestión de Inventario"
-    ws[f'A{current_row}'].font = subtitle_font
-    ws[f'A{current_row}'].alignment = title_alignment
-    ws.merge_cells(f'A{current_row}:H{current_row}')
-    current_row += 1
-    
-    ws[f'A{current_row}'] = "Cochapata E12-56, Quito - Ecuador"
-    ws[f'A{current_row}'].font = Font(name='Calibri', size=10, color="4472C4")
-    ws[f'A{current_row}'].alignment = title_alignment
-    ws.merge_cells(f'A{current_row}:H{current_row}')
-    current_row += 3
-    
-    # Información del reporte
-    ws[f'A{current_row}'] = "INFORMACIÓN DEL REPORTE"
-    ws[f'A{current_row}'].font = subtitle_font
-    ws.merge_cells(f'A{current_row}:H{current_row}')
-    current_row += 1
-    
-    info_data = [
-        ["Tipo de Reporte:", titulo_reporte],
-        ["Generado por:", current_user.username if current_user.is_authenticated else 'Sistema'],
-        ["Fecha:", datetime.now().strftime('%d/%m/%Y %H:%M:%S')]
+def _estilos_con_nombre():
+    """Estilos institucionales como NamedStyle (una instancia por libro)"""
+    borde = Border(left=Side(style='thin'), right=Side(style='thin'),
+                   top=Side(style='thin'), bottom=Side(style='thin'))
+    centrado = Alignment(horizontal="center", vertical="center")
+    return [
+        NamedStyle(name='cnm_titulo', font=Font(name='Calibri', size=16, bold=True, color="2E5984"),
+                   alignment=centrado),
+        NamedStyle(name='cnm_subtitulo', font=Font(name='Calibri', size=12, bold=True, color="4472C4"),
+                   alignment=centrado),
+        NamedStyle(name='cnm_direccion', font=Font(name='Calibri', size=10, color="4472C4"),
+                   alignment=centrado),
+        NamedStyle(name='cnm_info_titulo', font=Font(name='Calibri', size=12, bold=True, color="4472C4")),
+        NamedStyle(name='cnm_info', font=Font(name='Calibri', size=10, bold=True)),
+        NamedStyle(name='cnm_seccion', font=Font(name='Calibri', size=14, bold=True, color="2E5984")),
+        NamedStyle(name='cnm_subseccion', font=Font(name='Calibri', size=12, bold=True, color="2E5984")),
+        NamedStyle(name='cnm_encabezado', font=Font(name='Calibri', size=12, bold=True, color="FFFFFF"),
+                   fill=PatternFill(start_color="2E5984", end_color="2E5984", fill_type="solid"),
+                   alignment=centrado, border=borde),
+        NamedStyle(name='cnm_dato', font=Font(name='Calibri', size=10), alignment=centrado, border=borde),
+        NamedStyle(name='cnm_dato_alterno', font=Font(name='Calibri', size=10), alignment=centrado, border=borde,
+                   fill=PatternFill(start_color="F8F9FA", end_color="F8F9FA", fill_type="solid")),
     ]
-    
-    for label, value in info_data:
-        ws[f'A{current_row}'] = label
-        ws[f'A{current_row}'].font = info_font
-        ws[f'B{current_row}'] = value
-        current_row += 1
-    
-    current_row += 2
-    return current_row
-
-def crear_estilos_excel():
-    """Crear estilos estandarizados para Excel"""
-    return {
-        'header_font': Font(name='Calibri', size=12, bold=True, color="FFFFFF"),
-        'header_fill': PatternFill(start_color="2E5984", end_color="2E5984", fill_type="solid"),
-        'header_alignment': Alignment(horizontal="center", vertical="center"),
-        'header_border': Border(left=Side(style='thin'), right=Side(style='thin'), 
-                               top=Side(style='thin'), bottom=Side(style='thin')),
-        'data_font': Font(name='Calibri', size=10),
-        'data_alignment': Alignment(horizontal="center", vertical="center"),
-        'data_border': Border(left=Side(style='thin'), right=Side(style='thin'), 
-                             top=Side(style='thin'), bottom=Side(style='thin'))
-    }
-
-def crear_tabla_detallada_excel(ws, headers, data, start_row, titulo_seccion=None):
-    """
-    Crear tabla detallada con formato profesional en Excel
-    
-    Args:
-        ws: Worksheet de openpyxl
-        headers: Lista de encabezados de columna
-        data: Lista de listas con los datos
-        start_row: Fila inicial
-        titulo_seccion: Título opcional de la sección
-    
-    Returns:
-        int: Siguiente fila disponible
-    """
-    estilos = crear_estilos_excel()
-    current_row = start_row
-    
-    # Agregar título de sección si se proporciona
-    if titulo_seccion:
-        ws[f'A{current_row}'] = titulo_seccion
-        ws[f'A{current_row}'].font = Font(name='Calibri', size=14, bold=True, color="2E5984")
-        ws.merge_cells(f'A{current_row}:{chr(64 + len(headers))}{current_row}')
-        current_row += 2
-    
-    # Crear encabezados
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=current_row, column=col, value=header)
-        cell.font = estilos['header_font']
-        cell.fill = estilos['header_fill']
-        cell.alignment = estilos['header_alignment']
-        cell.border = estilos['header_border']
-    current_row += 1
-    
-    # Agregar datos con formato alternado
-    for row_idx, row_data in enumerate(data):
-        for col, value in enumerate(row_data, 1):
-            cell = ws.cell(row=current_row, column=col, value=value)
-            cell.font = estilos['data_font']
-            cell.border = estilos['data_border']
-            cell.alignment = estilos['data_alignment']
-            
-            # Fondo alternado para mejor legibilidad
-            if row_idx % 2 == 0:
-                cell.fill = PatternFill(start_color="F8F9FA", end_color="F8F9FA", fill_type="solid")
-        current_row += 1
-    
-    current_row += 2  # Espacio después de la tabla
-    return current_row
 
-def crear_cabecera_pdf(titulo_reporte):
+
+class ExcelStreaming:
+    """Libro Excel de una sola hoja escrito en modo write-only.
+
+    Las filas se escriben en orden y se vuelcan al archivo temporal de
+    openpyxl sin quedar en memoria. Los estilos son NamedStyle compartidos
+    por todas las celdas y el ancho de cada columna se calcula con las
+    primeras filas (muestra) antes de volcarlas, sin releer la hoja.
     """
-    Crea cabecera institucional estandarizada para PDF
-    
+
+    MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    ANCHO_DEFECTO = 15
+    ANCHO_MAXIMO = 50
+    FILAS_MUESTRA = 500
+    # Hasta este tamaño el archivo generado se mantiene en memoria; luego pasa a disco
+    TAMANO_SPOOL = 8 * 1024 * 1024
+
+    def __init__(self, titulo_hoja, horizontal=True, usuario=None):
+        self.wb = Workbook(write_only=True)
+        for estilo in _estilos_con_nombre():
+            self.wb.add_named_style(estilo)
+        self.ws = self.wb.create_sheet(title=titulo_hoja[:31])
+        if horizontal:
+            self.ws.page_setup.orientation = 'landscape'
+        self.usuario = usuario
+        self._estilos = {}
+        self.fila_actual = 0
+        self._pendientes = []
+        self._anchos = {}
+        self._volcado = False
+
+    def _celda(self, valor, estilo):
+        if not estilo:
+            return WriteOnlyCell(self.ws, value=valor)
+        # Asignar el NamedStyle por nombre en cada celda es costoso: se resuelve
+        # una vez y las celdas siguientes reciben el mismo arreglo de estilo
+        arreglo = self._estilos.get(estilo)
+        if arreglo is None:
+            plantilla = WriteOnlyCell(self.ws)
+            plantilla.style = estilo
+            arreglo = self._estilos[estilo] = plantilla._style
+        return Cell(self.ws, row=1, column=1, value=valor, style_array=arreglo)
+
+    def fila(self, valores, estilo=None, estilos=None, medir=True):
+        """Escribe una fila; estilos permite un estilo distinto por columna"""
+        self.fila_actual += 1
+        if estilos is None:
+            estilos = [estilo] * len(valores)
+        celdas = [self._celda(valor, est) for valor, est in zip(valores, estilos)]
+
+        if self._volcado:
+            self.ws.append(celdas)
+            return self.fila_actual
+
+        if medir:
+            for columna, valor in enumerate(valores, 1):
+                if valor is not None:
+                    largo = len(str(valor))
+                    if largo > self._anchos.get(columna, 0):
+                        self._anchos[columna] = largo
+        self._pendientes.append(celdas)
+        if len(self._pendientes) >= self.FILAS_MUESTRA:
+            self._volcar()
+        return self.fila_actual
+
+    def _volcar(self):
+        """Fija los anchos calculados con la muestra y escribe las filas pendientes"""
+        if self._volcado:
+            return
+        for columna, largo in self._anchos.items():
+            ancho = min(largo + 2, self.ANCHO_MAXIMO) if largo > 0 else self.ANCHO_DEFECTO
+            self.ws.column_dimensions[get_column_letter(columna)].width = ancho
+        for celdas in self._pendientes:
+            self.ws.append(celdas)
+        self._pendientes = []
+        self._volcado = True
+
+    def espacio(self, filas=1):
+        for _ in range(filas):
+            self.fila([], medir=False)
+
+    def titulo(self, texto, columnas=8, estilo='cnm_seccion'):
+        """Título combinado sobre varias columnas (no cuenta para el ancho)"""
+        fila = self.fila([texto], estilo=estilo, medir=False)
+        if columnas > 1:
+            self.ws.merged_cells.add(f'A{fila}:{get_column_letter(columnas)}{fila}')
+        return fila
+
+    def cabecera(self, titulo_reporte, info_adicional=None):
+        """Cabecera institucional estandarizada"""
+        self.titulo("CONSERVATORIO NACIONAL DE MÚSICA", estilo='cnm_titulo')
+        self.titulo("Sistema de Gestión de Inventario", estilo='cnm_subtitulo')
+        self.titulo("Cochapata E12-56, Quito - Ecuador", estilo='cnm_direccion')
+        self.espacio(2)
+        self.titulo("INFORMACIÓN DEL REPORTE", estilo='cnm_info_titulo')
+
+        usuario = self.usuario
+        if usuario is None:
+            usuario = current_user.username if current_user.is_authenticated else 'Sistema'
+        info = [
+            ("Tipo de Reporte:", titulo_reporte),
+            ("Generado por:", usuario),
+            ("Fecha:", datetime.now().strftime('%d/%m/%Y %H:%M:%S'))
+        ] + list(info_adicional or [])
+        for etiqueta, valor in info:
+            self.fila([etiqueta, valor], estilos=['cnm_info', None])
+        self.espacio(2)
+
+    def tabla(self, headers, filas, titulo_seccion=None):
+        """Escribe una tabla con encabezado y filas alternadas.
+
+        Args:
+            headers: Lista de encabezados de columna
+            filas: Iterable (puede ser un generador) con las filas de datos
+            titulo_seccion: Título opcional de la sección
+
+        Returns:
+            int: Número de filas de datos escritas
+        """
+        if titulo_seccion:
+            self.titulo(titulo_seccion, columnas=len(headers))
+            self.espacio()
+
+        self.fila(headers, estilo='cnm_encabezado')
+        total = 0
+        for total, valores in enumerate(filas, 1):
+            self.fila(valores, estilo='cnm_dato_alterno' if total % 2 else 'cnm_dato')
+        self.espacio(2)
+        return total
+
+    def guardar(self, destino):
+        """Guarda el libro en una ruta o archivo abierto"""
+        self._volcar()
+        self.wb.save(destino)
+
+    def respuesta(self, nombre_archivo):
+        """Guarda el libro en un archivo temporal y lo envía al cliente por partes"""
+        archivo = tempfile.SpooledTemporaryFile(max_size=self.TAMANO_SPOOL)
+        self.guardar(archivo)
+        archivo.seek(0)
+        return send_file(archivo, mimetype=self.MIME, as_attachment=True,
+                         download_name=nombre_archivo)
+
+# Formatos de exportación en texto plano (?export=csv / ?export=csv.gz)
+FORMATOS_CSV = ('csv', 'csv.gz')
+
+# Filas acumuladas antes de enviar cada bloque de la respuesta
+FILAS_BLOQUE_CSV = 500
+
+
+def _valor_csv(valor):
+    """Fechas y horas sin microsegundos; el resto se escribe tal cual"""
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, time):
+        return valor.strftime('%H:%M:%S')
+    return valor
+
+
+def _bloques_csv(headers, filas):
+    """Genera el CSV en bloques de bytes UTF-8 (con BOM para que Excel detecte la codificación)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    escritor.writerow(headers)
+    for numero, valores in enumerate(filas, 1):
+        escritor.writerow([_valor_csv(valor) for valor in valores])
+        if numero % FILAS_BLOQUE_CSV == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _comprimir_gzip(bloques):
+    """Comprime un flujo de bloques en formato gzip sin acumularlo en memoria"""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: contenedor gzip
+    for bloque in bloques:
+        datos = compresor.compress(bloque)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def respuesta_csv(nombre_archivo, headers, filas, formato='csv'):
+    """Respuesta CSV transmitida por partes (chunked) a partir de un generador de filas.
+
+    El generador se consume mientras se envía la respuesta, dentro del
+    contexto de la petición, por lo que puede leer de la base de datos con
+    cursor del lado del servidor.
+
     Args:
-        titulo_reporte: Título específico del reporte
-    
-    Returns:
-        list: Lista de elementos para agregar al PDF
+        nombre_archivo: Nombre sin extensión del archivo descargado
+        headers: Encabezados de columna
+        filas: Iterable de filas (listas o tuplas de valores)
+        formato: 'csv' o 'csv.gz'
     """
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Estilos personalizados
-    title_style = ParagraphStyle(
-        'TituloInstitucional',
-        parent=styles['Title'],
+    bloques = _bloques_csv(headers, filas)
+    mimetype = 'text/csv'
+    if formato == 'csv.gz':
+        bloques = _comprimir_gzip(bloques)
+        mimetype = 'application/gzip'
+
+    response = Response(stream_with_context(bloques), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={nombre_archivo}.{formato}'
+    return response
+
+def _crear_hoja_estilos_pdf():
+    """Hoja de estilos base más los estilos institucionales"""
+    estilos = getSampleStyleSheet()
+    estilos.add(ParagraphStyle(
+        name='TituloInstitucional',
+        parent=estilos['Title'],
         fontSize=18,
         fontName='Helvetica-Bold',
         textColor=colors.HexColor('#2E5984'),
         alignment=1,
         spaceAfter=10
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'SubtituloInstitucional',
-        parent=styles['Normal'],
+    ))
+    estilos.add(ParagraphStyle(
+        name='SubtituloInstitucional',
+        parent=estilos['Normal'],
         fontSize=12,
         fontName='Helvetica',
         textColor=colors.HexColor('#4472C4'),
         alignment=1,
         spaceAfter=20
-    )
-    
-    # Encabezado institucional
-    elements.append(Paragraph("CONSERVATORIO NACIONAL DE MÚSICA", title_style))
-    elements.append(Paragraph("Sistema de Gestión de Inventario", subtitle_style))
-    elements.append(Paragraph("Cochapata E12-56, Quito - Ecuador", subtitle_style))
-    elements.append(Spacer(1, 20))
-    
-    # Información del reporte
-    info_style = ParagraphStyle(
-        'TituloSeccion',
-        parent=styles['Heading2'],
+    ))
+    estilos.add(ParagraphStyle(
+        name='TituloSeccion',
+        parent=estilos['Heading2'],
         fontSize=14,
         fontName='Helvetica-Bold',
         textColor=colors.HexColor('#2E5984'),
         spaceBefore=20,
         spaceAfter=12
-    )
+    ))
+    estilos.add(ParagraphStyle(
+        name='NotaFinal',
+        parent=estilos['Normal'],
+        fontSize=8,
+        fontName='Helvetica-Oblique',
+        textColor=colors.HexColor('#666666'),
+        alignment=1
+    ))
+    return estilos
+
+
+# Registro de estilos PDF compartido por todos los reportes. Se construye una
+# sola vez al importar el módulo: los estilos no deben modificarse en sitio
+ESTILOS_PDF = _crear_hoja_estilos_pdf()
+
+# Tabla de información de la cabecera (etiqueta / valor)
+ESTILO_TABLA_INFO_PDF = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F8F9FA'))
+])
+
+# Tabla simple con encabezado (aplicar_estilo_tabla_pdf)
+ESTILO_TABLA_PDF = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E5984')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+# Tabla detallada con filas alternadas (crear_tabla_detallada_pdf)
+ESTILO_TABLA_DETALLADA_PDF = TableStyle([
+    # Encabezado
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E5984')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    
+    # Datos con fondo alternado
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    
+    # Filas alternadas para mejor legibilidad
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F9FA')]),
+])
+
+# Filas de datos por bloque en tablas PDF largas. Cada bloque es una LongTable
+# independiente: al partirla entre páginas reportlab solo recalcula las filas
+# del bloque y no las de toda la tabla restante
+FILAS_BLOQUE_PDF = 500
+
+
+def crear_cabecera_pdf(titulo_reporte, usuario=None):
+    """
+    Crea cabecera institucional estandarizada para PDF
+    
+    Args:
+        titulo_reporte: Título específico del reporte
+        usuario: Nombre del usuario que genera el reporte (por defecto el
+            usuario de la sesión; necesario fuera de una petición)
+    
+    Returns:
+        list: Lista de elementos para agregar al PDF
+    """
+    elements = []
     
-    elements.append(Paragraph("INFORMACIÓN DEL REPORTE", info_style))
+    # Encabezado institucional
+    elements.append(Paragraph("CONSERVATORIO NACIONAL DE MÚSICA", ESTILOS_PDF['TituloInstitucional']))
+    elements.append(Paragraph("Sistema de Gestión de Inventario", ESTILOS_PDF['SubtituloInstitucional']))
+    elements.append(Paragraph("Cochapata E12-56, Quito - Ecuador", ESTILOS_PDF['SubtituloInstitucional']))
+    elements.append(Spacer(1, 20))
+    
+    # Información del reporte
+    elements.append(Paragraph("INFORMACIÓN DEL REPORTE", ESTILOS_PDF['TituloSeccion']))
     
     # Tabla de información
+    if usuario is None:
+        usuario = current_user.username if current_user.is_authenticated else 'Sistema'
     info_data = [
         ['Tipo de Reporte:', titulo_reporte],
-        ['Generado por:', current_user.username if current_user.is_authenticated else 'Sistema'],
+        ['Generado por:', usuario],
         ['Fecha de Generación:', datetime.now().strftime('%d/%m/%Y %H:%M:%S')]
     ]
     
     info_table = Table(info_data, colWidths=[2*inch, 3*inch])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F8F9FA'))
-    ]))
+    info_table.setStyle(ESTILO_TABLA_INFO_PDF)
     
     elements.append(info_table)
     elements.append(Spacer(1, 20))
@@ -207,132 +388,137 @@ def crear_cabecera_pdf(titulo_reporte):
     return elements
 
 def crear_estilos_pdf():
-    """Crear estilos estandarizados para PDF"""
-    styles = getSampleStyleSheet()
-    
-    # Estilo para títulos de sección
-    styles.add(ParagraphStyle(
-        name='TituloSeccion',
-        parent=styles['Heading2'],
-        fontSize=14,
-        fontName='Helvetica-Bold',
-        textColor=colors.HexColor('#2E5984'),
-        spaceBefore=20,
-        spaceAfter=12
-    ))
-    
-    return styles
+    """Devuelve el registro compartido de estilos PDF (no modificar los estilos)"""
+    return ESTILOS_PDF
 
 def aplicar_estilo_tabla_pdf(table):
     """Aplicar estilo estandarizado a tablas PDF"""
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E5984')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
+    table.setStyle(ESTILO_TABLA_PDF)
     return table
 
-def ajustar_columnas_excel(ws):
-    """Ajustar automáticamente el ancho de columnas en Excel"""
-    from openpyxl.cell.cell import MergedCell
-    
-    for column in ws.columns:
-        max_length = 0
-        column_letter = None
-        
-        for cell in column:
-            # Saltar celdas combinadas
-            if isinstance(cell, MergedCell):
-                continue
-                
-            # Obtener la letra de la columna de la primera celda válida
-            if column_letter is None:
-                column_letter = cell.column_letter
-            
-            try:
-                if cell.value and len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except Exception:
-                pass
-        
-        # Solo ajustar si encontramos una columna válida
-        if column_letter:
-            adjusted_width = min(max_length + 2, 50) if max_length > 0 else 15
-            ws.column_dimensions[column_letter].width = adjusted_width
-
-def crear_tabla_detallada_pdf(headers, data, titulo_seccion=None, col_widths=None):
+def iterar_tabla_pdf(headers, filas, col_widths, estilo=ESTILO_TABLA_DETALLADA_PDF,
+                     filas_por_bloque=FILAS_BLOQUE_PDF):
     """
-    Crear tabla detallada con formato profesional en PDF
+    Genera una tabla PDF larga como bloques de LongTable con el encabezado repetido
+    
+    Las celdas se pasan como texto plano (sin Paragraph): reportlab las
+    dibuja directamente sin calcular saltos de línea. Las filas se leen
+    bloque a bloque, de modo que `filas` puede ser un generador sobre un
+    cursor de base de datos.
     
     Args:
         headers: Lista de encabezados de columna
-        data: Lista de listas con los datos
-        titulo_seccion: Título opcional de la sección
-        col_widths: Anchos de columna personalizados
+        filas: Iterable con las filas de datos
+        col_widths: Anchos de columna
+        estilo: TableStyle compartido a aplicar
+        filas_por_bloque: Filas de datos por bloque
     
-    Returns:
-        list: Lista de elementos para agregar al PDF
+    Yields:
+        LongTable: Una tabla por bloque
     """
-    from reportlab.lib.styles import getSampleStyleSheet
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
+    iterador = iter(filas)
+    primero = True
+    while True:
+        bloque = list(itertools.islice(iterador, filas_por_bloque))
+        if not bloque and not primero:
+            return
+        tabla = LongTable([headers] + bloque, colWidths=col_widths, repeatRows=1)
+        tabla.setStyle(estilo)
+        yield tabla
+        primero = False
+        if len(bloque) < filas_por_bloque:
+            return
+
+def iterar_tabla_detallada_pdf(headers, data, titulo_seccion=None, col_widths=None):
+    """Versión perezosa de crear_tabla_detallada_pdf (ver construir_pdf_incremental)"""
     # Agregar título de sección si se proporciona
     if titulo_seccion:
-        title_style = ParagraphStyle(
-            'TituloSeccionDetallada',
-            parent=styles['Heading2'],
-            fontSize=14,
-            fontName='Helvetica-Bold',
-            textColor=colors.HexColor('#2E5984'),
-            spaceBefore=20,
-            spaceAfter=12
-        )
-        elements.append(Paragraph(titulo_seccion, title_style))
-    
-    # Preparar datos de la tabla
-    table_data = [headers] + data
+        yield Paragraph(titulo_seccion, ESTILOS_PDF['TituloSeccion'])
     
     # Crear tabla con anchos automáticos si no se especifican
     if not col_widths:
         col_widths = [1.2*inch] * len(headers)
     
-    table = Table(table_data, colWidths=col_widths)
-    
-    # Aplicar estilo detallado
-    table.setStyle(TableStyle([
-        # Encabezado
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2E5984')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        
-        # Datos con fondo alternado
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        
-        # Filas alternadas para mejor legibilidad
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F9FA')]),
-    ]))
+    yield from iterar_tabla_pdf(headers, data, col_widths)
+    yield Spacer(1, 15)
+
+def crear_tabla_detallada_pdf(headers, data, titulo_seccion=None, col_widths=None):
+    """
+    Crear tabla detallada con formato profesional en PDF
     
-    elements.append(table)
-    elements.append(Spacer(1, 15))
+    Args:
+        headers: Lista de encabezados de columna
+        data: Lista de listas con los datos
+        titulo_seccion: Título opcional de la sección
+        col_widths: Anchos de columna personalizados
     
-    return elements
+    Returns:
+        list: Lista de elementos para agregar al PDF
+    """
+    return list(iterar_tabla_detallada_pdf(headers, data, titulo_seccion, col_widths))
+
+
+class FlowablesIncrementales:
+    """Lista perezosa de flowables para SimpleDocTemplate.build().
+    
+    reportlab consume la lista de elementos por el frente (lee, borra y
+    reinserta las partes de una tabla partida). Esta clase implementa esas
+    operaciones sobre un generador y solo materializa una ventana de
+    elementos, así las páginas se generan a medida que se leen las filas y
+    la memoria no crece con el total de filas del reporte.
+    """
+
+    # Elementos leídos por adelantado (keepWithNext mira algunos hacia delante)
+    VENTANA = 4
+
+    def __init__(self, flowables):
+        self._pendientes = iter(flowables)
+        self._buffer = []
+
+    def _llenar(self, cantidad):
+        while self._pendientes is not None and len(self._buffer) < cantidad:
+            try:
+                self._buffer.append(next(self._pendientes))
+            except StopIteration:
+                self._pendientes = None
+
+    def _llenar_hasta(self, indice):
+        if isinstance(indice, slice):
+            if indice.stop is None or indice.stop < 0:
+                self._llenar(float('inf'))
+            else:
+                self._llenar(indice.stop)
+        elif indice < 0:
+            self._llenar(float('inf'))
+        else:
+            self._llenar(indice + 1)
+
+    def __len__(self):
+        self._llenar(self.VENTANA)
+        return len(self._buffer)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, indice):
+        self._llenar_hasta(indice)
+        return self._buffer[indice]
+
+    def __setitem__(self, indice, valor):
+        self._llenar_hasta(indice)
+        self._buffer[indice] = valor
+
+    def __delitem__(self, indice):
+        self._llenar_hasta(indice)
+        del self._buffer[indice]
+
+    def insert(self, indice, valor):
+        self._buffer.insert(indice, valor)
+
+
+def construir_pdf_incremental(doc, flowables):
+    """Construye el documento consumiendo `flowables` (iterable o generador) de forma perezosa"""
+    doc.build(FlowablesIncrementales(flowables))
 
 def formatear_valor_moneda(valor):
     """Formatear valor como moneda"""
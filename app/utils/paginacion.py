@@ -0,0 +1,208 @@
+"""
+Paginación por clave (keyset / seek) para listados grandes.
+
+En lugar de `OFFSET n`, cada página se pide con un cursor opaco que guarda
+la clave de orden de la última (o primera) fila mostrada, y la consulta
+filtra `clave < cursor`. El costo de una página profunda es el mismo que el
+de la primera: MySQL recorre el índice desde la clave, sin descartar filas.
+
+El total de filas solo se usa para informar ("de ~N") y se cachea por
+filtros con un TTL, así que puede estar levemente desactualizado.
+"""
+
+import base64
+import binascii
+import json
+import math
+from datetime import date, datetime, time
+
+from flask import current_app, request, url_for
+from sqlalchemy import and_, or_
+
+from app.utils.cache import cache, ESPACIO_LISTADOS
+
+DIRECCION_SIGUIENTE = 's'
+DIRECCION_ANTERIOR = 'a'
+
+
+def _codificar_valor(valor):
+    if isinstance(valor, datetime):
+        return ['dt', valor.isoformat()]
+    if isinstance(valor, date):
+        return ['d', valor.isoformat()]
+    if isinstance(valor, time):
+        return ['t', valor.isoformat()]
+    return ['v', valor]
+
+
+def _decodificar_valor(valor):
+    tipo, dato = valor
+    if tipo == 'dt':
+        return datetime.fromisoformat(dato)
+    if tipo == 'd':
+        return date.fromisoformat(dato)
+    if tipo == 't':
+        return time.fromisoformat(dato)
+    return dato
+
+
+def codificar_cursor(valores, direccion, pagina):
+    """Cursor opaco (base64 url-safe) con la clave de orden, la dirección y el número de página"""
+    datos = {'k': [_codificar_valor(valor) for valor in valores], 'd': direccion, 'p': pagina}
+    texto = json.dumps(datos, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(texto).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (valores, dirección, página) o None si el cursor no es válido"""
+    if not cursor:
+        return None
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        datos = json.loads(texto)
+        valores = [_decodificar_valor(valor) for valor in datos['k']]
+        direccion = datos['d']
+        pagina = int(datos['p'])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+    if direccion not in (DIRECCION_SIGUIENTE, DIRECCION_ANTERIOR) or pagina < 1:
+        return None
+    return valores, direccion, pagina
+
+
+def _comparar_clave(columnas, valores, menor):
+    """Comparación lexicográfica (c1, ..., cn) < (v1, ..., vn) (o >) expandida en OR.
+
+    Se agrega la condición sobre la primera columna por separado para que
+    el optimizador la use como rango del índice.
+    """
+    condiciones = []
+    for indice, columna in enumerate(columnas):
+        iguales = [columnas[previa] == valores[previa] for previa in range(indice)]
+        comparacion = columna < valores[indice] if menor else columna > valores[indice]
+        condiciones.append(and_(*iguales, comparacion))
+    borde = columnas[0] <= valores[0] if menor else columnas[0] >= valores[0]
+    return and_(borde, or_(*condiciones))
+
+
+class PaginaCursor:
+    """Página de un listado paginado por clave.
+
+    Expone los mismos atributos que la paginación de Flask-SQLAlchemy que
+    usan las plantillas (items, page, per_page, total, pages, has_prev,
+    has_next) más las URLs de navegación con cursor.
+    """
+
+    def __init__(self, items, page, per_page, total, cursor_siguiente, cursor_anterior, parametro):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.parametro = parametro
+
+    @property
+    def pages(self):
+        # El total puede estar desactualizado: nunca menos páginas que la actual
+        return max(math.ceil(self.total / self.per_page) if self.per_page else 0, self.page)
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    def _url(self, cursor):
+        argumentos = request.args.to_dict()
+        argumentos.pop(self.parametro, None)
+        if cursor:
+            argumentos[self.parametro] = cursor
+        return url_for(request.endpoint, **(request.view_args or {}), **argumentos)
+
+    def url_siguiente(self):
+        return self._url(self.cursor_siguiente)
+
+    def url_anterior(self):
+        # La página 1 se pide sin cursor: siempre muestra lo más reciente
+        return self._url(self.cursor_anterior if self.page > 2 else None)
+
+    def url_primera(self):
+        return self._url(None)
+
+
+def contar_cacheado(query, clave, ttl=None):
+    """Total de filas de la consulta, cacheado por `clave` durante CONTEO_LISTADOS_TTL segundos"""
+    ttl = ttl or current_app.config.get('CONTEO_LISTADOS_TTL', 300)
+    return cache.obtener_o_calcular(
+        ESPACIO_LISTADOS, f'conteo:{clave}', lambda: query.order_by(None).count(), ttl
+    )
+
+
+def clave_filtros(listado, **filtros):
+    """Clave de caché del conteo de un listado a partir de sus filtros"""
+    return f'{listado}:' + json.dumps(filtros, sort_keys=True, default=str)
+
+
+def paginar_por_clave(query, columnas, cursor=None, per_page=20, clave_conteo=None, parametro='cursor'):
+    """Obtiene una página de `query` ordenada por `columnas` en forma descendente.
+
+    Args:
+        query: Consulta con filtros y joins (su order_by se reemplaza)
+        columnas: Columnas de la clave de orden (la última debe ser única, p.ej. id)
+        cursor: Cursor recibido en la petición (None o inválido = primera página)
+        per_page: Filas por página
+        clave_conteo: Clave de caché del total (filtros normalizados);
+            None omite el conteo
+        parametro: Nombre del parámetro de la URL que lleva el cursor
+
+    Returns:
+        PaginaCursor: las filas tienen la misma forma que las de `query`
+    """
+    total = contar_cacheado(query, clave_conteo) if clave_conteo is not None else 0
+    datos_cursor = decodificar_cursor(cursor)
+    if datos_cursor is not None and len(datos_cursor[0]) != len(columnas):
+        datos_cursor = None
+
+    # Las columnas de la clave se agregan al final de cada fila y se quitan al armar la página
+    consulta = query.order_by(None).add_columns(*columnas)
+    if datos_cursor is None:
+        pagina, hacia_atras = 1, False
+        consulta = consulta.order_by(*[columna.desc() for columna in columnas])
+    else:
+        valores, direccion, pagina = datos_cursor
+        hacia_atras = direccion == DIRECCION_ANTERIOR
+        consulta = consulta.filter(_comparar_clave(columnas, valores, menor=not hacia_atras))
+        orden = [columna.asc() if hacia_atras else columna.desc() for columna in columnas]
+        consulta = consulta.order_by(*orden)
+
+    filas = consulta.limit(per_page + 1).all()
+    hay_mas = len(filas) > per_page
+    filas = filas[:per_page]
+    if hacia_atras:
+        filas.reverse()
+        if not hay_mas:
+            # Se llegó al inicio del listado antes de lo esperado (se insertaron o
+            # borraron filas): la página 1 real es la primera sin cursor
+            pagina = 1
+
+    cursor_siguiente = cursor_anterior = None
+    if filas:
+        n_claves = len(columnas)
+        primera = tuple(filas[0])[-n_claves:]
+        ultima = tuple(filas[-1])[-n_claves:]
+        if hay_mas or hacia_atras:
+            cursor_siguiente = codificar_cursor(ultima, DIRECCION_SIGUIENTE, pagina + 1)
+        if pagina > 1:
+            cursor_anterior = codificar_cursor(primera, DIRECCION_ANTERIOR, pagina - 1)
+
+    items = [_sin_clave(fila, len(columnas)) for fila in filas]
+    return PaginaCursor(items, pagina, per_page, total, cursor_siguiente, cursor_anterior, parametro)
+
+
+def _sin_clave(fila, n_claves):
+    """Quita las columnas de la clave; una sola entidad se devuelve sin tupla"""
+    valores = tuple(fila)[:-n_claves]
+    return valores[0] if len(valores) == 1 else valores
@@ -0,0 +1,92 @@
+"""
+Resolución de periodos de reportes a rangos de fechas semiabiertos.
+
+Todos los reportes y exportaciones filtran con `columna >= inicio AND
+columna < fin` en lugar de `extract(year/month, columna)`, de modo que
+MySQL pueda usar los índices sobre las columnas de fecha (range scan).
+"""
+
+from datetime import date, datetime, timedelta
+
+
+def _a_fecha(valor):
+    """Convierte un string 'YYYY-MM-DD', date o datetime a date (None si no es válido)"""
+    if not valor:
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return datetime.strptime(str(valor).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def _primer_dia_mes_siguiente(fecha):
+    if fecha.month == 12:
+        return date(fecha.year + 1, 1, 1)
+    return date(fecha.year, fecha.month + 1, 1)
+
+
+def resolver_periodo(periodo, fecha_inicio=None, fecha_fin=None, hoy=None):
+    """Convierte un periodo de reporte en un rango semiabierto [inicio, fin).
+
+    Args:
+        periodo: 'mes_actual', 'año_actual', 'personalizado' o None/'todos'
+        fecha_inicio: Fecha inicial (inclusive) para 'personalizado'
+        fecha_fin: Fecha final (inclusive) para 'personalizado'
+        hoy: Fecha de referencia (por defecto date.today())
+
+    Returns:
+        tuple: (inicio, fin) como objetos date; cualquiera puede ser None
+        cuando ese extremo no se filtra.
+    """
+    hoy = hoy or date.today()
+
+    if periodo == 'mes_actual':
+        inicio = hoy.replace(day=1)
+        return inicio, _primer_dia_mes_siguiente(inicio)
+
+    if periodo == 'año_actual':
+        return date(hoy.year, 1, 1), date(hoy.year + 1, 1, 1)
+
+    if periodo == 'personalizado':
+        return rango_fechas(fecha_inicio, fecha_fin)
+
+    return None, None
+
+
+def rango_fechas(fecha_desde=None, fecha_hasta=None):
+    """Convierte un par de fechas inclusivas (formularios de filtro) en [desde, hasta + 1 día)"""
+    inicio = _a_fecha(fecha_desde)
+    fin = _a_fecha(fecha_hasta)
+    if fin is not None:
+        fin = fin + timedelta(days=1)
+    return inicio, fin
+
+
+def filtrar_por_rango(query, columna, inicio, fin):
+    """Aplica el rango semiabierto [inicio, fin) sobre una columna de fecha"""
+    if inicio is not None:
+        query = query.filter(columna >= inicio)
+    if fin is not None:
+        query = query.filter(columna < fin)
+    return query
+
+
+def meses_completos(inicio, fin):
+    """Devuelve ((año, mes) desde, (año, mes) hasta) si [inicio, fin) cubre meses completos.
+
+    Retorna None si alguno de los extremos no cae en el día 1 de un mes; los
+    extremos abiertos se devuelven como None.
+    """
+    if (inicio is not None and inicio.day != 1) or (fin is not None and fin.day != 1):
+        return None
+
+    desde = (inicio.year, inicio.month) if inicio is not None else None
+    hasta = None
+    if fin is not None:
+        ultimo_mes = fin - timedelta(days=1)
+        hasta = (ultimo_mes.year, ultimo_mes.month)
+    return desde, hasta
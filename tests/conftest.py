@@ -0,0 +1,54 @@
+"""
+Aplicación de pruebas sobre una base SQLite temporal.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from app.config import config, DevelopmentConfig
+from app.database import db
+from app.database.models import Item, Usuario
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    class ConfigPruebas(DevelopmentConfig):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'pruebas.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        VERIFICAR_INDICES = False
+        VERIFICAR_RESUMEN = False
+        CACHE_SHARED_PATH = None
+        EXPORT_JOBS_DIR = str(tmp_path / 'trabajos')
+        EXPORT_CACHE_DIR = str(tmp_path / 'exportaciones')
+
+    monkeypatch.setitem(config, 'pruebas', ConfigPruebas)
+    app = create_app('pruebas')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def item(app):
+    usuario = Usuario(u_username='pruebas', u_password='x')
+    item = Item(i_codigo='ART00001', i_nombre='Artículo de prueba', i_tipo='articulo',
+                i_cantidad=0, i_vUnitario=0, i_vTotal=0,
+                created_at=datetime.now() - timedelta(days=1))
+    db.session.add_all([usuario, item])
+    db.session.commit()
+    return item, usuario
+
+
+@pytest.fixture
+def cliente(app, item):
+    """Cliente HTTP con la sesión del usuario de pruebas iniciada"""
+    _, usuario = item
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['_user_id'] = str(usuario.id)
+        sesion['_fresh'] = True
+    return cliente
@@ -0,0 +1,111 @@
+"""
+Descuentos y entradas de stock concurrentes (varios hilos sobre SQLite temporal).
+"""
+
+import threading
+from decimal import Decimal
+
+from app.database import db
+from app.database.models import Item, MovimientoDetalle
+from app.database.repositories.movimientos import MovimientoRepository
+
+HILOS = 8
+INTENTOS_POR_HILO = 50
+STOCK_INICIAL = 100
+
+
+def _en_hilos(app, trabajo):
+    """Ejecuta trabajo(indice) en HILOS hilos, cada uno con su contexto y su sesión"""
+    barrera = threading.Barrier(HILOS)
+    errores = []
+
+    def ejecutar(indice):
+        with app.app_context():
+            barrera.wait()
+            try:
+                trabajo(indice)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                db.session.remove()
+
+    hilos = [threading.Thread(target=ejecutar, args=(indice,)) for indice in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert not errores, errores
+
+
+def test_salidas_concurrentes_no_sobrevenden_ni_pierden_stock(app, item):
+    item, usuario = item
+    MovimientoRepository().crear_entrada(item.id, STOCK_INICIAL, 4, usuario.id)
+    aceptadas, rechazadas = [], []
+
+    def retirar(_):
+        repo = MovimientoRepository()
+        for _ in range(INTENTOS_POR_HILO):
+            try:
+                repo.crear_salida(item.id, 1, 4, usuario.id)
+                aceptadas.append(1)
+            except ValueError as e:
+                db.session.rollback()
+                assert 'Stock insuficiente' in str(e)
+                rechazadas.append(1)
+
+    _en_hilos(app, retirar)
+
+    db.session.expire_all()
+    actual = db.session.get(Item, item.id)
+    assert len(aceptadas) == STOCK_INICIAL
+    assert len(rechazadas) == HILOS * INTENTOS_POR_HILO - STOCK_INICIAL
+    assert actual.i_cantidad == 0
+    assert Decimal(str(actual.i_vTotal)) == 0
+
+    # El kardex forma una cadena continua de saldos, sin negativos ni saltos
+    salidas = MovimientoDetalle.query.filter_by(i_id=item.id, m_tipo='salida')\
+        .order_by(MovimientoDetalle.id).all()
+    assert [m.m_stock_anterior for m in salidas] == list(range(STOCK_INICIAL, 0, -1))
+    assert [m.m_stock_actual for m in salidas] == list(range(STOCK_INICIAL - 1, -1, -1))
+
+
+def test_entradas_y_salidas_concurrentes_conservan_el_stock(app, item):
+    item, usuario = item
+    MovimientoRepository().crear_entrada(item.id, STOCK_INICIAL, 4, usuario.id)
+    aceptadas = []
+
+    def mover(indice):
+        repo = MovimientoRepository()
+        for _ in range(INTENTOS_POR_HILO):
+            if indice % 2:
+                repo.crear_entrada(item.id, 2, 4, usuario.id)
+            else:
+                try:
+                    repo.crear_salida(item.id, 3, 4, usuario.id)
+                    aceptadas.append(3)
+                except ValueError:
+                    db.session.rollback()
+
+    _en_hilos(app, mover)
+
+    db.session.expire_all()
+    actual = db.session.get(Item, item.id)
+    entradas = (HILOS // 2) * INTENTOS_POR_HILO * 2
+    assert actual.i_cantidad == STOCK_INICIAL + entradas - sum(aceptadas) >= 0
+    assert Decimal(str(actual.i_vUnitario)) == Decimal('4.00')
+    assert Decimal(str(actual.i_vTotal)) == actual.i_cantidad * 4
+
+
+def test_entrada_con_stock_negativo_toma_el_valor_de_la_entrada(app, item):
+    """Si el stock resultante no es positivo no se divide por él: se usa el valor de la entrada"""
+    item, usuario = item
+    db.session.get(Item, item.id).i_cantidad = -5
+    db.session.commit()
+
+    MovimientoRepository().crear_entrada(item.id, 3, 7, usuario.id)
+
+    db.session.expire_all()
+    actual = db.session.get(Item, item.id)
+    assert actual.i_cantidad == -2
+    assert Decimal(str(actual.i_vUnitario)) == Decimal('7.00')
+    assert Decimal(str(actual.i_vTotal)) == Decimal('21.00')
@@ -0,0 +1,44 @@
+"""
+Caché de dos niveles: invalidación por generación y tamaño del nivel local.
+"""
+
+from app.utils.cache import Cache, CacheLocal
+
+
+def test_invalidar_no_acumula_generaciones_en_el_nivel_local(monkeypatch):
+    monkeypatch.setattr(CacheLocal, 'MAXIMO_ENTRADAS', 20)
+    cache = Cache()
+    llamadas = []
+
+    for generacion in range(200):
+        valor = cache.obtener_o_calcular('dashboard', 'totales', lambda: llamadas.append(1) or generacion)
+        assert valor == generacion
+        cache.invalidar('dashboard')
+
+    assert len(llamadas) == 200
+    assert len(cache.local) <= 20
+
+
+def test_misma_generacion_se_sirve_desde_el_nivel_local():
+    cache = Cache()
+    llamadas = []
+
+    def calcular():
+        llamadas.append(1)
+        return {'total': len(llamadas)}
+
+    assert cache.obtener_o_calcular('dashboard', 'totales', calcular) == {'total': 1}
+    assert cache.obtener_o_calcular('dashboard', 'totales', calcular) == {'total': 1}
+    cache.invalidar('dashboard')
+    assert cache.obtener_o_calcular('dashboard', 'totales', calcular) == {'total': 2}
+
+
+def test_purga_las_entradas_vencidas_al_guardar(monkeypatch):
+    monkeypatch.setattr(CacheLocal, 'MAXIMO_ENTRADAS', 10)
+    local = CacheLocal()
+    for indice in range(10):
+        local.guardar(f'vieja:{indice}', indice, ttl=-1)
+    local.guardar('nueva', 'valor', ttl=60)
+
+    assert len(local) == 1
+    assert local.obtener('nueva') == 'valor'
@@ -0,0 +1,54 @@
+"""
+Valorización a una fecha con movimientos del mismo día (SQLite temporal).
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from app.database import db
+from app.database.models import Item
+from app.database.repositories.movimientos import MovimientoRepository
+from app.services.cierre_service import CierrePeriodoService
+
+
+def test_salida_del_mismo_dia_despues_de_una_entrada(item):
+    item, usuario = item
+    repo = MovimientoRepository()
+    repo.crear_entrada(item.id, 20, 4, usuario.id)
+    repo.crear_salida(item.id, 5, 4, usuario.id)
+
+    valores = CierrePeriodoService().valorizar(date.today())[item.id]
+    assert valores['cantidad'] == 15
+    assert valores['valor_unitario'] == Decimal('4.00')
+    assert valores['valor_total'] == Decimal('60.00')
+
+
+def test_salida_historica_con_fecha_a_medianoche(item):
+    """Las salidas antiguas guardaban solo la fecha: se ordenan antes que la entrada de la mañana"""
+    item, usuario = item
+    repo = MovimientoRepository()
+    repo.crear_entrada(item.id, 20, 4, usuario.id)
+    actualizado, stock_anterior, valor_anterior = repo.ajustar_stock(item.id, -5)
+    repo.nuevo_movimiento(actualizado, 'salida', 5, 4, usuario.id, stock_anterior, valor_anterior,
+                          fecha=datetime.combine(date.today(), datetime.min.time()))
+    db.session.commit()
+
+    valores = CierrePeriodoService().valorizar(date.today())[item.id]
+    assert valores['cantidad'] == 15
+    assert valores['valor_unitario'] == Decimal('4.00')
+
+
+def test_reproduccion_sin_columnas_de_kardex_coincide_con_el_stock(item):
+    """Sin estado guardado se reproduce el historial; una salida a cero conserva el valor unitario"""
+    item, usuario = item
+    repo = MovimientoRepository()
+    repo.crear_entrada(item.id, 20, 4, usuario.id)
+    repo.crear_salida(item.id, 20, 4, usuario.id)
+    for movimiento in repo.get_by_item(item.id):
+        movimiento.m_stock_actual = movimiento.m_valor_actual = None
+    db.session.commit()
+
+    valores = CierrePeriodoService().valorizar(date.today())[item.id]
+    actual = db.session.get(Item, item.id)
+    assert valores['cantidad'] == actual.i_cantidad == 0
+    assert valores['valor_unitario'] == Decimal(str(actual.i_vUnitario))
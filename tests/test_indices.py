@@ -0,0 +1,65 @@
+"""
+Índices compuestos declarados en los modelos y plan de las consultas más usadas.
+"""
+
+import pytest
+
+from app.database import db
+from app.database.indices import (
+    CONSULTAS_PLAN, crear_indices_faltantes, explicar_consultas, obtener_indices_faltantes
+)
+
+# Índice que debe elegir el plan de cada consulta representativa
+INDICE_ESPERADO = {
+    'kardex_item': 'ix_movimiento_item_id',
+    'movimientos_item_tipo': 'ix_movimiento_item_tipo_fecha',
+    'movimientos_rango_fechas': 'ix_movimiento_fecha',
+    'asignaciones_por_estado': 'ix_consumo_estado_fecha_hora',
+    'asignaciones_por_persona': 'ix_consumo_persona_fecha_hora',
+    'codigos_articulo': 'ix_item_tipo_codigo',
+}
+
+
+def _detalle_plan(filas):
+    return ' | '.join(fila['detail'] for fila in filas)
+
+
+def _borrar_indices_declarados():
+    with db.engine.begin() as conexion:
+        for tabla in db.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                indice.drop(bind=conexion)
+
+
+def test_todas_las_consultas_tienen_su_indice():
+    assert set(INDICE_ESPERADO) == set(CONSULTAS_PLAN)
+
+
+def test_create_all_crea_los_indices_declarados(app):
+    assert obtener_indices_faltantes() == []
+
+
+@pytest.mark.parametrize('consulta', sorted(INDICE_ESPERADO))
+def test_plan_usa_el_indice_compuesto(app, consulta):
+    plan = _detalle_plan(explicar_consultas()[consulta])
+    assert f'INDEX {INDICE_ESPERADO[consulta]} ' in plan, plan
+    assert 'SCAN' not in plan, plan
+
+
+def test_kardex_por_item_no_ordena_en_memoria(app):
+    plan = _detalle_plan(explicar_consultas()['kardex_item'])
+    assert 'TEMP B-TREE' not in plan, plan
+
+
+def test_indices_faltantes_se_detectan_y_se_crean(app):
+    _borrar_indices_declarados()
+    faltantes = {indice.name for indice in obtener_indices_faltantes()}
+    assert set(INDICE_ESPERADO.values()) <= faltantes
+
+    # Sin índices las consultas recorren la tabla completa
+    planes = explicar_consultas()
+    assert all('SCAN' in _detalle_plan(planes[consulta]) for consulta in INDICE_ESPERADO)
+
+    assert set(crear_indices_faltantes()) == faltantes
+    assert obtener_indices_faltantes() == []
+    assert 'SCAN' not in _detalle_plan(explicar_consultas()['movimientos_rango_fechas'])
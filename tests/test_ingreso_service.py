@@ -0,0 +1,119 @@
+"""
+Ingreso masivo de artículos de una factura (IngresoFacturaService).
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app.database import db
+from app.database.models import (
+    Articulo, Entrada, Item, MovimientoDetalle, Proveedor, ResumenMovimiento, Usuario
+)
+from app.database.repositories.movimientos import MovimientoRepository
+from app.services.ingreso_service import IngresoFacturaService
+
+
+@pytest.fixture
+def compra(app):
+    usuario = Usuario(u_username='ingresos', u_password='x')
+    proveedor = Proveedor(p_codigo='PROV001', p_razonsocial='Proveedor de prueba', p_ci_ruc='0999999999001')
+    db.session.add_all([usuario, proveedor])
+    db.session.commit()
+    return usuario.id, proveedor.id
+
+
+def _filas(cantidad):
+    return [{
+        'nombre': f'Artículo {numero}',
+        'cuenta_contable': '1.1.01',
+        'cantidad': str(numero + 1),
+        'valor_unitario': '2.50',
+    } for numero in range(cantidad)]
+
+
+def _contar_sentencias(funcion):
+    """Sentencias SQL enviadas a la base (un executemany cuenta como una)"""
+    sentencias = []
+
+    def contar(conexion, cursor, sql, parametros, contexto, executemany):
+        sentencias.append(sql)
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        resultado = funcion()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+    return resultado, len(sentencias)
+
+
+def test_factura_crea_items_movimientos_y_resumen(compra):
+    usuario_id, proveedor_id = compra
+    resultado = IngresoFacturaService().registrar_factura(
+        _filas(100), usuario_id, proveedor_id=proveedor_id, numero_factura='F-001'
+    )
+
+    assert resultado['success'], resultado
+    assert len(set(resultado['codigos'])) == 100
+    assert Item.query.filter(Item.i_codigo.in_(resultado['codigos'])).count() == 100
+    assert Articulo.query.count() == 100
+
+    entrada = Entrada.query.one()
+    assert entrada.e_numFactura == 'F-001' and entrada.p_id == proveedor_id
+
+    movimientos = MovimientoDetalle.query.all()
+    assert len(movimientos) == 100
+    assert all(m.e_id == entrada.id and m.m_stock_anterior == 0 for m in movimientos)
+    assert all(m.m_stock_actual == m.m_cantidad for m in movimientos)
+    assert sum(r.r_movimientos for r in ResumenMovimiento.query.all()) == 100
+
+    item = Item.query.filter_by(i_codigo=resultado['codigos'][9]).one()
+    assert item.i_cantidad == 10
+    assert MovimientoRepository().obtener_totales_item(item.id)['saldo'] == 10
+
+
+def test_sentencias_no_crecen_con_las_filas(compra):
+    """Inserciones masivas: la cantidad de sentencias no depende del número de líneas"""
+    usuario_id, proveedor_id = compra
+    servicio = IngresoFacturaService()
+    filas = _filas(500)
+    # La primera factura crea además la fila de la secuencia de códigos
+    servicio.registrar_factura(filas[:1], usuario_id, proveedor_id=proveedor_id, numero_factura='F-000')
+
+    pocas, sentencias_pocas = _contar_sentencias(lambda: servicio.registrar_factura(
+        filas[1:6], usuario_id, proveedor_id=proveedor_id, numero_factura='F-001'
+    ))
+    muchas, sentencias_muchas = _contar_sentencias(lambda: servicio.registrar_factura(
+        filas[6:], usuario_id, proveedor_id=proveedor_id, numero_factura='F-002'
+    ))
+
+    assert pocas['success'] and muchas['success']
+    assert Item.query.count() == 500
+    assert sentencias_muchas == sentencias_pocas
+
+
+def test_fila_invalida_no_escribe_nada(compra):
+    usuario_id, proveedor_id = compra
+    filas = _filas(3)
+    filas[1]['cantidad'] = '0'
+    filas[2]['nombre'] = filas[0]['nombre']
+
+    resultado = IngresoFacturaService().registrar_factura(
+        filas, usuario_id, proveedor_id=proveedor_id, numero_factura='F-001'
+    )
+
+    assert not resultado['success']
+    assert [error['fila'] for error in resultado['errores']] == [2, 3]
+    assert Item.query.count() == 0
+    assert MovimientoDetalle.query.count() == 0
+    assert Entrada.query.count() == 0
+
+
+def test_donacion_sin_proveedor_ni_entrada(compra):
+    usuario_id, _ = compra
+    resultado = IngresoFacturaService().registrar_factura(
+        _filas(2), usuario_id, es_donacion=True, observaciones_donacion='Donación anual'
+    )
+
+    assert resultado['success'], resultado
+    assert Entrada.query.count() == 0
+    assert all(m.e_id is None and 'DONACIÓN' in m.m_observaciones for m in MovimientoDetalle.query.all())
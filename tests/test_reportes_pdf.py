@@ -0,0 +1,55 @@
+"""
+Exportación de reportes a PDF con detalle acotado y completo.
+"""
+
+import time
+
+import pytest
+
+from app.database.repositories.movimientos import MovimientoRepository
+from app.routes.web.reportes import MODO_DETALLE_COMPLETO
+from app.services.exportacion_service import ESTADO_PENDIENTE, ESTADO_PROCESANDO, ESTADO_COMPLETADO
+
+
+@pytest.fixture
+def movimientos(item):
+    item, usuario = item
+    repo = MovimientoRepository()
+    repo.crear_entrada(item.id, 20, 4, usuario.id)
+    for _ in range(3):
+        repo.crear_salida(item.id, 2, 4, usuario.id)
+
+
+@pytest.mark.parametrize('tipo_reporte', ['movimientos', 'completo'])
+@pytest.mark.parametrize('detalle', ['', MODO_DETALLE_COMPLETO])
+def test_exportar_pdf_con_movimientos(cliente, movimientos, tipo_reporte, detalle):
+    respuesta = cliente.post('/reportes/exportar/pdf', data={
+        'tipo_reporte': tipo_reporte, 'periodo': 'anual', 'detalle': detalle
+    })
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert respuesta.data.startswith(b'%PDF')
+
+
+@pytest.mark.parametrize('detalle', ['', MODO_DETALLE_COMPLETO])
+def test_exportar_pdf_sin_movimientos(cliente, detalle):
+    respuesta = cliente.post('/reportes/exportar/pdf', data={
+        'tipo_reporte': 'movimientos', 'periodo': 'anual', 'detalle': detalle
+    })
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    assert respuesta.data.startswith(b'%PDF')
+
+
+@pytest.mark.parametrize('detalle', ['', MODO_DETALLE_COMPLETO])
+def test_trabajo_pdf_con_movimientos(cliente, movimientos, detalle):
+    respuesta = cliente.post('/reportes/exportar/pdf/trabajo', data={
+        'tipo_reporte': 'movimientos', 'periodo': 'anual', 'detalle': detalle
+    })
+    trabajo = respuesta.get_json()['trabajo']
+    limite = time.monotonic() + 30
+    while trabajo['estado'] in (ESTADO_PENDIENTE, ESTADO_PROCESANDO) and time.monotonic() < limite:
+        time.sleep(0.05)
+        trabajo = cliente.get(f"/reportes/trabajos/{trabajo['id']}").get_json()['trabajo']
+    assert trabajo['estado'] == ESTADO_COMPLETADO, trabajo
+
+    descarga = cliente.get(f"/reportes/trabajos/{trabajo['id']}/descargar")
+    assert descarga.data.startswith(b'%PDF')
@@ -0,0 +1,47 @@
+"""
+Verificación al arrancar del resumen mensual de movimientos.
+"""
+
+from app.database import db
+from app.database.models import ResumenMovimiento
+from app.database.repositories.movimientos import MovimientoRepository
+from app.database.resumen import contar_movimientos_resumidos, verificar_resumen
+
+
+def _movimientos(item):
+    item, usuario = item
+    repo = MovimientoRepository()
+    repo.crear_entrada(item.id, 20, 4, usuario.id)
+    repo.crear_salida(item.id, 5, 4, usuario.id)
+    repo.crear_salida(item.id, 3, 4, usuario.id)
+    return item
+
+
+def test_resumen_al_dia(app, item):
+    _movimientos(item)
+    assert contar_movimientos_resumidos() == (3, 3)
+    assert verificar_resumen(app)
+
+
+def test_resumen_vacio_se_reconstruye(app, item):
+    """Base existente actualizada: hay movimientos pero el resumen nunca se llenó"""
+    item = _movimientos(item)
+    ResumenMovimiento.query.delete()
+    db.session.commit()
+    assert MovimientoRepository().obtener_totales_item(item.id)['saldo'] == 0
+
+    assert verificar_resumen(app)
+
+    db.session.expire_all()
+    assert contar_movimientos_resumidos() == (3, 3)
+    assert MovimientoRepository().obtener_totales_item(item.id)['saldo'] == 12
+
+
+def test_resumen_incompleto_solo_se_informa(app, item, caplog):
+    _movimientos(item)
+    ResumenMovimiento.query.filter_by(r_tipo='salida').delete()
+    db.session.commit()
+
+    assert not verificar_resumen(app)
+    assert 'flask resumen-movimientos-rebuild' in caplog.text
+    assert contar_movimientos_resumidos() == (3, 1)